@@ -0,0 +1,22 @@
+# backfill_activity.py
+"""
+Rebuild the per-user activity rollups (activity_daily, activity_levels) from
+chat_messages, todo_items and timetable_entries.
+
+The app does this once by itself on the first start after upgrading; run it
+by hand after bulk imports or raw-SQL fixes that bypassed the ORM.
+
+Usage: python backfill_activity.py [--days N]
+"""
+import argparse
+
+from newapp import activity_rollups, startup
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the activity rollups from the source tables")
+    parser.add_argument("--days", type=int, default=None,
+                        help="only rebuild the daily rows of the last N days (default: all history)")
+    args = parser.parse_args()
+
+    startup.ensure_schema()
+    print(activity_rollups.backfill(args.days))
@@ -0,0 +1,179 @@
+# bench_activity_rollups.py
+"""
+Activity rollups: validation against raw counts, and window query cost.
+
+In a throwaway SQLite database, seeds MESSAGES_PER_USER historical chat
+messages per user over the last 90 days with Core inserts (which the ORM
+hooks don't see) and runs `activity_rollups.backfill()`. Then replays
+OPERATIONS random ORM writes through SessionLocal - messages sent and
+deleted, todos created, completed, reopened and deleted, timetable classes
+added, moved to another day and removed - committing (or now and then
+rolling back) each one so the after_commit deltas apply.
+
+Every user's rollups are then compared with counts over the source tables
+(messages this week / the week before, pending todos, classes per weekday),
+and every daily row's message count with a fresh backfill's. Mismatches are
+printed and the script exits non-zero.
+
+Finally it times the two-week message counts for every user both ways: two
+COUNTs over chat_messages vs one SUM over activity_daily.
+
+Usage: python bench_activity_rollups.py [users] [messages_per_user] [operations]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+MESSAGES_PER_USER = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+OPERATIONS = int(sys.argv[3]) if len(sys.argv) > 3 else 3000
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+from sqlalchemy import func, insert, select
+
+from newapp import activity_rollups, models, startup
+from newapp.database import SessionLocal, engine
+
+_messages = models.ChatMessage.__table__
+
+
+def seed(rng: random.Random) -> tuple:
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [{
+            "email": f"student{i}@bench.local", "college_id": f"STU{i}", "hashed_password": "!",
+            "full_name": f"Student {i}", "department": "Bench", "year": 1,
+            "is_verified": True, "is_active": True,
+        } for i in range(USERS)])
+        users = models.User.__table__
+        user_ids = [row.id for row in conn.execute(select(users.c.id).where(users.c.email.like("%@bench.local")))]
+        group_id = conn.execute(insert(models.ChatGroup.__table__).values(
+            name="Bench", created_by=user_ids[0])).inserted_primary_key[0]
+        rows = [{
+            "group_id": group_id, "sender_id": user_id, "message": "hi",
+            "created_at": now - timedelta(days=rng.uniform(0, 90)),
+        } for user_id in user_ids for _ in range(MESSAGES_PER_USER)]
+        for offset in range(0, len(rows), 10000):
+            conn.execute(insert(_messages), rows[offset:offset + 10000])
+    return user_ids, group_id
+
+
+def replay(rng: random.Random, user_ids: list, group_id: int):
+    db = SessionLocal()
+    for _ in range(OPERATIONS):
+        user_id = rng.choice(user_ids)
+        op = rng.random()
+        if op < 0.35:
+            db.add(models.ChatMessage(group_id=group_id, sender_id=user_id, message="hello"))
+        elif op < 0.4:
+            message = db.query(models.ChatMessage).filter_by(sender_id=user_id) \
+                .order_by(models.ChatMessage.id.desc()).first()
+            if message:
+                db.delete(message)
+        elif op < 0.6:
+            db.add(models.TodoItem(user_id=user_id, task="Read chapter", is_completed=rng.random() < 0.1))
+        elif op < 0.75:
+            todo = db.query(models.TodoItem).filter_by(user_id=user_id).first()
+            if todo:
+                todo.is_completed = not todo.is_completed
+        elif op < 0.8:
+            todo = db.query(models.TodoItem).filter_by(user_id=user_id).first()
+            if todo:
+                db.delete(todo)
+        elif op < 0.9:
+            db.add(models.TimetableEntry(
+                user_id=user_id, course_id=1, day_of_week=rng.choice(activity_rollups.WEEKDAYS + ("Funday",)),
+                start_time="09:00", end_time="10:00", course_name="Maths", teacher="T", room_number="101"))
+        elif op < 0.95:
+            entry = db.query(models.TimetableEntry).filter_by(user_id=user_id).first()
+            if entry:
+                entry.day_of_week = rng.choice(activity_rollups.WEEKDAYS)
+        else:
+            entry = db.query(models.TimetableEntry).filter_by(user_id=user_id).first()
+            if entry:
+                db.delete(entry)
+        if rng.random() < 0.05:
+            db.rollback()
+        else:
+            db.commit()
+    db.close()
+
+
+def raw_weeks(conn, user_id: int, today) -> tuple:
+    def count(start, end):
+        return conn.execute(select(func.count()).where(
+            _messages.c.sender_id == user_id,
+            _messages.c.created_at >= datetime.combine(start, datetime.min.time()),
+            _messages.c.created_at < datetime.combine(end, datetime.min.time()))).scalar()
+    week_start = today - timedelta(days=6)
+    return count(week_start, today + timedelta(days=1)), count(today - timedelta(days=13), week_start)
+
+
+def validate(user_ids: list) -> int:
+    today = datetime.utcnow().date()
+    failures = 0
+    with engine.connect() as conn:
+        weeks = activity_rollups.weekly_messages(conn, today)
+        stored_levels = activity_rollups.user_levels(conn, user_ids)
+        expected_levels = activity_rollups.compute_levels(conn, user_ids)
+        daily = {(row.user_id, row.day): tuple(row._mapping[c] for c in activity_rollups.FLOW_COLUMNS)
+                 for row in conn.execute(select(activity_rollups.daily))}
+        for user_id in user_ids:
+            expected = raw_weeks(conn, user_id, today)
+            if weeks.get(user_id, (0, 0)) != expected:
+                failures += 1
+                print(f"❌ user {user_id} weekly messages: rollup {weeks.get(user_id)} vs raw {expected}")
+            if stored_levels[user_id] != expected_levels[user_id]:
+                failures += 1
+                print(f"❌ user {user_id} levels: rollup {stored_levels[user_id]} vs raw {expected_levels[user_id]}")
+
+    activity_rollups.backfill()
+    with engine.connect() as conn:
+        rebuilt = {(row.user_id, row.day): tuple(row._mapping[c] for c in activity_rollups.FLOW_COLUMNS)
+                   for row in conn.execute(select(activity_rollups.daily))}
+    # The todo counters count events, and a backfill only sees the todos that still exist
+    # (and their last update, not the completion); compare the message counts
+    differing = [key for key in set(daily) | set(rebuilt)
+                 if daily.get(key, (0, 0, 0))[0] != rebuilt.get(key, (0, 0, 0))[0]]
+    for key in differing[:10]:
+        print(f"❌ daily row {key}: incremental {daily.get(key)} vs backfill {rebuilt.get(key)}")
+    failures += len(differing)
+    print(f"validated {len(user_ids)} users and {len(rebuilt)} daily rows: {failures} mismatching")
+    return failures
+
+
+def measure(user_ids: list):
+    today = datetime.utcnow().date()
+    with engine.connect() as conn:
+        started = time.perf_counter()
+        for user_id in user_ids:
+            raw_weeks(conn, user_id, today)
+        raw_ms = (time.perf_counter() - started) / len(user_ids) * 1000
+
+        started = time.perf_counter()
+        for user_id in user_ids:
+            activity_rollups.weekly_messages(conn, today, [user_id])
+        rollup_ms = (time.perf_counter() - started) / len(user_ids) * 1000
+    print(f"two-week message counts per user: raw {raw_ms:.3f} ms, rollup {rollup_ms:.3f} ms")
+
+
+def main():
+    rng = random.Random(5)
+    startup.bootstrap()
+    user_ids, group_id = seed(rng)
+    started = time.perf_counter()
+    stats = activity_rollups.backfill()
+    print(f"{USERS} users x {MESSAGES_PER_USER} messages; backfill {time.perf_counter() - started:.2f}s {stats}")
+    replay(rng, user_ids, group_id)
+    failures = validate(user_ids)
+    measure(user_ids)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# bench_ai_agent.py
+"""
+AI agent registry: per-question agent builds vs one shared agent.
+
+Starts a local stand-in MCP server (streamable HTTP, JSON responses, two
+tools) on 127.0.0.1 that counts the TCP connections it accepts and the
+tools/list calls it answers, and uses a canned-reply chat model so no
+OpenAI key is needed. Then:
+
+  - per request: QUESTIONS questions, each through a brand-new
+    `AgentRegistry` (what a per-request AIAssistant did)
+  - shared: the same questions through one registry
+  - ttl: with a 1 s TTL, the tools are re-discovered after it expires
+  - failure: a failed agent call makes the next question re-discover tools
+  - outage: with the stand-in server down, the old agent keeps answering
+
+Reports mean latency per question and the server's tools/list and connection
+counts; a failed check exits non-zero.
+
+Needs langchain and langchain-mcp-adapters installed.
+
+Usage: python bench_ai_agent.py [questions]
+"""
+import asyncio
+import itertools
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUESTIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from newapp import ai_agent, llm_gate
+
+TOOLS = [
+    {"name": "get_timetable", "description": "A student's classes for a day",
+     "inputSchema": {"type": "object", "properties": {"user_id": {"type": "integer"}, "day": {"type": "string"}},
+                     "required": ["user_id"]}},
+    {"name": "get_mess_menu", "description": "Today's mess menu",
+     "inputSchema": {"type": "object", "properties": {}}},
+]
+
+
+class StandInMCP(BaseHTTPRequestHandler):
+    """Just enough of MCP over streamable HTTP for tool discovery and calls"""
+    protocol_version = "HTTP/1.1"  # keep-alive
+    connections = 0
+    tools_listed = 0
+
+    def setup(self):
+        super().setup()
+        StandInMCP.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: dict = None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Mcp-Session-Id", "bench")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._reply(405)  # no server-initiated stream
+
+    def do_DELETE(self):
+        self._reply(200)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        method = request.get("method")
+        if "id" not in request:
+            return self._reply(202)  # notification
+        if method == "initialize":
+            result = {"protocolVersion": request["params"]["protocolVersion"], "capabilities": {"tools": {}},
+                      "serverInfo": {"name": "stand-in", "version": "0"}}
+        elif method == "tools/list":
+            StandInMCP.tools_listed += 1
+            result = {"tools": TOOLS}
+        elif method == "tools/call":
+            result = {"content": [{"type": "text", "text": "[]"}], "isError": False}
+        else:
+            result = {}
+        self._reply(200, {"jsonrpc": "2.0", "id": request["id"], "result": result})
+
+
+class CannedModel(GenericFakeChatModel):
+    """Always answers without calling a tool"""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+class FailingOnce(CannedModel):
+    failed: bool = False
+
+    def _generate(self, *args, **kwargs):
+        if not self.failed:
+            self.failed = True
+            raise RuntimeError("upstream error")
+        return super()._generate(*args, **kwargs)
+
+
+def registry_for(url: str, model, **kwargs) -> ai_agent.AgentRegistry:
+    """No rate limit: this measures agent setup, not admission control"""
+    return ai_agent.AgentRegistry(url, model, gate=llm_gate.LLMGate(rate=0), **kwargs)
+
+
+def canned() -> CannedModel:
+    return CannedModel(messages=itertools.repeat(AIMessage(content="The library is open from 8 am to midnight.")))
+
+
+def check(label: str, ok: bool, detail: str = "") -> int:
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return 0 if ok else 1
+
+
+async def timed(label: str, url: str, per_request: bool) -> float:
+    StandInMCP.connections = StandInMCP.tools_listed = 0
+    shared = registry_for(url, canned())
+    started = time.perf_counter()
+    for _ in range(QUESTIONS):
+        registry = registry_for(url, canned()) if per_request else shared
+        await registry.invoke("When is the library open?")
+        if per_request:
+            await registry.shutdown()
+    mean_ms = (time.perf_counter() - started) / QUESTIONS * 1000
+    await shared.shutdown()
+    print(f"{label:<12} {mean_ms:8.2f} ms/question  tools/list {StandInMCP.tools_listed:>4}  "
+          f"connections {StandInMCP.connections:>4}")
+    return mean_ms
+
+
+async def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInMCP)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/mcp"
+    print(f"stand-in MCP server at {url}, {QUESTIONS} questions\n")
+
+    per_request = await timed("per request", url, per_request=True)
+    shared = await timed("shared", url, per_request=False)
+    listed, connections = StandInMCP.tools_listed, StandInMCP.connections
+    print(f"\n{per_request / shared:.1f}x faster per question\n")
+
+    failures = check("shared registry discovers tools once", listed == 1, f"{listed} tools/list calls")
+    failures += check("shared registry reuses connections", connections < QUESTIONS,
+                      f"{connections} connections for {QUESTIONS} questions")
+
+    registry = registry_for(url, canned(), ttl=1)
+    StandInMCP.tools_listed = 0
+    await registry.invoke("q")
+    await asyncio.sleep(1.1)
+    await registry.invoke("q")
+    failures += check("tools re-discovered after the TTL", StandInMCP.tools_listed == 2)
+
+    registry = registry_for(url, FailingOnce(messages=itertools.repeat(AIMessage(content="ok"))))
+    StandInMCP.tools_listed = 0
+    try:
+        await registry.invoke("q")
+    except RuntimeError:
+        pass
+    await registry.invoke("q")
+    failures += check("tools re-discovered after a failed call", StandInMCP.tools_listed == 2)
+
+    registry = registry_for(url, canned(), ttl=0)
+    await registry.invoke("q")
+    server.shutdown()
+    server.server_close()
+    try:
+        answer = await registry.invoke("q")
+    except Exception as e:
+        answer = repr(e)
+    failures += check("old agent keeps answering while the MCP server is down",
+                      answer.startswith("The library"), answer[:80])
+    await registry.shutdown()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,164 @@
+# bench_ai_roundtrips.py
+"""
+Database round trips per AI question.
+
+In a throwaway SQLite database with KB_ROWS knowledge-base rows, asks
+`AIAssistant.get_response` QUESTIONS questions on each path - answered from
+the knowledge base, answered from the cache, answered without the knowledge
+base, unanswered (the agent is unsure, so the question goes to the review
+queue) and busy (the gate sheds it) - with a fake agent that answers
+instantly, and counts SQL statements and commits per question.
+
+Checks that every path writes in exactly one commit, that the returned
+chat_id is the stored reply (and never looked up with a query on
+chat_history), that the knowledge-base category list is read once and not
+per unanswered question, and that it's re-read after an answer is added to
+the knowledge base. Exits non-zero on a failed check.
+
+Usage: python bench_ai_roundtrips.py [questions] [kb_rows]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+QUESTIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+KB_ROWS = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+from sqlalchemy import event
+
+from newapp import ai_agent, answer_cache, llm_gate, models, startup
+from newapp.ai_service import AIAssistant
+from newapp.database import SessionLocal, engine
+
+CONFIDENT = "The central library is open from 8 am to midnight on weekdays and 9 am to 6 pm on weekends."
+UNSURE = "I don't have enough information about that, sorry."
+
+statements = []
+commits = 0
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+
+@event.listens_for(engine, "commit")
+def _count_commit(conn):
+    global commits
+    commits += 1
+
+
+class Reply:
+    type = "ai"
+
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeAgent:
+    answer = CONFIDENT
+
+    async def ainvoke(self, inputs):
+        return {"messages": [Reply(self.answer)]}
+
+
+class Shed(llm_gate.LLMGate):
+    async def run(self, key, call):
+        raise llm_gate.LLMBusy("queue full")
+
+
+def check(label: str, ok: bool, detail: str = "") -> int:
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return 0 if ok else 1
+
+
+async def ask(user_id: int, question: str) -> dict:
+    global commits
+    statements.clear()
+    commits = 0
+    db = SessionLocal()
+    try:
+        response = await AIAssistant(db).get_response(user_id, question)
+    finally:
+        db.close()
+    result = {
+        "response": response, "statements": len(statements), "commits": commits,
+        "category_scans": sum("DISTINCT" in s and "knowledge_base.category" in s for s in statements),
+        "chat_lookups": sum(s.lstrip().startswith("SELECT") and "chat_history" in s for s in statements),
+    }
+    with SessionLocal() as db:
+        stored = db.get(models.ChatHistory, response["chat_id"])
+    result["stored"] = stored is not None and not stored.is_user and stored.message == response["response"]
+    return result
+
+
+async def main():
+    startup.bootstrap()
+    with SessionLocal() as db:
+        user = models.User(email="bench@x.com", college_id="B1", full_name="Bench", hashed_password="x",
+                           department="CS", year=2, is_active=True)
+        db.add(user)
+        db.add_all(models.KnowledgeBase(
+            category=["academics", "hostel", "library", "sports", "general"][i % 5],
+            title=f"Notice {i}", content=f"Circular number {i} for students. " * 20,
+            source_url=f"https://iitpkd.ac.in/notice/{i}", keywords=f"notice,circular,{i}",
+        ) for i in range(KB_ROWS))
+        db.add(models.KnowledgeBase(category="library", title="Library timings",
+                                    content="The central library is open from 8 am to midnight on weekdays.",
+                                    source_url="admin_added", keywords="library,timings,hours,open"))
+        db.commit()
+        user_id = user.id
+
+    agent = FakeAgent()
+    registry = ai_agent.registry
+    registry._agent = agent
+    registry._built_at = 10 ** 9  # never expires during the run
+    registry.gate = llm_gate.LLMGate(max_concurrency=100, rate=0)
+
+    paths = {
+        "kb answer": lambda i: "What are the library timings?" if i == 0 else None,
+        "cached": lambda i: "library timings",
+        "general": lambda i: f"Is there a shuttle to the railway station on day {i}?",
+        "unanswered": lambda i: f"Who runs the robotics society meeting number {i}?",
+        "busy": lambda i: f"What's the holiday list for the term {i}?",
+    }
+    results = {}
+    for path, question_for in paths.items():
+        agent.answer = UNSURE if path == "unanswered" else CONFIDENT
+        registry.gate = Shed(rate=0) if path == "busy" else llm_gate.LLMGate(max_concurrency=100, rate=0)
+        runs = []
+        for i in range(QUESTIONS if path != "kb answer" else 1):
+            runs.append(await ask(user_id, question_for(i)))
+        results[path] = runs
+
+    print(f"{QUESTIONS} questions per path, {KB_ROWS + 1} knowledge-base rows\n")
+    print(f"{'':<12}{'statements':>11}{'commits':>9}")
+    for path, runs in results.items():
+        print(f"{path:<12}{sum(r['statements'] for r in runs) / len(runs):>11.1f}"
+              f"{sum(r['commits'] for r in runs) / len(runs):>9.1f}")
+    print()
+
+    every = [r for runs in results.values() for r in runs]
+    failures = check("one commit per question on every path", all(r["commits"] == 1 for r in every),
+                     str(sorted({r["commits"] for r in every})))
+    failures += check("cached path answered from the cache",
+                      all(r["response"].get("cached") for r in results["cached"]))
+    failures += check("chat_id is the stored reply", all(r["stored"] for r in every))
+    failures += check("chat_id not looked up with a query", not any(r["chat_lookups"] for r in every))
+    scans = sum(r["category_scans"] for r in results["unanswered"])
+    failures += check("category list read once for all unanswered questions", scans <= 1, f"{scans} scans")
+
+    agent.answer = UNSURE
+    registry.gate = llm_gate.LLMGate(max_concurrency=100, rate=0)
+    answer_cache.cache.invalidate_matching("robotics society")  # what /ai/add-answer does after adding a row
+    rescan = await ask(user_id, "Who runs the robotics society meeting number 999?")
+    failures += check("category list re-read after the knowledge base changes", rescan["category_scans"] == 1)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
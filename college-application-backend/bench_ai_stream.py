@@ -0,0 +1,238 @@
+# bench_ai_stream.py
+"""
+Streamed AI answers: time to first byte, database use while streaming, and
+clean-up when the client goes away.
+
+Installs a fake agent in `ai_agent.registry` that "thinks" for THINK seconds
+and then writes TOKENS tokens TOKEN_DELAY seconds apart (a tool-result chunk
+first, which must not reach the client), behind a gate with no rate limit.
+Then, in a throwaway SQLite database, calls the ASGI app directly - the test
+client would buffer the whole body - REQUESTS times each for /ai/ask and
+/ai/ask/stream, and reports time to first byte and total time.
+
+Checks:
+  - the stream's first byte arrives within THINK + a few tokens, well
+    before /ai/ask's
+  - the streamed tokens add up to the `done` event's response, which has a
+    chat_id naming the stored reply, and NDJSON carries the same events
+  - a streamed answer is written in one commit, with no pooled connection
+    checked out while tokens are being sent
+  - a client that disconnects mid-answer still has its question stored,
+    and the gate is left with nothing in flight
+  - a second stream of the same question is coalesced onto the first
+
+Usage: python bench_ai_stream.py [requests]
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+THINK = 0.3
+TOKEN_DELAY = 0.02
+TOKENS = [f"word{i} " for i in range(60)]
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+from sqlalchemy import event, func, select
+
+from newapp import ai_agent, llm_gate, models, startup
+from newapp.database import SessionLocal, engine
+from newapp.main import app
+
+
+class Chunk:
+    def __init__(self, content: str, type: str = "AIMessageChunk"):
+        self.content = content
+        self.type = type
+
+
+class FakeAgent:
+    async def ainvoke(self, inputs):
+        await asyncio.sleep(THINK + TOKEN_DELAY * len(TOKENS))
+        return {"messages": [Chunk("".join(TOKENS), "ai")]}
+
+    async def astream(self, inputs, stream_mode="messages"):
+        await asyncio.sleep(THINK)
+        yield Chunk("[tool result: 3 rows]", "tool"), {}
+        for token in TOKENS:
+            await asyncio.sleep(TOKEN_DELAY)
+            yield Chunk(token), {}
+
+
+commits = 0
+checked_out = 0
+
+
+@event.listens_for(engine, "commit")
+def _count_commit(conn):
+    global commits
+    commits += 1
+
+
+@event.listens_for(engine.pool, "checkout")
+def _checkout(*args):
+    global checked_out
+    checked_out += 1
+
+
+@event.listens_for(engine.pool, "checkin")
+def _checkin(*args):
+    global checked_out
+    checked_out -= 1
+
+
+async def call(path: str, user_id: int, question: str, accept: str = "", disconnect_after: int = 0) -> dict:
+    """One request straight through the ASGI app; timings, body chunks and connections held per chunk"""
+    body = json.dumps({"message": question}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": f"user_id={user_id}".encode(), "client": ("127.0.0.1", 5000), "server": ("bench", 80),
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"), (b"accept", accept.encode())],
+    }
+    gone = asyncio.Event()
+    requested = False
+    result = {"chunks": [], "held": [], "first": None}
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    started = time.perf_counter()
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            if result["first"] is None:
+                result["first"] = time.perf_counter() - started
+            result["chunks"].append(message["body"])
+            result["held"].append(checked_out)
+            if disconnect_after and len(result["chunks"]) >= disconnect_after:
+                gone.set()
+
+    await app(scope, receive, send)
+    result["total"] = time.perf_counter() - started
+    return result
+
+
+def sse_events(chunks: list) -> list:
+    text = b"".join(chunks).decode()
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def ndjson_events(chunks: list) -> list:
+    rows = [json.loads(line) for line in b"".join(chunks).decode().splitlines() if line]
+    return [(row.pop("event"), row) for row in rows]
+
+
+def check(label: str, ok: bool, detail: str = "") -> int:
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return 0 if ok else 1
+
+
+async def coalesced() -> bool:
+    gate = llm_gate.LLMGate(rate=0)
+    opened = 0
+
+    async def tokens():
+        nonlocal opened
+        opened += 1
+        for token in TOKENS[:5]:
+            await asyncio.sleep(TOKEN_DELAY)
+            yield token
+
+    async def read():
+        return [part async for part in gate.stream("k", tokens)]
+
+    first, second = await asyncio.gather(read(), read())
+    return opened == 1 and "".join(first) == "".join(second) == "".join(TOKENS[:5]) and len(second) == 1
+
+
+async def main():
+    startup.bootstrap()
+    with SessionLocal() as db:
+        user = models.User(email="bench@x.com", college_id="B1", full_name="Bench", hashed_password="x",
+                           department="CS", year=2, is_active=True)
+        db.add(user)
+        db.commit()
+        user_id = user.id
+    ai_agent.registry._agent = FakeAgent()
+    ai_agent.registry._built_at = time.monotonic()
+    ai_agent.registry.gate = llm_gate.LLMGate(max_concurrency=100, rate=0)
+
+    timings = {"/ai/ask": [], "/ai/ask/stream": []}
+    failures = 0
+    stream_commits, held, matched = [], [], True
+    for i in range(REQUESTS):
+        for path in timings:
+            question = f"question {i} about the timetable via {path}"
+            before = commits
+            r = await call(path, user_id, question)
+            timings[path].append((r["first"], r["total"]))
+            if path == "/ai/ask/stream":
+                stream_commits.append(commits - before)
+                events = sse_events(r["chunks"])
+                name, done = events[-1]
+                text = "".join(data["text"] for kind, data in events if kind == "token")
+                held.extend(r["held"][1:-1])  # token chunks; the last carries `done`, after the write
+                with SessionLocal() as db:
+                    stored = db.get(models.ChatHistory, done.get("chat_id"))
+                matched &= (name == "done" and text == done["response"] and "[tool" not in text
+                            and stored is not None and stored.message == done["response"])
+
+    print(f"fake agent: {THINK:.1f}s thinking, {len(TOKENS)} tokens {TOKEN_DELAY * 1000:.0f} ms apart\n")
+    print(f"{'':<16}{'ttfb p50 ms':>12}{'total p50 ms':>14}")
+    for path, rows in timings.items():
+        print(f"{path:<16}{statistics.median(t[0] for t in rows) * 1000:>12.0f}"
+              f"{statistics.median(t[1] for t in rows) * 1000:>14.0f}")
+    print()
+
+    stream_ttfb = statistics.median(t[0] for t in timings["/ai/ask/stream"])
+    plain_ttfb = statistics.median(t[0] for t in timings["/ai/ask"])
+    failures += check("stream's first byte within thinking time + 5 tokens",
+                      stream_ttfb < THINK + 5 * TOKEN_DELAY + 0.1, f"{stream_ttfb * 1000:.0f} ms")
+    failures += check("stream's first byte well before /ai/ask's", stream_ttfb < plain_ttfb / 2,
+                      f"{stream_ttfb * 1000:.0f} vs {plain_ttfb * 1000:.0f} ms")
+    failures += check("streamed tokens make up the stored reply", matched)
+    failures += check("one commit per streamed answer", set(stream_commits) == {1}, str(stream_commits))
+    failures += check("no pooled connection held while tokens are sent", not any(held),
+                      f"max {max(held, default=0)}")
+
+    r = await call("/ai/ask/stream", user_id, "ndjson question about the timetable", accept="application/x-ndjson")
+    events = ndjson_events(r["chunks"])
+    failures += check("NDJSON carries the same events", events[-1][0] == "done" and
+                      "".join(d["text"] for k, d in events if k == "token") == events[-1][1]["response"])
+
+    question = "disconnecting question about the timetable"
+    r = await call("/ai/ask/stream", user_id, question, disconnect_after=3)
+    await asyncio.sleep(0.2)
+    with SessionLocal() as db:
+        rows = db.execute(select(models.ChatHistory.is_user, func.count()).where(
+            models.ChatHistory.message == question).group_by(models.ChatHistory.is_user)).all()
+        replies = db.scalar(select(func.count()).select_from(models.ChatHistory).where(
+            models.ChatHistory.user_id == user_id, models.ChatHistory.is_user.is_(False)))
+    failures += check("disconnect stops the stream", r["total"] < THINK + len(TOKENS) * TOKEN_DELAY,
+                      f"{r['total'] * 1000:.0f} ms, {len(r['chunks'])} chunks")
+    failures += check("disconnected question is stored", rows == [(True, 1)], str(rows))
+    failures += check("no reply stored for it", replies == 2 * REQUESTS + 1, str(replies))
+    failures += check("gate has nothing in flight afterwards",
+                      not ai_agent.registry.gate._in_flight and ai_agent.registry.gate.waiting == 0)
+    failures += check("a second stream of the same question is coalesced", await coalesced())
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
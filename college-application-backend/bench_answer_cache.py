@@ -0,0 +1,160 @@
+# bench_answer_cache.py
+"""
+AI answer cache: hit rate on a realistic question stream, lookup cost, and
+invalidation.
+
+Builds a stream of QUESTIONS questions drawn (Zipf-like: a few topics asked
+most of the time) from phrasings of TOPICS topics - reordered words, extra
+filler, case and punctuation changes, singular/plural - and replays it
+through `AnswerCache`, caching each miss as the agent's answer would be.
+Reports the hit rate with exact keys only and with the near-duplicate layer,
+and checks that no near-duplicate hit returned another topic's answer.
+
+Then, in a throwaway SQLite database with KB_ROWS knowledge-base rows, times
+a cache lookup against the knowledge-base scan every uncached question pays
+(`AIAssistant._search_knowledge_base`), and checks invalidation: a changed
+row drops the answers drawn from it, a new row drops the answers it covers,
+and `sync()` sees both when made by "another worker" (straight to the table).
+
+Usage: python bench_answer_cache.py [questions] [kb_rows]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+QUESTIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+KB_ROWS = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+from newapp import answer_cache, models, startup
+from newapp.ai_service import AIAssistant
+from newapp.database import SessionLocal
+
+# topic -> phrasings; the first is canonical
+TOPICS = {
+    "library": ["What are the library timings?", "library timings", "When is the library open?",
+                "Library timing on weekends", "what are library timings"],
+    "mess_fee": ["How much is the mess fee?", "mess fee", "What is the mess fees amount",
+                 "Mess fee per semester?"],
+    "hostel_wifi": ["How do I connect to hostel wifi?", "hostel wifi setup", "Hostel WiFi password",
+                    "connect hostel wi-fi"],
+    "exam_schedule": ["When are the end semester exams?", "end semester exam schedule",
+                      "End-semester exams date", "end sem exams"],
+    "medical": ["Where is the medical center?", "medical centre location", "Medical center timings"],
+    "bus": ["What is the campus bus schedule?", "campus bus timings", "bus schedule to Palakkad town"],
+    "sports": ["How to book the badminton court?", "badminton court booking", "book badminton courts"],
+    "fees_deadline": ["What is the fee payment deadline?", "fee payment last date", "fees deadline"],
+    # differ only in a number or code: must never share an answer
+    "warden_3": ["Warden of hostel 3", "who is the hostel 3 warden"],
+    "warden_4": ["Warden of hostel 4", "who is the hostel 4 warden"],
+    "cs101": ["CS101 syllabus", "syllabus for CS101"],
+    "cs102": ["CS102 syllabus", "syllabus for CS102"],
+}
+
+
+def stream(rng: random.Random) -> list:
+    topics = list(TOPICS)
+    weights = [1 / (rank + 1) for rank in range(len(topics))]
+    fillers = ["", "please ", "hey, ", "can you tell me "]
+    out = []
+    for _ in range(QUESTIONS):
+        topic = rng.choices(topics, weights)[0]
+        text = rng.choice(fillers) + rng.choice(TOPICS[topic])
+        text = text.upper() if rng.random() < 0.05 else text
+        out.append((topic, text.rstrip("?") if rng.random() < 0.3 else text))
+    return out
+
+
+def replay(questions: list, near_duplicates: bool) -> tuple:
+    cache = answer_cache.AnswerCache(near_duplicates=near_duplicates)
+    wrong = 0
+    for topic, text in questions:
+        entry = cache.get(text)
+        if entry is None:
+            cache.put(text, {"response": topic}, 0.85, [])
+        elif entry.response["response"] != topic:
+            wrong += 1
+    return cache.stats(), wrong
+
+
+def check(label: str, ok: bool, detail: str = "") -> int:
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return 0 if ok else 1
+
+
+def main():
+    questions = stream(random.Random(3))
+    exact, _ = replay(questions, near_duplicates=False)
+    near, wrong = replay(questions, near_duplicates=True)
+    print(f"{QUESTIONS} questions on {len(TOPICS)} topics "
+          f"({sum(len(p) for p in TOPICS.values())} phrasings)")
+    print(f"  exact keys       hit rate {exact['hit_rate']:.3f}  entries {exact['entries']}")
+    print(f"  + near-duplicate hit rate {near['hit_rate']:.3f}  entries {near['entries']}")
+    failures = check("near-duplicate hits all answered the right topic", not wrong, f"{wrong} wrong")
+
+    startup.bootstrap()
+    db = SessionLocal()
+    rng = random.Random(4)
+    vocabulary = [word for phrasings in TOPICS.values() for p in phrasings for word in answer_cache.words(p)]
+    db.add_all(models.KnowledgeBase(
+        category=rng.choice(["academics", "hostel", "general"]), title=" ".join(rng.sample(vocabulary, 4)),
+        content=" ".join(rng.choices(vocabulary + ["lorem", "ipsum", "campus"], k=150)),
+        source_url=f"https://iitpkd.ac.in/page/{i}", keywords=",".join(rng.sample(vocabulary, 5)),
+    ) for i in range(KB_ROWS))
+    db.commit()
+
+    assistant = AIAssistant(db)
+    cache = answer_cache.AnswerCache()
+    sample = [text for _, text in questions[:200]]
+    started = time.perf_counter()
+    for text in sample:
+        assistant._search_knowledge_base(text)
+    scan_ms = (time.perf_counter() - started) / len(sample) * 1000
+    for text in sample:
+        cache.put(text, {"response": text}, 0.85, [])
+    started = time.perf_counter()
+    for text in sample:
+        cache.get(text)
+    lookup_ms = (time.perf_counter() - started) / len(sample) * 1000
+    print(f"\nper question: knowledge-base scan over {KB_ROWS} rows {scan_ms:.2f} ms, cache lookup {lookup_ms:.3f} ms")
+
+    library = models.KnowledgeBase(category="general", title="Central Library",
+                                   content="The library is open 8 am to midnight.", source_url="admin_added")
+    bus = models.KnowledgeBase(category="general", title="Campus bus",
+                               content="Buses leave the main gate hourly.", source_url="admin_added")
+    db.add_all([library, bus])
+    db.commit()
+    cache = answer_cache.AnswerCache()
+    cache.sync(db)
+    cache.put("What are the library timings?", {"response": "8am-12am"}, 0.85, [library.id])
+    cache.put("What is the campus bus schedule?", {"response": "hourly"}, 0.85, [bus.id])
+    cache.put("How much is the mess fee?", {"response": "3000"}, 0.85, [])
+
+    library.content += " Closed on national holidays."
+    db.commit()
+    cache.sync(db)
+    failures += check("changed row drops its answers",
+                      cache.get("library timings") is None and cache.get("campus bus schedule") is not None)
+
+    new_row = models.KnowledgeBase(category="hostel", title="Mess fee 2025",
+                                   content="The mess fee is Rs 3500 per month.", source_url="admin_added")
+    db.add(new_row)
+    db.commit()
+    cache.sync(db)
+    failures += check("new covering row drops the answer it covers",
+                      cache.get("mess fee") is None and cache.get("campus bus schedule") is not None)
+
+    db.delete(bus)
+    db.commit()
+    cache.sync(db)
+    failures += check("deleted row drops its answers", cache.get("campus bus schedule") is None)
+    db.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
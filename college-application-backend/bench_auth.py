@@ -0,0 +1,81 @@
+# bench_auth.py
+"""
+Admin token authentication overhead per request.
+
+Resolves one admin token to its admin + user (what `get_current_user` does
+for every authenticated club call) in a throwaway SQLite database and
+reports the mean time and SQL statements per request for:
+  - uncached: JWT decode + AdminUser query + User query (the old path)
+  - cache miss: JWT decode + one joined query, then cached
+  - cache hit: JWT decode + re-attaching the cached rows, no SQL
+
+Usage: python bench_auth.py [iterations]
+"""
+import os
+import sys
+import tempfile
+import time
+
+ITERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+import jwt
+
+from newapp import models, startup
+from newapp.admin_auth import ALGORITHM, SECRET_KEY, create_admin_token, get_current_user
+from newapp.auth_cache import principals
+from newapp.database import SessionLocal, engine
+from newapp.query_metrics import instrument, track_all_queries
+
+
+def uncached(token, db):
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    admin = db.query(models.AdminUser).filter(
+        models.AdminUser.id == payload["admin_id"],
+        models.AdminUser.is_active == True
+    ).first()
+    return db.query(models.User).filter(models.User.id == admin.user_id).first()
+
+
+def cache_miss(token, db):
+    principals.clear()
+    return get_current_user(token, db)
+
+
+def cache_hit(token, db):
+    return get_current_user(token, db)
+
+
+def measure(resolve, token) -> tuple:
+    elapsed = 0.0
+    with track_all_queries() as stats:
+        for _ in range(ITERATIONS):
+            # A fresh session per call, like a request
+            db = SessionLocal()
+            started = time.perf_counter()
+            user = resolve(token, db)
+            elapsed += time.perf_counter() - started
+            assert user.email
+            db.close()
+    return elapsed / ITERATIONS * 1e6, stats.count / ITERATIONS
+
+
+def main():
+    startup.bootstrap()
+    instrument(engine)
+    db = SessionLocal()
+    admin = db.query(models.AdminUser).first()
+    token = create_admin_token(admin.id, admin.user_id)
+    db.close()
+
+    cache_hit(token, SessionLocal())  # warm up
+    print(f"{ITERATIONS} authentications per path")
+    for name, resolve in (("uncached", uncached), ("cache miss", cache_miss), ("cache hit", cache_hit)):
+        micros, queries = measure(resolve, token)
+        print(f"{name:<11}: {micros:7.1f} µs/request, {queries:.1f} queries/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# bench_chat_sentiment.py
+"""
+Chat sentiment pipeline: throughput per core, restartability, idempotency.
+
+Seeds MESSAGES chat messages from USERS students over the last 10 days in a
+throwaway SQLite database (sentences drawn from a small mixed-tone corpus),
+then:
+
+  - throughput: for each worker count (inline, then 1..cpu_count processes)
+    clears the cache, aggregates and watermark and runs
+    `chat_sentiment.run(workers=...)`; reports messages/second and
+    messages/second per core used
+  - restart: clears everything, runs a single batch, "restarts" and runs the
+    rest; the ChatAnalysis rows must equal an uninterrupted run's
+  - idempotency: moves the watermark back to 0 and runs again; nothing may
+    be re-scored and the rows must not change
+  - correctness: for a sample of (user, day) rows, the stored mean polarity
+    must match TextBlob run directly over that day's messages
+
+Any failed check is printed and the script exits non-zero.
+
+Usage: python bench_chat_sentiment.py [messages] [users]
+"""
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 6000
+USERS = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+TOLERANCE = 1e-9
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+from sqlalchemy import delete, func, insert, select
+
+from newapp import chat_sentiment, models, startup
+from newapp.database import engine
+
+CORPUS = [
+    "Had a great time at the club meeting today!", "This assignment is killing me, I hate it",
+    "Anyone up for lunch at the mess?", "Thanks so much, that was really helpful",
+    "I'm so tired and stressed about the exams", "The lecture was boring and way too long",
+    "See you in the library at 5", "Congrats on the results, amazing work!",
+    "I feel terrible, can't sleep again", "Which room is the lab in?",
+    "Best fest ever, loved the music", "Ugh the wifi is awful in the hostel",
+    "ok", "Can someone share the notes from Monday?", "I'm worried I'll fail the quiz",
+]
+
+
+def seed() -> list:
+    rng = random.Random(9)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [{
+            "email": f"student{i}@bench.local", "college_id": f"STU{i}", "hashed_password": "!",
+            "full_name": f"Student {i}", "department": "Bench", "year": 1,
+            "is_verified": True, "is_active": True,
+        } for i in range(USERS)])
+        users = models.User.__table__
+        user_ids = [row.id for row in conn.execute(select(users.c.id).where(users.c.email.like("%@bench.local")))]
+        group_id = conn.execute(insert(models.ChatGroup.__table__).values(
+            name="Bench", created_by=user_ids[0])).inserted_primary_key[0]
+        conn.execute(insert(models.ChatMessage.__table__), [{
+            "group_id": group_id, "sender_id": rng.choice(user_ids),
+            "message": " ".join(rng.sample(CORPUS, rng.randint(1, 3))),
+            "message_type": "image" if rng.random() < 0.03 else "text",
+            "created_at": now - timedelta(days=rng.uniform(0, 10), seconds=chat_sentiment.SETTLE),
+        } for _ in range(MESSAGES)])
+    return user_ids
+
+
+def reset(keep_cache: bool = False):
+    with engine.begin() as conn:
+        if not keep_cache:
+            conn.execute(delete(models.MessageSentiment.__table__))
+        conn.execute(delete(models.ChatAnalysis.__table__))
+    chat_sentiment.set_watermark(0)
+
+
+def snapshot() -> dict:
+    table = models.ChatAnalysis.__table__
+    with engine.connect() as conn:
+        return {(row.user_id, row.analysis_date): tuple(row._mapping[c] for c in chat_sentiment.AGGREGATE_COLUMNS)
+                for row in conn.execute(select(table))}
+
+
+def check(label: str, ok: bool, detail: str = "") -> int:
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return 0 if ok else 1
+
+
+def main():
+    startup.bootstrap()
+    seed()
+    cores = os.cpu_count() or 1
+    print(f"{MESSAGES} messages from {USERS} users, {cores} CPU(s)")
+
+    print("\nworkers   messages/s   per core")
+    for workers in [0] + list(range(1, cores + 1)):
+        reset()
+        stats = chat_sentiment.run(workers=workers)
+        used = max(1, min(workers, cores))
+        print(f"  {workers or 'inline':<8}{stats['messages_per_second']:>10.0f}  "
+              f"{stats['messages_per_second'] / used:>9.0f}")
+    chat_sentiment.shutdown()
+    reference = snapshot()
+
+    failures = 0
+    reset()
+    first = chat_sentiment.run(workers=0, max_batches=1)
+    rest = chat_sentiment.run(workers=0)
+    failures += check("restart resumes from the watermark",
+                      first["batches"] == 1 and first["messages"] + rest["messages"] == MESSAGES
+                      and snapshot() == reference)
+
+    reset(keep_cache=True)
+    again = chat_sentiment.run(workers=0)
+    failures += check("re-run from watermark 0 uses the cache", again["scored"] == 0,
+                      f"{again['scored']} re-scored, {again['cached']} cached")
+    failures += check("re-run leaves the aggregates unchanged", snapshot() == reference)
+
+    messages = models.ChatMessage.__table__
+    sample = random.Random(1).sample(sorted(reference), min(20, len(reference)))
+    mismatched = 0
+    with engine.connect() as conn:
+        for user_id, day in sample:
+            texts = conn.execute(select(messages.c.message).where(
+                messages.c.sender_id == user_id, messages.c.message_type == "text",
+                func.date(messages.c.created_at) == day.isoformat())).scalars().all()
+            polarities = [polarity for polarity, _ in chat_sentiment.score_texts(texts)]
+            expected = sum(polarities) / len(polarities)
+            stored = reference[(user_id, day)][1]
+            if abs(expected - stored) > TOLERANCE or reference[(user_id, day)][0] != len(texts):
+                mismatched += 1
+                print(f"   user {user_id} {day}: stored {stored} over {reference[(user_id, day)][0]}, "
+                      f"TextBlob {expected} over {len(texts)}")
+    failures += check(f"{len(sample)} sampled days match TextBlob directly", not mismatched)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# bench_checkin.py
+"""
+POST /wellness/checkin latency with the daily analysis inline vs queued.
+
+Seeds USERS students in a throwaway SQLite database with chat messages,
+timetable entries and todos, then posts CHECKINS_PER_USER check-ins per user
+(same day, so all but the first are repeat check-ins) through the ASGI app:
+
+  - inline: the analysis pool isn't started, so `daily_analysis.enqueue`
+    computes and stores the analysis before the handler returns - the cost
+    the old handler paid on every check-in
+  - queued: the pool is started; the handler does the entry upsert and the
+    analysis happens in the workers, coalesced per user and day
+
+Reports mean/p95 request latency for each, how long the queue took to drain,
+and checks that each run left exactly one DailyAnalysis per user for the day
+(exits non-zero otherwise).
+
+Usage: python bench_checkin.py [users] [checkins_per_user]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+CHECKINS_PER_USER = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+MESSAGES_PER_USER = 200
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+os.environ.setdefault("MCP_SERVER_URL", "http://127.0.0.1:9/mcp")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, func, insert, select
+
+from newapp import activity_rollups, daily_analysis, models, startup
+from newapp.database import engine
+from newapp.main import app
+
+
+def seed() -> list:
+    rng = random.Random(3)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [{
+            "email": f"student{i}@bench.local", "college_id": f"STU{i}", "hashed_password": "!",
+            "full_name": f"Student {i}", "department": "Bench", "year": 1,
+            "is_verified": True, "is_active": True,
+        } for i in range(USERS)])
+        users = models.User.__table__
+        user_ids = [row.id for row in conn.execute(select(users.c.id).where(users.c.email.like("%@bench.local")))]
+        group_id = conn.execute(insert(models.ChatGroup.__table__).values(
+            name="Bench", created_by=user_ids[0])).inserted_primary_key[0]
+        conn.execute(insert(models.ChatMessage.__table__), [{
+            "group_id": group_id, "sender_id": user_id, "message": "hi",
+            "created_at": now - timedelta(days=rng.uniform(0, 30)),
+        } for user_id in user_ids for _ in range(MESSAGES_PER_USER)])
+        conn.execute(insert(models.TimetableEntry.__table__), [{
+            "user_id": user_id, "course_id": 1, "day_of_week": day, "start_time": "09:00",
+            "end_time": "10:00", "course_name": "Maths", "teacher": "T", "room_number": "101",
+        } for user_id in user_ids for day in ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday")])
+        conn.execute(insert(models.TodoItem.__table__), [{
+            "user_id": user_id, "task": f"Task {n}", "is_completed": n % 3 == 0,
+        } for user_id in user_ids for n in range(6)])
+    return user_ids
+
+
+def run(client: TestClient, user_ids: list) -> list:
+    rng = random.Random(11)
+    latencies = []
+    for _ in range(CHECKINS_PER_USER):
+        for user_id in user_ids:
+            body = {"user_id": user_id, "mood": rng.randint(1, 5), "stress": rng.randint(1, 10),
+                    "energy": rng.randint(1, 10), "sleep_hours": rng.choice([None, 6, 7.5])}
+            started = time.perf_counter()
+            response = client.post("/wellness/checkin", json=body)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.text
+    return latencies
+
+
+def analyses_today() -> tuple:
+    with engine.connect() as conn:
+        table = models.DailyAnalysis.__table__
+        return conn.execute(
+            select(func.count(), func.count(table.c.user_id.distinct())).where(table.c.analysis_date == date.today())
+        ).one()
+
+
+def report(label: str, latencies: list, drain_seconds: float) -> int:
+    rows, users = analyses_today()
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    print(f"{label:<8} mean {statistics.mean(latencies) * 1000:6.2f} ms  p95 {p95 * 1000:6.2f} ms  "
+          f"drain {drain_seconds:5.2f}s  analyses {rows} for {users} users")
+    with engine.begin() as conn:
+        conn.execute(delete(models.DailyAnalysis.__table__))
+        conn.execute(delete(models.WellnessEntry.__table__))
+        conn.execute(delete(models.WellnessStats.__table__))
+    return 0 if rows == users == USERS else 1
+
+
+def main():
+    startup.bootstrap()
+    user_ids = seed()
+    activity_rollups.backfill()
+    print(f"{USERS} users x {CHECKINS_PER_USER} check-ins, {MESSAGES_PER_USER} messages each")
+
+    client = TestClient(app)  # no lifespan: the analysis pool stays stopped
+    failures = report("inline", run(client, user_ids), 0.0)
+
+    daily_analysis.queue.start()
+    latencies = run(client, user_ids)
+    started = time.perf_counter()
+    daily_analysis.queue.stop()
+    failures += report("queued", latencies, time.perf_counter() - started)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# bench_compression.py
+"""
+Bytes on the wire and serialisation CPU for the big list payloads.
+
+Seeds marketplace listings in a throwaway SQLite database, fetches
+GET /marketplace/items through the ASGI app with each Accept-Encoding
+(identity, gzip, zstd), with and without `fields=`, and reports the bytes
+downloaded and the mean request time. It then times the pieces on their own
+over the same payload: stdlib json vs orjson serialisation, and gzip vs
+zstd compression of the serialised body.
+
+Usage: python bench_compression.py [items] [repeats]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+ITEMS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+REPEATS = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+FIELDS = "id,title,price,images,seller.name"
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+os.environ.setdefault("MCP_SERVER_URL", "http://127.0.0.1:9/mcp")
+
+import orjson
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from newapp import compression, models, startup
+from newapp.database import engine
+from newapp.main import app
+from newapp.streaming import ORJSON_OPTIONS
+
+
+def seed():
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [{
+            "email": f"seller{i}@bench.local", "college_id": f"SEL{i}", "hashed_password": "!",
+            "full_name": f"Seller {i}", "department": "Mechanical Engineering", "year": 1 + i % 4,
+            "is_verified": True, "is_active": True,
+        } for i in range(50)])
+        seller_ids = [row.id for row in conn.execute(models.User.__table__.select())]
+        conn.execute(insert(models.MarketplaceItem.__table__), [{
+            "seller_id": seller_ids[i % len(seller_ids)],
+            "title": f"Used textbook #{i} - Engineering Mathematics vol {i % 3 + 1}",
+            "description": "Lightly used, a few highlighted pages, no missing sheets. "
+                           f"Pick up from hostel block {i % 7}. Price slightly negotiable.",
+            "price": str(100 + i % 900), "category": "books", "condition": "good",
+            "location": f"Hostel {i % 7}", "images": [f"https://cdn.example.edu/items/{i}/{n}.jpg" for n in range(3)],
+            "status": "active", "views": i % 50, "is_negotiable": i % 2 == 0,
+        } for i in range(ITEMS)])
+
+
+def fetch(client, encoding: str, fields: str = None) -> tuple:
+    params = {"fields": fields} if fields else {}
+    elapsed, size = 0.0, 0
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        response = client.get("/marketplace/items", params=params, headers={"Accept-Encoding": encoding})
+        elapsed += time.perf_counter() - started
+        size = response.num_bytes_downloaded
+        assert response.status_code == 200 and len(response.json()) == ITEMS
+    return size, elapsed / REPEATS * 1000
+
+
+def timed(fn, *args) -> tuple:
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        result = fn(*args)
+    return result, (time.perf_counter() - started) / REPEATS * 1000
+
+
+def main():
+    startup.bootstrap()
+    seed()
+    print(f"{ITEMS} marketplace items, {REPEATS} repeats, fields={FIELDS}")
+
+    with TestClient(app) as client:
+        payloads = {"full": client.get("/marketplace/items").json(),
+                    "fields": client.get("/marketplace/items", params={"fields": FIELDS}).json()}
+        print("\nGET /marketplace/items          bytes      ms/request")
+        for fields in (None, FIELDS):
+            for encoding in ("identity", "gzip", "zstd"):
+                size, millis = fetch(client, encoding, fields)
+                label = f"{encoding}{' + fields' if fields else ''}"
+                print(f"  {label:<28}{size:>9,}  {millis:>10.1f}")
+
+    print("\nCPU per payload (ms)          json   orjson     gzip     zstd")
+    for name, payload in payloads.items():
+        _, stdlib_ms = timed(lambda: json.dumps(payload).encode())
+        body, orjson_ms = timed(lambda: orjson.dumps(payload, option=ORJSON_OPTIONS))
+        _, gzip_ms = timed(compression.compress, body, "gzip")
+        _, zstd_ms = timed(compression.compress, body, "zstd")
+        print(f"  {name:<26}{stdlib_ms:>7.2f}  {orjson_ms:>7.2f}  {gzip_ms:>7.2f}  {zstd_ms:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
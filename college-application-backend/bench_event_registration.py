@@ -0,0 +1,158 @@
+# bench_event_registration.py
+"""
+Event registration burst test.
+
+Fires a burst of concurrent POST /clubs/events/{id}/register requests
+(join_waitlist=true) through the ASGI app at one limited-capacity event,
+then a burst of cancellations, and checks the invariants:
+  - registrations == capacity and seats_remaining == 0 after the burst
+  - no user registered twice, nobody both registered and waitlisted
+  - every user who asked got either a seat or a waitlist entry
+  - cancellations promote waitlisted users strictly in FIFO order
+
+Runs against a throwaway SQLite (WAL) file by default; pass a database URL
+to run against a server database instead (it must be empty/disposable).
+
+Usage: python bench_event_registration.py [requests] [capacity] [database_url]
+"""
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+CAPACITY = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+DUPLICATE_SHARE = 0.1  # fraction of requests that repeat an earlier user
+CANCELLATIONS = max(1, CAPACITY // 2)
+
+_tmp = None
+if len(sys.argv) > 3:
+    os.environ["DATABASE_URL"] = sys.argv[3]
+else:
+    _tmp = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+os.environ.setdefault("MCP_SERVER_URL", "http://127.0.0.1:9/mcp")
+
+import httpx
+from fastapi import Header
+from sqlalchemy import func, insert, select
+
+from newapp import models, startup
+from newapp.admin_auth import get_current_user
+from newapp.database import SessionLocal, engine
+from newapp.main import app
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def seed(user_count: int):
+    users = models.User.__table__
+    with engine.begin() as conn:
+        first_id = (conn.execute(select(func.max(users.c.id))).scalar() or 0) + 1
+        conn.execute(insert(users), [{
+            "email": f"burst{i}@bench.local", "college_id": f"BURST{i}",
+            "hashed_password": "!", "full_name": f"Burst {i}",
+            "department": "Bench", "year": 1, "is_active": True, "is_verified": True,
+        } for i in range(user_count)])
+        club_id = conn.execute(insert(models.Club.__table__).values(
+            name=f"Bench club {time.time()}", category="Bench", description="burst test",
+            club_head_id=first_id, is_active=True,
+        )).inserted_primary_key[0]
+        event_id = conn.execute(insert(models.ClubEvent.__table__).values(
+            club_id=club_id, title="Fest", description="burst test",
+            event_date=datetime.utcnow() + timedelta(days=7), location="Main hall",
+            registration_required=True, max_participants=CAPACITY,
+            seats_remaining=CAPACITY, status="scheduled",
+        )).inserted_primary_key[0]
+    return first_id, event_id
+
+
+def bench_user(x_bench_user: int = Header(...)):
+    db = SessionLocal()
+    try:
+        return db.get(models.User, x_bench_user)
+    finally:
+        db.close()
+
+
+async def burst(client, method, url, user_ids):
+    async def one(user_id):
+        started = time.perf_counter()
+        response = await client.request(method, url, headers={"X-Bench-User": str(user_id)})
+        return user_id, response, time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(user_id) for user_id in user_ids))
+    return results, time.perf_counter() - started
+
+
+def report(label, results, elapsed):
+    latencies = sorted(r[2] * 1000 for r in results)
+    statuses = Counter(r[1].status_code for r in results)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{label:<8} {len(results)} requests in {elapsed:.2f}s "
+          f"({len(results) / elapsed:.0f} req/s)  "
+          f"latency p50 {statistics.median(latencies):.1f} ms, p99 {p99:.1f} ms  "
+          f"statuses {dict(statuses)}")
+
+
+def check(condition, message):
+    print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+    return condition
+
+
+def snapshot(event_id):
+    with engine.connect() as conn:
+        registered = list(conn.execute(select(models.EventRegistration.user_id).where(
+            models.EventRegistration.event_id == event_id)).scalars())
+        waiting = list(conn.execute(select(models.EventWaitlist.user_id).where(
+            models.EventWaitlist.event_id == event_id).order_by(models.EventWaitlist.id)).scalars())
+        seats = conn.execute(select(models.ClubEvent.seats_remaining).where(
+            models.ClubEvent.id == event_id)).scalar()
+    return registered, waiting, seats
+
+
+async def main():
+    startup.bootstrap()
+    distinct = REQUESTS - int(REQUESTS * DUPLICATE_SHARE)
+    first_id, event_id = seed(distinct)
+    user_ids = list(range(first_id, first_id + distinct))
+    attempts = user_ids + user_ids[:REQUESTS - distinct]
+
+    app.dependency_overrides[get_current_user] = bench_user
+    transport = httpx.ASGITransport(app=app)
+    ok = True
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        url = f"/clubs/events/{event_id}/register?join_waitlist=true"
+        results, elapsed = await burst(client, "POST", url, attempts)
+        report("register", results, elapsed)
+
+        registered, waiting, seats = snapshot(event_id)
+        ok &= check(len(registered) == CAPACITY, f"{len(registered)} registrations for {CAPACITY} seats")
+        ok &= check(seats == 0, f"seats_remaining = {seats}")
+        ok &= check(len(set(registered)) == len(registered), "no duplicate registrations")
+        ok &= check(not set(registered) & set(waiting), "nobody both registered and waitlisted")
+        ok &= check(set(registered) | set(waiting) == set(user_ids), "every user got a seat or a waitlist entry")
+        ok &= check(all(r[1].status_code in (200, 400) for r in results), "no 5xx / lock errors")
+
+        to_cancel = registered[:CANCELLATIONS]
+        expected_promotions = waiting[:len(to_cancel)]
+        results, elapsed = await burst(client, "DELETE", f"/clubs/events/{event_id}/register", to_cancel)
+        report("cancel", results, elapsed)
+
+        registered, waiting_after, seats = snapshot(event_id)
+        ok &= check(len(registered) == CAPACITY, f"{len(registered)} registrations after cancellations")
+        ok &= check(set(expected_promotions) <= set(registered), "waitlist promoted in FIFO order")
+        ok &= check(waiting_after == waiting[len(to_cancel):], "remaining waitlist order preserved")
+
+    print("PASS" if ok else "FAIL")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
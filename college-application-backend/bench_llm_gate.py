@@ -0,0 +1,150 @@
+# bench_llm_gate.py
+"""
+LLM gate under an exam-season burst: upstream calls, concurrency, shedding.
+
+REQUESTS questions arrive over ARRIVAL_SECONDS, each a phrasing of one of a
+few popular questions plus a long tail of one-off ones, keyed the way
+`AIAssistant._flight_key` keys them. The "upstream" is a fake agent call that
+sleeps LATENCY seconds and records how many calls run at once and when each
+started.
+
+Runs the burst twice - straight to the upstream, then through an `LLMGate`
+(concurrency 4, 2 calls/s with a burst of 5, 32 waiting, 10 s max wait) -
+and reports upstream calls, peak concurrency, shed requests and p50/p95
+latency of the answered ones. Checks that the gate never exceeds its
+concurrency or rate, that a full queue sheds immediately, and that a
+cancelled or failing leader hands over correctly to its followers; exits
+non-zero on a failed check.
+
+Usage: python bench_llm_gate.py [requests] [arrival_seconds]
+"""
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+ARRIVAL_SECONDS = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+LATENCY = 1.0
+POPULAR = ["When are the end semester exams?", "end semester exam schedule", "What is the exam hall allotment?",
+           "exam hall allotment", "Is the library open late during exams?", "library timings during exams"]
+
+from newapp import answer_cache
+from newapp.llm_gate import LLMBusy, LLMGate
+
+
+class Upstream:
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+        self.starts = []
+
+    async def call(self, question: str) -> str:
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        self.starts.append(time.monotonic())
+        try:
+            await asyncio.sleep(LATENCY)
+            return f"answer to {question}"
+        finally:
+            self.running -= 1
+
+
+def burst(rng: random.Random) -> list:
+    arrivals = sorted(rng.uniform(0, ARRIVAL_SECONDS) for _ in range(REQUESTS))
+    return [(at, rng.choice(POPULAR) if rng.random() < 0.8 else f"question number {i} about something else")
+            for i, at in enumerate(arrivals)]
+
+
+async def replay(requests: list, gate) -> dict:
+    upstream = Upstream()
+    latencies, shed, shed_ms = [], 0, []  # shed_ms: queue-full rejections only
+    began = time.monotonic()
+
+    async def ask(at: float, question: str):
+        nonlocal shed
+        await asyncio.sleep(max(0.0, began + at - time.monotonic()))
+        started = time.monotonic()
+        key = f"kb:{answer_cache.question_key(answer_cache.tokens(question))}"
+        try:
+            if gate is None:
+                await upstream.call(question)
+            else:
+                await gate.run(key, lambda: upstream.call(question))
+            latencies.append(time.monotonic() - started)
+        except LLMBusy as e:
+            shed += 1
+            if str(e) == "queue full":
+                shed_ms.append((time.monotonic() - started) * 1000)
+
+    await asyncio.gather(*(ask(at, question) for at, question in requests))
+    latencies.sort()
+    return {
+        "calls": len(upstream.starts), "peak": upstream.peak, "shed": shed, "starts": upstream.starts,
+        "answered": len(latencies), "shed_ms": shed_ms,
+        "p50": statistics.median(latencies) if latencies else 0.0,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0,
+    }
+
+
+def check(label: str, ok: bool, detail: str = "") -> int:
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return 0 if ok else 1
+
+
+def max_starts_in(starts: list, window: float) -> int:
+    return max((sum(1 for t in starts if s <= t < s + window) for s in starts), default=0)
+
+
+async def handover() -> int:
+    failures = 0
+    gate = LLMGate(max_concurrency=1, rate=0)
+
+    async def slow():
+        await asyncio.sleep(0.2)
+        return "ok"
+
+    leader = asyncio.create_task(gate.run("k", slow))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(gate.run("k", slow))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    failures += check("follower of a cancelled leader still gets an answer", await follower == "ok")
+
+    async def boom():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("upstream error")
+
+    leader = asyncio.create_task(gate.run("k", boom))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(gate.run("k", slow))
+    results = await asyncio.gather(leader, follower, return_exceptions=True)
+    failures += check("leader's error is shared with its followers",
+                      all(isinstance(r, RuntimeError) for r in results))
+    return failures
+
+
+async def main():
+    requests = burst(random.Random(8))
+    print(f"{REQUESTS} questions over {ARRIVAL_SECONDS:.0f}s, upstream latency {LATENCY:.1f}s\n")
+    print(f"{'':<10}{'calls':>7}{'peak':>6}{'shed':>6}{'p50 s':>8}{'p95 s':>8}")
+    results = {}
+    for label, gate in (("direct", None), ("gated", LLMGate(4, 2.0, 5, 32, 10.0))):
+        results[label] = r = await replay(requests, gate)
+        print(f"{label:<10}{r['calls']:>7}{r['peak']:>6}{r['shed']:>6}{r['p50']:>8.2f}{r['p95']:>8.2f}")
+
+    gated = results["gated"]
+    print()
+    failures = check("gated peak concurrency within 4", gated["peak"] <= 4, str(gated["peak"]))
+    busiest = max_starts_in(gated["starts"], 1.0)
+    failures += check("gated upstream starts within rate + burst per second", busiest <= 2 + 5, str(busiest))
+    failures += check("requests shed for a full queue fail fast", max(gated["shed_ms"], default=0) < 50,
+                      f"{len(gated['shed_ms'])} of {gated['shed']} shed, slowest {max(gated['shed_ms'], default=0):.1f} ms")
+    failures += check("every request answered or shed", gated["answered"] + gated["shed"] == REQUESTS)
+    failures += await handover()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
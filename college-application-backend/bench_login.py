@@ -0,0 +1,138 @@
+# bench_login.py
+"""
+Login burst benchmark: throughput and event-loop lag.
+
+Seeds verified users in a throwaway SQLite database and fires a burst of
+concurrent POST /login/ requests through the ASGI app, while a probe task on
+the same event loop sleeps in PROBE_INTERVAL steps and records how late it
+wakes up. Lag is what every other request on the worker would feel.
+
+Runs the burst twice:
+  - inline: bcrypt on the event loop (PASSWORD_HASH_WORKERS=0, the old path)
+  - pooled: bcrypt on the password-hash thread pool
+
+A third of the users are stored with a lower bcrypt cost, so the pooled run
+also exercises rehash-on-login (reported as "rehashed").
+
+Usage: python bench_login.py [logins] [concurrency] [bcrypt_rounds] [workers]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+LOGINS = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+CONCURRENCY = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+ROUNDS = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+WORKERS = int(sys.argv[4]) if len(sys.argv) > 4 else min(4, os.cpu_count() or 1)
+PROBE_INTERVAL = 0.005  # seconds
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+os.environ["BCRYPT_ROUNDS"] = str(ROUNDS)
+os.environ.setdefault("MCP_SERVER_URL", "http://127.0.0.1:9/mcp")
+
+import httpx
+from sqlalchemy import bindparam, insert, select, update
+
+from newapp import models, passwords, startup
+from newapp.database import engine
+from newapp.main import app
+
+
+def seed() -> list:
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [{
+            "email": f"student{i}@bench.local", "college_id": f"STU{i}", "hashed_password": "!",
+            "full_name": f"Student {i}", "department": "Bench", "year": 1,
+            "is_verified": True, "is_active": True,
+        } for i in range(LOGINS)])
+    return [f"student{i}@bench.local" for i in range(LOGINS)]
+
+
+def reset_hashes(emails: list):
+    current = passwords.pwd_context.hash("correct horse")
+    # Stored before a cost increase: upgraded on first login
+    outdated = passwords.pwd_context.hash("correct horse", rounds=max(4, ROUNDS - 2))
+    users = models.User.__table__
+    with engine.begin() as conn:
+        conn.execute(
+            update(users).where(users.c.email == bindparam("b_email")).values(hashed_password=bindparam("b_hash")),
+            [{"b_email": email, "b_hash": outdated if i % 3 == 0 else current} for i, email in enumerate(emails)],
+        )
+
+
+async def probe(lags: list, done: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not done.is_set():
+        started = loop.time()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(0.0, loop.time() - started - PROBE_INTERVAL))
+
+
+async def burst(emails: list) -> dict:
+    lags, latencies, statuses = [], [], []
+    done = asyncio.Event()
+    limit = asyncio.Semaphore(CONCURRENCY)
+
+    async def login(client, email):
+        async with limit:
+            started = time.perf_counter()
+            response = await client.post("/login/", json={"identifier": email, "password": "correct horse"})
+            latencies.append(time.perf_counter() - started)
+            statuses.append(response.status_code)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        prober = asyncio.create_task(probe(lags, done))
+        started = time.perf_counter()
+        await asyncio.gather(*(login(client, email) for email in emails))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await prober
+
+    lags.sort()
+    latencies.sort()
+    return {
+        "ok": statuses.count(200),
+        "shed": statuses.count(503),
+        "per_second": len(emails) / elapsed,
+        "p50": statistics.median(latencies),
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+        "lag_p99": lags[int(len(lags) * 0.99) - 1] if lags else 0.0,
+        "lag_max": lags[-1] if lags else 0.0,
+    }
+
+
+def count_outdated() -> int:
+    users = models.User.__table__
+    with engine.connect() as conn:
+        hashes = conn.execute(select(users.c.hashed_password).where(users.c.email.like("%@bench.local"))).scalars()
+        return sum(passwords.pwd_context.needs_update(hashed) for hashed in hashes)
+
+
+def report(name: str, result: dict):
+    print(f"{name:<7}: {result['ok']} ok / {result['shed']} shed, {result['per_second']:.1f} logins/s, "
+          f"latency p50 {result['p50'] * 1000:.0f} ms p99 {result['p99'] * 1000:.0f} ms, "
+          f"loop lag p99 {result['lag_p99'] * 1000:.1f} ms max {result['lag_max'] * 1000:.1f} ms")
+
+
+def main():
+    startup.bootstrap()
+    emails = seed()
+    print(f"{LOGINS} logins, {CONCURRENCY} concurrent, bcrypt rounds {ROUNDS}, {WORKERS} hash workers")
+
+    reset_hashes(emails)
+    passwords.hasher = passwords.PasswordHasher(workers=0)
+    report("inline", asyncio.run(burst(emails)))
+
+    reset_hashes(emails)
+    before = count_outdated()
+    passwords.hasher = passwords.PasswordHasher(workers=WORKERS, max_pending=LOGINS)
+    report("pooled", asyncio.run(burst(emails)))
+    print(f"rehashed: {before - count_outdated()} of {before} outdated hashes upgraded on login")
+
+if __name__ == "__main__":
+    main()
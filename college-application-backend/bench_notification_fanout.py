@@ -0,0 +1,88 @@
+# bench_notification_fanout.py
+"""
+Club notification fan-out benchmark.
+
+Seeds a club with N followers in a throwaway SQLite database, then reports:
+  - bulk fan-out throughput (notification rows/s) for one announcement
+  - a second fan-out of the same announcement (should write 0: dedupe)
+  - the old approach - one ORM Notification add + commit per follower - on
+    a sample of followers, for comparison
+
+Usage: python bench_notification_fanout.py [followers] [orm_sample]
+"""
+import os
+import sys
+import tempfile
+import time
+
+FOLLOWERS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+ORM_SAMPLE = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+from sqlalchemy import func, insert, select
+
+from newapp import models, startup
+from newapp.database import SessionLocal, engine
+from newapp.notification_fanout import fan_out_to_followers
+
+
+def seed() -> int:
+    users = models.User.__table__
+    with engine.begin() as conn:
+        first_id = (conn.execute(select(func.max(users.c.id))).scalar() or 0) + 1
+        conn.execute(insert(users), [{
+            "email": f"fan{i}@bench.local", "college_id": f"FAN{i}",
+            "hashed_password": "!", "full_name": f"Fan {i}",
+            "department": "Bench", "year": 1, "is_active": True,
+        } for i in range(FOLLOWERS)])
+        club_id = conn.execute(insert(models.Club.__table__).values(
+            name="Bench club", category="Bench", description="fan-out test",
+            club_head_id=first_id, is_active=True,
+        )).inserted_primary_key[0]
+        conn.execute(insert(models.ClubFollower.__table__), [
+            {"club_id": club_id, "user_id": first_id + i} for i in range(FOLLOWERS)
+        ])
+    return club_id
+
+
+def orm_baseline(club_id: int) -> float:
+    db = SessionLocal()
+    try:
+        user_ids = [f.user_id for f in db.query(models.ClubFollower).filter(
+            models.ClubFollower.club_id == club_id).limit(ORM_SAMPLE)]
+        started = time.perf_counter()
+        for user_id in user_ids:
+            db.add(models.Notification(
+                user_id=user_id, type=models.NotificationType.ADMIN_BROADCAST,
+                title="baseline", message="one row at a time", related_id=0,
+            ))
+            db.commit()
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+    return len(user_ids) / elapsed
+
+
+def main():
+    startup.bootstrap()
+    club_id = seed()
+    print(f"{FOLLOWERS} followers")
+
+    first = fan_out_to_followers(club_id, models.NotificationType.CLUB_ANNOUNCEMENT,
+                                 "Bench club: hello", "fan-out test", related_id=1)
+    print(f"bulk fan-out : {first['written']} rows in {first['seconds']:.2f}s "
+          f"({first['per_second']:.0f} rows/s)")
+
+    again = fan_out_to_followers(club_id, models.NotificationType.CLUB_ANNOUNCEMENT,
+                                 "Bench club: hello", "fan-out test", related_id=1)
+    print(f"repeat       : {again['written']} rows written, {again['skipped']} deduplicated "
+          f"in {again['seconds']:.2f}s")
+
+    if ORM_SAMPLE:
+        print(f"ORM per-row  : {orm_baseline(club_id):.0f} rows/s (sample of {ORM_SAMPLE})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# bench_risk_batch.py
+"""
+Campus-wide risk scoring: per-request path vs the vectorised nightly batch.
+
+Seeds USERS students in a throwaway SQLite database with 14 days of wellness
+check-ins (some sparse), two weeks of chat messages and a few grades each,
+rebuilds the activity rollups from them, then:
+  - per-request: for every user, what /wellness/risk-assessment computes
+    (rolling-aggregate state + scalar risk helpers + the weekly message
+    sums from the activity rollups + the grade scan)
+  - batch: risk_batch.score_population() - three bulk queries, NumPy over
+    the whole population, bulk RiskAssessment insert
+
+and reports users/second for each. Every batch score is checked against the
+per-request score for the same user; mismatches are printed and the script
+exits non-zero.
+
+Usage: python bench_risk_batch.py [users]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+TOLERANCE = 1e-6
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+from sqlalchemy import insert
+
+from newapp import activity_rollups, models, risk_batch, startup, wellness_stats
+from newapp.database import SessionLocal, engine
+from newapp.wellness_routes import (
+    calculate_academic_risk, calculate_social_withdrawal_risk,
+    mood_risk_score, sleep_risk_score, stress_risk_score,
+)
+
+GRADES = ["A+", "A", "B+", "B", "C+", "C", "D", "F", "I"]
+
+
+def seed(today: date, now: datetime) -> list:
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [{
+            "email": f"student{i}@bench.local", "college_id": f"STU{i}", "hashed_password": "!",
+            "full_name": f"Student {i}", "department": "Bench", "year": 1 + i % 4,
+            "is_verified": True, "is_active": True,
+        } for i in range(USERS)])
+        user_ids = [row.id for row in conn.execute(
+            models.User.__table__.select().where(models.User.__table__.c.email.like("%@bench.local")))]
+        group_id = conn.execute(insert(models.ChatGroup.__table__).values(
+            name="Bench", created_by=user_ids[0])).inserted_primary_key[0]
+
+        entries, messages, grades = [], [], []
+        for user_id in user_ids:
+            attendance = rng.choice([0.1, 0.5, 0.9, 1.0])
+            base_mood, base_sleep = rng.uniform(1.5, 4.5), rng.uniform(4.5, 8.5)
+            for offset in range(15):
+                if rng.random() < attendance:
+                    entries.append({
+                        "user_id": user_id, "date": today - timedelta(days=offset),
+                        "mood_score": round(min(5, max(1, rng.gauss(base_mood, 1))), 1),
+                        "stress_level": float(rng.randint(1, 10)),
+                        "energy_level": float(rng.randint(1, 10)),
+                        "sleep_hours": None if rng.random() < 0.2 else round(rng.gauss(base_sleep, 1), 1),
+                    })
+            for week, volume in ((0, rng.randint(0, 20)), (1, rng.randint(0, 20))):
+                for _ in range(volume):
+                    messages.append({
+                        "group_id": group_id, "sender_id": user_id, "message": "hi",
+                        "created_at": now - timedelta(days=week * 7 + rng.uniform(0.01, 6.9)),
+                    })
+            for n in range(rng.randint(0, 8)):
+                grades.append({
+                    "user_id": user_id, "course_name": f"Course {n}", "credits": 3.0,
+                    "grade": rng.choice(GRADES), "semester": "S1",
+                    "created_at": now - timedelta(days=30 * n, seconds=user_id),
+                })
+        conn.execute(insert(models.WellnessEntry.__table__), entries)
+        conn.execute(insert(models.ChatMessage.__table__), messages)
+        conn.execute(insert(models.GradeEntry.__table__), grades)
+    return user_ids
+
+
+def per_request(db, user_id: int, today: date):
+    """The /wellness/risk-assessment computation for one user, without the write"""
+    state = wellness_stats.load(db, user_id, today)
+    fortnight = wellness_stats.window(state, 14)
+    week = wellness_stats.window(state, 7)
+    if fortnight["n"] < 3:
+        return None
+    recent = week if week["n"] else fortnight
+    return {
+        "mood": mood_risk_score(wellness_stats.mean(recent, "mood"), wellness_stats.std(fortnight, "mood")),
+        "stress": stress_risk_score(wellness_stats.mean(recent, "stress"),
+                                    wellness_stats.slope(recent, "day", "stress")),
+        "sleep": sleep_risk_score(wellness_stats.sleep_mean(fortnight), wellness_stats.recent_sleep(state, 14)),
+        "social": calculate_social_withdrawal_risk(user_id, db),
+        "academic": calculate_academic_risk(user_id, db),
+    }
+
+
+def main():
+    startup.bootstrap()
+    today, now = date.today(), datetime.now()
+    user_ids = seed(today, now)
+    activity_rollups.backfill()
+    print(f"{USERS} users")
+
+    db = SessionLocal()
+    for user_id in user_ids:
+        wellness_stats.load(db, user_id, today)  # build the rolling state once, as check-ins would have
+
+    started = time.perf_counter()
+    expected = {user_id: per_request(db, user_id, today) for user_id in user_ids}
+    per_request_seconds = time.perf_counter() - started
+    expected = {user_id: scores for user_id, scores in expected.items() if scores is not None}
+    db.close()
+    print(f"per-request: {len(expected)} scored in {per_request_seconds:.2f}s "
+          f"({len(user_ids) / per_request_seconds:.0f} users/s)")
+
+    stats = risk_batch.score_population(today)
+    print(f"batch      : {stats['users']} scored in {stats['seconds']:.2f}s ({stats['users_per_second']:.0f} users/s)")
+
+    with engine.connect() as conn:
+        result = risk_batch.score(conn, today)
+    mismatches = 0
+    if set(result["user_id"].tolist()) != set(expected):
+        mismatches += 1
+        print(f"❌ scored different users: {len(result['user_id'])} vs {len(expected)}")
+    for i, user_id in enumerate(result["user_id"].tolist()):
+        for name in risk_batch.COMPONENTS:
+            if user_id in expected and abs(expected[user_id][name] - result[name][i]) > TOLERANCE:
+                mismatches += 1
+                print(f"❌ user {user_id} {name}: per-request {expected[user_id][name]} vs batch {result[name][i]}")
+    print(f"validated {len(expected)} users x {len(risk_batch.COMPONENTS)} components: {mismatches} mismatching")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
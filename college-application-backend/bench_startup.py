@@ -0,0 +1,83 @@
+# bench_startup.py
+"""
+Startup-time benchmark.
+
+Runs each measurement in a fresh interpreter against a throwaway SQLite file:
+  - import time of newapp.main
+  - time to first request (process start -> first 200 from GET /), for a
+    cold database (first boot, migrations run) and a warm one (already at
+    SCHEMA_VERSION)
+It also reports which heavy optional modules were actually executed.
+
+Usage: python bench_startup.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ["numpy", "textblob", "bs4", "PyPDF2", "langchain", "langchain_mcp_adapters"]
+
+CHILD = r"""
+import json, sys, time
+started = time.perf_counter()
+import newapp.main as main
+imported = time.perf_counter()
+
+from fastapi.testclient import TestClient
+from newapp.lazy_imports import is_loaded
+
+with TestClient(main.app) as client:
+    response = client.get("/")
+    first_request = time.perf_counter()
+
+heavy = {name: name in sys.modules and is_loaded(name) for name in json.loads(sys.argv[1])}
+print("BENCH " + json.dumps({
+    "status": response.status_code,
+    "import_s": imported - started,
+    "first_request_s": first_request - started,
+    "heavy_loaded": heavy,
+}))
+"""
+
+
+def run_once(db_path: str) -> dict:
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", MCP_SERVER_URL="http://127.0.0.1:9/mcp")
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run(
+        [sys.executable, "-c", CHILD, json.dumps(HEAVY_MODULES)],
+        cwd=here, env=env, capture_output=True, text=True, timeout=300
+    )
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH "):
+            return json.loads(line[len("BENCH "):])
+    raise RuntimeError(f"benchmark child failed:\n{proc.stderr[-2000:]}")
+
+
+def summarize(label: str, samples: list):
+    imports = [s["import_s"] * 1000 for s in samples]
+    firsts = [s["first_request_s"] * 1000 for s in samples]
+    print(f"{label:<6} import: median {statistics.median(imports):7.1f} ms  "
+          f"first request: median {statistics.median(firsts):7.1f} ms  "
+          f"(min {min(firsts):.1f}, max {max(firsts):.1f}, n={len(samples)})")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    cold, warm = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(runs):
+            db_path = os.path.join(tmp, f"bench_{i}.db")
+            cold.append(run_once(db_path))
+            warm.append(run_once(db_path))
+
+    summarize("cold", cold)
+    summarize("warm", warm)
+    loaded = sorted({name for s in cold + warm for name, hit in s["heavy_loaded"].items() if hit})
+    print(f"heavy modules executed before first response: {', '.join(loaded) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
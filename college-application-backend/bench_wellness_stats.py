@@ -0,0 +1,210 @@
+# bench_wellness_stats.py
+"""
+Rolling wellness aggregates: validation against the batch formulas, and cost.
+
+Simulates DAYS days of check-ins for USERS users in a throwaway SQLite
+database (random gaps, missing sleep, some same-day re-check-ins), folding
+each one in with `wellness_stats.record_checkin`. Every day, every user's
+state is advanced to that day with `wellness_stats.load` and each window's
+statistics are compared with the batch helpers in wellness_routes
+(np.mean/np.std/np.polyfit, calculate_correlation, calculate_streak,
+analyze_weekly_patterns) run over the same entries. Any mismatch beyond
+TOLERANCE is printed and the script exits non-zero.
+
+Then reports the mean time per user to get 30-day statistics both ways:
+reload the entries and recompute, vs read the aggregate state.
+
+Usage: python bench_wellness_stats.py [users] [days]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+DAYS = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+TOLERANCE = 1e-6
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+import numpy as np
+from sqlalchemy import insert
+
+from newapp import models, startup, wellness_stats
+from newapp.database import SessionLocal, engine
+from newapp.models import WellnessEntry
+from newapp.wellness_routes import analyze_weekly_patterns, calculate_correlation, calculate_streak
+
+START = date(2026, 1, 5)
+
+
+def seed_users() -> list:
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [{
+            "email": f"student{i}@bench.local", "college_id": f"STU{i}", "hashed_password": "!",
+            "full_name": f"Student {i}", "department": "Bench", "year": 1,
+            "is_verified": True, "is_active": True,
+        } for i in range(USERS)])
+    db = SessionLocal()
+    ids = [user.id for user in db.query(models.User).filter(models.User.email.like("%@bench.local"))]
+    db.close()
+    return ids
+
+
+def random_values(rng: random.Random) -> dict:
+    return {
+        "mood_score": rng.choice([1, 1.5, 2, 2.5, 3, 3.5, 4, 4.5, 5]),
+        "stress_level": float(rng.randint(1, 10)),
+        "energy_level": float(rng.randint(1, 10)),
+        "sleep_hours": None if rng.random() < 0.2 else rng.choice([4, 5, 5.5, 6, 7, 7.5, 8, 9]),
+    }
+
+
+def check_in(db, rng: random.Random, user_id: int, day: date):
+    entry = WellnessEntry(user_id=user_id, date=day, **random_values(rng))
+    db.add(entry)
+    wellness_stats.record_checkin(db, entry)
+    db.commit()
+    if rng.random() < 0.1:
+        for name, value in random_values(rng).items():
+            setattr(entry, name, value)
+        wellness_stats.record_checkin(db, entry, replaced=True)
+        db.commit()
+
+
+def batch(entries: list, days: int, today: date) -> dict:
+    """The old per-request computations over the window's entries"""
+    entries = sorted((e for e in entries if e.date >= today - timedelta(days=days)), key=lambda e: e.date)
+    if not entries:
+        return {"n": 0}
+    moods = [e.mood_score for e in entries]
+    stress = [e.stress_level for e in entries]
+    energy = [e.energy_level for e in entries]
+    sleep = [e.sleep_hours or 0 for e in entries]
+    reported = [e.sleep_hours for e in entries if e.sleep_hours]
+    ordinals = [e.date.toordinal() for e in entries]
+    correlations = {}
+    for name, series in (("sleep", sleep), ("stress", stress), ("energy", energy)):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            value = calculate_correlation(series, moods)
+        correlations[name] = 0.0 if value != value else value  # nan -> 0.0, as the aggregate reports it
+    return {
+        "n": len(entries),
+        "mood": float(np.mean(moods)), "stress": float(np.mean(stress)),
+        "energy": float(np.mean(energy)), "sleep": float(np.mean(sleep)),
+        "mood_std": float(np.std(moods)),
+        "stress_slope": float(np.polyfit(ordinals, stress, 1)[0]) if len(set(ordinals)) > 1 else 0.0,
+        "sleep_mean": float(np.mean(reported)) if reported else None,
+        "recent_sleep": reported[-3:],
+        "correlations": correlations,
+        "streak": calculate_streak(entries),
+        "weekly": analyze_weekly_patterns(entries),
+    }
+
+
+def aggregate(state: dict, days: int) -> dict:
+    window = wellness_stats.window(state, days)
+    if not window["n"]:
+        return {"n": 0}
+    return {
+        "n": window["n"],
+        "mood": wellness_stats.mean(window, "mood"), "stress": wellness_stats.mean(window, "stress"),
+        "energy": wellness_stats.mean(window, "energy"), "sleep": wellness_stats.mean(window, "sleep"),
+        "mood_std": wellness_stats.std(window, "mood"),
+        "stress_slope": wellness_stats.slope(window, "day", "stress"),
+        "sleep_mean": wellness_stats.sleep_mean(window),
+        "recent_sleep": wellness_stats.recent_sleep(state, days),
+        "correlations": {name: wellness_stats.correlation(window, name, "mood")
+                         for name in ("sleep", "stress", "energy")},
+        "streak": wellness_stats.streak(state, days),
+        "weekly": wellness_stats.weekly_patterns(state, days),
+    }
+
+
+def differences(expected, actual, path="") -> list:
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        if set(expected) != set(actual):
+            return [f"{path}: keys {sorted(expected)} != {sorted(actual)}"]
+        return [d for key in expected for d in differences(expected[key], actual[key], f"{path}.{key}")]
+    if isinstance(expected, list) and isinstance(actual, list) and len(expected) == len(actual):
+        return [d for i, (a, b) in enumerate(zip(expected, actual)) for d in differences(a, b, f"{path}[{i}]")]
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        # Correlations are rounded to 2 places; allow the last digit to flip
+        tolerance = 0.0100001 if ".correlations." in path else TOLERANCE
+        return [] if abs(expected - actual) <= tolerance else [f"{path}: {expected} != {actual}"]
+    return [] if expected == actual else [f"{path}: {expected} != {actual}"]
+
+
+def check_month(entries: list, state: dict, today: date) -> list:
+    month = [e for e in entries if today.replace(day=1) <= e.date <= today]
+    if not month:
+        return [] if state["month"]["n"] == 0 else ["month: expected empty"]
+    best = max(month, key=lambda e: e.mood_score)
+    worst = min(month, key=lambda e: e.mood_score)
+    expected = {"n": len(month), "mood": sum(e.mood_score for e in month) / len(month),
+                "best": [best.date.isoformat(), best.mood_score], "worst": [worst.date.isoformat(), worst.mood_score]}
+    got = state["month"]
+    actual = {"n": got["n"], "mood": got["sum"]["mood"] / got["n"], "best": got["best"], "worst": got["worst"]}
+    return differences(expected, actual, ".month")
+
+
+def validate(user_ids: list) -> int:
+    rng = random.Random(42)
+    db = SessionLocal()
+    failures = checks = 0
+    for offset in range(DAYS):
+        today = START + timedelta(days=offset)
+        for user_id in user_ids:
+            # Some users check in most days, some rarely; gaps exercise eviction on read
+            if rng.random() < (0.9 if user_id % 2 else 0.4):
+                check_in(db, rng, user_id, today)
+            state = wellness_stats.load(db, user_id, today)
+            entries = db.query(WellnessEntry).filter(WellnessEntry.user_id == user_id).all()
+            problems = check_month(entries, state, today)
+            for days in wellness_stats.WINDOWS:
+                problems += differences(batch(entries, days, today), aggregate(state, days), f"[{days}d]")
+            checks += 1
+            if problems:
+                failures += 1
+                print(f"❌ user {user_id} on {today}: {problems[:3]}")
+    db.close()
+    print(f"validated {checks} user-days x {len(wellness_stats.WINDOWS)} windows: {failures} mismatching")
+    return failures
+
+
+def measure(user_ids: list):
+    today = START + timedelta(days=DAYS - 1)
+    db = SessionLocal()
+
+    started = time.perf_counter()
+    for user_id in user_ids:
+        entries = db.query(WellnessEntry).filter(
+            WellnessEntry.user_id == user_id,
+            WellnessEntry.date >= today - timedelta(days=30)
+        ).all()
+        batch(entries, 30, today)
+    batch_ms = (time.perf_counter() - started) / len(user_ids) * 1000
+
+    started = time.perf_counter()
+    for user_id in user_ids:
+        aggregate(wellness_stats.load(db, user_id, today), 30)
+    aggregate_ms = (time.perf_counter() - started) / len(user_ids) * 1000
+    db.close()
+
+    print(f"30-day statistics per user: recompute {batch_ms:.2f} ms, aggregate {aggregate_ms:.2f} ms")
+
+
+def main():
+    startup.bootstrap()
+    user_ids = seed_users()
+    print(f"{USERS} users, {DAYS} days from {START}")
+    failures = validate(user_ids)
+    measure(user_ids)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
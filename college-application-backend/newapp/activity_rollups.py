@@ -0,0 +1,301 @@
+# activity_rollups.py
+"""
+Per-user activity rollups for the wellness features.
+
+Social withdrawal risk, the daily analysis and the nightly risk batch used to
+count raw rows every time: ChatMessage by sender over the last 7 and 14
+days, pending TodoItems, today's TimetableEntries. Two tables now hold those
+numbers:
+
+  - `activity_daily`: one row per (user, UTC day) with flow counters -
+    messages sent, todos created, todos completed. A window is a SUM over at
+    most window-length rows of the user's primary key range.
+  - `activity_levels`: one row per user with the current pending-todo count
+    and the number of timetable classes on each weekday.
+
+Counters move with the writes, like admin_metrics: an `after_flush` hook on
+SessionLocal turns inserted/deleted messages, todos and timetable entries,
+and flipped `is_completed`/`day_of_week` values, into deltas; `after_commit`
+applies them with one upsert per table. Rolled-back sessions drop theirs.
+A user without a levels row gets one computed from the source tables.
+
+Writes that bypass the ORM (Core bulk inserts, the raw-SQL timetable
+fallback) are caught up by `reconcile_levels()` every RECONCILE_INTERVAL for
+the levels, and by `backfill()` for the daily rows - run once automatically
+on the first start after upgrading, and by hand with backfill_activity.py.
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, delete, event, func, inspect, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal, engine, upsert
+
+RECONCILE_INTERVAL = 3600  # seconds
+BACKFILL_KEY = "activity_rollups_backfilled"
+BATCH_SIZE = 1000
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+FLOW_COLUMNS = ("messages_sent", "todos_created", "todos_completed")
+CLASS_COLUMNS = {day: f"classes_{day.lower()}" for day in WEEKDAYS}
+LEVEL_COLUMNS = ("todos_pending",) + tuple(CLASS_COLUMNS.values())
+
+daily = models.ActivityDaily.__table__
+levels = models.ActivityLevels.__table__
+_messages = models.ChatMessage.__table__
+_todos = models.TodoItem.__table__
+_timetable = models.TimetableEntry.__table__
+
+add_flows = upsert(daily, ("user_id", "day"), ("updated_at",), add=FLOW_COLUMNS)
+add_levels = upsert(levels, ("user_id",), ("updated_at",), add=LEVEL_COLUMNS)
+set_levels = upsert(levels, ("user_id",), LEVEL_COLUMNS + ("updated_at",))
+
+_DELTAS_KEY = "activity_rollup_deltas"
+
+
+def _today() -> date:
+    return datetime.utcnow().date()
+
+
+def _as_date(value) -> date:
+    """func.date() comes back as a string on SQLite"""
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+# ================ DELTAS FROM THE ORM ================
+
+def _previous(obj, attr: str):
+    history = inspect(obj).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(obj, attr)
+
+
+def _deltas(session: Session):
+    return session.info.setdefault(_DELTAS_KEY, (Counter(), Counter()))
+
+
+def _collect(session: Session, flush_context):
+    for objects, kind in ((session.new, "new"), (session.deleted, "deleted"), (session.dirty, "dirty")):
+        for obj in objects:
+            if isinstance(obj, models.ChatMessage):
+                if kind != "dirty":
+                    day = obj.created_at.date() if obj.created_at else _today()
+                    _deltas(session)[0][(obj.sender_id, day, "messages_sent")] += 1 if kind == "new" else -1
+
+            elif isinstance(obj, models.TodoItem):
+                flows, level = _deltas(session)
+                if kind == "new":
+                    flows[(obj.user_id, _today(), "todos_created")] += 1
+                    if obj.is_completed:
+                        flows[(obj.user_id, _today(), "todos_completed")] += 1
+                    else:
+                        level[(obj.user_id, "todos_pending")] += 1
+                elif kind == "deleted":
+                    if not _previous(obj, "is_completed"):
+                        level[(obj.user_id, "todos_pending")] -= 1
+                elif bool(obj.is_completed) != bool(_previous(obj, "is_completed")):
+                    if obj.is_completed:
+                        flows[(obj.user_id, _today(), "todos_completed")] += 1
+                        level[(obj.user_id, "todos_pending")] -= 1
+                    else:
+                        level[(obj.user_id, "todos_pending")] += 1
+
+            elif isinstance(obj, models.TimetableEntry):
+                level = _deltas(session)[1]
+                before = None if kind == "new" else CLASS_COLUMNS.get(_previous(obj, "day_of_week"))
+                after = None if kind == "deleted" else CLASS_COLUMNS.get(obj.day_of_week)
+                if before != after:
+                    if before:
+                        level[(obj.user_id, before)] -= 1
+                    if after:
+                        level[(obj.user_id, after)] += 1
+
+
+def _apply_after_commit(session: Session):
+    deltas = session.info.pop(_DELTAS_KEY, None)
+    if deltas and (deltas[0] or deltas[1]):
+        try:
+            apply_deltas(*deltas)
+        except Exception as e:
+            # reconcile_levels() / backfill() will catch the rollups up
+            print(f"Error applying activity rollup deltas: {e}")
+
+
+def _discard(session: Session, previous_transaction=None):
+    session.info.pop(_DELTAS_KEY, None)
+
+
+def _keep_previous(target, value, oldvalue, initiator):
+    return value
+
+
+# Load the old value when these are assigned on an expired instance, so the
+# flush history says what the row was before
+for _attr in (models.TodoItem.is_completed, models.TimetableEntry.day_of_week):
+    event.listen(_attr, "set", _keep_previous, active_history=True, retval=True)
+
+event.listen(SessionLocal, "after_flush", _collect)
+event.listen(SessionLocal, "after_commit", _apply_after_commit)
+event.listen(SessionLocal, "after_soft_rollback", _discard)
+
+
+def apply_deltas(flows: Counter, level: Counter):
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        rows = {}
+        for (user_id, day, column), delta in flows.items():
+            if delta:
+                row = rows.setdefault((user_id, day), dict.fromkeys(FLOW_COLUMNS, 0))
+                row[column] += delta
+        if rows:
+            conn.execute(add_flows, [dict(row, user_id=user_id, day=day, updated_at=now)
+                                     for (user_id, day), row in rows.items()])
+
+        rows = {}
+        for (user_id, column), delta in level.items():
+            if delta:
+                rows.setdefault(user_id, dict.fromkeys(LEVEL_COLUMNS, 0))[column] += delta
+        if rows:
+            known = set(conn.execute(select(levels.c.user_id).where(levels.c.user_id.in_(rows))).scalars())
+            if known:
+                conn.execute(add_levels, [dict(rows[user_id], user_id=user_id, updated_at=now)
+                                          for user_id in known])
+            if len(known) < len(rows):
+                # First change for these users: the count from the source already includes it
+                computed = compute_levels(conn, [user_id for user_id in rows if user_id not in known])
+                conn.execute(set_levels, [dict(row, user_id=user_id, updated_at=now)
+                                          for user_id, row in computed.items()])
+
+
+# ================ FROM THE SOURCE TABLES ================
+
+def compute_levels(conn, user_ids: Optional[Iterable[int]] = None) -> Dict[int, dict]:
+    """Levels counted from todo_items/timetable_entries, for `user_ids` (default: everyone with any)"""
+    pending = select(_todos.c.user_id, func.count()).where(_todos.c.is_completed == False)
+    classes = select(_timetable.c.user_id, _timetable.c.day_of_week, func.count()) \
+        .where(_timetable.c.day_of_week.in_(WEEKDAYS))
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        pending = pending.where(_todos.c.user_id.in_(user_ids))
+        classes = classes.where(_timetable.c.user_id.in_(user_ids))
+
+    result = {user_id: dict.fromkeys(LEVEL_COLUMNS, 0) for user_id in user_ids or ()}
+    for user_id, count in conn.execute(pending.group_by(_todos.c.user_id)):
+        result.setdefault(user_id, dict.fromkeys(LEVEL_COLUMNS, 0))["todos_pending"] = count
+    for user_id, day, count in conn.execute(classes.group_by(_timetable.c.user_id, _timetable.c.day_of_week)):
+        result.setdefault(user_id, dict.fromkeys(LEVEL_COLUMNS, 0))[CLASS_COLUMNS[day]] = count
+    return result
+
+
+def _daily_counts(conn, since: Optional[date]) -> Dict[tuple, dict]:
+    sources = (
+        ("messages_sent", _messages.c.sender_id, _messages.c.created_at, ()),
+        ("todos_created", _todos.c.user_id, _todos.c.created_at, ()),
+        # No completion timestamp; the last update of a completed todo is the closest thing
+        ("todos_completed", _todos.c.user_id, _todos.c.updated_at, (_todos.c.is_completed == True,)),
+    )
+    rows = {}
+    for column, user_id, timestamp, criteria in sources:
+        day = func.date(timestamp)
+        query = select(user_id, day, func.count()).where(timestamp.is_not(None), *criteria)
+        if since is not None:
+            query = query.where(timestamp >= datetime.combine(since, datetime.min.time()))
+        for user, value, count in conn.execute(query.group_by(user_id, day)):
+            key = (user, _as_date(value))
+            rows.setdefault(key, dict.fromkeys(FLOW_COLUMNS, 0))[column] = count
+    return rows
+
+
+def backfill(days: Optional[int] = None) -> dict:
+    """
+    Rebuild the daily rows (the last `days` days, default all history) and
+    every user's levels from the source tables
+    """
+    since = _today() - timedelta(days=days - 1) if days else None
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        # Delete first: on SQLite that takes the write lock, so no commit can
+        # land between the counts below and the inserts
+        conn.execute(delete(daily).where(daily.c.day >= since) if since else delete(daily))
+        conn.execute(delete(levels))
+
+        rows = [dict(counts, user_id=user_id, day=day, updated_at=now)
+                for (user_id, day), counts in _daily_counts(conn, since).items()]
+        for offset in range(0, len(rows), BATCH_SIZE):
+            conn.execute(insert(daily), rows[offset:offset + BATCH_SIZE])
+        user_levels = [dict(row, user_id=user_id, updated_at=now)
+                       for user_id, row in compute_levels(conn).items()]
+        for offset in range(0, len(user_levels), BATCH_SIZE):
+            conn.execute(insert(levels), user_levels[offset:offset + BATCH_SIZE])
+    print(f"📈 Activity rollups rebuilt: {len(rows)} daily rows, {len(user_levels)} users")
+    return {"daily_rows": len(rows), "users": len(user_levels), "since": since.isoformat() if since else None}
+
+
+def backfill_once(db: Session):
+    """Startup job: backfill the first time this database runs with rollups"""
+    meta = models.AppMeta.__table__
+    if db.execute(select(meta.c.key).where(meta.c.key == BACKFILL_KEY)).first():
+        return
+    try:
+        # Claim it first so only one worker runs the backfill
+        db.execute(insert(meta).values(key=BACKFILL_KEY, value=_today().isoformat(),
+                                       updated_at=datetime.utcnow()))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return
+    backfill()
+
+
+def reconcile_levels(db: Optional[Session] = None) -> int:
+    """Recount every user's levels; returns the number of users stored"""
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        computed = compute_levels(conn)
+        known = set(conn.execute(select(levels.c.user_id)).scalars())
+        # Users whose todos/classes are all gone drop to zero
+        for user_id in known - set(computed):
+            computed[user_id] = dict.fromkeys(LEVEL_COLUMNS, 0)
+        rows = [dict(row, user_id=user_id, updated_at=now) for user_id, row in computed.items()]
+        for offset in range(0, len(rows), BATCH_SIZE):
+            conn.execute(set_levels, rows[offset:offset + BATCH_SIZE])
+    return len(rows)
+
+
+# ================ READS ================
+
+def weekly_messages(conn, today: Optional[date] = None,
+                    user_ids: Optional[Iterable[int]] = None) -> Dict[int, tuple]:
+    """
+    (messages sent in the 7 days ending `today`, in the 7 days before that)
+    per user with any in the fortnight
+    """
+    today = today or _today()
+    week_start = today - timedelta(days=6)
+    query = select(
+        daily.c.user_id,
+        func.sum(case((daily.c.day >= week_start, daily.c.messages_sent), else_=0)),
+        func.sum(case((daily.c.day < week_start, daily.c.messages_sent), else_=0)),
+    ).where(daily.c.day >= today - timedelta(days=13), daily.c.day <= today)
+    if user_ids is not None:
+        query = query.where(daily.c.user_id.in_(list(user_ids)))
+    return {user_id: (int(current), int(previous))
+            for user_id, current, previous in conn.execute(query.group_by(daily.c.user_id))}
+
+
+def user_levels(conn, user_ids: Iterable[int]) -> Dict[int, dict]:
+    """Levels per user; users without a row yet are counted from the source tables"""
+    user_ids = list(user_ids)
+    result = {row.user_id: {column: row._mapping[column] for column in LEVEL_COLUMNS}
+              for row in conn.execute(select(levels).where(levels.c.user_id.in_(user_ids)))}
+    missing = [user_id for user_id in user_ids if user_id not in result]
+    if missing:
+        result.update(compute_levels(conn, missing))
+    return result
+
+
+def classes_on(row: dict, day: date) -> int:
+    return row[CLASS_COLUMNS[WEEKDAYS[day.weekday()]]]
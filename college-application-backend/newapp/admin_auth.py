@@ -4,12 +4,13 @@ from sqlalchemy.orm import Session
 from typing import Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
-from passlib.context import CryptContext
+import hashlib
 import jwt
+import uuid
 from jwt import DecodeError
 
 from .database import get_database
-from . import models
+from . import audit_log, auth_cache, models, passwords
 
 # Initialize router
 router = APIRouter(prefix="/admin/auth", tags=["admin-auth"])
@@ -17,7 +18,6 @@ router = APIRouter(prefix="/admin/auth", tags=["admin-auth"])
 # Configuration
 SECRET_KEY = "your-secret-key-here"  # TODO: Use environment variable
 ALGORITHM = "HS256"
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Pydantic Models
 class AdminLoginRequest(BaseModel):
@@ -42,12 +42,17 @@ def create_admin_token(admin_id: int, user_id: int) -> str:
         "admin_id": admin_id,
         "user_id": user_id,
         "exp": expire,
-        "type": "admin"
+        "type": "admin",
+        "jti": uuid.uuid4().hex
     }
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def verify_admin_token(token: str, db: Session):
-    """Verify admin JWT token and return admin object"""
+def _token_id(payload: dict, token: str) -> str:
+    # Tokens issued before token ids existed are keyed by their hash
+    return payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+def _token_principal(token: str, db: Session) -> auth_cache.Principal:
+    """Verify an admin JWT and resolve it to its (cached) admin and user rows"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         admin_id = payload.get("admin_id")
@@ -55,33 +60,44 @@ def verify_admin_token(token: str, db: Session):
         if not admin_id:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        admin = db.query(models.AdminUser).filter(
-            models.AdminUser.id == admin_id,
-            models.AdminUser.is_active == True
-        ).first()
+        token_id = _token_id(payload, token)
+        if auth_cache.revocations.is_revoked(token_id):
+            raise HTTPException(status_code=401, detail="Token revoked")
         
-        if not admin:
+        principal = auth_cache.lookup(
+            db, token_id, admin_id, datetime.utcfromtimestamp(payload["exp"])
+        )
+        
+        if not principal:
             raise HTTPException(status_code=401, detail="Admin not found")
         
-        return admin
+        return principal
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except DecodeError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+def verify_admin_token(token: str, db: Session):
+    """Verify admin JWT token and return admin object"""
+    principal = _token_principal(token, db)
+    return auth_cache.attach(db, models.AdminUser, principal.admin)
+
 async def get_admin_token(authorization: str = Header(None)) -> str:
     """Extract token from Authorization header"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
     return authorization.replace("Bearer ", "")
 
+def require_admin(token: str = Depends(get_admin_token), db: Session = Depends(get_database)) -> models.AdminUser:
+    """Dependency for admin-only routes: the verified admin, or 401"""
+    return verify_admin_token(token, db)
+
 def get_current_user(token: str = Depends(get_admin_token), db: Session = Depends(get_database)) -> models.User:
     """Get current authenticated user"""
-    admin = verify_admin_token(token, db)
-    user = db.query(models.User).filter(models.User.id == admin.user_id).first()
-    if not user:
+    principal = _token_principal(token, db)
+    if not principal.user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return auth_cache.attach(db, models.User, principal.user)
 
 # Routes
 @router.get("/test")
@@ -107,9 +123,21 @@ async def admin_login(
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        if not pwd_context.verify(request.password, user.hashed_password):
+        try:
+            valid, new_hash = await passwords.verify_password(request.password, user.hashed_password)
+        except passwords.HasherBusy:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many logins in progress. Please try again shortly.",
+                headers={"Retry-After": "1"}
+            )
+        
+        if not valid:
             raise HTTPException(status_code=401, detail="Incorrect password")
         
+        if new_hash:
+            user.hashed_password = new_hash
+        
         admin = db.query(models.AdminUser).filter(
             models.AdminUser.user_id == user.id,
             models.AdminUser.is_active == True
@@ -124,18 +152,10 @@ async def admin_login(
         admin.last_login = datetime.utcnow()
         user.last_login = datetime.utcnow()
         
-        try:
-            activity_log = models.AdminActivityLog(
-                admin_id=admin.id,
-                action="login",
-                details={"identifier": request.identifier}
-            )
-            db.add(activity_log)
-        except:
-            pass  # Non-critical
-        
         db.commit()
         
+        audit_log.log(admin.id, "login", details={"identifier": request.identifier})
+        
         token = create_admin_token(admin.id, user.id)
         
         return AdminLoginResponse(
@@ -162,6 +182,23 @@ async def admin_login(
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/logout")
+async def admin_logout(token: str = Depends(get_admin_token)):
+    """Revoke the presented token until it would have expired"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        return {"message": "Logged out"}
+    except DecodeError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    
+    auth_cache.revocations.revoke(
+        _token_id(payload, token),
+        datetime.utcfromtimestamp(payload["exp"]),
+        admin_id=payload.get("admin_id")
+    )
+    return {"message": "Logged out"}
+
 @router.post("/create-admin")
 async def create_new_admin(
     request: CreateAdminRequest,
@@ -218,9 +255,9 @@ async def create_new_admin(
         db.refresh(new_admin)
         
         # Log activity
-        activity_log = models.AdminActivityLog(
-            admin_id=requesting_admin.id,
-            action="create_admin",
+        audit_log.log(
+            requesting_admin.id,
+            "create_admin",
             target_type="admin",
             target_id=new_admin.id,
             details={
@@ -228,8 +265,6 @@ async def create_new_admin(
                 "admin_level": request.admin_level
             }
         )
-        db.add(activity_log)
-        db.commit()
         
         return {
             "message": "Admin created successfully",
@@ -347,17 +382,17 @@ async def remove_admin(
         
         # Soft delete
         admin_to_remove.is_active = False
+        db.commit()
+        auth_cache.principals.invalidate(admin_ids={admin_id})
         
         # Log activity
-        activity_log = models.AdminActivityLog(
-            admin_id=requesting_admin.id,
-            action="remove_admin",
+        audit_log.log(
+            requesting_admin.id,
+            "remove_admin",
             target_type="admin",
             target_id=admin_id,
             details={"removed_admin_id": admin_id}
         )
-        db.add(activity_log)
-        db.commit()
         
         return {
             "message": "Admin removed successfully",
@@ -376,11 +411,21 @@ async def remove_admin(
 @router.get("/activity-logs")
 async def get_activity_logs(
     authorization: str = Header(None),
-    skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
+    admin_id: Optional[int] = None,
+    action: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    skip: int = 0,
     db: Session = Depends(get_database)
 ):
-    """Get admin activity logs with pagination"""
+    """
+    Get admin activity logs, newest first
+    
+    Pass the returned `next_cursor` as `cursor` to get the next page.
+    Filter by `admin_id`, `action` and a `since`/`until` time range.
+    """
     try:
         if not authorization or not authorization.startswith("Bearer "):
             raise HTTPException(status_code=401, detail="Missing token")
@@ -388,39 +433,18 @@ async def get_activity_logs(
         token = authorization.replace("Bearer ", "")
         requesting_admin = verify_admin_token(token, db)
         
-        # Query logs with pagination
-        logs = db.query(models.AdminActivityLog).order_by(
-            models.AdminActivityLog.created_at.desc()
-        ).offset(skip).limit(limit).all()
-        
-        result = []
-        for log in logs:
-            admin = db.query(models.AdminUser).filter(
-                models.AdminUser.id == log.admin_id
-            ).first()
-            
-            if admin:
-                user = db.query(models.User).filter(
-                    models.User.id == admin.user_id
-                ).first()
-                
-                if user:
-                    result.append({
-                        "id": log.id,
-                        "action": log.action,
-                        "target_type": log.target_type,
-                        "target_id": log.target_id,
-                        "details": log.details or {},
-                        "created_at": log.created_at.isoformat(),
-                        "admin": {
-                            "name": user.full_name,
-                            "email": user.email
-                        }
-                    })
+        try:
+            page = audit_log.query_logs(
+                db, limit=limit, cursor=cursor, admin_id=admin_id,
+                action=action, since=since, until=until, skip=skip
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
         
         return {
-            "logs": result,
-            "total": len(result),
+            "logs": page["logs"],
+            "total": len(page["logs"]),
+            "next_cursor": page["next_cursor"],
             "skip": skip,
             "limit": limit
         }
@@ -431,4 +455,4 @@ async def get_activity_logs(
         raise HTTPException(
             status_code=500,
             detail=f"Failed to fetch activity logs: {str(e)}"
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,262 @@
+# admin_metrics.py
+"""
+Incrementally maintained admin dashboard counters.
+
+`admin_metrics_daily` holds one row per day; today's row is what
+/admin/stats reads, and older rows are the trend history. Counters move
+with the writes themselves: an `after_flush` hook on SessionLocal works out,
+for every tracked model that was inserted, deleted or had its status/active
+flag flipped, how each counter changes, and `after_commit` applies the
+summed deltas with a single UPDATE. Rolled-back sessions drop their deltas.
+
+Writes that bypass the ORM session (Core bulk inserts, fixtures, raw SQL)
+and the rolling "active chats in the last 30 days" figure are handled by
+`reconcile()`, which recomputes everything in one SELECT and runs every
+RECONCILE_INTERVAL seconds.
+"""
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, func, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import audit_log, models
+from .database import SessionLocal, engine
+
+RECONCILE_INTERVAL = 300  # seconds
+
+COUNTERS = [
+    "total_users",
+    "new_users",
+    "total_clubs",
+    "total_events",
+    "total_posts",
+    "total_marketplace_items",
+    "total_discussions",
+    "total_courses",
+    "active_admins",
+    "active_chats",
+    "pending_follow_requests",
+]
+
+metrics = models.AdminMetricsDaily.__table__
+
+_DELTAS_KEY = "admin_metric_deltas"
+
+
+class Tracked:
+    """`column` counts rows of a model matching `where`"""
+
+    def __init__(self, column: str, where: Optional[dict] = None, created_today: bool = False):
+        self.column = column
+        self.where = where or {}
+        # Only rows created today count (e.g. sign-ups); the new day's row starts at 0
+        self.created_today = created_today
+
+
+TRACKED: Dict[type, List[Tracked]] = {
+    models.User: [
+        Tracked("total_users", {"is_active": True}),
+        Tracked("new_users", {"is_active": True}, created_today=True),
+    ],
+    models.Club: [Tracked("total_clubs", {"is_active": True})],
+    models.ClubEvent: [Tracked("total_events")],
+    models.Post: [Tracked("total_posts")],
+    models.MarketplaceItem: [Tracked("total_marketplace_items", {"status": "active"})],
+    models.Discussion: [Tracked("total_discussions")],
+    models.CourseCatalog: [Tracked("total_courses", {"is_active": True})],
+    models.AdminUser: [Tracked("active_admins", {"is_active": True})],
+    models.Follow: [Tracked("pending_follow_requests", {"status": models.FollowStatus.PENDING})],
+}
+
+
+# ================ DELTAS FROM THE ORM ================
+
+def _current_value(obj, attr: str):
+    value = getattr(obj, attr)
+    if value is None:
+        # Python-side column defaults may not be on the instance yet
+        default = obj.__table__.c[attr].default
+        if default is not None and default.is_scalar:
+            value = default.arg
+    return value
+
+
+def _previous_value(obj, attr: str):
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return _current_value(obj, attr)
+
+
+def _matches(obj, where: dict, previous: bool = False) -> bool:
+    read = _previous_value if previous else _current_value
+    return all(read(obj, attr) == expected for attr, expected in where.items())
+
+
+def _collect(session: Session, flush_context):
+    deltas = None
+    for objects, kind in ((session.new, "new"), (session.deleted, "deleted"), (session.dirty, "dirty")):
+        for obj in objects:
+            specs = TRACKED.get(type(obj))
+            if not specs:
+                continue
+            for spec in specs:
+                if spec.created_today and obj.created_at is not None \
+                        and obj.created_at.date() != datetime.utcnow().date():
+                    continue
+                if kind == "new":
+                    delta = int(_matches(obj, spec.where))
+                elif kind == "deleted":
+                    delta = -int(_matches(obj, spec.where, previous=True))
+                elif spec.where:
+                    delta = int(_matches(obj, spec.where)) - int(_matches(obj, spec.where, previous=True))
+                else:
+                    continue
+                if delta:
+                    if deltas is None:
+                        deltas = session.info.setdefault(_DELTAS_KEY, Counter())
+                    deltas[spec.column] += delta
+
+
+def _apply_after_commit(session: Session):
+    deltas = session.info.pop(_DELTAS_KEY, None)
+    if deltas:
+        try:
+            apply_deltas(deltas)
+        except Exception as e:
+            # The reconciler will catch the counters up
+            print(f"Error applying admin metric deltas: {e}")
+
+
+def _discard(session: Session, previous_transaction=None):
+    session.info.pop(_DELTAS_KEY, None)
+
+
+def _keep_previous(target, value, oldvalue, initiator):
+    return value
+
+
+# Make flag/status attributes load their old value when assigned on an
+# expired instance, so the flush history says what the row was before
+for _model, _specs in TRACKED.items():
+    for _attr in {attr for spec in _specs for attr in spec.where}:
+        event.listen(getattr(_model, _attr), "set", _keep_previous, active_history=True, retval=True)
+
+event.listen(SessionLocal, "after_flush", _collect)
+event.listen(SessionLocal, "after_commit", _apply_after_commit)
+event.listen(SessionLocal, "after_soft_rollback", _discard)
+
+
+# ================ SNAPSHOT ROWS ================
+
+def _ensure_today(today: date) -> bool:
+    """Start today's row, carrying yesterday's totals forward.
+
+    Returns True if the row had to be computed from scratch (first ever run),
+    in which case it already reflects every committed write.
+    """
+    with engine.connect() as conn:
+        if conn.execute(select(metrics.c.day).where(metrics.c.day == today)).first():
+            return False
+        latest = conn.execute(select(metrics).order_by(metrics.c.day.desc()).limit(1)).mappings().first()
+
+    if latest is None:
+        reconcile()
+        return True
+
+    row = {column: latest[column] for column in COUNTERS}
+    row.update(day=today, new_users=0, reconciled_at=latest["reconciled_at"])
+    try:
+        with engine.begin() as conn:
+            conn.execute(insert(metrics).values(**row))
+    except IntegrityError:
+        pass  # another worker started the day first
+    return False
+
+
+def apply_deltas(deltas: Dict[str, int]):
+    today = datetime.utcnow().date()
+    if _ensure_today(today):
+        return
+    with engine.begin() as conn:
+        conn.execute(
+            update(metrics)
+            .where(metrics.c.day == today)
+            .values(updated_at=datetime.utcnow(), **{
+                column: metrics.c[column] + delta
+                for column, delta in deltas.items() if delta
+            })
+        )
+
+
+def _count(model, *filters):
+    return select(func.count()).select_from(model).where(*filters).scalar_subquery()
+
+
+def reconcile(db: Optional[Session] = None) -> dict:
+    """Recompute every counter from the source tables and store today's row"""
+    now = datetime.utcnow()
+    today = now.date()
+    start_of_day = datetime.combine(today, time.min)
+
+    counts = select(
+        _count(models.User, models.User.is_active == True).label("total_users"),
+        _count(models.User, models.User.is_active == True,
+               models.User.created_at >= start_of_day,
+               models.User.created_at < start_of_day + timedelta(days=1)).label("new_users"),
+        _count(models.Club, models.Club.is_active == True).label("total_clubs"),
+        _count(models.ClubEvent).label("total_events"),
+        _count(models.Post).label("total_posts"),
+        _count(models.MarketplaceItem, models.MarketplaceItem.status == "active").label("total_marketplace_items"),
+        _count(models.Discussion).label("total_discussions"),
+        _count(models.CourseCatalog, models.CourseCatalog.is_active == True).label("total_courses"),
+        _count(models.AdminUser, models.AdminUser.is_active == True).label("active_admins"),
+        select(func.count(func.distinct(models.ChatMessage.group_id)))
+        .where(models.ChatMessage.created_at >= now - timedelta(days=30))
+        .scalar_subquery().label("active_chats"),
+        _count(models.Follow, models.Follow.status == models.FollowStatus.PENDING).label("pending_follow_requests"),
+    )
+
+    with engine.begin() as conn:
+        row = dict(conn.execute(counts).mappings().one())
+        values = dict(row, reconciled_at=now, updated_at=now)
+        updated = conn.execute(update(metrics).where(metrics.c.day == today).values(**values)).rowcount
+        if not updated:
+            conn.execute(insert(metrics).values(day=today, **values))
+    return row
+
+
+# ================ READS ================
+
+def snapshot() -> dict:
+    """Today's counters (one row)"""
+    today = datetime.utcnow().date()
+    query = select(metrics).where(metrics.c.day == today)
+    with engine.connect() as conn:
+        row = conn.execute(query).mappings().first()
+    if row is None:
+        _ensure_today(today)
+        with engine.connect() as conn:
+            row = conn.execute(query).mappings().first()
+    return dict(row)
+
+
+def history(days: int = 30) -> List[dict]:
+    """Daily rows for trend charts, oldest first"""
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(metrics).where(metrics.c.day >= since).order_by(metrics.c.day)
+        ).mappings().all()
+    return [{
+        "day": row["day"].isoformat(),
+        **{column: row[column] for column in COUNTERS}
+    } for row in rows]
+
+
+def recent_activity(db: Session, limit: int = 10) -> List[dict]:
+    """Latest admin actions with the acting admin's name, in one joined query"""
+    return audit_log.query_logs(db, limit=limit)["logs"]
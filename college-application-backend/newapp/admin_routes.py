@@ -1,4 +1,6 @@
 # admin_routes.py
+import asyncio
+
 from fastapi import APIRouter, Depends, HTTPException, status, Header, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func
@@ -6,7 +8,10 @@ from typing import List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 
+from .admin_auth import require_admin
 from .database import get_database
+from . import admin_metrics, auth_cache, risk_batch
+from .club_directory import ADMIN, directory_cache, like_counts, registration_counts
 from . import models
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -30,98 +35,22 @@ class ClubHeadUpdate(BaseModel):
 
 # Helper Functions
 def get_admin_stats(db: Session):
-    """Get comprehensive admin stats"""
-    # Get user stats
-    total_users = db.query(models.User).filter(models.User.is_active == True).count()
-    
-    # Get today's new users
-    today = datetime.utcnow().date()
-    new_users_today = db.query(models.User).filter(
-        func.date(models.User.created_at) == today,
-        models.User.is_active == True
-    ).count()
-    
-    # Get club stats
-    total_clubs = db.query(models.Club).filter(models.Club.is_active == True).count()
-    
-    # Get event stats
-    total_events = db.query(models.ClubEvent).count()
-    
-    # Get post stats
-    total_posts = db.query(models.Post).count()
-    
-    # Get marketplace stats
-    total_marketplace_items = db.query(models.MarketplaceItem).filter(
-        models.MarketplaceItem.status == 'active'
-    ).count()
-    
-    # Get discussion stats
-    total_discussions = db.query(models.Discussion).count()
-    
-    # Get course stats
-    total_courses = db.query(models.CourseCatalog).filter(
-        models.CourseCatalog.is_active == True
-    ).count()
-    
-    # Get admin stats
-    active_admins = db.query(models.AdminUser).filter(
-        models.AdminUser.is_active == True
-    ).count()
-    
-    # Get active chats (groups with recent messages)
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    active_chats = db.query(models.ChatGroup).join(models.ChatMessage).filter(
-        models.ChatMessage.created_at >= thirty_days_ago
-    ).distinct().count()
-    
-    # Get pending follow requests
-    pending_follow_requests = db.query(models.Follow).filter(
-        models.Follow.status == 'pending'
-    ).count()
-    
-    # Get recent admin activity
-    recent_activity = db.query(models.AdminActivityLog).order_by(
-        models.AdminActivityLog.created_at.desc()
-    ).limit(10).all()
-    
-    activity_list = []
-    for activity in recent_activity:
-        admin = db.query(models.AdminUser).filter(
-            models.AdminUser.id == activity.admin_id
-        ).first()
-        
-        if admin:
-            user = db.query(models.User).filter(
-                models.User.id == admin.user_id
-            ).first()
-            
-            if user:
-                activity_list.append({
-                    "id": activity.id,
-                    "action": activity.action,
-                    "target_type": activity.target_type,
-                    "target_id": activity.target_id,
-                    "details": activity.details or {},
-                    "created_at": activity.created_at.isoformat(),
-                    "admin": {
-                        "name": user.full_name,
-                        "email": user.email
-                    }
-                })
+    """Get comprehensive admin stats from the maintained snapshot row"""
+    stats = admin_metrics.snapshot()
     
     return {
-        "total_users": total_users,
-        "new_users_today": new_users_today,
-        "totalClubs": total_clubs,
-        "totalEvents": total_events,
-        "total_posts": total_posts,
-        "total_marketplace_items": total_marketplace_items,
-        "total_discussions": total_discussions,
-        "total_courses": total_courses,
-        "activeAdmins": active_admins,
-        "active_chats": active_chats,
-        "pending_follow_requests": pending_follow_requests,
-        "recentActivity": activity_list
+        "total_users": stats["total_users"],
+        "new_users_today": stats["new_users"],
+        "totalClubs": stats["total_clubs"],
+        "totalEvents": stats["total_events"],
+        "total_posts": stats["total_posts"],
+        "total_marketplace_items": stats["total_marketplace_items"],
+        "total_discussions": stats["total_discussions"],
+        "total_courses": stats["total_courses"],
+        "activeAdmins": stats["active_admins"],
+        "active_chats": stats["active_chats"],
+        "pending_follow_requests": stats["pending_follow_requests"],
+        "recentActivity": admin_metrics.recent_activity(db)
     }
 
 # Admin Routes
@@ -132,51 +61,74 @@ async def get_admin_dashboard_stats(
     """Get admin dashboard statistics"""
     return get_admin_stats(db)
 
+@router.get("/stats/history")
+async def get_admin_stats_history(
+    days: int = Query(30, ge=1, le=366),
+    admin: models.AdminUser = Depends(require_admin)
+):
+    """Daily dashboard counters for trend charts"""
+    return admin_metrics.history(days)
+
+@router.post("/stats/reconcile")
+async def reconcile_admin_stats(admin: models.AdminUser = Depends(require_admin)):
+    """Recompute the dashboard counters from the source tables now"""
+    return admin_metrics.reconcile()
+
+# Wellness Risk Routes
+@router.get("/wellness/at-risk")
+async def get_at_risk_students(
+    level: str = Query("high"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_database),
+    admin: models.AdminUser = Depends(require_admin)
+):
+    """Students whose latest risk assessment is `level` or worse, highest risk first"""
+    if level not in risk_batch.LEVELS:
+        raise HTTPException(status_code=400, detail=f"level must be one of {', '.join(risk_batch.LEVELS)}")
+    levels = risk_batch.LEVELS[risk_batch.LEVELS.index(level):]
+    
+    latest = db.query(func.max(models.RiskAssessment.id)).group_by(models.RiskAssessment.user_id)
+    rows = db.query(models.RiskAssessment, models.User).join(
+        models.User, models.User.id == models.RiskAssessment.user_id
+    ).filter(
+        models.RiskAssessment.id.in_(latest),
+        models.RiskAssessment.overall_risk_level.in_(levels)
+    ).order_by(models.RiskAssessment.risk_percentage.desc()).limit(limit).all()
+    
+    return [
+        {
+            "user_id": user.id,
+            "full_name": user.full_name,
+            "email": user.email,
+            "department": user.department,
+            "year": user.year,
+            "risk_level": assessment.overall_risk_level,
+            "risk_percentage": round(assessment.risk_percentage or 0, 1),
+            "risk_breakdown": {
+                "mood_volatility": assessment.mood_volatility_score,
+                "stress_accumulation": assessment.stress_accumulation_score,
+                "sleep_deterioration": assessment.sleep_deterioration_score,
+                "social_withdrawal": assessment.social_withdrawal_score,
+                "academic_decline": assessment.academic_decline_score
+            },
+            "immediate_intervention": bool(assessment.immediate_intervention),
+            "assessed_at": assessment.assessment_date.isoformat() if assessment.assessment_date else None
+        }
+        for assessment, user in rows
+    ]
+
+@router.post("/wellness/risk-scoring/run")
+async def run_risk_scoring(admin: models.AdminUser = Depends(require_admin)):
+    """Score every student's wellness risk now instead of waiting for the nightly run"""
+    return await asyncio.to_thread(risk_batch.score_population)
+
 # Club Management Routes
 @router.get("/clubs")
 async def get_all_clubs_admin(
     db: Session = Depends(get_database)
 ):
     """Get all clubs (including inactive ones) for admin management"""
-    
-    clubs = db.query(models.Club).all()
-    
-    result = []
-    for club in clubs:
-        # Get club head info
-        head = db.query(models.User).filter(
-            models.User.id == club.club_head_id
-        ).first()
-        
-        # Get follower count
-        follower_count = db.query(models.ClubFollower).filter(
-            models.ClubFollower.club_id == club.id
-        ).count()
-        
-        # Get event count
-        event_count = db.query(models.ClubEvent).filter(
-            models.ClubEvent.club_id == club.id
-        ).count()
-        
-        result.append({
-            "id": club.id,
-            "name": club.name,
-            "category": club.category,
-            "description": club.description,
-            "logo_url": club.logo_url,
-            "cover_url": club.cover_url,
-            "is_active": club.is_active,
-            "follower_count": follower_count,
-            "event_count": event_count,
-            "created_at": club.created_at.isoformat(),
-            "club_head": {
-                "id": head.id,
-                "name": head.full_name,
-                "email": head.email
-            } if head else None
-        })
-    
-    return result
+    return directory_cache.get(db, ADMIN)
 
 @router.get("/clubs/{club_id}")
 async def get_club_details_admin(
@@ -200,11 +152,15 @@ async def get_club_details_admin(
         models.ClubFollower.club_id == club.id
     ).all()
     
+    follower_ids = [follower.user_id for follower in followers]
+    follower_users = {
+        user.id: user for user in
+        db.query(models.User).filter(models.User.id.in_(follower_ids)).all()
+    } if follower_ids else {}
+    
     follower_list = []
     for follower in followers:
-        user = db.query(models.User).filter(
-            models.User.id == follower.user_id
-        ).first()
+        user = follower_users.get(follower.user_id)
         
         if user:
             follower_list.append({
@@ -221,16 +177,12 @@ async def get_club_details_admin(
         models.ClubEvent.club_id == club.id
     ).order_by(models.ClubEvent.created_at.desc()).all()
     
+    event_ids = [event.id for event in events]
+    registrations = registration_counts(db, event_ids)
+    likes = like_counts(db, event_ids)
+    
     event_list = []
     for event in events:
-        registration_count = db.query(models.EventRegistration).filter(
-            models.EventRegistration.event_id == event.id
-        ).count()
-        
-        like_count = db.query(models.EventLike).filter(
-            models.EventLike.event_id == event.id
-        ).count()
-        
         event_list.append({
             "id": event.id,
             "title": event.title,
@@ -238,9 +190,9 @@ async def get_club_details_admin(
             "event_date": event.event_date.isoformat(),
             "location": event.location,
             "status": event.status,
-            "registration_count": registration_count,
+            "registration_count": registrations.get(event.id, 0),
             "max_participants": event.max_participants,
-            "like_count": like_count,
+            "like_count": likes.get(event.id, 0),
             "image_url": event.image_url,
             "created_at": event.created_at.isoformat()
         })
@@ -306,6 +258,7 @@ async def create_club_admin(
         
         db.add(new_club)
         db.commit()
+        directory_cache.invalidate()
         db.refresh(new_club)
         
         return {
@@ -347,6 +300,7 @@ async def update_club_admin(
         setattr(club, field, value)
     
     db.commit()
+    directory_cache.invalidate()
     
     return {"message": "Club updated successfully"}
 
@@ -372,9 +326,13 @@ async def update_club_head_admin(
         raise HTTPException(status_code=404, detail="User not found")
     
     # Update club head
+    previous_head_id = club.club_head_id
     club.club_head_id = new_head.id
     
     db.commit()
+    directory_cache.invalidate()
+    # Both heads' club-head routes resolve them through the principal cache
+    auth_cache.principals.invalidate(user_ids={previous_head_id, new_head.id})
     
     return {"message": "Club head updated successfully"}
 
@@ -394,6 +352,7 @@ async def delete_club_admin(
     club.is_active = False
     
     db.commit()
+    directory_cache.invalidate()
     
     return {"message": "Club deleted successfully"}
 
@@ -413,5 +372,6 @@ async def restore_club_admin(
     club.is_active = True
     
     db.commit()
+    directory_cache.invalidate()
     
     return {"message": "Club restored successfully"}
\ No newline at end of file
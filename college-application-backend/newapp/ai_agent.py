@@ -0,0 +1,218 @@
+# ai_agent.py
+"""
+One AI agent per process, shared by every /ai/ask.
+
+`AIAssistant` used to build its agent per request: a tools/list round trip
+to the MCP server plus `create_agent(...)` before every question, each over
+a fresh HTTP connection. `registry` now holds the agent for the life of the
+process:
+
+  - it's built on first use and rebuilt (tools re-discovered) after
+    TOOLS_TTL seconds, or on the next request after an agent call failed;
+    concurrent requests wait on one build instead of each starting their own
+  - if re-discovery fails while an agent exists, the old one keeps serving
+    and the refresh is retried after RETRY_AFTER seconds
+  - every MCP session (tool discovery and each tool call) goes through one
+    keep-alive connection pool of MCP_MAX_CONNECTIONS connections
+
+The agent holds no database state; `AIAssistant` keeps the request's own
+session for knowledge-base reads and chat history writes.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from typing import AsyncIterator, Optional
+
+import httpx
+from prometheus_client import Counter, Gauge, Histogram
+
+from newapp import llm_gate
+
+MODEL = os.getenv("AI_MODEL", "gpt-4o")  # or "gpt-3.5-turbo" for cost savings
+MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "http://10.32.5.221:8080/mcp")
+TOOLS_TTL = int(os.getenv("AI_TOOLS_TTL", "600"))  # seconds
+RETRY_AFTER = 30  # seconds between refresh attempts while the MCP server is failing
+MCP_MAX_CONNECTIONS = int(os.getenv("MCP_MAX_CONNECTIONS", "20"))
+
+SYSTEM_PROMPT = """You are an AI assistant specifically for IIT Palakkad students.
+
+CORE RESPONSIBILITIES:
+1. Answer student queries accurately using available tools and knowledge base
+2. Provide clear, well-structured responses with proper formatting
+3. Extract and provide relevant contact information when needed
+4. Be friendly, helpful, and student-oriented
+
+RESPONSE GUIDELINES:
+- Use bullet points or numbered lists for clarity
+- Keep responses under 250 words unless detailed explanation needed
+- Use emojis sparingly (1-2 max) for friendliness
+- Always cite sources when using knowledge base information
+- If uncertain, be honest and suggest relevant contacts
+
+CONTACT SUGGESTIONS:
+- Academic queries → academics@iitpkd.ac.in
+- Hostel queries → hostel@iitpkd.ac.in
+- Exam queries → exams@iitpkd.ac.in
+- General queries → office@iitpkd.ac.in
+
+You have access to tools that can query the college database. Use them when appropriate."""
+
+agent_builds = Counter(
+    "app_ai_agent_builds_total",
+    "AI agent (re)builds, by why and whether tool discovery succeeded",
+    ["reason", "result"],  # reason: startup / ttl / failure
+)
+agent_build_seconds = Histogram(
+    "app_ai_agent_build_seconds",
+    "MCP tool discovery plus agent construction",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+agent_tools = Gauge(
+    "app_ai_agent_tools",
+    "MCP tools the current agent was built with",
+)
+
+
+class _SharedTransport(httpx.AsyncHTTPTransport):
+    """
+    Keep-alive pool shared by every MCP session. The MCP client opens and
+    closes an httpx client per session, which would close the pool with it,
+    so closing is a no-op here and `shutdown()` closes it for real.
+    """
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def aclose(self):
+        pass
+
+    async def shutdown(self):
+        await super().aclose()
+
+
+class AgentRegistry:
+    def __init__(self, url: str = MCP_SERVER_URL, model=MODEL, ttl: float = TOOLS_TTL,
+                 gate: Optional[llm_gate.LLMGate] = None):
+        self.url = url
+        self.model = model
+        self.ttl = ttl
+        self.gate = gate or llm_gate.gate
+        self._agent = None
+        self._built_at = 0.0
+        self._failed_at = 0.0
+        self._stale = False
+        self._lock = asyncio.Lock()
+        self._transport: Optional[_SharedTransport] = None
+        self._mcp_client = None
+
+    def _http_client(self, headers=None, timeout=None, auth=None) -> httpx.AsyncClient:
+        """httpx_client_factory for the MCP client: new client, shared pool"""
+        if self._transport is None:
+            self._transport = _SharedTransport(limits=httpx.Limits(
+                max_connections=MCP_MAX_CONNECTIONS, max_keepalive_connections=MCP_MAX_CONNECTIONS))
+        return httpx.AsyncClient(transport=self._transport, headers=headers, auth=auth,
+                                 timeout=timeout or httpx.Timeout(30, read=300))
+
+    def mcp_client(self):
+        """The MCP client, created on first call so importing this module doesn't pull in the LangChain / MCP stack"""
+        if self._mcp_client is None:
+            from langchain_mcp_adapters.client import MultiServerMCPClient
+
+            self._mcp_client = MultiServerMCPClient({
+                "college": {
+                    "transport": "streamable_http",
+                    "url": self.url,
+                    "httpx_client_factory": self._http_client,
+                },
+            })
+        return self._mcp_client
+
+    def _fresh(self) -> bool:
+        if self._agent is None:
+            return False
+        now = time.monotonic()
+        if now - self._failed_at < RETRY_AFTER:
+            return True  # the last refresh failed; keep the old agent for now
+        return not self._stale and now - self._built_at < self.ttl
+
+    async def get(self):
+        """The shared agent, (re)building it first if it's missing, expired or failed"""
+        if self._fresh():
+            return self._agent
+        async with self._lock:
+            if self._fresh():
+                return self._agent  # built while we waited
+            reason = "startup" if self._agent is None else "failure" if self._stale else "ttl"
+            started = time.perf_counter()
+            try:
+                tools = await self.mcp_client().get_tools()
+            except Exception as e:
+                agent_builds.labels(reason, "error").inc()
+                if self._agent is None:
+                    raise
+                print(f"⚠️ MCP tool refresh failed ({e}); keeping the current agent")
+                self._failed_at = time.monotonic()
+                return self._agent
+
+            from langchain.agents import create_agent
+
+            self._agent = create_agent(self.model, tools, system_prompt=SYSTEM_PROMPT)
+            self._built_at = time.monotonic()
+            self._failed_at = 0.0
+            self._stale = False
+            agent_builds.labels(reason, "ok").inc()
+            agent_build_seconds.observe(time.perf_counter() - started)
+            agent_tools.set(len(tools))
+            print(f"🤖 AI agent built ({reason}) with {len(tools)} MCP tools")
+            return self._agent
+
+    def invalidate(self):
+        """Re-discover tools before the next question"""
+        self._stale = True
+
+    async def _invoke(self, prompt: str) -> str:
+        agent = await self.get()
+        try:
+            response = await agent.ainvoke({"messages": [{"role": "user", "content": prompt}]})
+        except Exception:
+            self.invalidate()
+            raise
+        return response["messages"][-1].content
+
+    async def invoke(self, prompt: str, key: Optional[str] = None) -> str:
+        """
+        Ask the agent one question through the LLM gate (concurrent calls
+        with the same `key`, by default the prompt itself, share one
+        answer); a failure invalidates the agent
+        """
+        key = key or hashlib.blake2b(prompt.encode(), digest_size=16).hexdigest()
+        return await self.gate.run(key, lambda: self._invoke(prompt))
+
+    async def _stream(self, prompt: str) -> AsyncIterator[str]:
+        agent = await self.get()
+        try:
+            async for chunk, _ in agent.astream({"messages": [{"role": "user", "content": prompt}]},
+                                                stream_mode="messages"):
+                # Model tokens only: tool results and tool-call chunks carry no answer text
+                if getattr(chunk, "type", None) in ("AIMessageChunk", "ai") \
+                        and isinstance(chunk.content, str) and chunk.content:
+                    yield chunk.content
+        except Exception:
+            self.invalidate()
+            raise
+
+    def stream(self, prompt: str, key: Optional[str] = None) -> AsyncIterator[str]:
+        """`invoke()`, yielding the answer's text as the model produces it"""
+        key = key or hashlib.blake2b(prompt.encode(), digest_size=16).hexdigest()
+        return self.gate.stream(key, lambda: self._stream(prompt))
+
+    async def shutdown(self):
+        if self._transport is not None:
+            await self._transport.shutdown()
+            self._transport = None
+        self._agent = None
+        self._mcp_client = None
+
+
+registry = AgentRegistry()
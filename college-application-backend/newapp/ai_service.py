@@ -2,171 +2,155 @@
 
 from sqlalchemy.orm import Session
 from sqlalchemy import func, or_
-from newapp import models
+from newapp import ai_agent, answer_cache, llm_gate, models
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from difflib import SequenceMatcher
+import contextlib
 import re
 import os
 
-# LangChain imports
-from langchain.agents import create_agent
-from langchain_mcp_adapters.client import MultiServerMCPClient
-
 # Configure OpenAI API Key
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
-# Configure MCP Client
-mcp_client = MultiServerMCPClient(
-    {
-        "college": {
-            "transport": "streamable_http",
-            "url": os.getenv("MCP_SERVER_URL", "http://10.32.5.221:8080/mcp"),
-        },
-    }
-)
+# (answer cache version, categories) for _guess_category
+_categories: Optional[Tuple[int, List[str]]] = None
 
 
 class AIAssistant:
     def __init__(self, db: Session):
+        # The request's session; the agent itself is process-wide (ai_agent.registry)
         self.db = db
-        self.agent = None
-        self.tools = None
-        
-    async def initialize_agent(self):
-        """Initialize the MCP agent with tools"""
-        if self.agent is None:
-            self.tools = await mcp_client.get_tools()
-            # Create agent with system prompt
-            self.agent = create_agent(
-                "gpt-4o",  # or "gpt-3.5-turbo" for cost savings
-                self.tools,
-                system_prompt="""You are an AI assistant specifically for IIT Palakkad students.
-
-CORE RESPONSIBILITIES:
-1. Answer student queries accurately using available tools and knowledge base
-2. Provide clear, well-structured responses with proper formatting
-3. Extract and provide relevant contact information when needed
-4. Be friendly, helpful, and student-oriented
-
-RESPONSE GUIDELINES:
-- Use bullet points or numbered lists for clarity
-- Keep responses under 250 words unless detailed explanation needed
-- Use emojis sparingly (1-2 max) for friendliness
-- Always cite sources when using knowledge base information
-- If uncertain, be honest and suggest relevant contacts
 
-CONTACT SUGGESTIONS:
-- Academic queries → academics@iitpkd.ac.in
-- Hostel queries → hostel@iitpkd.ac.in
-- Exam queries → exams@iitpkd.ac.in
-- General queries → office@iitpkd.ac.in
-
-You have access to tools that can query the college database. Use them when appropriate."""
-            )
-        
     async def get_response(self, user_id: int, message: str) -> Dict:
-        """Main function to get AI response using MCP + LangChain"""
-        
-        # Initialize agent if needed
-        await self.initialize_agent()
-        
-        # Save user message
-        self._save_chat(user_id, message, True)
+        """
+        Main function to get AI response using MCP + LangChain. Nothing is
+        written until the answer is ready: question, reply and any
+        review-queue entry then go in one commit (`_persist`)
+        """
+        asked_at = datetime.utcnow()
+        
+        # Repeated questions are answered from the cache
+        shareable = answer_cache.cacheable(message)
+        if shareable:
+            cached = answer_cache.cache.get(message)
+            if cached is not None:
+                chat_id = self._persist(user_id, message, asked_at, cached.response["response"], cached.confidence_score)
+                return {**cached.response, "cached": True, "chat_id": chat_id}
+        cache_version = answer_cache.cache.version
         
         # Step 1: Search knowledge base for relevant context
         kb_results = self._search_knowledge_base(message)
+        kind, prompt, confidence, has_kb_data = self._plan(user_id, message, kb_results)
+        # Don't hold a pooled connection while the agent works; the session reconnects to write
+        self.db.close()
         
         # Step 2: Query agent with full context
+        cache_it = False
+        try:
+            answer_text = await ai_agent.registry.invoke(prompt, self._flight_key(kind, message))
+            reply, confidence_score, unanswered = self._compose(
+                message, answer_text, kb_results, has_kb_data, confidence
+            )
+            # Only knowledge-base answers are cached: they can be invalidated when the KB changes
+            cache_it = shareable and has_kb_data and not unanswered
+        except llm_gate.LLMBusy as e:
+            print(f"Agent busy: {e}")
+            reply, confidence_score, unanswered = self._busy_reply(message)
+        except Exception as e:
+            print(f"Agent error: {e}")
+            reply, confidence_score, unanswered = self._fallback_reply()
+        
+        # Unanswered questions also go to the review queue for admins
+        chat_id = self._persist(user_id, message, asked_at, reply["response"], confidence_score, unanswered)
+        if cache_it:
+            answer_cache.cache.put(message, reply, confidence_score, [r['id'] for r in kb_results], cache_version)
+        return {**reply, "chat_id": chat_id}
+    
+    async def stream_response(self, user_id: int, message: str) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        The answer as ("token", {"text": ...}) events while the agent writes
+        it, then one ("done", {...}) event with the fields /ai/ask returns;
+        the done event's "response" is the complete reply.
+        
+        The session is released before the agent call and written to once at
+        the end: question, reply and any review-queue entry in one commit.
+        Closes the session when done.
+        """
+        asked_at = datetime.utcnow()
+        persisted = False
         try:
-            if kb_results and kb_results[0]['similarity'] > 0.4:
-                # We have relevant knowledge - provide it to agent
-                response_data = await self._query_agent_with_kb_context(
-                    user_id, message, kb_results
-                )
-                confidence = "high" if kb_results[0]['similarity'] > 0.65 else "medium"
-                has_kb_data = True
+            shareable = answer_cache.cacheable(message)
+            cached = answer_cache.cache.get(message) if shareable else None
+            if cached is not None:
+                reply, confidence_score, unanswered = {**cached.response, "cached": True}, cached.confidence_score, False
+                yield "token", {"text": reply["response"]}
             else:
-                # No relevant knowledge - let agent use its own knowledge + tools
-                response_data = await self._query_agent_general(user_id, message)
-                confidence = "medium"
-                has_kb_data = False
-            
-            response_text = response_data['answer']
-            contacts = response_data.get('contacts', [])
-            
-            # Additional contact extraction from KB
-            if kb_results:
-                kb_contacts = self._extract_contacts_from_kb(kb_results)
-                contacts.extend(kb_contacts)
-            
-            # Remove duplicates
-            contacts = self._deduplicate_contacts(contacts)
-            
-            # Check if agent couldn't answer
-            if self._is_uncertain_response(response_text):
-                confidence = "low"
-                # Save as unanswered question for admin review
-                self._save_unanswered_question(user_id, message)
+                cache_version = answer_cache.cache.version
+                kb_results = self._search_knowledge_base(message)
+                # Don't hold a pooled connection while the agent writes
+                self.db.close()
+                kind, prompt, confidence, has_kb_data = self._plan(user_id, message, kb_results)
                 
-                # Suggest contacts
-                if not contacts:
-                    contacts = self._suggest_contacts_for_query(message)
+                parts = []
+                try:
+                    tokens = ai_agent.registry.stream(prompt, self._flight_key(kind, message))
+                    async with contextlib.aclosing(tokens):  # stop the agent if the client goes away
+                        async for text in tokens:
+                            parts.append(text)
+                            yield "token", {"text": text}
+                    reply, confidence_score, unanswered = self._compose(
+                        message, "".join(parts), kb_results, has_kb_data, confidence
+                    )
+                    if shareable and has_kb_data and not unanswered:
+                        answer_cache.cache.put(message, reply, confidence_score,
+                                               [r['id'] for r in kb_results], cache_version)
+                except llm_gate.LLMBusy as e:
+                    print(f"Agent busy: {e}")
+                    reply, confidence_score, unanswered = self._busy_reply(message)
+                except Exception as e:
+                    print(f"Agent error: {e}")
+                    reply, confidence_score, unanswered = self._fallback_reply()
                 
-                if contacts:
-                    response_text += f"\n\n💡 I've noted this question for review. Meanwhile, try contacting: {contacts[0]['email']}"
-                
-                self._save_chat(user_id, response_text, False, 0.3)
-                
-                return {
-                    "response": response_text,
-                    "confidence": confidence,
-                    "contacts": contacts[:3],
-                    "sources": ["AI Generated"] if not has_kb_data else [r['source_url'] for r in kb_results[:2]],
-                    "unanswered": True,
-                    "chat_id": self._get_last_chat_id(user_id)
-                }
-            
-            # Success! Save and return
-            confidence_score = 0.85 if confidence == "high" else 0.65 if confidence == "medium" else 0.4
-            self._save_chat(user_id, response_text, False, confidence_score)
+                # Whatever the reply adds to the streamed text: the review note, or a busy/fallback reply
+                sent = "".join(parts)
+                rest = reply["response"][len(sent):] if reply["response"].startswith(sent) else "\n\n" + reply["response"]
+                if rest:
+                    yield "token", {"text": rest}
             
-            return {
-                "response": response_text,
-                "confidence": confidence,
-                "sources": ["IIT Palakkad Knowledge Base + AI"] if has_kb_data else ["AI Generated with IIT Palakkad Context"],
-                "contacts": contacts[:3],
-                "chat_id": self._get_last_chat_id(user_id)
-            }
-            
-        except Exception as e:
-            print(f"Agent error: {e}")
-            # Fallback response
-            self._save_unanswered_question(user_id, message)
-            contacts = self._get_general_contacts()
-            
-            fallback = "I'm having trouble processing your question right now. For immediate help, please contact office@iitpkd.ac.in or check the IIT Palakkad website at https://iitpkd.ac.in"
-            self._save_chat(user_id, fallback, False, 0.3)
-            
-            return {
-                "response": fallback,
-                "confidence": "error",
-                "contacts": contacts,
-                "unanswered": True,
-                "chat_id": self._get_last_chat_id(user_id)
-            }
+            chat_id = self._persist(user_id, message, asked_at, reply["response"], confidence_score, unanswered)
+            persisted = True
+            yield "done", {**reply, "chat_id": chat_id}
+        finally:
+            if not persisted:
+                # The client went away (or the write failed); keep the question at least.
+                # A failed flush/commit leaves the session needing a rollback first,
+                # and the rollback also drops the reply rows it had pending
+                try:
+                    self.db.rollback()
+                    self._persist(user_id, message, asked_at)
+                except Exception as e:
+                    print(f"Error saving chat: {e}")
+            self.db.close()
     
-    async def _query_agent_with_kb_context(
-        self, user_id: int, message: str, kb_results: List[Dict]
-    ) -> Dict:
-        """Query agent WITH knowledge base context"""
+    def _plan(self, user_id: int, message: str, kb_results: List[Dict]) -> Tuple[str, str, str, bool]:
+        """(flight key kind, prompt, confidence, has_kb_data) for a question"""
+        if kb_results and kb_results[0]['similarity'] > 0.4:
+            # We have relevant knowledge - provide it to agent
+            confidence = "high" if kb_results[0]['similarity'] > 0.65 else "medium"
+            return "kb", self._kb_prompt(user_id, message, kb_results), confidence, True
+        # No relevant knowledge - let agent use its own knowledge + tools
+        return "general", self._general_prompt(user_id, message), "medium", False
+    
+    def _kb_prompt(self, user_id: int, message: str, kb_results: List[Dict]) -> str:
+        """Prompt WITH knowledge base context"""
         
         # Build context from knowledge base
         context = self._build_detailed_context(kb_results)
         
         # Create comprehensive prompt with user context
-        user_prompt = f"""USER CONTEXT:
+        return f"""USER CONTEXT:
 - User ID: {user_id}
 - Remember this user ID for any tool calls that require user identification
 
@@ -184,38 +168,11 @@ Instructions:
 6. Use bullet points or numbered lists when appropriate
 
 Provide your answer:"""
-
-        try:
-            # Invoke agent
-            agent_response = await self.agent.ainvoke(
-                {
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": user_prompt
-                        }
-                    ]
-                }
-            )
-            
-            # Extract final response
-            answer_text = agent_response["messages"][-1].content
-            
-            # Extract contacts mentioned in response
-            contacts = self._extract_contacts_from_text(answer_text)
-            
-            return {
-                'answer': answer_text,
-                'contacts': contacts
-            }
-        except Exception as e:
-            print(f"Agent query error: {e}")
-            raise
     
-    async def _query_agent_general(self, user_id: int, message: str) -> Dict:
-        """Query agent WITHOUT KB context - uses general knowledge + tools"""
+    def _general_prompt(self, user_id: int, message: str) -> str:
+        """Prompt WITHOUT KB context - uses general knowledge + tools"""
         
-        user_prompt = f"""USER CONTEXT:
+        return f"""USER CONTEXT:
 - User ID: {user_id}
 - Remember this user ID for any tool calls that require user identification
 
@@ -234,37 +191,81 @@ Instructions:
    * General queries → office@iitpkd.ac.in
 
 Provide your answer:"""
-
-        try:
-            # Invoke agent
-            agent_response = await self.agent.ainvoke(
-                {
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": user_prompt
-                        }
-                    ]
-                }
-            )
-            
-            # Extract final response
-            answer_text = agent_response["messages"][-1].content
-            
-            # Extract any contacts mentioned
-            contacts = self._extract_contacts_from_text(answer_text)
-            
-            # If no contacts found, suggest based on query
+    
+    def _compose(self, message: str, response_text: str, kb_results: List[Dict], has_kb_data: bool,
+                 confidence: str) -> Tuple[Dict, float, bool]:
+        """(reply, confidence score, unanswered) for the agent's answer"""
+        
+        # Extract contacts mentioned in response
+        contacts = self._extract_contacts_from_text(response_text)
+        
+        # If no contacts found, suggest based on query
+        if not has_kb_data and not contacts:
+            contacts = self._suggest_contacts_for_query(message)
+        
+        # Additional contact extraction from KB
+        if kb_results:
+            kb_contacts = self._extract_contacts_from_kb(kb_results)
+            contacts.extend(kb_contacts)
+        
+        # Remove duplicates
+        contacts = self._deduplicate_contacts(contacts)
+        
+        # Check if agent couldn't answer
+        if self._is_uncertain_response(response_text):
+            # Suggest contacts
             if not contacts:
                 contacts = self._suggest_contacts_for_query(message)
             
+            if contacts:
+                response_text += f"\n\n💡 I've noted this question for review. Meanwhile, try contacting: {contacts[0]['email']}"
+            
             return {
-                'answer': answer_text,
-                'contacts': contacts
-            }
-        except Exception as e:
-            print(f"Agent query error: {e}")
-            raise
+                "response": response_text,
+                "confidence": "low",
+                "contacts": contacts[:3],
+                "sources": ["AI Generated"] if not has_kb_data else [r['source_url'] for r in kb_results[:2]],
+                "unanswered": True,
+            }, 0.3, True
+        
+        # Success!
+        confidence_score = 0.85 if confidence == "high" else 0.65 if confidence == "medium" else 0.4
+        return {
+            "response": response_text,
+            "confidence": confidence,
+            "sources": ["IIT Palakkad Knowledge Base + AI"] if has_kb_data else ["AI Generated with IIT Palakkad Context"],
+            "contacts": contacts[:3],
+        }, confidence_score, False
+    
+    def _busy_reply(self, message: str) -> Tuple[Dict, float, bool]:
+        """Too many questions in flight: point at the right people rather than make them wait"""
+        contacts = self._suggest_contacts_for_query(message)
+        busy = f"Lots of students are asking questions right now, so I couldn't get to yours. Please try again in a minute, or contact {contacts[0]['email']}"
+        return {
+            "response": busy,
+            "confidence": "busy",
+            "contacts": contacts[:3],
+        }, 0.3, False
+    
+    def _fallback_reply(self) -> Tuple[Dict, float, bool]:
+        """The agent failed: general contacts, and the question goes to the review queue"""
+        fallback = "I'm having trouble processing your question right now. For immediate help, please contact office@iitpkd.ac.in or check the IIT Palakkad website at https://iitpkd.ac.in"
+        return {
+            "response": fallback,
+            "confidence": "error",
+            "contacts": self._get_general_contacts(),
+            "unanswered": True,
+        }, 0.3, True
+    
+    def _flight_key(self, kind: str, message: str) -> Optional[str]:
+        """
+        Concurrent questions that normalise the same and don't depend on who
+        asks share one agent call; anything else only coalesces with an
+        identical prompt (same student, same question)
+        """
+        if answer_cache.cacheable(message):
+            return f"{kind}:{answer_cache.question_key(answer_cache.tokens(message))}"
+        return None
     
     def _search_knowledge_base(self, query: str, limit: int = 10) -> List[Dict]:
         """Search knowledge base using semantic similarity"""
@@ -515,29 +516,32 @@ Provide your answer:"""
         
         return unique_contacts
     
-    def _save_chat(self, user_id: int, message: str, is_user: bool, confidence: float = 0.0):
-        """Save chat message to history"""
-        chat = models.ChatHistory(
-            user_id=user_id,
-            message=message,
-            is_user=is_user,
-            confidence_score=confidence,
-            created_at=datetime.utcnow()
-        )
-        self.db.add(chat)
+    def _persist(self, user_id: int, question: str, asked_at: datetime, reply: Optional[str] = None,
+                 confidence: float = 0.0, unanswered: bool = False) -> int:
+        """
+        The request's unit of work: question, reply and review-queue entry
+        added together and committed once. Returns the reply's chat id,
+        read from the flush rather than queried back
+        """
+        self.db.add(models.ChatHistory(
+            user_id=user_id, message=question, is_user=True, confidence_score=0.0, created_at=asked_at
+        ))
+        chat_id = 0
+        if reply is not None:
+            chat = models.ChatHistory(
+                user_id=user_id, message=reply, is_user=False, confidence_score=confidence,
+                created_at=datetime.utcnow()
+            )
+            self.db.add(chat)
+            if unanswered:
+                self._queue_unanswered_question(user_id, question)
+            self.db.flush()
+            chat_id = chat.id
         self.db.commit()
+        return chat_id
     
-    def _get_last_chat_id(self, user_id: int) -> int:
-        """Get the ID of the last chat message"""
-        last_chat = self.db.query(models.ChatHistory).filter(
-            models.ChatHistory.user_id == user_id,
-            models.ChatHistory.is_user == False
-        ).order_by(models.ChatHistory.created_at.desc()).first()
-        
-        return last_chat.id if last_chat else 0
-    
-    def _save_unanswered_question(self, user_id: int, question: str):
-        """Save question that couldn't be answered"""
+    def _queue_unanswered_question(self, user_id: int, question: str):
+        """Add (or count again) a question for admin review, without committing"""
         # Check if similar question exists
         existing = self.db.query(models.UnansweredQuestion).filter(
             models.UnansweredQuestion.question_text.ilike(f"%{question[:50]}%")
@@ -560,8 +564,16 @@ Provide your answer:"""
                 last_asked=datetime.utcnow()
             )
             self.db.add(unanswered)
-        
-        self.db.commit()
+    
+    def _categories(self) -> List[str]:
+        """All knowledge-base categories, reloaded only after the knowledge base changes"""
+        global _categories
+        # The answer cache's version moves on every knowledge-base change it hears of (see answer_cache)
+        version = answer_cache.cache.version
+        if _categories is None or _categories[0] != version:
+            rows = self.db.query(models.KnowledgeBase.category).distinct().all()
+            _categories = (version, [c[0] for c in rows if c[0]])
+        return _categories[1]
     
     def _guess_category(self, text: str) -> str:
         """Guess category from question text"""
@@ -569,9 +581,7 @@ Provide your answer:"""
         
         # Try to find the most relevant category from our knowledge base
         try:
-            # Get all unique categories from KB
-            categories = self.db.query(models.KnowledgeBase.category).distinct().all()
-            category_list = [c[0] for c in categories if c[0]]
+            category_list = self._categories()
             
             # Find best matching category based on keywords
             max_overlap = 0
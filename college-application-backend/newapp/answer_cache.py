@@ -0,0 +1,280 @@
+# answer_cache.py
+"""
+Cached AI answers for repeated questions.
+
+Students ask the same handful of questions over and over, and each one paid
+for a knowledge-base scan plus a full agent call. Confident answers drawn
+from the knowledge base are now kept for ANSWER_CACHE_TTL seconds, keyed by
+a normalised form of the question: lowercased words minus stop words, as a
+sorted set, hashed - so "What are the library timings?" and "library
+timings" share an entry.
+
+With ANSWER_CACHE_NEAR_DUPLICATES on, a miss on the exact key also looks for
+a near-duplicate: each entry has a MinHash signature over the character
+trigrams of its words, bucketed into LSH bands, and a candidate whose
+estimated Jaccard similarity reaches NEAR_DUPLICATE_THRESHOLD is a hit
+("end-semester examination schedule" finds "end semester examinations
+schedule"). Words with a digit in them -
+hostel numbers, course codes, years - must match exactly: "warden of hostel
+4" never gets hostel 3's answer, however similar the trigrams.
+
+Only answers that can be shared are stored (see `cacheable`): questions in
+the first person ("my timetable") go to the agent every time, and so do
+answers the assistant was unsure of or that didn't use the knowledge base.
+
+An entry is dropped when a knowledge-base row it was answered from changes
+or disappears, when a new row would match its question (`/ai/add-answer`),
+or on `/ai/refresh-knowledge`. The endpoints invalidate this process's
+cache directly; `sync()` (scheduled every SYNC_INTERVAL) catches the other
+workers up from the table itself.
+"""
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy.orm import Session
+
+from newapp import models
+
+TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))  # seconds
+MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+NEAR_DUPLICATES = os.getenv("ANSWER_CACHE_NEAR_DUPLICATES", "1") == "1"
+NEAR_DUPLICATE_THRESHOLD = 0.85
+SYNC_INTERVAL = 60  # seconds
+
+# A new knowledge-base row covering this share of a cached question's words invalidates it
+COVERAGE_THRESHOLD = 0.5
+
+STOP_WORDS = frozenset({
+    'the', 'is', 'at', 'which', 'on', 'a', 'an', 'and', 'or', 'but', 'in', 'with', 'to', 'for', 'of',
+    'what', 'how', 'when', 'where', 'who', 'why', 'are', 'was', 'be', 'can', 'do', 'does', 'there',
+    'any', 'about', 'please', 'tell', 'me', 'i', 'you', 'it', 'this', 'that', 'will', 'should',
+})
+PERSONAL_WORDS = frozenset({'i', 'me', 'my', 'mine', 'myself', 'we', 'our', 'us', "i'm", 'am'})
+
+# MinHash: NUM_PERM hash functions in BANDS bands of NUM_PERM // BANDS rows
+NUM_PERM = 64
+BANDS = 16
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240611)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+cache_lookups = Counter(
+    "app_ai_answer_cache_lookups_total",
+    "AI answer cache lookups by result",
+    ["result"],  # hit / near_hit / miss
+)
+cache_invalidations = Counter(
+    "app_ai_answer_cache_invalidations_total",
+    "AI answer cache entries dropped, by reason",
+    ["reason"],  # knowledge_changed / new_answer / refresh / expired / evicted / replaced
+)
+cache_entries = Gauge(
+    "app_ai_answer_cache_entries",
+    "AI answers currently cached",
+)
+
+
+# ================ NORMALISATION ================
+
+def words(text: str) -> List[str]:
+    return re.findall(r"\b\w+\b", text.lower())
+
+
+def tokens(text: str) -> FrozenSet[str]:
+    return frozenset(word for word in words(text) if word not in STOP_WORDS)
+
+
+def question_key(question_tokens: FrozenSet[str]) -> str:
+    return hashlib.blake2b(" ".join(sorted(question_tokens)).encode(), digest_size=16).hexdigest()
+
+
+def cacheable(question: str) -> bool:
+    """Questions whose answer doesn't depend on who asks"""
+    raw = re.findall(r"\b[\w']+\b", question.lower())
+    return bool(tokens(question)) and not PERSONAL_WORDS.intersection(raw)
+
+
+def identifiers(question_tokens: Iterable[str]) -> FrozenSet[str]:
+    """The words with a digit in them ("3", "cs101", "2024"), which a near-duplicate must share exactly"""
+    return frozenset(word for word in question_tokens if any(ch.isdigit() for ch in word))
+
+
+def signature(question_tokens: Iterable[str]) -> Tuple[int, ...]:
+    """MinHash over the character trigrams of the words"""
+    shingles = set()
+    for word in question_tokens:
+        padded = f"^{word}$"
+        shingles.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingles]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def _bands(sig: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+    rows = NUM_PERM // BANDS
+    return [(band, sig[band * rows:(band + 1) * rows]) for band in range(BANDS)]
+
+
+def _similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+# ================ CACHE ================
+
+class CachedAnswer:
+    def __init__(self, question_tokens: FrozenSet[str], sig: Optional[Tuple[int, ...]], response: dict,
+                 confidence_score: float, kb_ids: Iterable[int], ttl: float):
+        self.tokens = question_tokens
+        self.identifiers = identifiers(question_tokens)
+        self.signature = sig
+        self.response = response
+        self.confidence_score = confidence_score
+        self.kb_ids = frozenset(kb_ids)
+        self.expires_at = time.monotonic() + ttl
+
+
+class AnswerCache:
+    """Confident, shareable AI answers keyed by normalised question"""
+
+    def __init__(self, ttl: float = TTL, max_entries: int = MAX_ENTRIES, near_duplicates: bool = NEAR_DUPLICATES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.near_duplicates = near_duplicates
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], set] = {}
+        self._version = 0
+        self._hits = 0
+        self._misses = 0
+        # knowledge_base id -> updated_at, as of the last sync()
+        self._kb_seen: Optional[Dict[int, object]] = None
+
+    @property
+    def version(self) -> int:
+        """Moves on every invalidation, i.e. whenever the knowledge base is known to have changed"""
+        return self._version
+
+    def _drop(self, key: str, reason: str):
+        entry = self._entries.pop(key)
+        if entry.signature is not None:
+            for band in _bands(entry.signature):
+                keys = self._buckets.get(band)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._buckets[band]
+        cache_invalidations.labels(reason).inc()
+
+    def _live(self, key: str) -> Optional[CachedAnswer]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._drop(key, "expired")
+            return None
+        return entry
+
+    def get(self, question: str) -> Optional[CachedAnswer]:
+        question_tokens = tokens(question)
+        key = question_key(question_tokens)
+        with self._lock:
+            entry = self._live(key)
+            result = "hit"
+            if entry is None and self.near_duplicates:
+                sig = signature(question_tokens)
+                numbers = identifiers(question_tokens)
+                candidates = set()
+                for band in _bands(sig):
+                    candidates |= self._buckets.get(band, set())
+                candidates = {k for k in candidates if self._entries[k].identifiers == numbers}
+                best = max(candidates, key=lambda k: _similarity(sig, self._entries[k].signature), default=None)
+                if best is not None and _similarity(sig, self._entries[best].signature) >= NEAR_DUPLICATE_THRESHOLD:
+                    key, entry, result = best, self._live(best), "near_hit"
+            if entry is None:
+                self._misses += 1
+                cache_lookups.labels("miss").inc()
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        cache_lookups.labels(result).inc()
+        return entry
+
+    def put(self, question: str, response: dict, confidence_score: float, kb_ids: Iterable[int],
+            version: Optional[int] = None):
+        """Cache an answer; pass the `version` read before answering so a concurrent invalidation wins"""
+        question_tokens = tokens(question)
+        key = question_key(question_tokens)
+        sig = signature(question_tokens) if self.near_duplicates else None
+        entry = CachedAnswer(question_tokens, sig, response, confidence_score, kb_ids, self.ttl)
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            if key in self._entries:
+                self._drop(key, "replaced")
+            self._entries[key] = entry
+            if sig is not None:
+                for band in _bands(sig):
+                    self._buckets.setdefault(band, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)), "evicted")
+            cache_entries.set(len(self._entries))
+
+    def clear(self, reason: str = "refresh"):
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key, reason)
+            self._version += 1
+            cache_entries.set(0)
+
+    def invalidate_rows(self, kb_ids: Iterable[int], reason: str = "knowledge_changed"):
+        """Drop answers drawn from these knowledge-base rows"""
+        kb_ids = set(kb_ids)
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry.kb_ids & kb_ids]:
+                self._drop(key, reason)
+            self._version += 1
+            cache_entries.set(len(self._entries))
+
+    def invalidate_matching(self, text: str, reason: str = "new_answer"):
+        """Drop answers to questions a new knowledge-base text now covers"""
+        covering = tokens(text)
+        with self._lock:
+            for key in [key for key, entry in self._entries.items()
+                        if len(entry.tokens & covering) >= COVERAGE_THRESHOLD * len(entry.tokens)]:
+                self._drop(key, reason)
+            self._version += 1
+            cache_entries.set(len(self._entries))
+
+    def invalidate_for_entry(self, entry: models.KnowledgeBase):
+        self.invalidate_matching(f"{entry.title or ''} {entry.keywords or ''} {entry.content}")
+
+    def sync(self, db: Session):
+        """Periodic job: invalidate for knowledge-base changes made by other workers"""
+        kb = models.KnowledgeBase
+        current = dict(db.query(kb.id, kb.updated_at).all())
+        seen, self._kb_seen = self._kb_seen, current
+        if seen is None or current == seen:
+            return
+        removed = seen.keys() - current.keys()
+        changed = [kb_id for kb_id, updated_at in current.items() if seen.get(kb_id, updated_at) != updated_at]
+        added = current.keys() - seen.keys()
+        if removed or changed:
+            self.invalidate_rows(removed | set(changed))
+        for row in db.query(kb).filter(kb.id.in_(added | set(changed))).all() if added or changed else []:
+            self.invalidate_for_entry(row)
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 3) if lookups else None,
+        }
+
+
+cache = AnswerCache()
@@ -0,0 +1,265 @@
+# audit_log.py
+"""
+Append-only admin audit log.
+
+Handlers call `audit_log.log(...)` after their own commit; entries are
+queued in memory and a background thread inserts them in batches (one
+executemany per batch) as soon as BATCH_SIZE entries are waiting or
+FLUSH_INTERVAL seconds have passed. `stop()` drains the queue on shutdown.
+Until the writer is started (scripts, one-off sessions) entries are written
+immediately.
+
+Durability: set AUDIT_LOG_JOURNAL_DIR and every entry is also appended (and
+fsync'd) to a per-process JSONL journal before log() returns. The journal is
+truncated whenever the queue has been fully flushed. On startup, journals
+left behind by dead processes are replayed; entries already in the table
+(same admin, action and created_at timestamp) are skipped, so a crash
+between insert and truncate doesn't duplicate rows.
+"""
+import base64
+import glob
+import json
+import os
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import and_, insert, or_, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import engine
+
+BATCH_SIZE = 100
+FLUSH_INTERVAL = 1.0  # seconds
+MAX_PAGE_SIZE = 200
+
+logs = models.AdminActivityLog.__table__
+
+
+class AuditLogWriter:
+    def __init__(self, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL,
+                 journal_dir: Optional[str] = None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal_dir = journal_dir
+        self._pending: List[dict] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._journal = None
+
+    # ---------------- producer side ----------------
+
+    def log(self, admin_id: int, action: str, target_type: Optional[str] = None,
+            target_id: Optional[int] = None, details: Optional[dict] = None,
+            ip_address: Optional[str] = None):
+        entry = {
+            "admin_id": admin_id,
+            "action": action,
+            "target_type": target_type,
+            "target_id": target_id,
+            "details": details,
+            "ip_address": ip_address,
+            "created_at": datetime.utcnow(),
+        }
+        if self._thread is None:
+            try:
+                self._insert([entry])
+            except Exception as e:
+                print(f"Error writing audit log entry: {e}")
+            return
+
+        with self._lock:
+            if self._journal is not None:
+                self._journal.write(json.dumps(entry, default=str) + "\n")
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+            self._pending.append(entry)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+
+    # ---------------- consumer side ----------------
+
+    def _insert(self, entries: List[dict]):
+        with engine.begin() as conn:
+            conn.execute(insert(logs), entries)
+
+    def flush(self) -> int:
+        """Insert everything queued so far; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                self._insert(batch)
+            except Exception as e:
+                print(f"Error writing {len(batch)} audit log entries: {e}")
+                with self._lock:
+                    self._pending[:0] = batch
+                return 0
+            with self._lock:
+                # Everything journaled so far is now in the table
+                if not self._pending and self._journal is not None:
+                    self._journal.seek(0)
+                    self._journal.truncate()
+            return len(batch)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._stopping and len(self._pending) < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+    # ---------------- lifecycle ----------------
+
+    def _journal_path(self, pid: int) -> str:
+        return os.path.join(self.journal_dir, f"audit-{pid}.jsonl")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        if self.journal_dir:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self.recover()
+            self._journal = open(self._journal_path(os.getpid()), "a", encoding="utf-8")
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Flush what's queued and stop the background thread"""
+        if self._thread is None:
+            return
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+        self._thread.join()
+        self._thread = None
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def recover(self) -> int:
+        """Replay journals left behind by processes that are no longer running"""
+        replayed = 0
+        for path in glob.glob(os.path.join(self.journal_dir, "audit-*.jsonl")):
+            pid = int(os.path.basename(path)[len("audit-"):-len(".jsonl")])
+            if pid != os.getpid() and _process_alive(pid):
+                continue
+            entries = []
+            with open(path, encoding="utf-8") as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn final line from the crash
+                    entry["created_at"] = datetime.fromisoformat(entry["created_at"])
+                    entries.append(entry)
+            if entries:
+                replayed += self._insert_missing(entries)
+            os.remove(path)
+        if replayed:
+            print(f"Recovered {replayed} audit log entries from journal")
+        return replayed
+
+    def _insert_missing(self, entries: List[dict]) -> int:
+        keys = [(e["admin_id"], e["action"], e["created_at"]) for e in entries]
+        with engine.begin() as conn:
+            existing = set(conn.execute(
+                select(logs.c.admin_id, logs.c.action, logs.c.created_at).where(
+                    logs.c.created_at.in_({key[2] for key in keys})
+                )
+            ).all())
+            missing = [e for e, key in zip(entries, keys) if key not in existing]
+            if missing:
+                conn.execute(insert(logs), missing)
+        return len(missing)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+writer = AuditLogWriter(journal_dir=os.getenv("AUDIT_LOG_JOURNAL_DIR") or None)
+log = writer.log
+
+
+# ================ READS ================
+
+def encode_cursor(created_at: datetime, log_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{log_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    created_at, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(created_at), int(log_id)
+
+
+def query_logs(db: Session, limit: int = 50, cursor: Optional[str] = None,
+               admin_id: Optional[int] = None, action: Optional[str] = None,
+               since: Optional[datetime] = None, until: Optional[datetime] = None,
+               skip: int = 0) -> dict:
+    """Newest-first page of logs with actor info, keyset-paginated on (created_at, id)"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.query(models.AdminActivityLog, models.User.full_name, models.User.email).join(
+        models.AdminUser, models.AdminUser.id == models.AdminActivityLog.admin_id
+    ).join(
+        models.User, models.User.id == models.AdminUser.user_id
+    )
+
+    if admin_id is not None:
+        query = query.filter(models.AdminActivityLog.admin_id == admin_id)
+    if action:
+        query = query.filter(models.AdminActivityLog.action == action)
+    if since:
+        query = query.filter(models.AdminActivityLog.created_at >= since)
+    if until:
+        query = query.filter(models.AdminActivityLog.created_at < until)
+    if cursor:
+        created_at, log_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            models.AdminActivityLog.created_at < created_at,
+            and_(models.AdminActivityLog.created_at == created_at,
+                 models.AdminActivityLog.id < log_id),
+        ))
+    elif skip:
+        # Legacy offset paging; prefer the cursor
+        query = query.offset(skip)
+
+    rows = query.order_by(
+        models.AdminActivityLog.created_at.desc(),
+        models.AdminActivityLog.id.desc()
+    ).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    last = rows[-1][0] if rows else None
+    return {
+        "logs": [{
+            "id": activity.id,
+            "action": activity.action,
+            "target_type": activity.target_type,
+            "target_id": activity.target_id,
+            "details": activity.details or {},
+            "created_at": activity.created_at.isoformat(),
+            "admin": {
+                "name": full_name,
+                "email": email
+            }
+        } for activity, full_name, email in rows],
+        "next_cursor": encode_cursor(last.created_at, last.id) if has_more else None,
+    }
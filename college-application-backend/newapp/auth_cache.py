@@ -0,0 +1,233 @@
+# auth_cache.py
+"""
+Cache of resolved admin principals for token-authenticated requests.
+
+Verifying an admin token used to mean a JWT decode plus an AdminUser query,
+and `get_current_user` then queried User as well. The signature and expiry
+are still checked on every request, but the admin and user rows behind a
+token id (`jti`, or a hash of tokens issued before ids existed) are
+cached for TTL seconds in a bounded LRU. A hit re-attaches copies of the
+cached rows to the request's session without touching the database; a miss
+loads both with a single joined query.
+
+Entries are dropped:
+  - explicitly, by `remove_admin` and `update_club_head_admin`
+  - after any committed change to an AdminUser or User row (deactivation,
+    level/permission changes, deletes) via SessionLocal hooks
+  - on revocation (logout)
+An invalidation bumps a generation counter, so a lookup that raced with it
+doesn't put the stale row back.
+
+Revoked token ids live in `revoked_tokens` and in memory; the in-memory set
+is reloaded every REVOCATION_REFRESH_INTERVAL seconds so revocations made by
+other workers apply within that window.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from prometheus_client import Counter
+from sqlalchemy import delete, event, inspect, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from . import models
+from .database import SessionLocal, engine
+
+MAX_ENTRIES = 10000
+TTL = 60  # seconds
+REVOCATION_REFRESH_INTERVAL = 60  # seconds
+
+revoked_tokens = models.RevokedToken.__table__
+
+_INVALIDATE_KEY = "auth_cache_invalidate"
+
+auth_cache_lookups = Counter(
+    "app_auth_cache_lookups_total",
+    "Admin principal lookups by cache result",
+    ["result"],
+)
+
+
+class Principal:
+    """Column values of the admin and user rows a token resolves to"""
+
+    __slots__ = ("admin", "user", "expires_at")
+
+    def __init__(self, admin: dict, user: Optional[dict], expires_at: float):
+        self.admin = admin
+        self.user = user
+        self.expires_at = expires_at
+
+
+def _columns(obj) -> dict:
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+
+
+def attach(db: Session, model, values: dict):
+    """A session-bound instance of a cached row, without a SELECT"""
+    existing = db.identity_map.get(inspect(model).identity_key_from_primary_key([values["id"]]))
+    if existing is not None:
+        return existing
+    # Build it as if loaded from a row: no constructor, no attribute events
+    obj = inspect(model).class_manager.new_instance()
+    obj.__dict__.update(values)
+    make_transient_to_detached(obj)
+    db.add(obj)
+    return obj
+
+
+class PrincipalCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Principal]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+
+    def get(self, token_id: str) -> Optional[Principal]:
+        with self._lock:
+            principal = self._entries.get(token_id)
+            if principal is None:
+                return None
+            if principal.expires_at <= time.monotonic():
+                del self._entries[token_id]
+                return None
+            self._entries.move_to_end(token_id)
+            return principal
+
+    def put(self, token_id: str, principal: Principal, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return  # invalidated while we were loading it
+            self._entries[token_id] = principal
+            self._entries.move_to_end(token_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token_id: Optional[str] = None, admin_ids: Set[int] = frozenset(),
+                   user_ids: Set[int] = frozenset()):
+        with self._lock:
+            self.generation += 1
+            if token_id is not None:
+                self._entries.pop(token_id, None)
+            if admin_ids or user_ids:
+                for key, principal in list(self._entries.items()):
+                    if principal.admin["id"] in admin_ids or principal.admin["user_id"] in user_ids:
+                        del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+principals = PrincipalCache()
+
+
+def lookup(db: Session, token_id: str, admin_id: int, expires_at: datetime) -> Optional[Principal]:
+    """Principal for an already-verified token, or None if the admin isn't active"""
+    principal = principals.get(token_id)
+    if principal is not None and principal.admin["id"] == admin_id:
+        auth_cache_lookups.labels("hit").inc()
+        return principal
+
+    auth_cache_lookups.labels("miss").inc()
+    generation = principals.generation
+    row = db.query(models.AdminUser, models.User).outerjoin(
+        models.User, models.User.id == models.AdminUser.user_id
+    ).filter(
+        models.AdminUser.id == admin_id,
+        models.AdminUser.is_active == True
+    ).first()
+    if row is None:
+        return None
+
+    admin, user = row
+    # Never outlive the token itself
+    lifetime = min(principals.ttl, (expires_at - datetime.utcnow()).total_seconds())
+    principal = Principal(_columns(admin), _columns(user) if user else None,
+                          time.monotonic() + lifetime)
+    principals.put(token_id, principal, generation)
+    return principal
+
+
+# ================ REVOCATION ================
+
+class RevocationList:
+    def __init__(self):
+        self._revoked: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+
+    def is_revoked(self, token_id: str) -> bool:
+        return token_id in self._revoked
+
+    def revoke(self, token_id: str, expires_at: datetime, admin_id: Optional[int] = None):
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(revoked_tokens).values(
+                    jti=token_id, admin_id=admin_id, expires_at=expires_at,
+                    revoked_at=datetime.utcnow(),
+                ))
+        except IntegrityError:
+            pass  # already revoked
+        with self._lock:
+            self._revoked[token_id] = expires_at
+        principals.invalidate(token_id=token_id)
+
+    def refresh(self, db: Optional[Session] = None) -> int:
+        """Reload the list from the table, dropping tokens that have expired anyway"""
+        now = datetime.utcnow()
+        with engine.begin() as conn:
+            conn.execute(delete(revoked_tokens).where(revoked_tokens.c.expires_at <= now))
+            revoked = dict(conn.execute(select(revoked_tokens.c.jti, revoked_tokens.c.expires_at)).all())
+        with self._lock:
+            self._revoked = revoked
+        return len(revoked)
+
+
+revocations = RevocationList()
+
+
+# ================ ORM HOOKS ================
+
+def _collect(session: Session, flush_context):
+    admin_ids, user_ids = set(), set()
+    for obj in session.deleted:
+        if isinstance(obj, models.AdminUser):
+            admin_ids.add(obj.id)
+        elif isinstance(obj, models.User):
+            user_ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, models.AdminUser):
+            changed = {attr.key for attr in inspect(obj).attrs if attr.history.has_changes()}
+            # Logins stamp last_login; that alone isn't worth a reload
+            if changed - {"last_login"}:
+                admin_ids.add(obj.id)
+        elif isinstance(obj, models.User):
+            if session.is_modified(obj, include_collections=False):
+                user_ids.add(obj.id)
+    if admin_ids or user_ids:
+        pending = session.info.setdefault(_INVALIDATE_KEY, (set(), set()))
+        pending[0].update(admin_ids)
+        pending[1].update(user_ids)
+
+
+def _invalidate_after_commit(session: Session):
+    pending = session.info.pop(_INVALIDATE_KEY, None)
+    if pending:
+        principals.invalidate(admin_ids=pending[0], user_ids=pending[1])
+
+
+def _discard(session: Session, previous_transaction=None):
+    session.info.pop(_INVALIDATE_KEY, None)
+
+
+event.listen(SessionLocal, "after_flush", _collect)
+event.listen(SessionLocal, "after_commit", _invalidate_after_commit)
+event.listen(SessionLocal, "after_soft_rollback", _discard)
@@ -0,0 +1,322 @@
+# chat_sentiment.py
+"""
+Batch sentiment scoring of chat messages.
+
+`ChatAnalysis` and the sentiment fields of `DailyAnalysis` existed but
+nothing filled them in. `run()` (scheduled every RUN_INTERVAL) works through
+the chat messages past a watermark stored in `app_meta`, BATCH_SIZE ids at a
+time:
+
+  1. read the batch's text messages (id > watermark, in id order), stopping
+     short of any message less than SETTLE seconds old
+  2. skip the ones already in `message_sentiments` (the per-message cache),
+     score the rest with TextBlob on a pool of WORKERS processes - TextBlob
+     is pure Python, so threads wouldn't help - in CHUNK_SIZE chunks
+  3. in one transaction: store the new scores, recompute the ChatAnalysis
+     row of every (sender, UTC day) the batch touched from all of that
+     day's scored messages, refresh those days' DailyAnalysis sentiment,
+     and move the watermark forward with a compare-and-swap
+
+Aggregates are recomputed rather than incremented and scores are upserted,
+so a batch that runs twice - after a crash before the commit, or on two
+workers at once (the loser's watermark CAS fails and it rolls back) - gives
+the same rows. Restarting just resumes from the watermark; resetting it
+re-derives every aggregate from the cache without re-scoring.
+
+The watermark is an id, so each message is read once, as it was then. That
+holds because chat messages are never edited (there is no edit route; one
+would have to reset the watermark or rescore the message itself). Ids are
+handed out when a row is inserted, not when it commits, so a message can
+become visible after one with a higher id - that's what SETTLE is for: a
+batch ends at the first message younger than SETTLE seconds, and a message
+whose transaction stays open longer than that is skipped.
+
+CHAT_SENTIMENT_WORKERS=0 scores inline on the calling thread.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import bindparam, case, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from newapp import models
+from newapp.database import engine, upsert
+
+WORKERS = int(os.getenv("CHAT_SENTIMENT_WORKERS", str(os.cpu_count() or 1)))
+BATCH_SIZE = 2000
+CHUNK_SIZE = 250
+RUN_INTERVAL = 300  # seconds
+WATERMARK_KEY = "chat_sentiment_watermark"
+SETTLE = 60  # seconds; messages younger than this wait for the next run
+
+# Polarity beyond +/-NEUTRAL_BAND counts as positive/negative
+NEUTRAL_BAND = 0.1
+SENTIMENT_WINDOW = 7  # days, for DailyAnalysis.sentiment_score
+
+_messages = models.ChatMessage.__table__
+_scores = models.MessageSentiment.__table__
+_chat = models.ChatAnalysis.__table__
+_daily = models.DailyAnalysis.__table__
+_meta = models.AppMeta.__table__
+
+AGGREGATE_COLUMNS = (
+    "message_count", "overall_sentiment", "positive_ratio", "negative_ratio", "neutral_ratio",
+    "activity_level", "stress_indicators",
+)
+store_scores = upsert(_scores, ("message_id",), ("polarity", "subjectivity", "scored_at"))
+store_aggregates = upsert(_chat, ("user_id", "analysis_date"), AGGREGATE_COLUMNS)
+
+messages_scored = Counter(
+    "app_chat_sentiment_messages_total",
+    "Chat messages run through the sentiment pipeline, by whether TextBlob scored them or the cache had them",
+    ["source"],  # scored / cached
+)
+backlog = Gauge(
+    "app_chat_sentiment_backlog",
+    "Chat messages past the sentiment watermark after the last run",
+)
+scoring_rate = Gauge(
+    "app_chat_sentiment_last_messages_per_second",
+    "TextBlob throughput of the last sentiment run",
+)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+# ================ SCORING ================
+
+def score_texts(texts: List[str]) -> List[Tuple[float, float]]:
+    """(polarity, subjectivity) per text; runs in the worker processes"""
+    from textblob import TextBlob
+    return [tuple(TextBlob(text).sentiment) if text else (0.0, 0.0) for text in texts]
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn, not fork: the app process has DB connections and threads
+        _executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def score(texts: List[str], workers: int = WORKERS) -> List[Tuple[float, float]]:
+    if not workers or len(texts) <= CHUNK_SIZE:
+        return score_texts(texts)
+    chunks = [texts[i:i + CHUNK_SIZE] for i in range(0, len(texts), CHUNK_SIZE)]
+    return [result for chunk in _pool(workers).map(score_texts, chunks) for result in chunk]
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+# ================ AGGREGATES ================
+
+def _as_date(value) -> date:
+    """func.date() comes back as a string on SQLite"""
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _aggregate(conn, keys: Iterable[Tuple[int, date]]) -> List[dict]:
+    """ChatAnalysis rows for (user, day) keys, from every scored message that day"""
+    keys = set(keys)
+    first, last = min(day for _, day in keys), max(day for _, day in keys)
+    day = func.date(_messages.c.created_at)
+    rows = conn.execute(
+        select(
+            _messages.c.sender_id, day, func.count(), func.avg(_scores.c.polarity),
+            func.sum(case((_scores.c.polarity > NEUTRAL_BAND, 1), else_=0)),
+            func.sum(case((_scores.c.polarity < -NEUTRAL_BAND, 1), else_=0)),
+        )
+        .join(_scores, _scores.c.message_id == _messages.c.id)
+        .where(_messages.c.sender_id.in_({user_id for user_id, _ in keys}),
+               _messages.c.created_at >= datetime.combine(first, datetime.min.time()),
+               _messages.c.created_at < datetime.combine(last + timedelta(days=1), datetime.min.time()))
+        .group_by(_messages.c.sender_id, day)
+    ).all()
+    now = datetime.utcnow()
+    aggregates = []
+    for user_id, value, count, mean, positive, negative in rows:
+        if (user_id, _as_date(value)) not in keys:
+            continue
+        aggregates.append({
+            "user_id": user_id,
+            "analysis_date": _as_date(value),
+            "message_count": count,
+            "overall_sentiment": float(mean),
+            "positive_ratio": positive / count,
+            "negative_ratio": negative / count,
+            "neutral_ratio": (count - positive - negative) / count,
+            "activity_level": "low" if count < 10 else "medium" if count < 30 else "high",
+            "stress_indicators": count >= 3 and negative / count >= 0.5,
+            "created_at": now,
+        })
+    return aggregates
+
+
+def sentiment_for(conn, user_ids: Iterable[int], day: date) -> Dict[int, Tuple[Optional[float], float]]:
+    """
+    (that day's mean polarity or None, message-weighted mean over the
+    SENTIMENT_WINDOW days ending on it) per user with any scored messages
+    """
+    rows = conn.execute(
+        select(_chat.c.user_id, _chat.c.analysis_date, _chat.c.message_count, _chat.c.overall_sentiment)
+        .where(_chat.c.user_id.in_(list(user_ids)),
+               _chat.c.analysis_date > day - timedelta(days=SENTIMENT_WINDOW),
+               _chat.c.analysis_date <= day)
+    ).all()
+    totals: Dict[int, list] = {}
+    for user_id, analysis_date, count, mean in rows:
+        total = totals.setdefault(user_id, [None, 0, 0.0])
+        if analysis_date == day:
+            total[0] = mean
+        total[1] += count
+        total[2] += count * mean
+    return {user_id: (day_mean, weighted / count)
+            for user_id, (day_mean, count, weighted) in totals.items() if count}
+
+
+def _refresh_daily_analyses(conn, keys: Iterable[Tuple[int, date]]):
+    """Sentiment of existing DailyAnalysis rows on or after the touched days"""
+    by_day: Dict[date, set] = {}
+    for user_id, day in keys:
+        for offset in range(SENTIMENT_WINDOW):
+            by_day.setdefault(day + timedelta(days=offset), set()).add(user_id)
+    updates = []
+    for day, user_ids in by_day.items():
+        analysed = conn.execute(select(_daily.c.user_id).where(
+            _daily.c.user_id.in_(user_ids), _daily.c.analysis_date == day)).scalars().all()
+        if analysed:
+            sentiment = sentiment_for(conn, analysed, day)
+            updates += [{"uid": user_id, "day": day, "avg": sentiment[user_id][0], "score": sentiment[user_id][1]}
+                        for user_id in analysed if user_id in sentiment]
+    if updates:
+        conn.execute(
+            update(_daily)
+            .where(_daily.c.user_id == bindparam("uid"), _daily.c.analysis_date == bindparam("day"))
+            .values(avg_message_sentiment=bindparam("avg"), sentiment_score=bindparam("score")),
+            updates,
+        )
+
+
+# ================ PIPELINE ================
+
+def get_watermark(conn) -> int:
+    value = conn.execute(select(_meta.c.value).where(_meta.c.key == WATERMARK_KEY)).scalar()
+    return int(value) if value else 0
+
+
+def set_watermark(value: int):
+    """Move the watermark (e.g. back to 0 to re-derive every aggregate from the cache)"""
+    with engine.begin() as conn:
+        updated = conn.execute(update(_meta).where(_meta.c.key == WATERMARK_KEY)
+                               .values(value=str(value), updated_at=datetime.utcnow())).rowcount
+        if not updated:
+            conn.execute(insert(_meta).values(key=WATERMARK_KEY, value=str(value), updated_at=datetime.utcnow()))
+
+
+def _ensure_watermark():
+    try:
+        with engine.begin() as conn:
+            if conn.execute(select(_meta.c.key).where(_meta.c.key == WATERMARK_KEY)).first() is None:
+                conn.execute(insert(_meta).values(key=WATERMARK_KEY, value="0", updated_at=datetime.utcnow()))
+    except IntegrityError:
+        pass  # another worker created it
+
+
+class WatermarkMoved(Exception):
+    """Another worker processed this batch first"""
+
+
+def _advance(conn, old: int, new: int):
+    moved = conn.execute(
+        update(_meta).where(_meta.c.key == WATERMARK_KEY, _meta.c.value == str(old))
+        .values(value=str(new), updated_at=datetime.utcnow())
+    ).rowcount
+    if moved != 1:
+        raise WatermarkMoved()
+
+
+def process_batch(workers: int = WORKERS, batch_size: int = BATCH_SIZE) -> dict:
+    """Score and aggregate the next batch past the watermark"""
+    with engine.connect() as conn:
+        watermark = get_watermark(conn)
+        batch = conn.execute(
+            select(_messages.c.id, _messages.c.sender_id, _messages.c.created_at,
+                   _messages.c.message, _messages.c.message_type)
+            .where(_messages.c.id > watermark)
+            .order_by(_messages.c.id)
+            .limit(batch_size)
+        ).all()
+        # A lower id may still be uncommitted behind a recent message; don't move past it yet
+        cutoff = datetime.utcnow() - timedelta(seconds=SETTLE)
+        settled = next((i for i, row in enumerate(batch) if row.created_at and row.created_at > cutoff), len(batch))
+        batch = batch[:settled]
+        texts = [row for row in batch if (row.message_type or "text") == "text"]
+        cached = set(conn.execute(select(_scores.c.message_id).where(
+            _scores.c.message_id.in_([row.id for row in texts]))).scalars()) if texts else set()
+    if not batch:
+        return {"messages": 0, "scored": 0, "cached": 0, "watermark": watermark, "seconds": 0.0}
+
+    todo = [row for row in texts if row.id not in cached]
+    started = time.perf_counter()
+    results = score([row.message for row in todo], workers)
+    seconds = time.perf_counter() - started
+
+    now = datetime.utcnow()
+    keys = {(row.sender_id, (row.created_at or now).date()) for row in texts}
+    with engine.begin() as conn:
+        if todo:
+            conn.execute(store_scores, [
+                {"message_id": row.id, "polarity": polarity, "subjectivity": subjectivity, "scored_at": now}
+                for row, (polarity, subjectivity) in zip(todo, results)
+            ])
+        if keys:
+            aggregates = _aggregate(conn, keys)
+            if aggregates:
+                conn.execute(store_aggregates, aggregates)
+            _refresh_daily_analyses(conn, keys)
+        _advance(conn, watermark, batch[-1].id)
+
+    messages_scored.labels("scored").inc(len(todo))
+    messages_scored.labels("cached").inc(len(texts) - len(todo))
+    return {"messages": len(batch), "scored": len(todo), "cached": len(texts) - len(todo),
+            "watermark": batch[-1].id, "seconds": seconds}
+
+
+def run(db: Optional[Session] = None, workers: int = WORKERS, max_batches: Optional[int] = None) -> dict:
+    """Periodic job: process batches until the watermark catches up"""
+    _ensure_watermark()
+    totals = {"messages": 0, "scored": 0, "cached": 0, "batches": 0, "seconds": 0.0}
+    while max_batches is None or totals["batches"] < max_batches:
+        try:
+            stats = process_batch(workers)
+        except WatermarkMoved:
+            print("Chat sentiment batch already processed by another worker; stopping this run")
+            break
+        if not stats["messages"]:
+            break
+        totals["batches"] += 1
+        for name in ("messages", "scored", "cached", "seconds"):
+            totals[name] += stats[name]
+
+    with engine.connect() as conn:
+        watermark = get_watermark(conn)
+        backlog.set(conn.execute(select(func.count()).where(_messages.c.id > watermark)).scalar())
+    rate = totals["scored"] / totals["seconds"] if totals["seconds"] > 0 else 0.0
+    if totals["scored"]:
+        scoring_rate.set(rate)
+    if totals["messages"]:
+        print(f"💬 Chat sentiment: {totals['messages']} messages ({totals['scored']} scored, "
+              f"{totals['cached']} cached) in {totals['batches']} batches, {rate:.0f} messages/s")
+    totals["messages_per_second"] = round(rate, 1)
+    return totals
@@ -0,0 +1,163 @@
+# club_directory.py
+"""
+Club directory read model.
+
+Follower, upcoming-event, registration and like counts come from one
+GROUP BY per table instead of a COUNT per club/event. The rendered directory
+(every club with its follower and event counts) is kept for DIRECTORY_TTL
+seconds and dropped whenever a club, follow or event is written - not on
+registrations or likes, which it doesn't show - so the public listing is
+normally served without touching the database.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+
+DIRECTORY_TTL = 30  # seconds; bounds how stale "upcoming" counts can get
+
+PUBLIC = "public"
+ADMIN = "admin"
+
+
+# ================ GROUPED COUNTS ================
+
+def _grouped_count(db: Session, key_column, ids: Optional[Iterable[int]], *filters) -> Dict[int, int]:
+    query = db.query(key_column, func.count()).filter(*filters)
+    if ids is not None:
+        ids = list(ids)
+        if not ids:
+            return {}
+        query = query.filter(key_column.in_(ids))
+    return dict(query.group_by(key_column).all())
+
+
+def follower_counts(db: Session, club_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+    return _grouped_count(db, models.ClubFollower.club_id, club_ids)
+
+
+def event_counts(db: Session, club_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+    return _grouped_count(db, models.ClubEvent.club_id, club_ids)
+
+
+def upcoming_event_counts(db: Session, club_ids: Optional[Iterable[int]] = None,
+                          now: Optional[datetime] = None) -> Dict[int, int]:
+    return _grouped_count(
+        db, models.ClubEvent.club_id, club_ids,
+        models.ClubEvent.event_date >= (now or datetime.utcnow()),
+        models.ClubEvent.status == "scheduled",
+    )
+
+
+def registration_counts(db: Session, event_ids: Iterable[int]) -> Dict[int, int]:
+    return _grouped_count(db, models.EventRegistration.event_id, event_ids)
+
+
+def like_counts(db: Session, event_ids: Iterable[int]) -> Dict[int, int]:
+    return _grouped_count(db, models.EventLike.event_id, event_ids)
+
+
+# ================ DIRECTORY VIEWS ================
+
+def _public_directory(db: Session) -> List[dict]:
+    clubs = db.query(models.Club).filter(models.Club.is_active == True).all()
+    followers = follower_counts(db)
+    upcoming = upcoming_event_counts(db)
+    return [{
+        "id": club.id,
+        "name": club.name,
+        "category": club.category,
+        "description": club.description,
+        "logo_url": club.logo_url,
+        "cover_url": club.cover_url,
+        "follower_count": followers.get(club.id, 0),
+        "event_count": upcoming.get(club.id, 0),
+        "created_at": club.created_at.isoformat() if club.created_at else None
+    } for club in clubs]
+
+
+def _admin_directory(db: Session) -> List[dict]:
+    clubs = db.query(models.Club).all()
+    followers = follower_counts(db)
+    events = event_counts(db)
+    head_ids = {club.club_head_id for club in clubs}
+    heads = {
+        user.id: user for user in
+        db.query(models.User).filter(models.User.id.in_(head_ids)).all()
+    } if head_ids else {}
+
+    result = []
+    for club in clubs:
+        head = heads.get(club.club_head_id)
+        result.append({
+            "id": club.id,
+            "name": club.name,
+            "category": club.category,
+            "description": club.description,
+            "logo_url": club.logo_url,
+            "cover_url": club.cover_url,
+            "is_active": club.is_active,
+            "follower_count": followers.get(club.id, 0),
+            "event_count": events.get(club.id, 0),
+            "created_at": club.created_at.isoformat(),
+            "club_head": {
+                "id": head.id,
+                "name": head.full_name,
+                "email": head.email
+            } if head else None
+        })
+    return result
+
+
+_VIEWS: Dict[str, Callable[[Session], List[dict]]] = {
+    PUBLIC: _public_directory,
+    ADMIN: _admin_directory,
+}
+
+
+class ClubDirectoryCache:
+    """Rendered directory views with a short TTL and write invalidation"""
+
+    def __init__(self, ttl: float = DIRECTORY_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[float, List[dict]]] = {}
+        self._version = 0
+
+    def invalidate(self):
+        """Drop every view; call after committing a write that changes a count"""
+        with self._lock:
+            self._entries.clear()
+            self._version += 1
+
+    def get(self, db: Session, view: str = PUBLIC) -> List[dict]:
+        entry = self._entries.get(view)
+        now = time.monotonic()
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        version = self._version
+        clubs = _VIEWS[view](db)
+        with self._lock:
+            # A write landed while we were querying; don't cache stale counts
+            if version == self._version:
+                self._entries[view] = (now + self.ttl, clubs)
+        return clubs
+
+
+def filter_clubs(clubs: List[dict], category: Optional[str] = None,
+                 search: Optional[str] = None) -> List[dict]:
+    if category:
+        clubs = [club for club in clubs if club["category"] == category]
+    if search:
+        needle = search.lower()
+        clubs = [club for club in clubs if needle in club["name"].lower()]
+    return clubs
+
+
+directory_cache = ClubDirectoryCache()
@@ -1,14 +1,19 @@
 # club_routes.py (Fixed version)
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 from typing import List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
+import logging
 
 from .database import get_database
 from .admin_auth import get_current_user, verify_admin_token, get_admin_token
-from . import models
+from .club_directory import directory_cache, filter_clubs, like_counts, registration_counts
+from . import event_registration, models
+from .notification_fanout import fan_out_to_followers
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/clubs", tags=["clubs"])
 
@@ -64,41 +69,8 @@ async def get_all_clubs(
     db: Session = Depends(get_database)
 ):
     """Get all active clubs - PUBLIC"""
-    query = db.query(models.Club).filter(models.Club.is_active == True)
-    
-    if category:
-        query = query.filter(models.Club.category == category)
-    
-    if search:
-        query = query.filter(models.Club.name.contains(search))
-    
-    clubs = query.all()
-    
-    result = []
-    for club in clubs:
-        follower_count = db.query(models.ClubFollower).filter(
-            models.ClubFollower.club_id == club.id
-        ).count()
-        
-        upcoming_events = db.query(models.ClubEvent).filter(
-            models.ClubEvent.club_id == club.id,
-            models.ClubEvent.event_date >= datetime.utcnow(),
-            models.ClubEvent.status == "scheduled"
-        ).count()
-        
-        result.append({
-            "id": club.id,
-            "name": club.name,
-            "category": club.category,
-            "description": club.description,
-            "logo_url": club.logo_url,
-            "cover_url": club.cover_url,
-            "follower_count": follower_count,
-            "event_count": upcoming_events,
-            "created_at": club.created_at.isoformat() if club.created_at else None
-        })
-    
-    return result
+    # Whole directory comes from the cache; filtering is done in memory
+    return filter_clubs(directory_cache.get(db), category, search)
 
 @router.get("/categories")
 async def get_categories(db: Session = Depends(get_database)):
@@ -144,6 +116,8 @@ async def get_club_details(
         models.ClubAnnouncement.club_id == club.id
     ).order_by(models.ClubAnnouncement.created_at.desc()).limit(5).all()
     
+    registrations = registration_counts(db, [event.id for event in events])
+    
     return {
         "id": club.id,
         "name": club.name,
@@ -164,9 +138,7 @@ async def get_club_details(
             "event_date": event.event_date.isoformat(),
             "location": event.location,
             "status": event.status,
-            "registration_count": db.query(models.EventRegistration).filter(
-                models.EventRegistration.event_id == event.id
-            ).count(),
+            "registration_count": registrations.get(event.id, 0),
             "max_participants": event.max_participants,
             "image_url": event.image_url
         } for event in events],
@@ -200,16 +172,12 @@ async def get_club_events(
         models.ClubEvent.event_date.desc()
     ).offset(skip).limit(limit).all()
     
+    event_ids = [event.id for event in events]
+    registrations = registration_counts(db, event_ids)
+    likes = like_counts(db, event_ids)
+    
     result = []
     for event in events:
-        registration_count = db.query(models.EventRegistration).filter(
-            models.EventRegistration.event_id == event.id
-        ).count()
-        
-        like_count = db.query(models.EventLike).filter(
-            models.EventLike.event_id == event.id
-        ).count()
-        
         result.append({
             "id": event.id,
             "title": event.title,
@@ -217,9 +185,9 @@ async def get_club_events(
             "event_date": event.event_date.isoformat(),
             "location": event.location,
             "status": event.status,
-            "registration_count": registration_count,
+            "registration_count": registrations.get(event.id, 0),
             "max_participants": event.max_participants,
-            "like_count": like_count,
+            "like_count": likes.get(event.id, 0),
             "image_url": event.image_url,
             "created_at": event.created_at.isoformat() if event.created_at else None
         })
@@ -257,6 +225,7 @@ async def get_event_details(
         "registration_required": event.registration_required,
         "registration_count": registration_count,
         "max_participants": event.max_participants,
+        "seats_remaining": event.seats_remaining,
         "like_count": like_count,
         "image_url": event.image_url,
         "club": {
@@ -307,6 +276,7 @@ async def follow_club(
     )
     db.add(follow)
     db.commit()
+    directory_cache.invalidate()
     
     # Get updated follower count
     follower_count = db.query(models.ClubFollower).filter(
@@ -337,6 +307,7 @@ async def unfollow_club(
     
     db.delete(follow)
     db.commit()
+    directory_cache.invalidate()
     
     # Get updated follower count
     follower_count = db.query(models.ClubFollower).filter(
@@ -385,50 +356,26 @@ async def get_user_following(
         "logo_url": club.logo_url
     } for club in clubs]
 
+# Plain `def` so a registration burst runs in the threadpool instead of
+# queueing on the event loop; seats are reserved atomically in event_registration
 @router.post("/events/{event_id}/register")
-async def register_for_event(
+def register_for_event(
     event_id: int,
+    join_waitlist: bool = False,
     user: models.User = Depends(get_current_user),
     db: Session = Depends(get_database)
 ):
-    """Register for event - REQUIRES AUTH"""
-    event = db.query(models.ClubEvent).filter(
-        models.ClubEvent.id == event_id
-    ).first()
-    
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-    
-    if event.status != "scheduled":
-        raise HTTPException(status_code=400, detail="Event is not open for registration")
-    
-    # Check if already registered
-    existing = db.query(models.EventRegistration).filter(
-        models.EventRegistration.event_id == event_id,
-        models.EventRegistration.user_id == user.id
-    ).first()
-    
-    if existing:
-        raise HTTPException(status_code=400, detail="Already registered")
-    
-    # Check capacity
-    if event.max_participants:
-        count = db.query(models.EventRegistration).filter(
-            models.EventRegistration.event_id == event_id
-        ).count()
-        
-        if count >= event.max_participants:
-            raise HTTPException(status_code=400, detail="Event is full")
-    
-    # Create registration
-    registration = models.EventRegistration(
-        event_id=event_id,
-        user_id=user.id
-    )
-    db.add(registration)
-    db.commit()
-    
-    return {"message": "Successfully registered for event"}
+    """Register for event (or join the waitlist when full) - REQUIRES AUTH"""
+    return event_registration.register(db, event_id, user.id, join_waitlist)
+
+@router.delete("/events/{event_id}/register")
+def cancel_event_registration(
+    event_id: int,
+    user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_database)
+):
+    """Cancel registration or leave the waitlist - REQUIRES AUTH"""
+    return event_registration.cancel(db, event_id, user.id)
 
 @router.post("/events/{event_id}/like")
 async def toggle_event_like(
@@ -482,6 +429,7 @@ async def get_my_club(
 async def create_event(
     club_id: int,
     event: EventCreate,
+    background_tasks: BackgroundTasks,
     user: models.User = Depends(get_current_user),
     db: Session = Depends(get_database)
 ):
@@ -497,14 +445,28 @@ async def create_event(
         location=event.location,
         registration_required=event.registration_required,
         max_participants=event.max_participants,
+        seats_remaining=event.max_participants or None,
         image_url=event.image_url,
         status="scheduled"
     )
     
     db.add(new_event)
     db.commit()
+    directory_cache.invalidate()
     db.refresh(new_event)
     
+    # Notify followers after the response is sent
+    club_name = db.query(models.Club.name).filter(models.Club.id == club_id).scalar()
+    background_tasks.add_task(
+        fan_out_to_followers,
+        club_id,
+        models.NotificationType.CLUB_EVENT,
+        title=f"{club_name}: {new_event.title}",
+        message=f"New event on {new_event.event_date.strftime('%d %b %Y, %H:%M')} at {new_event.location}",
+        related_id=new_event.id,
+        exclude_user_id=user.id
+    )
+    
     return {
         "message": "Event created successfully",
         "event_id": new_event.id
@@ -514,6 +476,7 @@ async def create_event(
 async def create_announcement(
     club_id: int,
     announcement: AnnouncementCreate,
+    background_tasks: BackgroundTasks,
     user: models.User = Depends(get_current_user),
     db: Session = Depends(get_database)
 ):
@@ -532,6 +495,18 @@ async def create_announcement(
     db.commit()
     db.refresh(new_announcement)
     
+    # Notify followers after the response is sent
+    club_name = db.query(models.Club.name).filter(models.Club.id == club_id).scalar()
+    background_tasks.add_task(
+        fan_out_to_followers,
+        club_id,
+        models.NotificationType.CLUB_ANNOUNCEMENT,
+        title=f"{club_name}: {new_announcement.title}",
+        message=new_announcement.content[:200],
+        related_id=new_announcement.id,
+        exclude_user_id=user.id
+    )
+    
     return {
         "message": "Announcement created successfully",
         "announcement_id": new_announcement.id
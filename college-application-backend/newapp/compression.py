@@ -0,0 +1,211 @@
+# compression.py
+"""
+Negotiated response compression (zstd, gzip).
+
+CompressionMiddleware picks an encoding from the request's Accept-Encoding
+(zstd preferred when the client offers it - the mobile client does - then
+gzip) and compresses responses whose content type is compressible. Bodies
+are only compressed if they reach MINIMUM_SIZE bytes; below that the framing
+overhead outweighs the saving. Streamed bodies (streaming.stream_rows) are
+held until MINIMUM_SIZE bytes have arrived - a stream that ends first goes
+out uncompressed - and then compressed chunk by chunk, flushing after each
+one so the client can start parsing before the stream ends.
+
+Skipped: responses that already carry a Content-Encoding, 204/304, Range
+responses, server-sent events and anything marked `Cache-Control:
+no-transform` (streaming.stream_events: each event must reach the client as
+soon as it's written, not wait for MINIMUM_SIZE bytes). A strong ETag on a
+compressed body is weakened, since the bytes no longer match the identity
+representation.
+
+zstandard is optional; without it only gzip is offered.
+"""
+import gzip
+import zlib
+from typing import List, Optional
+
+from prometheus_client import Counter
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+MINIMUM_SIZE = 1024  # bytes
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+NEVER_COMPRESS = ("text/event-stream",)
+
+compression_bytes = Counter(
+    "app_http_compression_bytes_total",
+    "Response body bytes before (identity) and after (wire) compression",
+    ["encoding", "stage"],
+)
+
+
+def _accepted(accept_encoding: str) -> set:
+    """Codings the client accepts (q > 0)"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, *params = [piece.strip() for piece in part.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            accepted.add(name)
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = _accepted(accept_encoding)
+    if zstandard is not None and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compress and flush, so the client gets this chunk now"""
+        if self.encoding == "zstd":
+            return self._obj.compress(data) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "zstd":
+            return self._obj.compress(data) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+        return self._obj.compress(data) + self._obj.flush()
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """One-shot compression of a whole body"""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+
+def _compressible(headers: dict) -> bool:
+    if b"no-transform" in headers.get(b"cache-control", b"").lower():
+        return False
+    content_type = headers.get(b"content-type", b"").decode("latin-1").lower()
+    if content_type.startswith(NEVER_COMPRESS):
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with the client's preferred encoding"""
+
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = dict(scope["headers"])
+        encoding = choose_encoding(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None or b"range" in request_headers:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+        pending: List[bytes] = []  # streamed chunks held until there are minimum_size bytes
+
+        async def send_wrapper(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                if (message["status"] in (204, 304) or b"content-encoding" in headers
+                        or not _compressible(headers)):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message  # held until we've seen the first body chunk
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                if pending or more_body:
+                    pending.append(body)
+                    if more_body and sum(map(len, pending)) < self.minimum_size:
+                        return
+                    body = b"".join(pending)
+                    pending.clear()
+                if not more_body:
+                    if len(body) < self.minimum_size:
+                        # Small, complete body: not worth compressing
+                        passthrough = True
+                        await send(start)
+                        await send({"type": "http.response.body", "body": body})
+                        return
+                    data = compress(body, encoding)
+                    compression_bytes.labels(encoding, "identity").inc(len(body))
+                    compression_bytes.labels(encoding, "wire").inc(len(data))
+                    passthrough = True
+                    await send(self._compressed_start(start, encoding, len(data)))
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                compressor = _Compressor(encoding)
+                await send(self._compressed_start(start, encoding, None))
+
+            data = compressor.chunk(body) if more_body else compressor.finish(body)
+            compression_bytes.labels(encoding, "identity").inc(len(body))
+            compression_bytes.labels(encoding, "wire").inc(len(data))
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+        if start is not None and compressor is None and not passthrough:
+            await send(start)  # the app never finished the body
+            if pending:
+                await send({"type": "http.response.body", "body": b"".join(pending)})
+
+    def _compressed_start(self, start: dict, encoding: str, content_length: Optional[int]) -> dict:
+        headers = [(name, value) for name, value in start.get("headers", [])
+                   if name.lower() not in (b"content-length", b"vary")]
+        vary = [value for name, value in start.get("headers", []) if name.lower() == b"vary"]
+        vary_values = {v.strip().lower() for value in vary for v in value.split(b",")}
+        if b"accept-encoding" not in vary_values:
+            vary.append(b"Accept-Encoding")
+        headers.append((b"vary", b", ".join(vary)))
+        headers.append((b"content-encoding", encoding.encode()))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+
+        for index, (name, value) in enumerate(headers):
+            if name.lower() == b"etag" and not value.startswith(b"W/"):
+                headers[index] = (name, b"W/" + value)
+        return {**start, "headers": headers}
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, func, or_, select
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
 from .database import get_database
+from .streaming import stream_rows
 from . import models
 
 router = APIRouter(prefix="/courses", tags=["courses"])
@@ -100,37 +101,47 @@ async def create_course(
 
 @router.get("/admin/courses", response_model=List[CourseResponse])
 async def get_course_catalog(
+    request: Request,
     department: Optional[str] = None,
     year: Optional[int] = None,
     semester: Optional[int] = None,
-    db: Session = Depends(get_database)
+    fields: Optional[str] = None
 ):
-    """Admin: Get course catalog with filters"""
+    """Admin: Get course catalog with filters (streamed; NDJSON on request; `fields=` to pick keys)"""
     try:
-        query = db.query(models.CourseCatalog)
+        catalog = models.CourseCatalog.__table__
+        enrollments = models.CourseEnrollment.__table__
+        total_enrolled = select(func.count()).where(
+            enrollments.c.course_id == catalog.c.id,
+            enrollments.c.is_active == True
+        ).scalar_subquery()
+        
+        query = select(
+            catalog.c.id, catalog.c.course_code, catalog.c.course_name, catalog.c.department,
+            catalog.c.credits, catalog.c.description, catalog.c.year, catalog.c.semester,
+            catalog.c.prerequisites, catalog.c.is_active, total_enrolled.label("total_enrolled")
+        ).where(catalog.c.is_active == True)
         
         if department:
-            query = query.filter(models.CourseCatalog.department == department)
+            query = query.where(catalog.c.department == department)
         if year:
-            query = query.filter(models.CourseCatalog.year == year)
+            query = query.where(catalog.c.year == year)
         if semester:
-            query = query.filter(models.CourseCatalog.semester == semester)
-        
-        courses = query.filter(models.CourseCatalog.is_active == True).all()
-        
-        result = []
-        for course in courses:
-            enrollment_count = db.query(models.CourseEnrollment).filter(
-                models.CourseEnrollment.course_id == course.id,
-                models.CourseEnrollment.is_active == True
-            ).count()
-            
-            result.append(CourseResponse(
-                **course.__dict__,
-                total_enrolled=enrollment_count
-            ))
-        
-        return result
+            query = query.where(catalog.c.semester == semester)
+        
+        return stream_rows(request, query.order_by(catalog.c.id), lambda course: {
+            "id": course.id,
+            "course_code": course.course_code,
+            "course_name": course.course_name,
+            "department": course.department,
+            "credits": course.credits,
+            "description": course.description,
+            "year": course.year,
+            "semester": course.semester,
+            "prerequisites": course.prerequisites,
+            "is_active": bool(course.is_active),
+            "total_enrolled": course.total_enrolled
+        }, name="course catalog", fields=fields)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
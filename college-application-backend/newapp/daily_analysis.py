@@ -0,0 +1,261 @@
+# daily_analysis.py
+"""
+Daily wellness analysis, off the check-in path.
+
+The check-in handler used to count the user's chat messages, today's classes
+and pending todos and insert a fresh DailyAnalysis row on every check-in -
+a user checking in three times got three analyses for the day. Now the
+handler upserts its WellnessEntry, commits and calls `enqueue(user_id, day)`.
+
+The queue coalesces: a (user, day) that is already waiting is not queued
+again, so any number of check-ins before the worker gets to it produce one
+analysis. WORKERS threads take up to BATCH_SIZE keys at a time, waiting up to
+FLUSH_INTERVAL seconds for a batch to fill. Each batch reads the day's
+entries, the users' activity rollups (messages this week, classes today,
+pending todos - see activity_rollups.py) and chat sentiment
+(chat_sentiment.py) in four queries, folds each entry into the user's
+rolling wellness stats and upserts the analyses on (user_id, analysis_date)
+- all in one transaction. A user is only ever in one
+worker's batch at a time; a check-in that arrives while its user is being
+analysed is picked up by the next batch. Failed batches go back on the queue.
+
+Until the pool is started (scripts, one-off sessions) `enqueue` analyses
+immediately. `stop()` drains the queue on shutdown.
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from newapp import activity_rollups, chat_sentiment, wellness_stats
+from newapp.database import SessionLocal, upsert
+from newapp.models import DailyAnalysis, WellnessEntry
+
+WORKERS = int(os.getenv("DAILY_ANALYSIS_WORKERS", "2"))
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 1.0  # seconds
+
+Key = Tuple[int, date]
+
+_entries = WellnessEntry.__table__
+_analyses = DailyAnalysis.__table__
+
+ANALYSIS_COLUMNS = (
+    "predicted_mood", "predicted_stress", "predicted_energy", "message_count", "chat_activity_level",
+    "classes_today", "todos_pending", "academic_stress", "risk_level", "recommendations",
+    "sentiment_score", "avg_message_sentiment",
+)
+upsert_analyses = upsert(_analyses, ("user_id", "analysis_date"), ANALYSIS_COLUMNS)
+
+analyses_enqueued = Counter(
+    "app_daily_analysis_enqueued_total",
+    "Check-ins handed to the daily analysis queue, by whether they joined a waiting key",
+    ["result"],  # queued / coalesced
+)
+analyses_pending = Gauge(
+    "app_daily_analysis_pending",
+    "(user, day) analyses waiting for a worker",
+)
+batch_seconds = Histogram(
+    "app_daily_analysis_batch_seconds",
+    "Time to compute and store one batch of daily analyses",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+
+# ================ ANALYSIS ================
+
+def risk_level(mood: float, stress: float) -> str:
+    if mood < 2.5 or stress > 7:
+        return "high"
+    if mood < 3.5 or stress > 5:
+        return "medium"
+    return "low"
+
+
+def recommendations(stress: float, classes_today: Optional[int] = None,
+                    message_count: Optional[int] = None) -> List[str]:
+    """Tips for the day; the schedule/social ones only once those counts are known"""
+    tips = []
+    if stress > 6:
+        tips.append("Take 10-minute breaks every hour")
+        tips.append("Try box breathing exercise")
+    if classes_today is not None and classes_today >= 4:
+        tips.append("Heavy class schedule - pace yourself")
+    if message_count is not None and message_count < 5:
+        tips.append("Consider reaching out to friends")
+    return tips
+
+
+def analyse(db: Session, keys: Iterable[Key]) -> int:
+    """Compute and upsert the analyses for `keys`, in the caller's transaction"""
+    by_day = defaultdict(list)
+    for user_id, day in keys:
+        by_day[day].append(user_id)
+
+    rows = []
+    for day, user_ids in by_day.items():
+        entries = {row.user_id: row for row in db.execute(
+            select(_entries.c.user_id, _entries.c.date, _entries.c.mood_score, _entries.c.stress_level,
+                   _entries.c.energy_level, _entries.c.sleep_hours)
+            .where(_entries.c.user_id.in_(user_ids), _entries.c.date == day)
+        )}
+        messages = activity_rollups.weekly_messages(db, user_ids=user_ids)
+        levels = activity_rollups.user_levels(db, user_ids)
+        sentiment = chat_sentiment.sentiment_for(db, user_ids, day)
+
+        for user_id in user_ids:
+            entry = entries.get(user_id)
+            if entry is not None:
+                wellness_stats.record_checkin(db, entry)
+            message_count = messages.get(user_id, (0, 0))[0]
+            classes_today = activity_rollups.classes_on(levels[user_id], day)
+            todos_pending = levels[user_id]["todos_pending"]
+            mood = entry.mood_score if entry else 3.0
+            stress = entry.stress_level if entry else 5.0
+            rows.append({
+                "user_id": user_id,
+                "analysis_date": day,
+                "predicted_mood": mood,
+                "predicted_stress": stress,
+                "predicted_energy": entry.energy_level if entry else 5.0,
+                "message_count": message_count,
+                "chat_activity_level": "low" if message_count < 10 else "medium" if message_count < 30 else "high",
+                "classes_today": classes_today,
+                "todos_pending": todos_pending,
+                "academic_stress": min(10, (classes_today * 1.5) + (todos_pending * 0.5)),
+                "risk_level": risk_level(mood, stress),
+                "recommendations": json.dumps(recommendations(stress, classes_today, message_count)),
+                "avg_message_sentiment": sentiment.get(user_id, (None, None))[0],
+                "sentiment_score": sentiment.get(user_id, (None, None))[1],
+                "created_at": datetime.utcnow(),
+            })
+    if rows:
+        db.execute(upsert_analyses, rows)
+    return len(rows)
+
+
+# ================ QUEUE ================
+
+class AnalysisQueue:
+    def __init__(self, workers: int = WORKERS, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: Dict[Key, None] = {}  # insertion-ordered set
+        self._busy_users = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+    # ---------------- producer side ----------------
+
+    def enqueue(self, user_id: int, day: date):
+        if not self._threads:
+            self._process([(user_id, day)])
+            return
+
+        with self._lock:
+            if (user_id, day) in self._pending:
+                analyses_enqueued.labels("coalesced").inc()
+                return
+            self._pending[(user_id, day)] = None
+            analyses_enqueued.labels("queued").inc()
+            analyses_pending.set(len(self._pending))
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+
+    def is_pending(self, user_id: int, day: date) -> bool:
+        """Queued, or the user's batch is being analysed right now"""
+        with self._lock:
+            return (user_id, day) in self._pending or user_id in self._busy_users
+
+    # ---------------- consumer side ----------------
+
+    def _take(self) -> List[Key]:
+        """Up to batch_size waiting keys whose users no other worker holds; call with the lock held"""
+        batch = []
+        for key in self._pending:
+            if key[0] not in self._busy_users:
+                batch.append(key)
+                self._busy_users.add(key[0])
+                if len(batch) == self.batch_size:
+                    break
+        for key in batch:
+            del self._pending[key]
+        analyses_pending.set(len(self._pending))
+        return batch
+
+    def _process(self, batch: List[Key]) -> bool:
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            analyse(db, batch)
+            db.commit()
+            return True
+        except Exception as e:
+            db.rollback()
+            print(f"Error analysing {len(batch)} daily check-ins: {e}")
+            return False
+        finally:
+            db.close()
+            batch_seconds.observe(time.perf_counter() - started)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._stopping and len(self._pending) < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                stopping = self._stopping
+                batch = self._take()
+            if batch:
+                ok = self._process(batch)
+                with self._lock:
+                    self._busy_users.difference_update(user_id for user_id, _ in batch)
+                    if not ok and not stopping:
+                        for key in batch:
+                            self._pending.setdefault(key, None)
+                        analyses_pending.set(len(self._pending))
+                    # Keys held back for a busy user can go now
+                    self._wakeup.notify()
+            elif stopping:
+                with self._lock:
+                    if not self._pending and not self._busy_users:
+                        self._wakeup.notify_all()
+                        return
+                    self._wakeup.wait(self.flush_interval)
+
+    # ---------------- lifecycle ----------------
+
+    def start(self):
+        if self._threads or self.workers <= 0:
+            return
+        self._stopping = False
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"daily-analysis-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Analyse what's queued and stop the workers"""
+        if not self._threads:
+            return
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+queue = AnalysisQueue()
+enqueue = queue.enqueue
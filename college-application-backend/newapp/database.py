@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -11,8 +11,17 @@ if DATABASE_URL.startswith("sqlite"):
     # SQLite specific configuration
     engine = create_engine(
         DATABASE_URL, 
-        connect_args={"check_same_thread": False}
+        connect_args={"check_same_thread": False, "timeout": 30}
     )
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers proceed while a writer holds the lock, so bursts of
+        # writes (e.g. event registrations) don't stall every GET
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
 else:
     # For other databases (PostgreSQL, MySQL, etc.)
     engine = create_engine(DATABASE_URL)
@@ -23,6 +32,31 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Create Base class for models
 Base = declarative_base()
 
+def upsert(table, keys, columns, add=()):
+    """
+    INSERT ... ON CONFLICT (keys) DO UPDATE SET columns = the inserted values
+
+    Columns in `add` are incremented by the inserted value instead. Execute
+    with one dict or a list of dicts. `keys` must be covered by a unique
+    index or the primary key.
+    """
+    if engine.dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table)
+        inserted = statement.inserted
+    else:
+        if engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table)
+        inserted = statement.excluded
+    values = {name: inserted[name] for name in columns}
+    values.update({name: table.c[name] + inserted[name] for name in add})
+    if engine.dialect.name == "mysql":
+        return statement.on_duplicate_key_update(values)
+    return statement.on_conflict_do_update(index_elements=list(keys), set_=values)
+
 # Dependency to get database session
 def get_database():
     db = SessionLocal()
@@ -0,0 +1,161 @@
+# event_registration.py
+"""
+Seat reservation for club events.
+
+A seat is taken with a single conditional UPDATE
+
+    UPDATE club_events SET seats_remaining = seats_remaining - 1
+    WHERE id = :id AND status = 'scheduled' AND seats_remaining > 0
+
+so concurrent requests serialise on the event row (on SQLite, on the write
+lock) and the counter can never go below zero. The registration INSERT runs
+in the same transaction; if the unique (event_id, user_id) constraint
+rejects it, the rollback hands the seat back. Events without a limit keep
+seats_remaining NULL and skip the counter.
+
+When an event is full, callers can opt into the waitlist. Cancelling a
+registration gives the seat directly to the oldest waitlist entry (FIFO by
+id), or returns it to the counter if nobody is waiting.
+"""
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+
+events = models.ClubEvent.__table__
+registrations = models.EventRegistration.__table__
+waitlist = models.EventWaitlist.__table__
+
+
+def _take_seat(db: Session, event_id: int) -> bool:
+    result = db.execute(
+        update(events)
+        .where(
+            events.c.id == event_id,
+            events.c.status == "scheduled",
+            (events.c.seats_remaining == None) | (events.c.seats_remaining > 0),
+        )
+        .values(seats_remaining=events.c.seats_remaining - 1)
+    )
+    return result.rowcount == 1
+
+
+def _is_registered(db: Session, event_id: int, user_id: int) -> bool:
+    return db.execute(
+        select(registrations.c.id).where(
+            registrations.c.event_id == event_id,
+            registrations.c.user_id == user_id,
+        )
+    ).first() is not None
+
+
+def waitlist_position(db: Session, event_id: int, user_id: int) -> Optional[int]:
+    """1-based place in the event's waitlist, or None if not waiting"""
+    entry_id = db.execute(
+        select(waitlist.c.id).where(
+            waitlist.c.event_id == event_id,
+            waitlist.c.user_id == user_id,
+        )
+    ).scalar()
+    if entry_id is None:
+        return None
+    return db.execute(
+        select(func.count()).select_from(waitlist).where(
+            waitlist.c.event_id == event_id,
+            waitlist.c.id <= entry_id,
+        )
+    ).scalar()
+
+
+def register(db: Session, event_id: int, user_id: int, join_waitlist: bool = False) -> dict:
+    """Reserve a seat for `user_id`, or queue them if full and `join_waitlist`"""
+    try:
+        if _take_seat(db, event_id):
+            db.execute(insert(registrations).values(event_id=event_id, user_id=user_id))
+            db.execute(delete(waitlist).where(
+                waitlist.c.event_id == event_id,
+                waitlist.c.user_id == user_id,
+            ))
+            db.commit()
+            return {"message": "Successfully registered for event", "registered": True}
+    except IntegrityError:
+        # Rolling back also returns the seat we just took
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Already registered")
+
+    # No seat: find out why, without holding any lock
+    db.rollback()
+    event = db.execute(
+        select(events.c.status, events.c.seats_remaining).where(events.c.id == event_id)
+    ).first()
+    if event is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if event.status != "scheduled":
+        raise HTTPException(status_code=400, detail="Event is not open for registration")
+    if _is_registered(db, event_id, user_id):
+        raise HTTPException(status_code=400, detail="Already registered")
+    if not join_waitlist:
+        raise HTTPException(status_code=400, detail="Event is full")
+
+    try:
+        db.execute(insert(waitlist).values(event_id=event_id, user_id=user_id))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Already on the waitlist")
+
+    return {
+        "message": "Event is full - added to waitlist",
+        "registered": False,
+        "waitlist_position": waitlist_position(db, event_id, user_id),
+    }
+
+
+def _promote_next(db: Session, event_id: int) -> Optional[int]:
+    """Move the oldest waitlisted user into the seat being freed"""
+    while True:
+        entry = db.execute(
+            select(waitlist.c.id, waitlist.c.user_id)
+            .where(waitlist.c.event_id == event_id)
+            .order_by(waitlist.c.id)
+            .limit(1)
+        ).first()
+        if entry is None:
+            return None
+        # Another cancellation may have claimed this entry first
+        claimed = db.execute(delete(waitlist).where(waitlist.c.id == entry.id)).rowcount
+        if claimed:
+            db.execute(insert(registrations).values(event_id=event_id, user_id=entry.user_id))
+            return entry.user_id
+
+
+def cancel(db: Session, event_id: int, user_id: int) -> dict:
+    """Drop a registration (promoting the waitlist) or leave the waitlist"""
+    removed = db.execute(delete(registrations).where(
+        registrations.c.event_id == event_id,
+        registrations.c.user_id == user_id,
+    )).rowcount
+
+    if not removed:
+        left = db.execute(delete(waitlist).where(
+            waitlist.c.event_id == event_id,
+            waitlist.c.user_id == user_id,
+        )).rowcount
+        db.commit()
+        if not left:
+            raise HTTPException(status_code=404, detail="Not registered for this event")
+        return {"message": "Removed from waitlist"}
+
+    promoted = _promote_next(db, event_id)
+    if promoted is None:
+        db.execute(
+            update(events)
+            .where(events.c.id == event_id, events.c.seats_remaining != None)
+            .values(seats_remaining=events.c.seats_remaining + 1)
+        )
+    db.commit()
+    return {"message": "Registration cancelled", "promoted_user_id": promoted}
@@ -0,0 +1,253 @@
+# fixtures/__init__.py
+"""
+Canonical seed data, loaded from the JSON files in this directory.
+
+Each fixture is applied in one transaction with core `executemany` inserts,
+and the sha256 of its file is stored in `app_meta` under `fixture:<name>`.
+When the stored hash matches the file, loading is a single SELECT.
+
+Boot fixtures (default admin, mess menu) are loaded by the startup pipeline;
+demo data is opt-in:  python -m newapp.fixtures demo_users
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.engine import Connection
+
+from newapp import models
+from newapp.database import engine
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+BOOT_FIXTURES = ["default_admin", "mess_menu"]
+
+_loaders: Dict[str, Callable[[Connection, dict, Optional[str]], int]] = {}
+_after_commit: Dict[str, Callable[[], None]] = {}
+
+
+def fixture(name: str, after_commit: Optional[Callable[[], None]] = None):
+    """Register a loader for fixtures/<name>.json"""
+    def decorator(fn):
+        _loaders[name] = fn
+        if after_commit is not None:
+            _after_commit[name] = after_commit
+        return fn
+    return decorator
+
+
+def _hash_key(name: str) -> str:
+    return f"fixture:{name}"
+
+
+def _read(name: str):
+    with open(os.path.join(FIXTURE_DIR, f"{name}.json"), "rb") as f:
+        raw = f.read()
+    return hashlib.sha256(raw).hexdigest(), json.loads(raw)
+
+
+def _stored_hash(conn: Connection, name: str):
+    meta = models.AppMeta.__table__
+    return conn.execute(
+        select(meta.c.value).where(meta.c.key == _hash_key(name))
+    ).scalar()
+
+
+def _store_hash(conn: Connection, name: str, digest: str):
+    meta = models.AppMeta.__table__
+    key = _hash_key(name)
+    conn.execute(delete(meta).where(meta.c.key == key))
+    conn.execute(insert(meta), [{"key": key, "value": digest, "updated_at": datetime.utcnow()}])
+
+
+def load_fixture(name: str, force: bool = False) -> bool:
+    """Apply fixture `name`; returns False if it was already up to date"""
+    digest, data = _read(name)
+    with engine.begin() as conn:
+        previous = _stored_hash(conn, name)
+        if previous == digest and not force:
+            return False
+
+        count = _loaders[name](conn, data, previous)
+        _store_hash(conn, name, digest)
+
+    if name in _after_commit:
+        _after_commit[name]()
+    print(f"✓ Loaded fixture '{name}' ({count} rows)")
+    return True
+
+
+def load_boot_fixtures():
+    for name in BOOT_FIXTURES:
+        load_fixture(name)
+
+
+# ================ LOADERS ================
+
+@fixture("default_admin")
+def _load_default_admin(conn: Connection, data: dict, previous_hash: Optional[str]) -> int:
+    users = models.User.__table__
+    admins = models.AdminUser.__table__
+
+    user = data["user"]
+    user_id = conn.execute(
+        select(users.c.id).where(users.c.college_id == user["college_id"])
+    ).scalar()
+    if user_id is not None:
+        return 0
+
+    user_id = conn.execute(insert(users).values(**user, is_active=True)).inserted_primary_key[0]
+    conn.execute(insert(admins).values(user_id=user_id, **data["admin"]))
+
+    print("\n" + "="*50)
+    print("✅ DEFAULT ADMIN CREATED")
+    print("="*50)
+    print(f"Email: {user['email']}")
+    print(f"College ID: {user['college_id']}")
+    print("Password: admin123")
+    print("="*50)
+    print("\n⚠️  Change this password after first login!")
+    return 2
+
+
+def _invalidate_menu_cache():
+    from newapp.mess_menu_cache import menu_cache
+    menu_cache.invalidate()
+
+
+# Keys ("WEEK_1/MONDAY/BREAKFAST/Bread") of the menu rows the fixture put there
+MESS_MENU_ITEMS_KEY = "fixture:mess_menu:items"
+
+
+def _menu_key(week_type: str, day: str, meal_type: str, item_name: str) -> str:
+    return f"{week_type}/{day}/{meal_type}/{item_name}"
+
+
+@fixture("mess_menu", after_commit=_invalidate_menu_cache)
+def _load_mess_menu(conn: Connection, data: dict, previous_hash: Optional[str]) -> int:
+    """
+    Sync the fixture's items into the menu by (week type, day, meal, name):
+    new items are inserted, kept ones get the fixture's description (their
+    ratings and votes are left alone), and items a previous version of the
+    fixture added but this one drops are deleted. Items added through the
+    admin endpoint are never touched.
+    """
+    table = models.MessMenuItem.__table__
+    meta = models.AppMeta.__table__
+
+    existing = conn.execute(select(table.c.id).limit(1)).first()
+    if existing and previous_hash is None:
+        # Menu predates fixtures (or was entered by hand); adopt it as-is
+        print("Mess menu data already exists, recording fixture hash only")
+        return 0
+
+    columns = data["columns"]
+    rows = {}
+    for week_type, days in data["menu"].items():
+        for day, meals in days.items():
+            for meal_type, items in meals.items():
+                for item in items:
+                    row = dict(zip(columns, item))
+                    row.update(
+                        day_of_week=models.DayOfWeek[day],
+                        meal_type=models.MealType[meal_type],
+                        menu_week_type=models.MenuWeekType[week_type],
+                    )
+                    rows[_menu_key(week_type, day, meal_type, row["item_name"])] = row
+
+    stored = conn.execute(select(meta.c.value).where(meta.c.key == MESS_MENU_ITEMS_KEY)).scalar()
+    owned = set(json.loads(stored)) if stored else set()
+    present = {
+        _menu_key(r.menu_week_type.name, r.day_of_week.name, r.meal_type.name, r.item_name): r
+        for r in conn.execute(select(
+            table.c.id, table.c.menu_week_type, table.c.day_of_week, table.c.meal_type, table.c.item_name,
+            table.c.description,
+        ))
+    }
+
+    dropped = [present[key].id for key in owned - rows.keys() if key in present]
+    if dropped:
+        conn.execute(delete(table).where(table.c.id.in_(dropped)))
+    for key, row in rows.items():
+        if key in present and present[key].description != row["description"]:
+            conn.execute(update(table).where(table.c.id == present[key].id).values(description=row["description"]))
+    added = [row for key, row in rows.items() if key not in present]
+    if added:
+        conn.execute(insert(table), added)
+
+    conn.execute(delete(meta).where(meta.c.key == MESS_MENU_ITEMS_KEY))
+    conn.execute(insert(meta), [{"key": MESS_MENU_ITEMS_KEY, "value": json.dumps(sorted(rows)),
+                                 "updated_at": datetime.utcnow()}])
+    return len(added) + len(dropped)
+
+
+@fixture("demo_users")
+def _load_demo_users(conn: Connection, data: dict, previous_hash: Optional[str]) -> int:
+    catalog = models.CourseCatalog.__table__
+    users = models.User.__table__
+    enrollments = models.CourseEnrollment.__table__
+    preferences = models.StudyPreference.__table__
+    timetable = models.TimetableEntry.__table__
+
+    # Courses (skip codes that already exist)
+    course_rows = [dict(zip(data["course_columns"], c), is_active=True) for c in data["courses"]]
+    codes = [c["course_code"] for c in course_rows]
+    have = set(conn.execute(select(catalog.c.course_code).where(catalog.c.course_code.in_(codes))).scalars())
+    new_courses = [c for c in course_rows if c["course_code"] not in have]
+    if new_courses:
+        conn.execute(insert(catalog), new_courses)
+    course_ids = dict(conn.execute(
+        select(catalog.c.course_code, catalog.c.id).where(catalog.c.course_code.in_(codes))
+    ).all())
+    course_names = {c["course_code"]: c["course_name"] for c in course_rows}
+
+    # Users (skip college IDs that already exist)
+    user_rows = [dict(zip(data["user_columns"], u)) for u in data["users"]]
+    college_ids = [u["college_id"] for u in user_rows]
+    have = set(conn.execute(select(users.c.college_id).where(users.c.college_id.in_(college_ids))).scalars())
+    new_users = [u for u in user_rows if u["college_id"] not in have]
+    if not new_users:
+        return len(new_courses)
+
+    conn.execute(insert(users), [{
+        "email": u["email"],
+        "college_id": u["college_id"],
+        "hashed_password": "$2b$12$fake_hash",
+        "full_name": u["full_name"],
+        "department": u["department"],
+        "year": u["year"],
+        "phone_number": u["phone_number"],
+        "is_verified": True,
+        "is_active": True,
+    } for u in new_users])
+    user_ids = dict(conn.execute(
+        select(users.c.college_id, users.c.id).where(
+            users.c.college_id.in_([u["college_id"] for u in new_users])
+        )
+    ).all())
+
+    term = data["enrollment"]
+    enrollment_rows, preference_rows, timetable_rows = [], [], []
+    for u in new_users:
+        user_id = user_ids[u["college_id"]]
+        for code in u["courses"]:
+            enrollment_rows.append({
+                "user_id": user_id, "course_id": course_ids[code],
+                "year": term["year"], "semester": term["semester"], "is_active": True,
+            })
+        preference = dict(zip(data["preference_columns"], u["preference"]))
+        preference.update(user_id=user_id, primary_goal="improve_grades")
+        preference_rows.append(preference)
+        for entry in u["timetable"]:
+            entry = dict(zip(data["timetable_columns"], entry))
+            code = entry.pop("course_code")
+            entry.update(user_id=user_id, course_id=course_ids[code], course_name=course_names[code])
+            timetable_rows.append(entry)
+
+    conn.execute(insert(enrollments), enrollment_rows)
+    conn.execute(insert(preferences), preference_rows)
+    conn.execute(insert(timetable), timetable_rows)
+    return len(new_courses) + len(new_users) + len(enrollment_rows) + len(preference_rows) + len(timetable_rows)
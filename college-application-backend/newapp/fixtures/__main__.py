@@ -0,0 +1,9 @@
+# python -m newapp.fixtures [name ...]
+import sys
+
+from newapp.fixtures import BOOT_FIXTURES, load_fixture
+
+names = sys.argv[1:] or BOOT_FIXTURES
+for name in names:
+    if not load_fixture(name):
+        print(f"Fixture '{name}' already up to date")
@@ -0,0 +1,77 @@
+# lazy_imports.py
+"""
+Deferred imports for heavy optional subsystems.
+
+numpy, textblob, bs4, PyPDF2 and the langchain/MCP stack together add seconds
+to `import newapp.main`, but most requests never touch them. Modules that
+need them bind a lazy module here and pay the import on first attribute use.
+
+The first attribute access executes the module under `_lock`, and threads
+that arrive meanwhile wait for it to finish. (importlib's LazyLoader before
+Python 3.12.3 let them read the half-executed module and fail with
+AttributeError - e.g. a request using numpy while the nightly risk scoring
+job was loading it.)
+"""
+import importlib
+import importlib.util
+import sys
+import threading
+import types
+
+# Re-entrant: executing a module reads its own attributes
+_lock = threading.RLock()
+
+
+class _LazyModule(types.ModuleType):
+    """Bound but not yet executed; the first attribute read executes it"""
+
+    def __getattribute__(self, attr):
+        with _lock:
+            if type(self) is _LazyModule:
+                spec = types.ModuleType.__getattribute__(self, "__spec__")
+                self.__class__ = _LoadingModule
+                try:
+                    spec.loader.exec_module(self)
+                except BaseException:
+                    self.__class__ = _LazyModule
+                    raise
+                self.__class__ = types.ModuleType
+        return types.ModuleType.__getattribute__(self, attr)
+
+
+class _LoadingModule(types.ModuleType):
+    """Executing: the loading thread reads through, others wait for it to finish"""
+
+    def __getattribute__(self, attr):
+        with _lock:
+            return types.ModuleType.__getattribute__(self, attr)
+
+
+def lazy_import(name: str):
+    """Return module `name`, executing it only when an attribute is first read"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    with _lock:
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+
+        spec = importlib.util.find_spec(name)
+        if spec is None:
+            # Let the real import raise a normal ModuleNotFoundError
+            return importlib.import_module(name)
+
+        module = importlib.util.module_from_spec(spec)
+        module.__class__ = _LazyModule
+        sys.modules[name] = module
+        return module
+
+
+def is_loaded(name: str) -> bool:
+    """True once `name` has actually executed (not just been bound lazily)"""
+    module = sys.modules.get(name)
+    if module is None:
+        return False
+    return not isinstance(module, (_LazyModule, _LoadingModule))
@@ -0,0 +1,200 @@
+# llm_gate.py
+"""
+Admission control for upstream LLM calls.
+
+During exam season many students ask near-identical questions at the same
+moment, and each one started its own agent call - all of them at once, into
+the provider's rate limits. Every agent call now goes through `gate.run()`:
+
+  1. single-flight: a call whose key matches one already in flight waits
+     for that call's answer instead of making its own (callers choose the
+     key; see AIAssistant._flight_key)
+  2. at most AI_MAX_CONCURRENCY calls run upstream at once, and they start
+     no faster than AI_RATE_PER_SECOND (token bucket, AI_BURST deep)
+  3. at most AI_MAX_WAITING calls wait for a slot, each for at most
+     AI_MAX_WAIT_SECONDS; past either limit `LLMBusy` is raised straight
+     away and the assistant answers with contact suggestions instead
+
+`stream()` does the same for a streamed answer: the caller making the call
+gets the pieces as they arrive and holds its slot until the stream ends.
+
+All state belongs to the event loop thread, so there are no locks.
+"""
+import asyncio
+import contextlib
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+RATE_PER_SECOND = float(os.getenv("AI_RATE_PER_SECOND", "2"))  # 0 = no rate limit
+BURST = int(os.getenv("AI_BURST", "5"))
+MAX_WAITING = int(os.getenv("AI_MAX_WAITING", "32"))
+MAX_WAIT_SECONDS = float(os.getenv("AI_MAX_WAIT_SECONDS", "10"))
+
+llm_requests = Counter(
+    "app_ai_llm_requests_total",
+    "Agent calls asked of the gate, by outcome",
+    ["outcome"],  # called / coalesced / queue_full / timeout
+)
+llm_waiting = Gauge(
+    "app_ai_llm_queue_depth",
+    "Agent calls waiting for a concurrency slot or rate-limit token",
+)
+llm_in_flight = Gauge(
+    "app_ai_llm_in_flight",
+    "Agent calls running upstream",
+)
+llm_wait_seconds = Histogram(
+    "app_ai_llm_wait_seconds",
+    "Time an agent call waited for a slot and token before going upstream",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+
+class LLMBusy(Exception):
+    """Too many agent calls already waiting, or waited too long"""
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    async def take(self):
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class LLMGate:
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, rate: float = RATE_PER_SECOND, burst: int = BURST,
+                 max_waiting: int = MAX_WAITING, max_wait: float = MAX_WAIT_SECONDS):
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(rate, burst)
+        self._waiting = 0
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    async def run(self, key: str, call: Callable[[], Awaitable[str]]) -> str:
+        """`call()`'s result, shared with every concurrent caller using the same key"""
+        while True:
+            shared: Optional[asyncio.Future] = self._in_flight.get(key)
+            if shared is None:
+                break
+            llm_requests.labels("coalesced").inc()
+            try:
+                return await asyncio.shield(shared)
+            except asyncio.CancelledError:
+                if not shared.cancelled():
+                    raise  # we were cancelled ourselves
+                # the caller making the call went away; make it ourselves
+
+        shared = asyncio.get_running_loop().create_future()
+        # nobody may be waiting on it; don't warn about an unretrieved exception
+        shared.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._in_flight[key] = shared
+        try:
+            result = await self._limited(call)
+        except asyncio.CancelledError:
+            shared.cancel()
+            raise
+        except Exception as e:
+            shared.set_exception(e)
+            raise
+        finally:
+            del self._in_flight[key]
+        shared.set_result(result)
+        return result
+
+    async def stream(self, key: str, open_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Like `run()`, but yields the answer in pieces as `open_stream()`
+        produces them; a caller coalesced onto another's call gets the whole
+        answer as one piece once it's done
+        """
+        if key in self._in_flight:
+            yield await self.run(key, lambda: _collect(open_stream()))
+            return
+
+        shared = asyncio.get_running_loop().create_future()
+        shared.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._in_flight[key] = shared
+        parts = []
+        try:
+            async with self._slot(), contextlib.aclosing(open_stream()) as upstream:
+                async for part in upstream:
+                    parts.append(part)
+                    yield part
+        except Exception as e:
+            shared.set_exception(e)
+            raise
+        except BaseException:
+            shared.cancel()  # cancelled, or the consumer stopped reading
+            raise
+        finally:
+            del self._in_flight[key]
+        shared.set_result("".join(parts))
+
+    async def _acquire(self):
+        await self._slots.acquire()
+        try:
+            await self._bucket.take()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    @contextlib.asynccontextmanager
+    async def _slot(self):
+        """Wait (boundedly) for a concurrency slot and a rate-limit token, and hold the slot"""
+        if self._waiting >= self.max_waiting:
+            llm_requests.labels("queue_full").inc()
+            raise LLMBusy("queue full")
+
+        self._waiting += 1
+        llm_waiting.inc()
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            llm_requests.labels("timeout").inc()
+            raise LLMBusy("timed out waiting for a slot")
+        finally:
+            self._waiting -= 1
+            llm_waiting.dec()
+            llm_wait_seconds.observe(time.monotonic() - started)
+
+        llm_requests.labels("called").inc()
+        llm_in_flight.inc()
+        try:
+            yield
+        finally:
+            llm_in_flight.dec()
+            self._slots.release()
+
+    async def _limited(self, call: Callable[[], Awaitable[str]]) -> str:
+        async with self._slot():
+            return await call()
+
+
+async def _collect(parts: AsyncIterator[str]) -> str:
+    return "".join([part async for part in parts])
+
+
+gate = LLMGate()
@@ -1,17 +1,17 @@
 from contextlib import asynccontextmanager
 import logging
-from fastapi import FastAPI, Depends, HTTPException, status,Query,Body
+from fastapi import FastAPI, Depends, HTTPException, status,Query,Body,Request,Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from datetime import datetime
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr,validator
 from datetime import datetime, timedelta, date
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, text, func,and_
+from sqlalchemy import or_, text, func,and_, select
 from typing import Optional, List
 from enum import Enum
 import random
 import string
-from passlib.context import CryptContext
 import jwt
 from difflib import SequenceMatcher
 import math
@@ -22,14 +22,22 @@ import traceback
 from newapp.database import SessionLocal, engine
 from newapp import models
 from newapp.ai_service import AIAssistant
-from newapp.web_scraper import scrape_iitpkd_website
 
 # Add to your main.py
 from newapp.admin_auth import router as admin_auth_router
-from newapp.create_default_admin import create_default_admin
+from newapp import startup
+from newapp.startup import fix_database_schema
 from newapp.study_buddy_routes import router as study_buddy_router
 from newapp.wellness_routes import wellness_bp
 from newapp.maps import router as maps_router
+from newapp.mess_menu_cache import menu_cache, menu_response
+from newapp.streaming import parse_fields, pick_fields, stream_events, stream_rows
+from newapp.compression import CompressionMiddleware
+from newapp import (
+    activity_rollups, admin_metrics, ai_agent, answer_cache, audit_log, auth_cache, chat_sentiment, daily_analysis,
+    notification_inbox, passwords, query_metrics, risk_batch,
+)
+from newapp.metrics import RequestMetricsMiddleware, router as metrics_router
 
 # Import new routers
 from . import course_routes
@@ -55,22 +63,49 @@ from .admin_routes import router as admin_router
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)  # Add this line!
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
-
 # Lifespan events
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("🚀 Starting up...")
-    models.Base.metadata.create_all(bind=engine)
-    
-    from newapp.create_default_admin import create_default_admin
-    create_default_admin()
-    
+    # Schema + seed fixtures; a no-op on an up-to-date database
+    startup.bootstrap()
+    # Batched audit log inserts (and journal replay, if enabled)
+    audit_log.writer.start()
+    # Wellness check-ins queue their daily analysis for these workers
+    daily_analysis.queue.start()
+    # Revoked admin tokens must be known before the first request
+    auth_cache.revocations.refresh()
+
+    # Slow seeding runs after we start serving requests
+    startup.defer("knowledge_base", initialize_knowledge_base)
+    # Build the activity rollups from history on the first start that has them
+    startup.defer("activity_backfill", activity_rollups.backfill_once)
+    # Catch the dashboard counters up with writes the ORM hooks can't see
+    startup.every("admin_metrics", admin_metrics.RECONCILE_INTERVAL, admin_metrics.reconcile)
+    # Pick up admin token revocations made by other workers
+    startup.every("token_revocations", auth_cache.REVOCATION_REFRESH_INTERVAL, auth_cache.revocations.refresh)
+    # Drop old read notifications and correct drifted unread counters
+    startup.every("notification_retention", notification_inbox.RETENTION_INTERVAL, notification_inbox.prune_read)
+    # Drop cached AI answers whose knowledge-base rows another worker changed
+    startup.every("answer_cache", answer_cache.SYNC_INTERVAL, answer_cache.cache.sync)
+    # Recount pending todos / classes per weekday for writes the ORM hooks can't see
+    startup.every("activity_levels", activity_rollups.RECONCILE_INTERVAL, activity_rollups.reconcile_levels)
+    # Score new chat messages' sentiment into per-user daily ChatAnalysis rows
+    startup.every("chat_sentiment", chat_sentiment.RUN_INTERVAL, chat_sentiment.run)
+    # Score every student's wellness risk once a night, for the counselor at-risk list
+    startup.every("risk_scoring", risk_batch.CHECK_INTERVAL, risk_batch.run_nightly)
+
     yield
+    await startup.shutdown()
+    daily_analysis.queue.stop()
+    audit_log.writer.stop()
+    passwords.hasher.shutdown()
+    chat_sentiment.shutdown()
+    await ai_agent.registry.shutdown()
     print("🛑 Shutting down...")
 
-app = FastAPI(title="College App API", version="1.0.0",lifespan = lifespan)
+# orjson for every JSON response unless a route says otherwise
+app = FastAPI(title="College App API", version="1.0.0",lifespan = lifespan, default_response_class=ORJSONResponse)
 
 # app.include_router(admin_router)
 
@@ -86,9 +121,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Per-request SQL counting / N+1 detection (see /metrics and /metrics/queries)
+query_metrics.instrument(engine)
+app.add_middleware(query_metrics.QueryBudgetMiddleware)
+# zstd/gzip by Accept-Encoding; inside the metrics middleware so sizes are wire bytes
+app.add_middleware(CompressionMiddleware)
+# Per-route latency / size / status metrics; outermost so it times the whole stack
+app.add_middleware(RequestMetricsMiddleware)
 # JWT settings
 SECRET_KEY = "your-secret-key-here-change-in-production"
 ALGORITHM = "HS256"
@@ -125,6 +165,7 @@ app.include_router(study_buddy_router)  # /study-buddy
 # app.include_router(maps_router)  # /maps
 
 app.include_router(wellness_bp, prefix="/wellness", tags=["wellness"])
+app.include_router(metrics_router)  # /metrics
 
 
 # Import router and verify it exists
@@ -342,12 +383,6 @@ class CalendarEventUpdate(BaseModel):
 def generate_otp(length=6):
     return ''.join(random.choices(string.digits, k=length))
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
@@ -375,53 +410,7 @@ def calculate_cgpa(grades):
 
 def get_current_menu_week_type():
     """Get current week type based on week number"""
-    now = datetime.utcnow()
-    week_number = now.isocalendar().week
-    if week_number % 4 in [1, 3]:  # Weeks 1 and 3 of month
-        return "WEEK_1"
-    else:  # Weeks 2 and 4 of month
-        return "WEEK_2"
-
-def fix_database_schema(db: Session):
-    """Fix the database schema by adding missing columns"""
-    try:
-        # Add missing columns if they don't exist
-        
-        # Check if course_id exists in timetable_entries
-        try:
-            db.execute(text("SELECT course_id FROM timetable_entries LIMIT 1"))
-        except:
-            print("Adding course_id column to timetable_entries")
-            db.execute(text("ALTER TABLE timetable_entries ADD COLUMN course_id INTEGER REFERENCES courses(id)"))
-        
-        # Check if start_date exists in courses
-        try:
-            db.execute(text("SELECT start_date FROM courses LIMIT 1"))
-        except:
-            print("Adding start_date column to courses")
-            db.execute(text("ALTER TABLE courses ADD COLUMN start_date DATE"))
-        
-        db.commit()
-        print("Database schema fixed successfully")
-    except Exception as e:
-        print(f"Error fixing database schema: {e}")
-        db.rollback()
-
-def fix_todo_table_schema(db: Session):
-    """Fix the todo_items table schema"""
-    try:
-        # Drop the existing table if it has wrong schema
-        db.execute(text("DROP TABLE IF EXISTS todo_items"))
-        db.commit()
-        
-        # Recreate the table with correct schema
-        models.TodoItem.__table__.create(bind=engine, checkfirst=True)
-        db.commit()
-        
-        print("TodoItem table schema fixed successfully")
-    except Exception as e:
-        print(f"Error fixing TodoItem table schema: {e}")
-        db.rollback()
+    return menu_cache.current_week_type()
 
 # Maps
 class LocationUpdate(BaseModel):
@@ -597,491 +586,6 @@ async def seed_test_locations(db: Session = Depends(get_db)):
 
 
 
-# ================ MESS MENU DATA POPULATION ================
-def populate_mess_menu_data(db: Session):
-    """Populate database with authentic mess menu data from PDF"""
-    try:
-        # Check if data already exists
-        existing_count = db.query(models.MessMenuItem).count()
-        if existing_count > 0:
-            print(f"Mess menu data already exists ({existing_count} items)")
-            return
-
-        print("Populating mess menu data from PDF...")
-
-        # WEEK 1 & 3 MENU DATA (from PDF page 1)
-        week2_menu = {
-            "MONDAY": {
-                "BREAKFAST": [
-                    {"name": "Bread", "desc": "Common", "rating": 3.8},
-                    {"name": "Butter", "desc": "Common", "rating": 4.0},
-                    {"name": "Jam", "desc": "Common", "rating": 3.9},
-                    {"name": "Milk", "desc": "Common", "rating": 4.1},
-                    {"name": "Tea/Coffee", "desc": "Common", "rating": 3.9},
-                    {"name": "Sprouts/Chana", "desc": "Common", "rating": 4.2},
-                    {"name": "Aloo Paratha", "desc": "Main", "rating": 4.3},
-                    {"name": "Ketchup", "desc": "Side", "rating": 3.5},
-                    {"name": "Curd", "desc": "Side", "rating": 4.0},
-                    {"name": "Mint & Coriander Chutney", "desc": "Side", "rating": 4.1}
-                ],
-                "LUNCH": [
-                    {"name": "Mix Pickle", "desc": "Common", "rating": 3.7},
-                    {"name": "Papad", "desc": "Common", "rating": 3.8},
-                    {"name": "Mix Salad", "desc": "Common", "rating": 3.6},
-                    {"name": "Onion", "desc": "Common", "rating": 3.5},
-                    {"name": "Lemon", "desc": "Common", "rating": 3.4},
-                    {"name": "Phulka", "desc": "Main", "rating": 4.1},
-                    {"name": "White Rice", "desc": "Main", "rating": 4.0},
-                    {"name": "Kerala Rice", "desc": "Main", "rating": 4.2},
-                    {"name": "Chana Masala", "desc": "Curry", "rating": 4.4},
-                    {"name": "Arhar Dal", "desc": "Curry", "rating": 4.2},
-                    {"name": "Curd", "desc": "Side", "rating": 4.0}
-                ],
-                "SNACKS": [
-                    {"name": "Tea/Coffee", "desc": "Common", "rating": 3.8},
-                    {"name": "Sugar", "desc": "Common", "rating": 3.0},
-                    {"name": "Onion Kachori", "desc": "Snack", "rating": 4.2},
-                    {"name": "Tomato Ketchup", "desc": "Side", "rating": 3.4},
-                    {"name": "Fried Chilly", "desc": "Side", "rating": 3.7}
-                ],
-                "DINNER": [
-                    {"name": "Appalam", "desc": "Common", "rating": 3.8},
-                    {"name": "Mixed Salad", "desc": "Common", "rating": 3.6},
-                    {"name": "Pickle", "desc": "Common", "rating": 3.7},
-                    {"name": "Egg Fried Rice", "desc": "Non-Veg", "rating": 4.5},
-                    {"name": "Gobhi Fried Rice", "desc": "Veg", "rating": 4.2},
-                    {"name": "Phulka", "desc": "Main", "rating": 4.1},
-                    {"name": "Dal Tadka", "desc": "Curry", "rating": 4.3},
-                    {"name": "Garlic Sauce", "desc": "Side", "rating": 3.6}
-                ]
-            },
-            "TUESDAY": {
-                "BREAKFAST": [
-                    {"name": "Bread", "desc": "Common", "rating": 3.8},
-                    {"name": "Butter", "desc": "Common", "rating": 4.0},
-                    {"name": "Jam", "desc": "Common", "rating": 3.9},
-                    {"name": "Milk", "desc": "Common", "rating": 4.1},
-                    {"name": "Tea/Coffee", "desc": "Common", "rating": 3.9},
-                    {"name": "Masala Dosa", "desc": "Main", "rating": 4.4},
-                    {"name": "Tomato Chutney", "desc": "Side", "rating": 4.0},
-                    {"name": "Sambar", "desc": "Curry", "rating": 4.2}
-                ],
-                "LUNCH": [
-                    {"name": "Puri", "desc": "Main", "rating": 4.2},
-                    {"name": "Aloo Palak", "desc": "Vegetable", "rating": 4.0},
-                    {"name": "Sambar", "desc": "Curry", "rating": 4.2},
-                    {"name": "Ridge Gourd Dry", "desc": "Vegetable", "rating": 3.7},
-                    {"name": "White Rice", "desc": "Main", "rating": 4.0},
-                    {"name": "Buttermilk", "desc": "Drink", "rating": 4.1},
-                    {"name": "Seasonal Fruit", "desc": "Fruit", "rating": 4.0},
-                    {"name": "Kerala Rice", "desc": "Main", "rating": 4.2}
-                ],
-                "SNACKS": [
-                    {"name": "Aloo Bonda", "desc": "Snack", "rating": 4.3},
-                    {"name": "Tomato Ketchup", "desc": "Side", "rating": 3.4}
-                ],
-                "DINNER": [
-                    {"name": "Phulka", "desc": "Main", "rating": 4.1},
-                    {"name": "Chole Masala", "desc": "Curry", "rating": 4.5},
-                    {"name": "Jeera Rice", "desc": "Rice", "rating": 4.2},
-                    {"name": "Dal", "desc": "Curry", "rating": 4.2},
-                    {"name": "Raita Plain", "desc": "Side", "rating": 4.0},
-                    {"name": "Ice Cream", "desc": "Dessert", "rating": 4.6}
-                ]
-            },
-            "WEDNESDAY": {
-                "BREAKFAST": [
-                    {"name": "Dal Kitchdi", "desc": "Main", "rating": 4.0},
-                    {"name": "Coconut Chutney", "desc": "Side", "rating": 4.2},
-                    {"name": "Dahi Boondhi", "desc": "Side", "rating": 3.9},
-                    {"name": "Peanut Butter", "desc": "Side", "rating": 3.8}
-                ],
-                "LUNCH": [
-                    {"name": "Chapathi", "desc": "Main", "rating": 4.1},
-                    {"name": "White Rice", "desc": "Main", "rating": 4.0},
-                    {"name": "Green Peas Masala", "desc": "Vegetable", "rating": 4.0},
-                    {"name": "Tomato Rice", "desc": "Rice", "rating": 4.1},
-                    {"name": "Onion Raita", "desc": "Side", "rating": 3.9},
-                    {"name": "Rasam", "desc": "Soup", "rating": 4.0},
-                    {"name": "Chana Dal Fry", "desc": "Curry", "rating": 4.2}
-                ],
-                "SNACKS": [
-                    {"name": "Masala Chana", "desc": "Snack", "rating": 4.1}
-                ],
-                "DINNER": [
-                    {"name": "Hyderabadi Paneer Dish", "desc": "Veg", "rating": 4.4},
-                    {"name": "Hyderabadi Chicken Masala", "desc": "Non-Veg", "rating": 4.7},
-                    {"name": "White Rice", "desc": "Main", "rating": 4.0},
-                    {"name": "Moong Dal", "desc": "Curry", "rating": 4.1},
-                    {"name": "Lachcha Paratha", "desc": "Main", "rating": 4.3},
-                    {"name": "Laddu", "desc": "Sweet", "rating": 4.5},
-                    {"name": "Lemon", "desc": "Side", "rating": 3.4}
-                ]
-            },
-            "THURSDAY": {
-                "BREAKFAST": [
-                    {"name": "Puri", "desc": "Main", "rating": 4.2},
-                    {"name": "Chana Masala", "desc": "Curry", "rating": 4.4}
-                ],
-                "LUNCH": [
-                    {"name": "Chapathi", "desc": "Main", "rating": 4.1},
-                    {"name": "White Rice", "desc": "Main", "rating": 4.0},
-                    {"name": "Mix Dal", "desc": "Curry", "rating": 4.1},
-                    {"name": "Gobhi Butter Masala", "desc": "Vegetable", "rating": 4.2},
-                    {"name": "Bottle Gourd Dry", "desc": "Vegetable", "rating": 3.6},
-                    {"name": "Curd", "desc": "Side", "rating": 4.0}
-                ],
-                "SNACKS": [
-                    {"name": "Tikki Chat", "desc": "Snack", "rating": 4.2}
-                ],
-                "DINNER": [
-                    {"name": "Sambar", "desc": "Curry", "rating": 4.2},
-                    {"name": "Masala Dosa", "desc": "Main", "rating": 4.4},
-                    {"name": "White Rice", "desc": "Main", "rating": 4.0},
-                    {"name": "Tomato Chutney", "desc": "Side", "rating": 4.0},
-                    {"name": "Coriander Chutney", "desc": "Side", "rating": 4.1},
-                    {"name": "Payasam", "desc": "Sweet", "rating": 4.4},
-                    {"name": "Rasam", "desc": "Soup", "rating": 4.0}
-                ]
-            },
-            "FRIDAY": {
-                "BREAKFAST": [
-                    {"name": "Fried Idly", "desc": "Main", "rating": 4.1},
-                    {"name": "Vada", "desc": "Side", "rating": 4.0},
-                    {"name": "Sambar", "desc": "Curry", "rating": 4.2},
-                    {"name": "Coconut Chutney", "desc": "Side", "rating": 4.2}
-                ],
-                "LUNCH": [
-                    {"name": "Phulka", "desc": "Main", "rating": 4.1},
-                    {"name": "White Rice", "desc": "Main", "rating": 4.0},
-                    {"name": "Kadai Veg", "desc": "Vegetable", "rating": 4.0},
-                    {"name": "Sambar", "desc": "Curry", "rating": 4.2},
-                    {"name": "Potato Cabbage Dry", "desc": "Vegetable", "rating": 3.8},
-                    {"name": "Buttermilk", "desc": "Drink", "rating": 4.1}
-                ],
-                "SNACKS": [
-                    {"name": "Pungulu", "desc": "Snack", "rating": 4.0},
-                    {"name": "Coconut Chutney", "desc": "Side", "rating": 4.2}
-                ],
-                "DINNER": [
-                    {"name": "Chicken Gravy", "desc": "Non-Veg", "rating": 4.6},
-                    {"name": "Paneer Butter Masala", "desc": "Veg", "rating": 4.5},
-                    {"name": "Pulao", "desc": "Rice", "rating": 4.3},
-                    {"name": "Mix Dal", "desc": "Curry", "rating": 4.1},
-                    {"name": "Chapathi", "desc": "Main", "rating": 4.1},
-                    {"name": "Mango Pickle", "desc": "Side", "rating": 3.8},
-                    {"name": "Lemon", "desc": "Side", "rating": 3.4},
-                    {"name": "Jalebi", "desc": "Sweet", "rating": 4.4}
-                ]
-            },
-            "SATURDAY": {
-                "BREAKFAST": [
-                    {"name": "Gobhi Mix Veg Paratha", "desc": "Main", "rating": 4.2},
-                    {"name": "Ketchup", "desc": "Side", "rating": 3.5},
-                    {"name": "Green Coriander Chutney", "desc": "Side", "rating": 4.1},
-                    {"name": "Peanut Butter", "desc": "Side", "rating": 3.8}
-                ],
-                "LUNCH": [
-                    {"name": "Chapathi", "desc": "Main", "rating": 4.1},
-                    {"name": "White Rice", "desc": "Main", "rating": 4.0},
-                    {"name": "Rajma Masala", "desc": "Curry", "rating": 4.4},
-                    {"name": "Green Vegetable Dry", "desc": "Vegetable", "rating": 3.8},
-                    {"name": "Ginger Dal", "desc": "Curry", "rating": 4.1},
-                    {"name": "Gongura Chutney", "desc": "Side", "rating": 3.9},
-                    {"name": "Curd", "desc": "Side", "rating": 4.0}
-                ],
-                "SNACKS": [
-                    {"name": "Samosa", "desc": "Snack", "rating": 4.3},
-                    {"name": "Tomato Ketchup", "desc": "Side", "rating": 3.4},
-                    {"name": "Cold Coffee", "desc": "Drink", "rating": 4.2}
-                ],
-                "DINNER": [
-                    {"name": "Phulka", "desc": "Main", "rating": 4.1},
-                    {"name": "Green Peas Masala", "desc": "Vegetable", "rating": 4.0},
-                    {"name": "White Rice", "desc": "Main", "rating": 4.0},
-                    {"name": "Brinjal Curry", "desc": "Vegetable", "rating": 3.9},
-                    {"name": "Rasam", "desc": "Soup", "rating": 4.0}
-                ]
-            },
-            "SUNDAY": {
-                "BREAKFAST": [
-                    {"name": "Onion Rava Dosa", "desc": "Main", "rating": 4.2},
-                    {"name": "Tomato Chutney", "desc": "Side", "rating": 4.0},
-                    {"name": "Sambar", "desc": "Curry", "rating": 4.2}
-                ],
-                "LUNCH": [
-                    {"name": "Chicken Dum Biryani", "desc": "Non-Veg", "rating": 4.8},
-                    {"name": "Paneer Dum Biryani", "desc": "Veg", "rating": 4.6},
-                    {"name": "Shorba Masala", "desc": "Curry", "rating": 4.2},
-                    {"name": "Onion Raita", "desc": "Side", "rating": 4.0},
-                    {"name": "Aam Panna", "desc": "Drink", "rating": 4.3}
-                ],
-                "SNACKS": [
-                    {"name": "Vada Pav", "desc": "Snack", "rating": 4.4},
-                    {"name": "Fried Green Chilly", "desc": "Side", "rating": 3.7},
-                    {"name": "Green Coriander Chutney", "desc": "Side", "rating": 4.1}
-                ],
-                "DINNER": [
-                    {"name": "Arhar Dal Tadka", "desc": "Curry", "rating": 4.2},
-                    {"name": "Aloo Fry", "desc": "Vegetable", "rating": 4.0},
-                    {"name": "Kadhi Pakoda", "desc": "Curry", "rating": 4.3},
-                    {"name": "Rice", "desc": "Main", "rating": 4.0},
-                    {"name": "Chapati", "desc": "Main", "rating": 4.1},
-                    {"name": "Gulab Jamun", "desc": "Sweet", "rating": 4.5}
-                ]
-            }
-        }
-
-        # WEEK 2 & 4 MENU DATA (from PDF page 2)
-        week1_menu = {
-            "MONDAY": {
-                "BREAKFAST": [
-                    {"name": "Bread", "desc": "Common", "rating": 3.8},
-                    {"name": "Butter", "desc": "Common", "rating": 4.0},
-                    {"name": "Jam", "desc": "Common", "rating": 3.9},
-                    {"name": "Milk", "desc": "Common", "rating": 4.1},
-                    {"name": "Tea/Coffee", "desc": "Common", "rating": 3.9},
-                    {"name": "Aloo Paratha", "desc": "Main", "rating": 4.3},
-                    {"name": "Ketchup", "desc": "Side", "rating": 3.5},
-                    {"name": "Curd", "desc": "Side", "rating": 4.0},
-                    {"name": "Seasonal Fruit", "desc": "Fruit", "rating": 4.0},
-                    {"name": "Mint & Coriander Chutney", "desc": "Side", "rating": 4.1}
-                ],
-                "LUNCH": [
-                    {"name": "Phulka", "desc": "Main", "rating": 4.1},
-                    {"name": "Ghee Rice", "desc": "Rice", "rating": 4.3},
-                    {"name": "Aloo Chana Masala", "desc": "Curry", "rating": 4.2},
-                    {"name": "Soya Chilly", "desc": "Vegetable", "rating": 3.9},
-                    {"name": "Rasam", "desc": "Soup", "rating": 4.0},
-                    {"name": "Chutney", "desc": "Side", "rating": 3.9},
-                    {"name": "Buttermilk", "desc": "Drink", "rating": 4.1}
-                ],
-                "SNACKS": [
-                    {"name": "Macaroni", "desc": "Snack", "rating": 4.0}
-                ],
-                "DINNER": [
-                    {"name": "Paneer Biryani", "desc": "Veg", "rating": 4.5},
-                    {"name": "Egg Biryani", "desc": "Non-Veg", "rating": 4.6},
-                    {"name": "Raita", "desc": "Side", "rating": 4.0},
-                    {"name": "Mutter Masala", "desc": "Vegetable", "rating": 4.1},
-                    {"name": "Chana Dal Tadka", "desc": "Curry", "rating": 4.2},
-                    {"name": "Phulka", "desc": "Main", "rating": 4.1},
-                    {"name": "Makhan Peda", "desc": "Sweet", "rating": 4.4},
-                    {"name": "White Rice", "desc": "Main", "rating": 4.0}
-                ]
-            },
-            "TUESDAY": {
-                "BREAKFAST": [
-                    {"name": "Poha", "desc": "Main", "rating": 4.1},
-                    {"name": "Coriander Chutney", "desc": "Side", "rating": 4.0},
-                    {"name": "Curd", "desc": "Side", "rating": 4.0}
-                ],
-                "LUNCH": [
-                    {"name": "Chola Bhatura", "desc": "Main", "rating": 4.5},
-                    {"name": "Toor Dal Fry", "desc": "Curry", "rating": 4.1},
-                    {"name": "Watermelon", "desc": "Fruit", "rating": 4.2},
-                    {"name": "Aloo Bhindi Dry", "desc": "Vegetable", "rating": 3.8},
-                    {"name": "Lemon Rice", "desc": "Rice", "rating": 4.1},
-                    {"name": "Curd", "desc": "Side", "rating": 4.0}
-                ],
-                "SNACKS": [
-                    {"name": "Bread Pakoda", "desc": "Snack", "rating": 4.2},
-                    {"name": "Sauce", "desc": "Side", "rating": 3.4}
-                ],
-                "DINNER": [
-                    {"name": "Phulka", "desc": "Main", "rating": 4.1},
-                    {"name": "White Rice", "desc": "Main", "rating": 4.0},
-                    {"name": "Methi Dal", "desc": "Curry", "rating": 4.0},
-                    {"name": "Veg White Kurma", "desc": "Vegetable", "rating": 4.1},
-                    {"name": "Ice Cream", "desc": "Dessert", "rating": 4.6}
-                ]
-            },
-            "WEDNESDAY": {
-                "BREAKFAST": [
-                    {"name": "Puttu", "desc": "Main", "rating": 3.9},
-                    {"name": "Kadala Curry", "desc": "Curry", "rating": 4.1},
-                    {"name": "Peanut Butter", "desc": "Side", "rating": 3.8}
-                ],
-                "LUNCH": [
-                    {"name": "Chapathi", "desc": "Main", "rating": 4.1},
-                    {"name": "Methi Dal", "desc": "Curry", "rating": 4.0},
-                    {"name": "Drumstick Gravy", "desc": "Vegetable", "rating": 4.0},
-                    {"name": "Dondakaya Dry", "desc": "Vegetable", "rating": 3.7},
-                    {"name": "Rasam", "desc": "Soup", "rating": 4.0},
-                    {"name": "Buttermilk", "desc": "Drink", "rating": 4.1}
-                ],
-                "SNACKS": [
-                    {"name": "Grilled Sandwich", "desc": "Snack", "rating": 4.2},
-                    {"name": "Tomato Ketchup", "desc": "Side", "rating": 3.4}
-                ],
-                "DINNER": [
-                    {"name": "Kadai Chicken", "desc": "Non-Veg", "rating": 4.6},
-                    {"name": "Kadai Paneer", "desc": "Veg", "rating": 4.4},
-                    {"name": "Pulao", "desc": "Rice", "rating": 4.3},
-                    {"name": "Mix Dal", "desc": "Curry", "rating": 4.1},
-                    {"name": "Tawa Butter Naan", "desc": "Main", "rating": 4.3},
-                    {"name": "Jalebi", "desc": "Sweet", "rating": 4.4},
-                    {"name": "Mango Pickle", "desc": "Side", "rating": 3.8},
-                    {"name": "Lemon", "desc": "Side", "rating": 3.4}
-                ]
-            },
-            "THURSDAY": {
-                "BREAKFAST": [
-                    {"name": "Mini Chola Bhatura", "desc": "Main", "rating": 4.3},
-                    {"name": "Seasonal Fruit", "desc": "Fruit", "rating": 4.0}
-                ],
-                "LUNCH": [
-                    {"name": "Chapathi", "desc": "Main", "rating": 4.1},
-                    {"name": "Mutter Paneer Masala", "desc": "Vegetable", "rating": 4.3},
-                    {"name": "Coriander Rice", "desc": "Rice", "rating": 4.1},
-                    {"name": "Kollu Rasam", "desc": "Soup", "rating": 3.9},
-                    {"name": "Potato Chips", "desc": "Side", "rating": 3.8},
-                    {"name": "Dalpodhi", "desc": "Side", "rating": 3.7},
-                    {"name": "Curd", "desc": "Side", "rating": 4.0}
-                ],
-                "SNACKS": [
-                    {"name": "Cutlet", "desc": "Snack", "rating": 4.2},
-                    {"name": "Tomato Ketchup", "desc": "Side", "rating": 3.4}
-                ],
-                "DINNER": [
-                    {"name": "Phulka", "desc": "Main", "rating": 4.1},
-                    {"name": "Baby Aloo Masala", "desc": "Vegetable", "rating": 4.2},
-                    {"name": "White Rice", "desc": "Main", "rating": 4.0},
-                    {"name": "Dal Thick", "desc": "Curry", "rating": 4.1},
-                    {"name": "Rasam", "desc": "Soup", "rating": 4.0},
-                    {"name": "Halwa Mix", "desc": "Sweet", "rating": 4.3}
-                ]
-            },
-            "FRIDAY": {
-                "BREAKFAST": [
-                    {"name": "Dal Dosa", "desc": "Main", "rating": 4.2},
-                    {"name": "Sambar", "desc": "Curry", "rating": 4.2},
-                    {"name": "Tomato Chutney", "desc": "Side", "rating": 4.0},
-                    {"name": "Peanut Butter", "desc": "Side", "rating": 3.8}
-                ],
-                "LUNCH": [
-                    {"name": "Phulka", "desc": "Main", "rating": 4.1},
-                    {"name": "Navadhanya Masala", "desc": "Vegetable", "rating": 4.0},
-                    {"name": "Sambar", "desc": "Curry", "rating": 4.2},
-                    {"name": "Rasam", "desc": "Soup", "rating": 4.0},
-                    {"name": "Mix Veg Sahi Curry", "desc": "Vegetable", "rating": 4.1},
-                    {"name": "Watermelon Juice", "desc": "Drink", "rating": 4.3}
-                ],
-                "SNACKS": [
-                    {"name": "Pani Puri", "desc": "Snack", "rating": 4.4}
-                ],
-                "DINNER": [
-                    {"name": "Chicken Gravy", "desc": "Non-Veg", "rating": 4.6},
-                    {"name": "Paneer Butter Masala", "desc": "Veg", "rating": 4.5},
-                    {"name": "Pulao", "desc": "Rice", "rating": 4.3},
-                    {"name": "Mix Dal", "desc": "Curry", "rating": 4.1},
-                    {"name": "Chapathi", "desc": "Main", "rating": 4.1},
-                    {"name": "Jalebi", "desc": "Sweet", "rating": 4.4},
-                    {"name": "Mango Pickle", "desc": "Side", "rating": 3.8},
-                    {"name": "Lemon", "desc": "Side", "rating": 3.4}
-                ]
-            },
-            "SATURDAY": {
-                "BREAKFAST": [
-                    {"name": "Mix Veg Paratha", "desc": "Main", "rating": 4.2},
-                    {"name": "Curd", "desc": "Side", "rating": 4.0},
-                    {"name": "Ketchup", "desc": "Side", "rating": 3.5}
-                ],
-                "LUNCH": [
-                    {"name": "Chapathi", "desc": "Main", "rating": 4.1},
-                    {"name": "Green Peas Pulav", "desc": "Rice", "rating": 4.2},
-                    {"name": "Spinach Dal", "desc": "Curry", "rating": 4.1},
-                    {"name": "Gobhi Capsicum Dry", "desc": "Vegetable", "rating": 3.8},
-                    {"name": "Butter Masala", "desc": "Curry", "rating": 4.2},
-                    {"name": "Cabbage Chutney", "desc": "Side", "rating": 3.8},
-                    {"name": "Masala Butter Milk", "desc": "Drink", "rating": 4.1}
-                ],
-                "SNACKS": [
-                    {"name": "Samosa", "desc": "Snack", "rating": 4.3},
-                    {"name": "Tomato Ketchup", "desc": "Side", "rating": 3.4},
-                    {"name": "Cold Coffee", "desc": "Drink", "rating": 4.2}
-                ],
-                "DINNER": [
-                    {"name": "Dal Makhani", "desc": "Curry", "rating": 4.5},
-                    {"name": "Gobhi Matar", "desc": "Vegetable", "rating": 4.0},
-                    {"name": "Phulka", "desc": "Main", "rating": 4.1},
-                    {"name": "Tomato Rice", "desc": "Rice", "rating": 4.1},
-                    {"name": "Kheer", "desc": "Sweet", "rating": 4.4}
-                ]
-            },
-            "SUNDAY": {
-                "BREAKFAST": [
-                    {"name": "Andhra Kara Dosa", "desc": "Main", "rating": 4.3},
-                    {"name": "Peanut Chutney", "desc": "Side", "rating": 4.0},
-                    {"name": "Sambar", "desc": "Curry", "rating": 4.2}
-                ],
-                "LUNCH": [
-                    {"name": "Puri", "desc": "Main", "rating": 4.2},
-                    {"name": "Biryani Rice", "desc": "Rice", "rating": 4.7},
-                    {"name": "Chicken Masala Spicy", "desc": "Non-Veg", "rating": 4.8},
-                    {"name": "Paneer Masala Spicy", "desc": "Veg", "rating": 4.6},
-                    {"name": "Chana Dal Tadka", "desc": "Curry", "rating": 4.2},
-                    {"name": "Raita", "desc": "Side", "rating": 4.0},
-                    {"name": "Fruit Juice", "desc": "Drink", "rating": 4.3}
-                ],
-                "SNACKS": [
-                    {"name": "Pav Bhaji", "desc": "Snack", "rating": 4.6}
-                ],
-                "DINNER": [
-                    {"name": "Arhar Dal Tadka", "desc": "Curry", "rating": 4.2},
-                    {"name": "Aloo Fry", "desc": "Vegetable", "rating": 4.0},
-                    {"name": "Kadhi Pakoda", "desc": "Curry", "rating": 4.3},
-                    {"name": "White Rice", "desc": "Main", "rating": 4.0},
-                    {"name": "Chapati", "desc": "Main", "rating": 4.1},
-                    {"name": "Mysore Pak", "desc": "Sweet", "rating": 4.5}
-                ]
-            }
-        }
-
-        # Add menu items to database
-        items_added = 0
-        
-        # Add Week 1 & 3 menu
-        for day, meals in week1_menu.items():
-            for meal_type, items in meals.items():
-                for item_data in items:
-                    menu_item = models.MessMenuItem(
-                        day_of_week=getattr(models.DayOfWeek, day),
-                        meal_type=getattr(models.MealType, meal_type),
-                        menu_week_type=models.MenuWeekType.WEEK_1,
-                        item_name=item_data["name"],
-                        description=item_data["desc"],
-                        rating=item_data["rating"],
-                        votes=random.randint(15, 150)
-                    )
-                    db.add(menu_item)
-                    items_added += 1
-
-        # Add Week 2 & 4 menu
-        for day, meals in week2_menu.items():
-            for meal_type, items in meals.items():
-                for item_data in items:
-                    menu_item = models.MessMenuItem(
-                        day_of_week=getattr(models.DayOfWeek, day),
-                        meal_type=getattr(models.MealType, meal_type),
-                        menu_week_type=models.MenuWeekType.WEEK_2,
-                        item_name=item_data["name"],
-                        description=item_data["desc"],
-                        rating=item_data["rating"],
-                        votes=random.randint(15, 150)
-                    )
-                    db.add(menu_item)
-                    items_added += 1
-
-        db.commit()
-        print(f"Successfully added {items_added} mess menu items from PDF data!")
-
-    except Exception as e:
-        db.rollback()
-        print(f"Error populating mess menu data: {e}")
-        raise
-
-
 # ================ AUTH ENDPOINTS ================
 @app.post("/register/", response_model=dict)
 async def register(user: UserCreate, db: Session = Depends(get_db)):
@@ -1102,7 +606,14 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
     
     otp = generate_otp()
     otp_expiry = datetime.utcnow() + timedelta(minutes=10)
-    hashed_password = get_password_hash(user.password)
+    try:
+        hashed_password = await passwords.hash_password(user.password)
+    except passwords.HasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-ups in progress. Please try again shortly.",
+            headers={"Retry-After": "1"}
+        )
     
     db_user = models.User(
         email=user.email,
@@ -1170,12 +681,26 @@ async def login(login_data: UserLogin, db: Session = Depends(get_db)):
             detail="Account not verified. Please verify your email first."
         )
     
-    if not verify_password(login_data.password, db_user.hashed_password):
+    try:
+        valid, new_hash = await passwords.verify_password(login_data.password, db_user.hashed_password)
+    except passwords.HasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many logins in progress. Please try again shortly.",
+            headers={"Retry-After": "1"}
+        )
+    
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, 
             detail="Incorrect password."
         )
     
+    if new_hash:
+        # Stored with an outdated cost; upgrade it now that we know the password
+        db_user.hashed_password = new_hash
+        db.commit()
+    
     access_token = create_access_token(
         data={"sub": db_user.email, "user_id": db_user.id},
         expires_delta=timedelta(days=7)
@@ -1717,33 +1242,10 @@ async def delete_grade_entry(entry_id: int, db: Session = Depends(get_db)):
 
 # ================ MESS MENU ENDPOINTS ================
 @app.get("/mess-menu/week/{day_of_week}")
-async def get_full_day_menu(day_of_week: DayOfWeek, db: Session = Depends(get_db)):
+async def get_full_day_menu(day_of_week: DayOfWeek, request: Request, db: Session = Depends(get_db)):
     try:
-        current_week_type = get_current_menu_week_type()
-        
-        menu_items = db.query(models.MessMenuItem).filter(
-            models.MessMenuItem.day_of_week == getattr(models.DayOfWeek, day_of_week.upper()),
-            models.MessMenuItem.menu_week_type == getattr(models.MenuWeekType, current_week_type)
-        ).order_by(models.MessMenuItem.meal_type, models.MessMenuItem.item_name).all()
-        
-        grouped_menu = {}
-        for item in menu_items:
-            meal_type = item.meal_type.value
-            if meal_type not in grouped_menu:
-                grouped_menu[meal_type] = []
-            grouped_menu[meal_type].append({
-                "id": item.id,
-                "item_name": item.item_name,
-                "description": item.description,
-                "rating": item.rating,
-                "votes": item.votes
-            })
-        
-        return {
-            "day": day_of_week,
-            "week_type": current_week_type,
-            "meals": grouped_menu
-        }
+        entry = menu_cache.get(db, day_of_week.value)
+        return menu_response(request, entry)
     except Exception as e:
         print(f"Error fetching full day menu for {day_of_week}: {e}")
         raise HTTPException(
@@ -1752,40 +1254,10 @@ async def get_full_day_menu(day_of_week: DayOfWeek, db: Session = Depends(get_db
         )
 
 @app.get("/mess-menu/weekly")
-async def get_weekly_menu(db: Session = Depends(get_db)):
+async def get_weekly_menu(request: Request, db: Session = Depends(get_db)):
     try:
-        current_week_type = get_current_menu_week_type()
-        
-        menu_items = db.query(models.MessMenuItem).filter(
-            models.MessMenuItem.menu_week_type == getattr(models.MenuWeekType, current_week_type)
-        ).order_by(
-            models.MessMenuItem.day_of_week, 
-            models.MessMenuItem.meal_type, 
-            models.MessMenuItem.item_name
-        ).all()
-        
-        weekly_menu = {}
-        for item in menu_items:
-            day = item.day_of_week.value
-            meal_type = item.meal_type.value
-            
-            if day not in weekly_menu:
-                weekly_menu[day] = {}
-            if meal_type not in weekly_menu[day]:
-                weekly_menu[day][meal_type] = []
-                
-            weekly_menu[day][meal_type].append({
-                "id": item.id,
-                "item_name": item.item_name,
-                "description": item.description,
-                "rating": item.rating,
-                "votes": item.votes
-            })
-        
-        return {
-            "week_type": current_week_type,
-            "weekly_menu": weekly_menu
-        }
+        entry = menu_cache.get(db)
+        return menu_response(request, entry)
     except Exception as e:
         print(f"Error fetching weekly menu: {e}")
         raise HTTPException(
@@ -1799,7 +1271,7 @@ async def add_mess_menu_item(item: MessMenuItemCreate, db: Session = Depends(get
         db_item = models.MessMenuItem(
             day_of_week=getattr(models.DayOfWeek, item.day_of_week.upper()),
             meal_type=getattr(models.MealType, item.meal_type.upper()),
-            menu_week_type=getattr(models.MenuWeekType, item.menu_week_type.replace(" ", "_")),
+            menu_week_type=getattr(models.MenuWeekType, item.menu_week_type.upper().replace(" ", "_")),
             item_name=item.item_name,
             description=item.description,
             rating=item.rating,
@@ -1808,6 +1280,7 @@ async def add_mess_menu_item(item: MessMenuItemCreate, db: Session = Depends(get
         db.add(db_item)
         db.commit()
         db.refresh(db_item)
+        menu_cache.invalidate()
         return db_item
     except Exception as e:
         print(f"Error adding mess menu item '{item.item_name}': {e}")
@@ -1989,20 +1462,33 @@ async def ask_ai(
             "confidence": "error"
         }
 
+@app.post("/ai/ask/stream")
+async def ask_ai_stream(user_id: int, chat: ChatMessage, request: Request):
+    """
+    Ask AI assistant a question, streamed: `token` events as the answer is
+    written, then a `done` event with what /ai/ask returns (contacts,
+    sources, chat_id). Server-sent events, or NDJSON with
+    `Accept: application/x-ndjson`.
+    """
+    # Its own session, released while the agent writes, not one held for the whole stream
+    assistant = AIAssistant(SessionLocal())
+    return stream_events(request, assistant.stream_response(user_id, chat.message))
+
 @app.get("/ai/chat-history/{user_id}")
 async def get_chat_history(
     user_id: int,
     limit: int = 50,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get user's chat history"""
+    """Get user's chat history (`fields=` to pick keys, e.g. `fields=id,message`)"""
     history = db.query(models.ChatHistory).filter(
         models.ChatHistory.user_id == user_id
     ).order_by(
         models.ChatHistory.created_at.desc()
     ).limit(limit).all()
     
-    return [
+    return pick_fields([
         {
             "id": msg.id,
             "message": msg.message,
@@ -2011,7 +1497,7 @@ async def get_chat_history(
             "created_at": msg.created_at.isoformat()
         }
         for msg in reversed(history)
-    ]
+    ], parse_fields(fields))
 
 @app.delete("/ai/chat-history/{user_id}")
 async def clear_chat_history(
@@ -2140,6 +1626,8 @@ async def add_answer_to_knowledge(
             resolved_count += 1
     
     db.commit()
+    # Cached answers to questions this entry now covers are stale
+    answer_cache.cache.invalidate_for_entry(kb_entry)
     
     return {
         "message": "Answer added successfully",
@@ -2176,6 +1664,7 @@ async def get_ai_analytics(db: Session = Depends(get_db)):
         "answered": answered,
         "pending": pending,
         "knowledge_base_entries": kb_entries,
+        "answer_cache": answer_cache.cache.stats(),
         "top_questions": [
             {
                 "question": q.question_text,
@@ -2199,9 +1688,13 @@ async def refresh_knowledge_base(db: Session = Depends(get_db)):
             models.KnowledgeBase.source_url != "admin_added"
         ).delete()
         db.commit()
+        answer_cache.cache.clear("refresh")
         
         # Re-scrape
+        from newapp.web_scraper import scrape_iitpkd_website
         scrape_iitpkd_website(db)
+        # Again, for answers cached from the half-scraped knowledge base
+        answer_cache.cache.clear("refresh")
         
         count = db.query(models.KnowledgeBase).count()
         return {
@@ -2976,36 +2469,17 @@ async def get_courses(user_id: int, db: Session = Depends(get_db)):
 async def root():
     return {"message": "College App API is running", "status": "connected"}
 
-# ================ STARTUP EVENT ================
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database tables and populate data on startup"""
-    db = SessionLocal()
-    try:
-        # Fix database schema
-        fix_database_schema(db)
-        
-        # Fix TodoItem table schema
-        fix_todo_table_schema(db)
-        
-        # Populate mess menu data
-        populate_mess_menu_data(db)
-        
-        # Initialize AI knowledge base
-        kb_count = db.query(models.KnowledgeBase).count()
-        if kb_count == 0:
-            print("Initializing AI knowledge base by scraping IIT Palakkad website...")
-            scrape_iitpkd_website(db)
-            print(f"Knowledge base initialized with {db.query(models.KnowledgeBase).count()} entries")
-        else:
-            print(f"Knowledge base already exists ({kb_count} entries)")
-        
-        print("Database initialized successfully!")
-        
-    except Exception as e:
-        print(f"Error during startup: {e}")
-    finally:
-        db.close()
+# ================ STARTUP DATA ================
+def initialize_knowledge_base(db: Session):
+    """Scrape the IIT Palakkad website into the AI knowledge base if it's empty"""
+    kb_count = db.query(models.KnowledgeBase).count()
+    if kb_count == 0:
+        from newapp.web_scraper import scrape_iitpkd_website
+        print("Initializing AI knowledge base by scraping IIT Palakkad website...")
+        scrape_iitpkd_website(db)
+        print(f"Knowledge base initialized with {db.query(models.KnowledgeBase).count()} entries")
+    else:
+        print(f"Knowledge base already exists ({kb_count} entries)")
 # ================ PYDANTIC MODELS ================
 
 class FollowRequest(BaseModel):
@@ -3593,9 +3067,10 @@ async def get_group_messages(
     group_id: int,
     limit: int = 50,
     offset: int = 0,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get messages from a group"""
+    """Get messages from a group (`fields=` to pick keys)"""
     try:
         messages = db.query(models.ChatMessage).filter(
             models.ChatMessage.group_id == group_id
@@ -3616,7 +3091,7 @@ async def get_group_messages(
                 "created_at": msg.created_at.isoformat()
             })
         
-        return result
+        return pick_fields(result, parse_fields(fields))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 # ================ ENHANCED CHAT ENDPOINTS ================
@@ -4034,9 +3509,14 @@ async def get_feed(
     user_id: int,
     limit: int = 20,
     offset: int = 0,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get feed for a user (posts from followed users + own posts)"""
+    """
+    Get feed for a user (posts from followed users + own posts)
+    
+    `fields=` picks keys, nested ones dotted: `fields=id,content,author.full_name`
+    """
     try:
         # Get followed users
         following = db.query(models.Follow).filter(
@@ -4079,7 +3559,7 @@ async def get_feed(
                 "created_at": post.created_at.isoformat()
             })
         
-        return result
+        return pick_fields(result, parse_fields(fields))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -4774,38 +4254,72 @@ async def search_users(
 @app.get("/notifications/{user_id}")
 async def get_notifications(
     user_id: int,
+    response: Response,
     unread_only: bool = False,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get user notifications"""
+    """
+    Get user notifications, newest first
+    
+    Pages of `limit` (max 200); pass the `X-Next-Cursor` response header
+    back as `cursor` for the next page. `X-Unread-Count` carries the badge count.
+    `fields=` picks keys, e.g. `fields=id,title,is_read`.
+    """
     try:
-        query = db.query(models.Notification).filter(
-            models.Notification.user_id == user_id
-        )
-        
-        if unread_only:
-            query = query.filter(models.Notification.is_read == False)
-        
-        notifications = query.order_by(
-            models.Notification.created_at.desc()
-        ).all()
+        try:
+            page = notification_inbox.list_notifications(
+                db, user_id, limit=limit, cursor=cursor, unread_only=unread_only
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
         
-        return [
-            {
-                "id": n.id,
-                "type": n.type.value,
-                "title": n.title,
-                "message": n.message,
-                "related_id": n.related_id,
-                "is_read": n.is_read,
-                "created_at": n.created_at.isoformat()
-            }
-            for n in notifications
-        ]
+        if page["next_cursor"]:
+            response.headers["X-Next-Cursor"] = page["next_cursor"]
+        response.headers["X-Unread-Count"] = str(page["unread_count"])
+        return pick_fields(page["notifications"], parse_fields(fields))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Get notifications error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/notifications/{user_id}/unread-count")
+async def get_unread_notification_count(
+    user_id: int,
+    db: Session = Depends(get_db)
+):
+    """Badge count, read from the maintained counter"""
+    try:
+        return {"unread_count": notification_inbox.get_unread_count(db, user_id)}
+    except Exception as e:
+        print(f"Get unread count error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/notifications/{user_id}/stream")
+async def stream_notifications(
+    user_id: int,
+    db: Session = Depends(get_db)
+):
+    """Server-sent events: the unread count, then each new notification as it's created"""
+    try:
+        queue = notification_inbox.hub.subscribe(user_id)
+        try:
+            unread_count = notification_inbox.get_unread_count(db, user_id)
+        except Exception:
+            notification_inbox.hub.unsubscribe(user_id, queue)
+            raise
+        return StreamingResponse(
+            notification_inbox.stream(user_id, unread_count, queue),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    except Exception as e:
+        print(f"Notification stream error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.put("/notifications/{notification_id}/read")
 async def mark_notification_read(
     notification_id: int,
@@ -4838,12 +4352,8 @@ async def mark_all_notifications_read(
 ):
     """Mark all notifications as read for a user"""
     try:
-        db.query(models.Notification).filter(
-            models.Notification.user_id == user_id,
-            models.Notification.is_read == False
-        ).update({"is_read": True})
-        
-        db.commit()
+        # Moves the read watermark; individual rows are left untouched
+        notification_inbox.mark_all_read(db, user_id)
         
         return {"message": "All notifications marked as read"}
     except Exception as e:
@@ -4943,74 +4453,92 @@ def get_relative_time(dt: datetime) -> str:
     else:
         return "Just now"
 
+def seller_avatar(full_name: str) -> str:
+    return f"https://api.dicebear.com/7.x/avataaars/svg?seed={full_name}"
+
 # Get all marketplace items
 @app.get("/marketplace/items", response_model=List[MarketplaceItemResponse])
 async def get_marketplace_items(
+    request: Request,
     category: str = Query("all"),
     search: str = Query(""),
     user_id: Optional[int] = Query(None),
+    fields: Optional[str] = Query(None),
     db: Session = Depends(get_db)
 ):
+    """
+    Active listings, newest first
+    
+    Streamed from a server-side cursor as a JSON array, or as NDJSON with
+    `Accept: application/x-ndjson`. `fields=id,title,price,seller.name`
+    returns only those keys.
+    """
     try:
         print(f"Getting marketplace items - category: {category}, user_id: {user_id}")
-        query = db.query(models.MarketplaceItem).filter(
-            models.MarketplaceItem.status == 'active'
-        )
+        items = models.MarketplaceItem.__table__
+        sellers = models.User.__table__
+        query = select(
+            items.c.id, items.c.title, items.c.description, items.c.price,
+            items.c.category, items.c.condition, items.c.location, items.c.images,
+            items.c.views, items.c.is_negotiable, items.c.created_at, items.c.seller_id,
+            sellers.c.full_name.label("seller_name"), sellers.c.department.label("seller_department")
+        ).join(sellers, sellers.c.id == items.c.seller_id).where(items.c.status == 'active')
         
         if category != 'all':
-            query = query.filter(models.MarketplaceItem.category == category)
+            query = query.where(items.c.category == category)
         
         if search:
-            query = query.filter(
+            query = query.where(
                 or_(
-                    models.MarketplaceItem.title.ilike(f"%{search}%"),
-                    models.MarketplaceItem.description.ilike(f"%{search}%")
+                    items.c.title.ilike(f"%{search}%"),
+                    items.c.description.ilike(f"%{search}%")
                 )
             )
         
-        items = query.order_by(models.MarketplaceItem.created_at.desc()).all()
-        
-        result = []
-        for item in items:
-            is_saved = False
-            if user_id:
-                is_saved = db.query(models.SavedItem).filter(
-                    models.SavedItem.user_id == user_id, 
-                    models.SavedItem.item_id == item.id
-                ).first() is not None
-            
-            posted_date = get_relative_time(item.created_at)
-            
-            seller_items_sold = db.query(models.MarketplaceItem).filter(
-                models.MarketplaceItem.seller_id == item.seller_id, 
-                models.MarketplaceItem.status == 'sold'
-            ).count()
-            
-            result.append(MarketplaceItemResponse(
-                id=item.id,
-                title=item.title,
-                description=item.description,
-                price=item.price,
-                category=item.category,
-                condition=item.condition,
-                location=item.location,
-                images=item.images or [],
-                views=item.views,
-                isNegotiable=item.is_negotiable,
-                isSaved=is_saved,
-                postedDate=posted_date,
-                seller=SellerInfo(
-                    id=item.seller.id,
-                    name=item.seller.full_name,
-                    avatar=f"https://api.dicebear.com/7.x/avataaars/svg?seed={item.seller.full_name}",
-                    college=item.seller.department,
-                    verified=True,
-                    rating=4.5,
-                    itemsSold=seller_items_sold
-                )
-            ))
+        # Per-item lookups, loaded once up front instead of two queries per item
+        saved_ids = set()
+        if user_id:
+            saved_ids = set(db.execute(
+                select(models.SavedItem.item_id).where(models.SavedItem.user_id == user_id)
+            ).scalars())
+        items_sold = dict(db.execute(
+            select(items.c.seller_id, func.count())
+            .where(items.c.status == 'sold')
+            .group_by(items.c.seller_id)
+        ).all())
+        
+        def serialize(item):
+            return {
+                "id": item.id,
+                "title": item.title,
+                "description": item.description,
+                "price": item.price,
+                "category": item.category,
+                "condition": item.condition,
+                "location": item.location,
+                "images": item.images or [],
+                "views": item.views or 0,
+                "isNegotiable": bool(item.is_negotiable),
+                "isSaved": item.id in saved_ids,
+                "postedDate": get_relative_time(item.created_at),
+                "seller": {
+                    "id": item.seller_id,
+                    "name": item.seller_name,
+                    "avatar": seller_avatar(item.seller_name),
+                    "college": item.seller_department,
+                    "verified": True,
+                    "rating": 4.5,
+                    "itemsSold": items_sold.get(item.seller_id, 0)
+                }
+            }
         
-        return result
+        return stream_rows(
+            request,
+            query.order_by(items.c.created_at.desc(), items.c.id.desc()),
+            serialize,
+            name="marketplace items",
+            fields=fields
+        )
         
     except Exception as e:
         print(f"ERROR in get_marketplace_items:")
@@ -5066,7 +4594,7 @@ async def get_item_details(
             seller=SellerInfo(
                 id=item.seller.id,
                 name=item.seller.full_name,
-                avatar=f"https://api.dicebear.com/7.x/avataaars/svg?seed={item.seller.full_name}",
+                avatar=seller_avatar(item.seller.full_name),
                 college=item.seller.department,
                 verified=True,
                 rating=4.5,
@@ -5607,21 +5135,9 @@ async def send_message(
         print(f"ERROR in send_message:")
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
-# Add this function
-def initialize_admin():
-    """Initialize default admin on startup"""
-    try:
-        create_default_admin()
-    except Exception as e:
-        print(f"Admin initialization failed: {e}")
-
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
-else:
-    # Auto-create admin when module is imported
-    initialize_admin()
 
 # from fastapi import FastAPI, Depends, HTTPException, status
 # from fastapi.middleware.cors import CORSMiddleware
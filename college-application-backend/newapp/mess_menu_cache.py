@@ -0,0 +1,176 @@
+# mess_menu_cache.py
+"""
+Precomputed mess menu responses.
+
+The menu only changes when an item is added (or the seed data is loaded), and
+the served week type only flips at the ISO week boundary. So we render each
+(week type, day) view once to JSON bytes and keep it until either a write
+bumps the version or the week rolls over.
+
+Last-Modified is the newest item's timestamp or the start of the current
+week, whichever is later: the rollover can switch to a menu whose items are
+all older than what a client already has, and If-Modified-Since must not
+answer that with a 304.
+"""
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+
+from . import models
+
+WEEKLY = "weekly"
+
+
+def week_type_for(now: datetime) -> str:
+    """Week 1 menu on odd ISO weeks, Week 2 menu on even ones"""
+    week_number = now.isocalendar().week
+    if week_number % 4 in [1, 3]:
+        return "WEEK_1"
+    return "WEEK_2"
+
+
+def next_rollover(now: datetime) -> datetime:
+    """Start of the next ISO week (Monday 00:00 UTC), when the week type flips"""
+    start_of_today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start_of_today + timedelta(days=7 - now.weekday())
+
+
+class CachedMenu:
+    def __init__(self, body: bytes, last_modified: datetime, expires_at: datetime):
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+
+class MessMenuCache:
+    """Rendered menu views keyed by (week type, day)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], CachedMenu] = {}
+        self._version = 0
+        self._week_type: Optional[str] = None
+        self._rollover_at: Optional[datetime] = None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def current_week_type(self, now: Optional[datetime] = None) -> str:
+        """Week type, recomputed only once the rollover instant has passed"""
+        now = now or datetime.utcnow()
+        if self._rollover_at is None or now >= self._rollover_at:
+            with self._lock:
+                self._week_type = week_type_for(now)
+                self._rollover_at = next_rollover(now)
+                # Entries for the previous week type can't be served any more
+                self._entries.clear()
+        return self._week_type
+
+    def invalidate(self):
+        """Drop every rendered view; call after any write to mess_menu_items"""
+        with self._lock:
+            self._entries.clear()
+            self._version += 1
+
+    def get(self, db: Session, day: str = WEEKLY, now: Optional[datetime] = None) -> CachedMenu:
+        week_type = self.current_week_type(now)
+        key = (week_type, day)
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+
+        version = self._version
+        entry = self._render(db, week_type, day, self._rollover_at)
+        with self._lock:
+            # A write landed while we were rendering; don't cache stale bytes
+            if version == self._version and week_type == self._week_type:
+                self._entries[key] = entry
+        return entry
+
+    def _render(self, db: Session, week_type: str, day: str, rollover_at: datetime) -> CachedMenu:
+        query = db.query(models.MessMenuItem).filter(
+            models.MessMenuItem.menu_week_type == getattr(models.MenuWeekType, week_type)
+        )
+        if day != WEEKLY:
+            query = query.filter(
+                models.MessMenuItem.day_of_week == getattr(models.DayOfWeek, day.upper())
+            )
+        menu_items = query.order_by(
+            models.MessMenuItem.day_of_week,
+            models.MessMenuItem.meal_type,
+            models.MessMenuItem.item_name
+        ).all()
+
+        grouped = {}
+        # The week type took effect at the last rollover; nothing served before then is current
+        last_modified = rollover_at - timedelta(days=7)
+        for item in menu_items:
+            meals = grouped
+            if day == WEEKLY:
+                meals = grouped.setdefault(item.day_of_week.value, {})
+            meals.setdefault(item.meal_type.value, []).append({
+                "id": item.id,
+                "item_name": item.item_name,
+                "description": item.description,
+                "rating": item.rating,
+                "votes": item.votes
+            })
+            stamp = item.updated_at or item.created_at
+            if stamp is not None:
+                stamp = stamp.replace(tzinfo=None)
+                if stamp > last_modified:
+                    last_modified = stamp
+
+        if day == WEEKLY:
+            payload = {"week_type": week_type, "weekly_menu": grouped}
+        else:
+            payload = {"day": day, "week_type": week_type, "meals": grouped}
+
+        return CachedMenu(
+            body=json.dumps(payload, separators=(",", ":")).encode("utf-8"),
+            last_modified=last_modified.replace(microsecond=0),
+            expires_at=rollover_at,
+        )
+
+
+def _http_date(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def menu_response(request: Request, entry: CachedMenu) -> Response:
+    """Serve a cached menu, answering conditional GETs with 304"""
+    max_age = max(0, int((entry.expires_at - datetime.utcnow()).total_seconds()))
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": _http_date(entry.last_modified),
+        "Cache-Control": f"public, max-age={max_age}, must-revalidate",
+        "Expires": _http_date(entry.expires_at),
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if entry.etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).replace(tzinfo=None)
+                if entry.last_modified <= since:
+                    return Response(status_code=304, headers=headers)
+            except (TypeError, ValueError):
+                pass
+
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+menu_cache = MessMenuCache()
@@ -0,0 +1,112 @@
+# metrics.py
+"""
+HTTP metrics in Prometheus text format, served at GET /metrics.
+
+RequestMetricsMiddleware records, per route template (e.g.
+"/clubs/{club_id}", so path parameters don't explode label cardinality):
+latency histogram, response size histogram and request count by status
+code, plus a global in-flight gauge. Labelled children are cached per
+(method, route, status) so the hot path is a dict lookup and a few adds.
+"""
+import time
+from typing import Dict, Tuple
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from .query_metrics import N_PLUS_ONE_THRESHOLD, n_plus_one_report
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+http_request_duration = Histogram(
+    "app_http_request_duration_seconds",
+    "Request latency by route template",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+http_response_size = Histogram(
+    "app_http_response_size_bytes",
+    "Response body size by route template",
+    ["method", "route"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+http_requests = Counter(
+    "app_http_requests_total",
+    "Requests by route template and status code",
+    ["method", "route", "status"],
+)
+http_requests_in_flight = Gauge(
+    "app_http_requests_in_flight",
+    "Requests currently being handled",
+)
+
+_children: Dict[Tuple[str, str], tuple] = {}
+_status_children: Dict[Tuple[str, str, int], Counter] = {}
+
+
+def route_template(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _observe(method: str, route: str, status: int, elapsed: float, size: int):
+    key = (method, route)
+    children = _children.get(key)
+    if children is None:
+        children = (http_request_duration.labels(method, route), http_response_size.labels(method, route))
+        _children[key] = children
+    children[0].observe(elapsed)
+    children[1].observe(size)
+
+    status_key = (method, route, status)
+    counter = _status_children.get(status_key)
+    if counter is None:
+        counter = http_requests.labels(method, route, str(status))
+        _status_children[status_key] = counter
+    counter.inc()
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording latency, size and status per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            _observe(scope["method"], route_template(scope), status,
+                     time.perf_counter() - started, size)
+
+
+@router.get("")
+async def prometheus_metrics():
+    """All app metrics in Prometheus text format"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@router.get("/queries")
+async def query_report():
+    """Routes that repeated a statement shape (likely N+1), worst count per shape"""
+    return {
+        "threshold": N_PLUS_ONE_THRESHOLD,
+        "routes": n_plus_one_report()
+    }
@@ -10,6 +10,7 @@ from sqlalchemy import (
     Date,
     ForeignKey,
     UniqueConstraint,
+    Index,
     JSON,
     or_,
     and_,
@@ -331,6 +332,8 @@ class NotificationType(enum.Enum):
     DISCUSSION_REPLY = "discussion_reply"
     EVENT_REMINDER = "event_reminder"
     ADMIN_BROADCAST = "admin_broadcast"
+    CLUB_ANNOUNCEMENT = "club_announcement"
+    CLUB_EVENT = "club_event"
 
 class DiscussionVisibility(enum.Enum):
     PUBLIC = "public"
@@ -482,6 +485,22 @@ class Notification(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="notifications")
+    
+    # Per-user inbox reads, fan-out dedupe and rate limiting
+    __table_args__ = (
+        Index("ix_notifications_user_created", "user_id", "created_at"),
+    )
+
+class NotificationInbox(Base):
+    """Per-user unread badge count and "read all" watermark"""
+    __tablename__ = "notification_inbox"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0)
+    # Every notification with id <= read_through_id counts as read
+    read_through_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class DiscussionParticipant(Base):
     __tablename__ = "discussion_participants"
     
@@ -606,6 +625,15 @@ class AdminUser(Base):
     user = relationship("User", backref="admin_profile")
     created_by_admin = relationship("AdminUser", remote_side=[id], backref="created_admins")
 
+class RevokedToken(Base):
+    """Admin JWTs revoked before their expiry (logout); rows go once the token would have expired"""
+    __tablename__ = "revoked_tokens"
+    
+    jti = Column(String(64), primary_key=True)
+    admin_id = Column(Integer, ForeignKey("admin_users.id", ondelete="CASCADE"), nullable=True)
+    revoked_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
 class AdminActivityLog(Base):
     __tablename__ = "admin_activity_logs"
     
@@ -619,6 +647,33 @@ class AdminActivityLog(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     admin = relationship("AdminUser", backref="activity_logs")
+    
+    # Keyset pagination (newest first) and the admin/action filters
+    __table_args__ = (
+        Index("ix_admin_activity_logs_created_id", "created_at", "id"),
+        Index("ix_admin_activity_logs_admin_created", "admin_id", "created_at"),
+        Index("ix_admin_activity_logs_action_created", "action", "created_at"),
+    )
+
+
+class AdminMetricsDaily(Base):
+    """Dashboard counters, one row per day; today's row is the live snapshot"""
+    __tablename__ = "admin_metrics_daily"
+    
+    day = Column(Date, primary_key=True)
+    total_users = Column(Integer, nullable=False, default=0)
+    new_users = Column(Integer, nullable=False, default=0)
+    total_clubs = Column(Integer, nullable=False, default=0)
+    total_events = Column(Integer, nullable=False, default=0)
+    total_posts = Column(Integer, nullable=False, default=0)
+    total_marketplace_items = Column(Integer, nullable=False, default=0)
+    total_discussions = Column(Integer, nullable=False, default=0)
+    total_courses = Column(Integer, nullable=False, default=0)
+    active_admins = Column(Integer, nullable=False, default=0)
+    active_chats = Column(Integer, nullable=False, default=0)
+    pending_follow_requests = Column(Integer, nullable=False, default=0)
+    reconciled_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
 
@@ -658,6 +713,8 @@ class ClubEvent(Base):
     image_url = Column(String, nullable=True)
     registration_required = Column(Boolean, default=False)
     max_participants = Column(Integer, nullable=True)
+    # Free seats, decremented atomically on registration; NULL = no limit
+    seats_remaining = Column(Integer, nullable=True)
     status = Column(String, default="scheduled")  # scheduled, ongoing, completed, cancelled
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -666,6 +723,7 @@ class ClubEvent(Base):
     club = relationship("Club", back_populates="events")
     registrations = relationship("EventRegistration", back_populates="event", cascade="all, delete-orphan")
     likes = relationship("EventLike", back_populates="event", cascade="all, delete-orphan")
+    waitlist = relationship("EventWaitlist", back_populates="event", cascade="all, delete-orphan")
 
 
 class ClubAnnouncement(Base):
@@ -736,6 +794,25 @@ class EventLike(Base):
     )
 
 
+class EventWaitlist(Base):
+    __tablename__ = "event_waitlist"
+    
+    # Autoincrement id doubles as the FIFO position
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(Integer, ForeignKey("club_events.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    event = relationship("ClubEvent", back_populates="waitlist")
+    user = relationship("User", backref="event_waitlist_entries")
+    
+    # Constraints
+    __table_args__ = (
+        UniqueConstraint('event_id', 'user_id', name='unique_event_waitlist'),
+    )
+
+
 # ==================== COURSE MANAGEMENT MODELS ====================
 
 class CourseCatalog(Base):
@@ -905,6 +982,49 @@ class WellnessEntry(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, 
                        onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # One entry per user per day; check-ins upsert on it
+        Index("uq_wellness_entries_user_date", "user_id", "date", unique=True),
+    )
+
+
+class WellnessStats(Base):
+    """Per-user rolling wellness aggregates, maintained by wellness_stats.py"""
+    __tablename__ = "wellness_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    # Window moments, streak, weekday and month accumulators as of `state["end"]`
+    state = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ActivityDaily(Base):
+    """Per-user activity counters for one day, maintained by activity_rollups.py"""
+    __tablename__ = "activity_daily"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    messages_sent = Column(Integer, nullable=False, default=0)
+    todos_created = Column(Integer, nullable=False, default=0)
+    todos_completed = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ActivityLevels(Base):
+    """Per-user current activity levels (pending todos, classes per weekday), see activity_rollups.py"""
+    __tablename__ = "activity_levels"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    todos_pending = Column(Integer, nullable=False, default=0)
+    classes_monday = Column(Integer, nullable=False, default=0)
+    classes_tuesday = Column(Integer, nullable=False, default=0)
+    classes_wednesday = Column(Integer, nullable=False, default=0)
+    classes_thursday = Column(Integer, nullable=False, default=0)
+    classes_friday = Column(Integer, nullable=False, default=0)
+    classes_saturday = Column(Integer, nullable=False, default=0)
+    classes_sunday = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 
 class DailyAnalysis(Base):
     """AI-generated daily behavior analysis"""
@@ -943,6 +1063,11 @@ class DailyAnalysis(Base):
     
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # One analysis per user per day; the daily-analysis worker upserts on it
+        Index("uq_daily_analyses_user_date", "user_id", "analysis_date", unique=True),
+    )
+
 
 class BehaviorPattern(Base):
     """Monthly/weekly patterns in user behavior"""
@@ -1015,6 +1140,21 @@ class ChatAnalysis(Base):
     
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Per-user daily aggregates; chat_sentiment.py upserts on it
+        Index("uq_chat_analyses_user_date", "user_id", "analysis_date", unique=True),
+    )
+
+
+class MessageSentiment(Base):
+    """TextBlob scores per chat message, cached by chat_sentiment.py"""
+    __tablename__ = "message_sentiments"
+
+    message_id = Column(Integer, ForeignKey("chat_messages.id", ondelete="CASCADE"), primary_key=True)
+    polarity = Column(Float, nullable=False)  # -1 to 1
+    subjectivity = Column(Float, nullable=False)  # 0 to 1
+    scored_at = Column(DateTime, default=datetime.utcnow)
+
 
 class CounselorForm(Base):
     """Form submissions from mental health counseling page"""
@@ -1070,6 +1210,11 @@ class RiskAssessment(Base):
     # Alert details
     triggered_alerts = Column(Text)  # JSON array
 
+    __table_args__ = (
+        # Latest assessment per user (/admin/wellness/at-risk)
+        Index("ix_risk_assessments_user_id_id", "user_id", "id"),
+    )
+
 
 class StudyBuddyMatch(Base):
     """Study buddy matching results"""
@@ -1102,4 +1247,14 @@ class UserLocation(Base):
     last_updated = Column(DateTime, default=datetime.utcnow)
     
     # Add the relationship with back_populates
-    user = relationship("User", back_populates="user_locations")
\ No newline at end of file
+    user = relationship("User", back_populates="user_locations")
+
+# ==================== APP METADATA ====================
+
+class AppMeta(Base):
+    """Key/value bookkeeping for the app itself (schema version, seed hashes, ...)"""
+    __tablename__ = "app_meta"
+
+    key = Column(String(100), primary_key=True)
+    value = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,163 @@
+# notification_fanout.py
+"""
+Fan-out of club announcements and events to follower notifications.
+
+Handlers schedule `fan_out_to_followers` as a BackgroundTask, so it runs
+after the response has been sent. Followers are read in keyset chunks of
+CHUNK_SIZE ids and each chunk becomes a single Core executemany INSERT in
+its own short transaction, so a club with thousands of followers never
+holds a long write lock or loads every follower at once.
+
+Per chunk, users are skipped if they:
+  - already have a notification of the same type for the same item (a
+    retried or duplicated fan-out doesn't notify twice)
+  - have received RATE_LIMIT club notifications within RATE_WINDOW
+  - are the author
+
+Recipients' unread counters move in the same transaction as the insert, and
+the new rows are pushed to any open notification stream once it commits.
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional
+
+from prometheus_client import Counter, Histogram
+from sqlalchemy import func, insert, select
+
+from . import models, notification_inbox
+from .database import engine
+
+CHUNK_SIZE = 1000
+RATE_LIMIT = 20
+RATE_WINDOW = timedelta(hours=1)
+
+CLUB_NOTIFICATION_TYPES = [
+    models.NotificationType.CLUB_ANNOUNCEMENT,
+    models.NotificationType.CLUB_EVENT,
+]
+
+fanout_notifications = Counter(
+    "app_notification_fanout_rows_total",
+    "Notification rows written by club fan-out",
+    ["type"],
+)
+fanout_skipped = Counter(
+    "app_notification_fanout_skipped_total",
+    "Followers skipped by club fan-out",
+    ["reason"],
+)
+fanout_duration = Histogram(
+    "app_notification_fanout_seconds",
+    "Wall time of one club fan-out",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+followers = models.ClubFollower.__table__
+notifications = models.Notification.__table__
+
+
+def follower_chunks(club_id: int, chunk_size: int = CHUNK_SIZE) -> Iterator[List[int]]:
+    """Follower user ids in keyset-paginated chunks"""
+    last_id = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(followers.c.id, followers.c.user_id)
+                .where(followers.c.club_id == club_id, followers.c.id > last_id)
+                .order_by(followers.c.id)
+                .limit(chunk_size)
+            ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield [row.user_id for row in rows]
+
+
+def _filter_recipients(conn, user_ids: List[int], type: models.NotificationType,
+                       related_id: Optional[int], now: datetime):
+    already = set(conn.execute(
+        select(notifications.c.user_id).where(
+            notifications.c.user_id.in_(user_ids),
+            notifications.c.type == type,
+            notifications.c.related_id == related_id,
+        )
+    ).scalars())
+    recent = dict(conn.execute(
+        select(notifications.c.user_id, func.count())
+        .where(
+            notifications.c.user_id.in_(user_ids),
+            notifications.c.type.in_(CLUB_NOTIFICATION_TYPES),
+            notifications.c.created_at >= now - RATE_WINDOW,
+        )
+        .group_by(notifications.c.user_id)
+    ).all())
+
+    recipients = []
+    for user_id in user_ids:
+        if user_id in already:
+            fanout_skipped.labels("duplicate").inc()
+        elif recent.get(user_id, 0) >= RATE_LIMIT:
+            fanout_skipped.labels("rate_limited").inc()
+        else:
+            recipients.append(user_id)
+    return recipients
+
+
+def fan_out_to_followers(club_id: int, type: models.NotificationType, title: str,
+                         message: str, related_id: Optional[int] = None,
+                         exclude_user_id: Optional[int] = None) -> dict:
+    """Notify every follower of `club_id`; returns counts and throughput"""
+    started = time.perf_counter()
+    written = skipped = 0
+
+    try:
+        for user_ids in follower_chunks(club_id):
+            if exclude_user_id is not None:
+                user_ids = [user_id for user_id in user_ids if user_id != exclude_user_id]
+            if not user_ids:
+                continue
+
+            now = datetime.utcnow()
+            inserted, moved = [], set()
+            with engine.begin() as conn:
+                recipients = _filter_recipients(conn, user_ids, type, related_id, now)
+                if recipients:
+                    inserted = conn.execute(
+                        insert(notifications).returning(notifications.c.id, notifications.c.user_id),
+                        [{
+                            "user_id": user_id,
+                            "type": type,
+                            "title": title,
+                            "message": message,
+                            "related_id": related_id,
+                            "is_read": False,
+                            "created_at": now,
+                        } for user_id in recipients],
+                    ).all()
+                    moved = notification_inbox.record_inserted(conn, inserted)
+            if inserted:
+                notification_inbox.publish_inserted([{
+                    "id": notification_id,
+                    "user_id": user_id,
+                    "type": type.value,
+                    "title": title,
+                    "message": message,
+                    "related_id": related_id,
+                    "is_read": False,
+                    "created_at": now.isoformat(),
+                } for notification_id, user_id in inserted], moved)
+
+            written += len(recipients)
+            skipped += len(user_ids) - len(recipients)
+            fanout_notifications.labels(type.value).inc(len(recipients))
+    except Exception as e:
+        print(f"❌ Notification fan-out for club {club_id} failed after {written} rows: {e}")
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        fanout_duration.observe(elapsed)
+
+    rate = written / elapsed if elapsed > 0 else 0.0
+    print(f"📣 Fan-out club {club_id} {type.value}: {written} notifications, "
+          f"{skipped} skipped in {elapsed * 1000:.1f} ms ({rate:.0f}/s)")
+    return {"written": written, "skipped": skipped, "seconds": elapsed, "per_second": rate}
@@ -0,0 +1,393 @@
+# notification_inbox.py
+"""
+Per-user notification inbox: unread badge counts, paging and live push.
+
+`notification_inbox` keeps one row per user with a maintained
+`unread_count` and a `read_through_id` watermark. A notification is unread
+while `is_read` is false *and* its id is above the watermark, so "read all"
+moves the watermark to the newest notification id and zeroes the counter -
+one row written, however many notifications the user has.
+
+Counters move with the writes: `after_flush` on SessionLocal collects ORM
+inserts, deletes and `is_read` flips of Notification rows, and
+`after_commit` applies the per-user deltas in one executemany UPDATE, then
+pushes the new notifications to any open stream of their recipient. Club
+fan-out (Core inserts) calls `record_inserted()` inside its own transaction.
+A user's row is created on first read with a full recount; writes that
+bypass both paths (bulk query deletes) are corrected by `recount_all()`,
+which the retention job runs after pruning read notifications older than
+RETENTION_DAYS.
+
+Push is in-process: a stream only sees notifications committed by the same
+worker, and clients should re-fetch the unread count on reconnect.
+"""
+import asyncio
+import json
+import threading
+from collections import Counter as Tally
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import and_, bindparam, delete, event, func, insert, inspect, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .audit_log import decode_cursor, encode_cursor
+from .database import SessionLocal, engine
+
+MAX_PAGE_SIZE = 200
+RETENTION_DAYS = 90
+RETENTION_INTERVAL = 6 * 3600  # seconds
+PRUNE_BATCH = 1000
+STREAM_QUEUE_SIZE = 100
+KEEPALIVE_INTERVAL = 15  # seconds
+
+inbox = models.NotificationInbox.__table__
+notifications = models.Notification.__table__
+
+_CHANGES_KEY = "notification_inbox_changes"
+
+stream_subscribers = Gauge(
+    "app_notification_stream_subscribers",
+    "Open notification push streams",
+)
+stream_dropped = Counter(
+    "app_notification_stream_dropped_total",
+    "Push events dropped because a subscriber's queue was full",
+)
+
+
+# ================ PUSH ================
+
+class NotificationHub:
+    """Fan-in point for push streams; `publish` is safe to call from any thread"""
+
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add((asyncio.get_running_loop(), queue))
+        stream_subscribers.inc()
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+        stream_subscribers.dec()
+
+    def watching(self, user_ids) -> Set[int]:
+        with self._lock:
+            return {user_id for user_id in user_ids if user_id in self._subscribers}
+
+    def publish(self, user_id: int, event: str, data: dict):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, (event, data))
+            except RuntimeError:
+                pass  # loop already closed
+
+
+def _offer(queue: asyncio.Queue, item):
+    try:
+        queue.put_nowait(item)
+    except asyncio.QueueFull:
+        stream_dropped.inc()
+
+
+hub = NotificationHub()
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def stream(user_id: int, unread_count: int, queue: asyncio.Queue) -> AsyncIterator[str]:
+    """Server-sent events for a subscribed `queue`: the current count, then live updates"""
+    try:
+        yield _sse("unread", {"unread_count": unread_count})
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield _sse(event, data)
+    finally:
+        hub.unsubscribe(user_id, queue)
+
+
+def serialize(row, read_through_id: int = 0) -> dict:
+    return {
+        "id": row.id,
+        "type": row.type.value,
+        "title": row.title,
+        "message": row.message,
+        "related_id": row.related_id,
+        "is_read": bool(row.is_read) or row.id <= read_through_id,
+        "created_at": row.created_at.isoformat(),
+    }
+
+
+# ================ COUNTERS ================
+
+def _unread_filter(read_through_id):
+    return and_(or_(notifications.c.is_read == False, notifications.c.is_read.is_(None)),
+                notifications.c.id > read_through_id)
+
+
+def _apply(conn, changes: List[Tuple[int, int, int]]) -> Set[int]:
+    """Apply (user_id, notification_id, +1/-1) changes; returns the users whose count moved"""
+    users = {user_id for user_id, _, _ in changes}
+    marks = dict(conn.execute(
+        select(inbox.c.user_id, inbox.c.read_through_id).where(inbox.c.user_id.in_(users))
+    ).all())
+
+    deltas = Tally()
+    for user_id, notification_id, sign in changes:
+        # No row yet: the first read counts from scratch
+        if user_id in marks and notification_id > marks[user_id]:
+            deltas[user_id] += sign
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if deltas:
+        conn.execute(
+            update(inbox)
+            .where(inbox.c.user_id == bindparam("b_user_id"))
+            .values(unread_count=inbox.c.unread_count + bindparam("b_delta"),
+                    updated_at=datetime.utcnow()),
+            [{"b_user_id": user_id, "b_delta": delta} for user_id, delta in deltas.items()],
+        )
+    return set(deltas)
+
+
+def _publish_counts(user_ids: Set[int]):
+    watched = hub.watching(user_ids)
+    if not watched:
+        return
+    with engine.connect() as conn:
+        counts = conn.execute(
+            select(inbox.c.user_id, inbox.c.unread_count).where(inbox.c.user_id.in_(watched))
+        ).all()
+    for user_id, unread_count in counts:
+        hub.publish(user_id, "unread", {"unread_count": max(0, unread_count)})
+
+
+def _publish_new(new_rows: List[dict]):
+    watched = hub.watching({row["user_id"] for row in new_rows})
+    for row in new_rows:
+        if row["user_id"] in watched:
+            hub.publish(row["user_id"], "notification", row)
+
+
+def record_inserted(conn, rows: List[Tuple[int, int]]):
+    """Count Core-inserted (notification_id, user_id) rows; call inside the inserting transaction"""
+    return _apply(conn, [(user_id, notification_id, 1) for notification_id, user_id in rows])
+
+
+def publish_inserted(new_rows: List[dict], moved: Set[int]):
+    """Push rows recorded with `record_inserted` once their transaction has committed"""
+    _publish_new(new_rows)
+    _publish_counts(moved)
+
+
+# ================ ORM HOOKS ================
+
+def _collect(session: Session, flush_context):
+    changes = None
+    new_rows = []
+    for obj in session.new:
+        if isinstance(obj, models.Notification) and not obj.is_read:
+            changes = changes if changes is not None else []
+            changes.append((obj.user_id, obj.id, 1))
+            new_rows.append({
+                "id": obj.id,
+                "user_id": obj.user_id,
+                "type": obj.type.value,
+                "title": obj.title,
+                "message": obj.message,
+                "related_id": obj.related_id,
+                "is_read": False,
+                "created_at": (obj.created_at or datetime.utcnow()).isoformat(),
+            })
+    for obj in session.deleted:
+        if isinstance(obj, models.Notification):
+            history = inspect(obj).attrs.is_read.history
+            was_read = history.deleted[0] if history.deleted else inspect(obj).dict.get("is_read", True)
+            if not was_read:
+                changes = changes if changes is not None else []
+                changes.append((obj.user_id, obj.id, -1))
+    for obj in session.dirty:
+        if isinstance(obj, models.Notification):
+            history = inspect(obj).attrs.is_read.history
+            if history.added and history.deleted and bool(history.added[0]) != bool(history.deleted[0]):
+                changes = changes if changes is not None else []
+                changes.append((obj.user_id, obj.id, -1 if history.added[0] else 1))
+
+    if changes:
+        pending = session.info.setdefault(_CHANGES_KEY, ([], []))
+        pending[0].extend(changes)
+        pending[1].extend(new_rows)
+
+
+def _apply_after_commit(session: Session):
+    pending = session.info.pop(_CHANGES_KEY, None)
+    if not pending:
+        return
+    changes, new_rows = pending
+    try:
+        with engine.begin() as conn:
+            moved = _apply(conn, changes)
+        _publish_new(new_rows)
+        _publish_counts(moved)
+    except Exception as e:
+        # recount_all() will catch the counters up
+        print(f"Error updating notification inbox counters: {e}")
+
+
+def _discard(session: Session, previous_transaction=None):
+    session.info.pop(_CHANGES_KEY, None)
+
+
+def _load_previous(target, value, oldvalue, initiator):
+    return value
+
+
+# Load the old is_read when it's assigned on an expired instance
+event.listen(models.Notification.is_read, "set", _load_previous, active_history=True, retval=True)
+
+event.listen(SessionLocal, "after_flush", _collect)
+event.listen(SessionLocal, "after_commit", _apply_after_commit)
+event.listen(SessionLocal, "after_soft_rollback", _discard)
+
+
+# ================ READS / WRITES ================
+
+def _count_unread(db: Session, user_id: int, read_through_id: int = 0) -> int:
+    return db.execute(
+        select(func.count()).select_from(notifications)
+        .where(notifications.c.user_id == user_id, _unread_filter(read_through_id))
+    ).scalar()
+
+
+def get_inbox(db: Session, user_id: int):
+    """(unread_count, read_through_id) for a user, creating the row on first use"""
+    row = db.execute(
+        select(inbox.c.unread_count, inbox.c.read_through_id).where(inbox.c.user_id == user_id)
+    ).first()
+    if row is not None:
+        return max(0, row.unread_count), row.read_through_id
+
+    unread_count = _count_unread(db, user_id)
+    try:
+        db.execute(insert(inbox).values(
+            user_id=user_id, unread_count=unread_count, read_through_id=0,
+            updated_at=datetime.utcnow(),
+        ))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return get_inbox(db, user_id)
+    return unread_count, 0
+
+
+def get_unread_count(db: Session, user_id: int) -> int:
+    return get_inbox(db, user_id)[0]
+
+
+def list_notifications(db: Session, user_id: int, limit: int = 50, cursor: Optional[str] = None,
+                       unread_only: bool = False) -> dict:
+    """Newest-first page, keyset-paginated on (created_at, id) via the (user_id, created_at) index"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    unread_count, read_through_id = get_inbox(db, user_id)
+
+    query = select(notifications).where(notifications.c.user_id == user_id)
+    if unread_only:
+        query = query.where(_unread_filter(read_through_id))
+    if cursor:
+        created_at, notification_id = decode_cursor(cursor)
+        query = query.where(or_(
+            notifications.c.created_at < created_at,
+            and_(notifications.c.created_at == created_at, notifications.c.id < notification_id),
+        ))
+
+    rows = db.execute(
+        query.order_by(notifications.c.created_at.desc(), notifications.c.id.desc()).limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "notifications": [serialize(row, read_through_id) for row in rows],
+        "next_cursor": encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+        "unread_count": unread_count,
+    }
+
+
+def mark_all_read(db: Session, user_id: int):
+    """Move the user's watermark to the newest notification id: one row, O(1)"""
+    # Ids only grow, so everything the user has right now is at or below this
+    newest_id = db.execute(select(func.max(notifications.c.id))).scalar() or 0
+    values = {"read_through_id": newest_id, "unread_count": 0, "updated_at": datetime.utcnow()}
+
+    updated = db.execute(update(inbox).where(inbox.c.user_id == user_id).values(**values)).rowcount
+    if not updated:
+        try:
+            db.execute(insert(inbox).values(user_id=user_id, **values))
+        except IntegrityError:
+            db.rollback()
+            db.execute(update(inbox).where(inbox.c.user_id == user_id).values(**values))
+    db.commit()
+    hub.publish(user_id, "unread", {"unread_count": 0})
+
+
+# ================ RETENTION ================
+
+def recount_all(db: Session) -> int:
+    """Recompute every stored unread count from the notifications table"""
+    unread = select(func.count()).select_from(notifications).where(
+        notifications.c.user_id == inbox.c.user_id,
+        _unread_filter(inbox.c.read_through_id),
+    ).scalar_subquery()
+    updated = db.execute(update(inbox).values(unread_count=unread)).rowcount
+    db.commit()
+    return updated
+
+
+def prune_read(db: Session, retention_days: int = RETENTION_DAYS) -> int:
+    """Delete read notifications older than `retention_days`, in batches, then recount"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    read = or_(
+        notifications.c.is_read == True,
+        notifications.c.id <= func.coalesce(inbox.c.read_through_id, 0),
+    )
+    batch = (
+        select(notifications.c.id)
+        .select_from(notifications.outerjoin(inbox, inbox.c.user_id == notifications.c.user_id))
+        .where(notifications.c.created_at < cutoff, read)
+        .limit(PRUNE_BATCH)
+    )
+
+    pruned = 0
+    while True:
+        ids = db.execute(batch).scalars().all()
+        if not ids:
+            break
+        db.execute(delete(notifications).where(notifications.c.id.in_(ids)))
+        db.commit()
+        pruned += len(ids)
+        if len(ids) < PRUNE_BATCH:
+            break
+
+    recounted = recount_all(db)
+    print(f"🧹 Pruned {pruned} read notifications older than {retention_days} days, "
+          f"recounted {recounted} inboxes")
+    return pruned
@@ -0,0 +1,100 @@
+# passwords.py
+"""
+Password hashing off the event loop.
+
+bcrypt is deliberately slow (~200-300 ms per hash at the default cost), and
+the login/register handlers are `async def`, so hashing inline froze every
+other request on the worker for the duration. Hashes now run on a dedicated
+thread pool of PASSWORD_HASH_WORKERS threads (bcrypt releases the GIL while
+it works). At most PASSWORD_HASH_MAX_PENDING hashes may be queued or running;
+beyond that `HasherBusy` is raised and handlers answer 503, so a login storm
+gets shed instead of piling up latency for everyone.
+
+Logins verify with `verify_and_update`: if the stored hash uses another
+scheme or a different cost than BCRYPT_ROUNDS, the caller gets a fresh hash
+to store, so raising the cost migrates users as they next log in.
+
+PASSWORD_HASH_WORKERS=0 hashes inline on the calling thread (the old
+behaviour; only useful for comparison benchmarks).
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+from prometheus_client import Gauge, Histogram
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+hash_seconds = Histogram(
+    "app_password_hash_seconds",
+    "Time from submitting a password hash/verify to its result, queueing included",
+    ["op"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+hash_pending = Gauge(
+    "app_password_hash_pending",
+    "Password hashes queued or running",
+)
+
+
+class HasherBusy(Exception):
+    """Too many password hashes already queued"""
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = WORKERS, max_pending: int = MAX_PENDING,
+                 context: CryptContext = pwd_context):
+        self.context = context
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="password-hash") if workers else None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    async def _run(self, op: str, fn, *args):
+        if self._executor is None:
+            with hash_seconds.labels(op).time():
+                return fn(*args)
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HasherBusy()
+            self._pending += 1
+        hash_pending.inc()
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            hash_seconds.labels(op).observe(time.perf_counter() - started)
+            hash_pending.dec()
+            with self._lock:
+                self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(matches, replacement hash or None); store the replacement if given"""
+        return await self._run("verify", self.context.verify_and_update, password, hashed)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+hasher = PasswordHasher()
+
+
+async def hash_password(password: str) -> str:
+    return await hasher.hash(password)
+
+
+async def verify_password(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    return await hasher.verify(password, hashed)
@@ -0,0 +1,94 @@
+# pytest_query_budget.py
+"""
+pytest plugin for SQL query budgets.
+
+Enable it from a conftest.py:
+
+    pytest_plugins = ["newapp.pytest_query_budget"]
+
+then either wrap a block:
+
+    def test_club_directory(client, query_budget):
+        with query_budget(max_queries=3):
+            client.get("/clubs/")
+
+budget one route:
+
+    def test_club_directory(client, route_budget):
+        route_budget(client, "GET", "/clubs/", max_queries=3)
+
+or budget a whole test:
+
+    @pytest.mark.query_budget(max_queries=3, allow_n_plus_one=False)
+    def test_club_directory(client):
+        client.get("/clubs/")
+
+Queries are counted on every engine passed to `instrument()`; the app's
+engine is instrumented when the plugin loads.
+"""
+from contextlib import contextmanager
+from typing import Optional
+
+import pytest
+
+from newapp.database import engine
+from newapp.query_metrics import N_PLUS_ONE_THRESHOLD, QueryStats, instrument, track_all_queries
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def check_budget(stats: QueryStats, max_queries: Optional[int] = None,
+                 allow_n_plus_one: bool = True, label: str = "block"):
+    problems = []
+    if max_queries is not None and stats.count > max_queries:
+        problems.append(f"{stats.count} queries (budget {max_queries})")
+    if not allow_n_plus_one:
+        for shape, n in stats.repeated(N_PLUS_ONE_THRESHOLD).items():
+            problems.append(f"N+1: {n}x {shape[:160]}")
+    if problems:
+        raise QueryBudgetExceeded(f"Query budget exceeded in {label}: " + "; ".join(problems))
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "query_budget(max_queries=None, allow_n_plus_one=True): "
+        "fail the test if it issues more SQL statements than budgeted",
+    )
+    instrument(engine)
+
+
+@pytest.fixture
+def query_budget():
+    """Context manager factory: `with query_budget(max_queries=N): ...`"""
+    @contextmanager
+    def budget(max_queries: Optional[int] = None, allow_n_plus_one: bool = True):
+        with track_all_queries() as stats:
+            yield stats
+        check_budget(stats, max_queries, allow_n_plus_one)
+    return budget
+
+
+@pytest.fixture
+def route_budget(query_budget):
+    """Issue one request through a test client and hold it to a budget"""
+    def request(client, method: str, url: str, max_queries: Optional[int] = None,
+                allow_n_plus_one: bool = False, **kwargs):
+        with query_budget(max_queries, allow_n_plus_one):
+            return client.request(method, url, **kwargs)
+    return request
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    marker = item.get_closest_marker("query_budget")
+    if marker is None:
+        yield
+        return
+
+    with track_all_queries() as stats:
+        outcome = yield
+    if outcome.excinfo is None:
+        check_budget(stats, label=item.nodeid, **marker.kwargs)
@@ -0,0 +1,177 @@
+# query_metrics.py
+"""
+Per-request SQL accounting.
+
+SQLAlchemy cursor events count statements and DB time into a QueryStats
+object bound to the current request through a contextvar (it follows the
+request into FastAPI's threadpool, since sync dependencies run with a copy of
+the context). QueryBudgetMiddleware opens one per request, and when the
+request finishes it records per-route histograms and flags N+1 patterns: the
+same statement shape executed N_PLUS_ONE_THRESHOLD or more times in a single
+request.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from prometheus_client import Counter as PromCounter, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+N_PLUS_ONE_THRESHOLD = 5
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233)
+
+db_queries_per_request = Histogram(
+    "app_db_queries_per_request",
+    "SQL statements executed per request",
+    ["route"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+db_time_per_request = Histogram(
+    "app_db_time_seconds_per_request",
+    "Time spent in SQL statements per request",
+    ["route"],
+)
+n_plus_one_requests = PromCounter(
+    "app_db_n_plus_one_requests_total",
+    "Requests that repeated one statement shape at least N_PLUS_ONE_THRESHOLD times",
+    ["route"],
+)
+
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+# Process-wide trackers, for callers outside the request's context (tests
+# driving the app through TestClient run it on another thread's event loop)
+_global_trackers: List["QueryStats"] = []
+
+_placeholder_list = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*\)")
+_whitespace = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Statement text with IN-lists collapsed, so repeats compare equal"""
+    shape = _placeholder_list.sub("(?...)", statement)
+    return _whitespace.sub(" ", shape).strip()
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.db_time += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> Dict[str, int]:
+        """Statement shapes executed at least `threshold` times"""
+        return {shape: n for shape, n in self.shapes.items() if n >= threshold}
+
+
+# ================ ENGINE EVENTS ================
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    for tracker in _global_trackers:
+        tracker.record(statement, elapsed)
+
+
+def instrument(engine: Engine):
+    """Attach the counting listeners to `engine` (safe to call more than once)"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def track_queries():
+    """Count statements issued inside the block: `with track_queries() as stats:`"""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def track_all_queries():
+    """Like track_queries, but counts statements from every thread and task"""
+    stats = QueryStats()
+    _global_trackers.append(stats)
+    try:
+        yield stats
+    finally:
+        _global_trackers.remove(stats)
+
+
+# ================ PER-ROUTE REPORT ================
+
+_report_lock = threading.Lock()
+_n_plus_one: Dict[str, Dict[str, int]] = {}
+
+
+def route_key(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None) or "unmatched"
+    return f"{scope.get('method', 'GET')} {path}"
+
+
+def observe(route: str, stats: QueryStats):
+    db_queries_per_request.labels(route).observe(stats.count)
+    db_time_per_request.labels(route).observe(stats.db_time)
+
+    repeated = stats.repeated()
+    if not repeated:
+        return
+
+    n_plus_one_requests.labels(route).inc()
+    with _report_lock:
+        seen = _n_plus_one.setdefault(route, {})
+        for shape, n in repeated.items():
+            seen[shape] = max(n, seen.get(shape, 0))
+    worst_shape, worst = max(repeated.items(), key=lambda item: item[1])
+    logger.warning(
+        f"Possible N+1 in {route}: {stats.count} queries, "
+        f"{worst}x \"{worst_shape[:160]}\""
+    )
+
+
+def n_plus_one_report() -> Dict[str, Dict[str, int]]:
+    """Worst repeat count seen per statement shape, per route"""
+    with _report_lock:
+        return {route: dict(shapes) for route, shapes in _n_plus_one.items()}
+
+
+class QueryBudgetMiddleware:
+    """ASGI middleware that tracks the SQL issued by each HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                observe(route_key(scope), stats)
@@ -0,0 +1,309 @@
+# risk_batch.py
+"""
+Nightly campus-wide wellness risk scoring.
+
+/wellness/risk-assessment scores one student when they open it, so a
+student who never does is never seen by a counselor. `score_population`
+scores everyone with enough recent check-ins (3 in the last 14 days, as the
+endpoint requires) in three bulk queries:
+
+  1. wellness entries for the last 14 days, ordered by user and date
+  2. messages sent this week and the week before, per user, summed from the
+     activity_daily rollups (at most 14 rows each)
+  3. each user's last 6 grades (a ROW_NUMBER() window)
+
+Every component - mood volatility, stress accumulation, sleep deterioration,
+social withdrawal, academic decline - is then computed for the whole
+population at once as NumPy array operations over per-user groups
+(`np.bincount` sums over the user index), mirroring the scalar
+`*_risk_score` helpers in wellness_routes threshold for threshold. The
+RiskAssessment rows go in with one executemany INSERT per BATCH_SIZE users.
+
+`run_nightly` is scheduled every CHECK_INTERVAL and scores once per day
+after RISK_SCORING_HOUR (local time); the last run date is claimed in
+`app_meta` with a compare-and-swap so only one worker scores. Counselors
+read the results from /admin/wellness/at-risk.
+"""
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+from prometheus_client import Gauge
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from newapp import activity_rollups, models
+from newapp.database import engine
+from newapp.lazy_imports import lazy_import
+from newapp.wellness_routes import GRADE_POINTS, RISK_PRECISION, generate_risk_recommendations
+
+np = lazy_import("numpy")
+
+RISK_SCORING_HOUR = int(os.getenv("RISK_SCORING_HOUR", "2"))
+CHECK_INTERVAL = 900  # seconds
+BATCH_SIZE = 1000
+LAST_RUN_KEY = "risk_scoring_last_run"
+
+LEVELS = ("low", "medium", "high", "critical")
+COMPONENTS = ("mood", "stress", "sleep", "social", "academic")
+
+scored_users = Gauge(
+    "app_risk_scoring_last_users",
+    "Users scored by the last population risk scoring run",
+)
+scoring_rate = Gauge(
+    "app_risk_scoring_last_users_per_second",
+    "Throughput of the last population risk scoring run",
+)
+
+_entries = models.WellnessEntry.__table__
+_grades = models.GradeEntry.__table__
+_assessments = models.RiskAssessment.__table__
+
+
+# ================ BULK LOADS ================
+
+def _load_wellness(conn, today: date) -> dict:
+    rows = conn.execute(
+        select(_entries.c.user_id, _entries.c.date, _entries.c.mood_score,
+               _entries.c.stress_level, _entries.c.sleep_hours)
+        .where(_entries.c.date >= today - timedelta(days=14), _entries.c.date <= today)
+        .order_by(_entries.c.user_id, _entries.c.date, _entries.c.id)
+    ).all()
+    return {
+        "user_id": np.fromiter((r.user_id for r in rows), dtype=np.int64, count=len(rows)),
+        "day": np.fromiter((r.date.toordinal() for r in rows), dtype=np.int64, count=len(rows)),
+        "mood": np.fromiter((r.mood_score for r in rows), dtype=np.float64, count=len(rows)),
+        "stress": np.fromiter((r.stress_level for r in rows), dtype=np.float64, count=len(rows)),
+        "sleep": np.fromiter((r.sleep_hours or 0 for r in rows), dtype=np.float64, count=len(rows)),
+    }
+
+
+def _load_message_counts(conn):
+    """(user ids, messages this week, messages the week before)"""
+    weeks = activity_rollups.weekly_messages(conn)
+    return (np.fromiter(weeks.keys(), dtype=np.int64, count=len(weeks)),
+            np.array([current for current, _ in weeks.values()], dtype=np.float64),
+            np.array([previous for _, previous in weeks.values()], dtype=np.float64))
+
+
+def _load_recent_grades(conn):
+    """(user ids, grade points, rank 1..6 newest first) for each user's last 6 grades"""
+    ranked = select(
+        _grades.c.user_id, _grades.c.grade,
+        func.row_number().over(
+            partition_by=_grades.c.user_id,
+            order_by=(_grades.c.created_at.desc(), _grades.c.id.desc())
+        ).label("rank")
+    ).subquery()
+    rows = conn.execute(select(ranked.c.user_id, ranked.c.grade, ranked.c.rank).where(ranked.c.rank <= 6)).all()
+    return (np.array([r.user_id for r in rows], dtype=np.int64),
+            np.array([GRADE_POINTS.get(r.grade, 5) for r in rows], dtype=np.float64),
+            np.array([r.rank for r in rows], dtype=np.int64))
+
+
+def _align(user_ids, keys, values, default=0.0):
+    """values[i] for the key equal to each user id, `default` where there is none"""
+    out = np.full(len(user_ids), default, dtype=np.float64)
+    if len(keys):
+        order = np.argsort(keys)
+        keys, values = keys[order], values[order]
+        position = np.clip(np.searchsorted(keys, user_ids), 0, len(keys) - 1)
+        found = keys[position] == user_ids
+        out[found] = values[position[found]]
+    return out
+
+
+# ================ COMPONENTS ================
+
+def _wellness_components(data: dict, today: date) -> dict:
+    users, first_row, group = np.unique(data["user_id"], return_index=True, return_inverse=True)
+    count = np.bincount(group, minlength=len(users)).astype(np.float64)
+
+    def group_sum(values):
+        return np.bincount(group, weights=values, minlength=len(users))
+
+    mood, stress, sleep, day = data["mood"], data["stress"], data["sleep"], data["day"].astype(np.float64)
+
+    # "Recent" is the last 7 days; users with none fall back to the whole fortnight
+    in_week = (data["day"] >= (today - timedelta(days=7)).toordinal()).astype(np.float64)
+    week_count = group_sum(in_week)
+    recent = np.where(week_count[group] > 0, in_week, 1.0)
+    recent_count = group_sum(recent)
+
+    # Mood: recent average and fortnight standard deviation
+    mood_mean = group_sum(mood) / count
+    mood_std = np.sqrt(group_sum((mood - mood_mean[group]) ** 2) / count)
+    recent_mood = np.round(group_sum(mood * recent) / recent_count, RISK_PRECISION)
+    mood_std = np.round(mood_std, RISK_PRECISION)
+    mood_risk = (np.where(recent_mood < 2.5, 50, np.where(recent_mood < 3.5, 25, 0))
+                 + np.where(mood_std > 1.5, 30, 0))
+
+    # Stress: recent average and least-squares slope per day
+    recent_stress = group_sum(stress * recent) / recent_count
+    day_mean = group_sum(day * recent) / recent_count
+    day_dev = (day - day_mean[group]) * recent
+    day_m2 = group_sum(day_dev ** 2)
+    stress_cov = group_sum(day_dev * (stress - recent_stress[group]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trend = np.where((recent_count >= 2) & (day_m2 > 0), stress_cov / day_m2, 0.0)
+    stress_risk = recent_stress / 10 * 50 + np.where(np.round(trend, RISK_PRECISION) > 0.5, 30, 0)
+
+    # Sleep: average reported sleep, and the mean of the last 3 reported nights
+    reported = (sleep > 0).astype(np.float64)
+    reported_count = group_sum(reported)
+    seen = np.cumsum(reported)
+    position = seen - (seen - reported)[first_row][group]  # 1-based among the user's reported nights
+    last_three = reported * (reported_count[group] - position < 3)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_sleep = group_sum(sleep * reported) / reported_count
+        recent_sleep = np.where(reported_count >= 3, group_sum(sleep * last_three) / 3, avg_sleep)
+    recent_sleep = np.round(recent_sleep, RISK_PRECISION)
+    sleep_risk = np.where(reported_count == 0, 0,
+                          np.where(recent_sleep < 5, 80,
+                                   np.where(recent_sleep < 6, 50,
+                                            np.where(recent_sleep < 7, 25, 0))))
+
+    return {
+        "user_id": users,
+        "count": count,
+        "mood": np.minimum(100, mood_risk).astype(np.float64),
+        "stress": np.minimum(100, stress_risk),
+        "sleep": sleep_risk.astype(np.float64),
+    }
+
+
+def _social_risk(user_ids, senders, current, previous):
+    current = _align(user_ids, senders, current)
+    previous = _align(user_ids, senders, previous)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = np.where(previous > 0, (current - previous) / previous * 100, 0.0)
+    risk = np.where(change < -60, 70, np.where(change < -40, 50, np.where(change < -20, 30, 0)))
+    return np.where(previous > 0, risk, 0).astype(np.float64)
+
+
+def _academic_risk(user_ids, graded, points, rank):
+    if not len(graded):
+        return np.zeros(len(user_ids))
+    users, group = np.unique(graded, return_inverse=True)
+    count = np.bincount(group).astype(np.float64)
+    top = (rank <= 3).astype(np.float64)
+    recent_avg = np.bincount(group, weights=points * top) / np.bincount(group, weights=top)
+    overall_avg = np.bincount(group, weights=points) / count
+    risk = np.where(count < 2, 0, np.where(recent_avg < 5, 60, np.where(recent_avg < overall_avg - 1.5, 40, 0)))
+    return _align(user_ids, users, risk.astype(np.float64))
+
+
+def score(conn, today: Optional[date] = None) -> Dict[str, "np.ndarray"]:
+    """Risk components, overall percentage and level for every user with >= 3 entries in 14 days"""
+    today = today or date.today()
+
+    wellness = _wellness_components(_load_wellness(conn, today), today)
+    eligible = wellness["count"] >= 3
+    result = {name: values[eligible] for name, values in wellness.items()}
+    user_ids = result["user_id"]
+
+    result["social"] = _social_risk(user_ids, *_load_message_counts(conn))
+    result["academic"] = _academic_risk(user_ids, *_load_recent_grades(conn))
+
+    components = np.stack([result[name] for name in COMPONENTS])
+    positive = components > 0
+    positive_count = positive.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        overall = np.where(positive_count > 0, (components * positive).sum(axis=0) / positive_count, 0.0)
+    result["overall"] = overall
+    result["level"] = np.digitize(overall, [30, 50, 70])  # index into LEVELS
+    return result
+
+
+# ================ WRITES ================
+
+def _recommendations(result) -> list:
+    """JSON recommendations per user, built once per distinct (level, sleep, stress, social) combination"""
+    key = (result["level"] * 8 + (result["sleep"] > 50) * 4
+           + (result["stress"] > 50) * 2 + (result["social"] > 40))
+    combos, index = np.unique(key, return_inverse=True)
+    texts = []
+    for combo in combos.tolist():
+        level, flags = divmod(combo, 8)
+        texts.append(json.dumps(generate_risk_recommendations(LEVELS[level], {
+            "sleep": 100 if flags & 4 else 0,
+            "stress": 100 if flags & 2 else 0,
+            "social": 100 if flags & 1 else 0,
+        })))
+    return [texts[i] for i in index.tolist()]
+
+
+def score_population(today: Optional[date] = None) -> dict:
+    """Score everyone and insert a RiskAssessment per scored user; returns the run's stats"""
+    started = time.perf_counter()
+    assessed_at = datetime.utcnow()
+    with engine.begin() as conn:
+        result = score(conn, today)
+        recommendations = _recommendations(result)
+        rows = [{
+            "user_id": user_id,
+            "assessment_date": assessed_at,
+            "mood_volatility_score": mood,
+            "stress_accumulation_score": stress,
+            "sleep_deterioration_score": sleep,
+            "social_withdrawal_score": social,
+            "academic_decline_score": academic,
+            "overall_risk_level": LEVELS[level],
+            "risk_percentage": overall,
+            "recommended_actions": actions,
+            "counselor_contact_recommended": overall >= 50,
+            "immediate_intervention": overall >= 70,
+        } for user_id, mood, stress, sleep, social, academic, overall, level, actions in zip(
+            result["user_id"].tolist(), result["mood"].tolist(), result["stress"].tolist(),
+            result["sleep"].tolist(), result["social"].tolist(), result["academic"].tolist(),
+            result["overall"].tolist(), result["level"].tolist(), recommendations,
+        )]
+        for offset in range(0, len(rows), BATCH_SIZE):
+            conn.execute(insert(_assessments), rows[offset:offset + BATCH_SIZE])
+
+    elapsed = time.perf_counter() - started
+    per_second = len(rows) / elapsed if elapsed > 0 else 0.0
+    scored_users.set(len(rows))
+    scoring_rate.set(per_second)
+    levels = np.bincount(result["level"], minlength=len(LEVELS)).tolist()
+    print(f"🧮 Risk scoring: {len(rows)} users in {elapsed:.2f}s ({per_second:.0f} users/s), "
+          f"{levels[3]} critical, {levels[2]} high")
+    return {
+        "users": len(rows),
+        "seconds": round(elapsed, 3),
+        "users_per_second": round(per_second, 1),
+        "levels": dict(zip(LEVELS, levels)),
+    }
+
+
+def _claim_run(today: date) -> bool:
+    """Record today as the last run unless another worker already did"""
+    meta = models.AppMeta.__table__
+    with engine.begin() as conn:
+        last = conn.execute(select(meta.c.value).where(meta.c.key == LAST_RUN_KEY)).first()
+        if last is None:
+            try:
+                conn.execute(insert(meta).values(key=LAST_RUN_KEY, value=today.isoformat(),
+                                                 updated_at=datetime.utcnow()))
+                return True
+            except IntegrityError:
+                return False
+        if last.value == today.isoformat():
+            return False
+        claimed = conn.execute(
+            update(meta).where(meta.c.key == LAST_RUN_KEY, meta.c.value == last.value)
+            .values(value=today.isoformat(), updated_at=datetime.utcnow())
+        )
+        return claimed.rowcount == 1
+
+
+def run_nightly(db: Session):
+    """Periodic job: score the population once a day, after RISK_SCORING_HOUR"""
+    now = datetime.now()
+    if now.hour < RISK_SCORING_HOUR or not _claim_run(now.date()):
+        return
+    score_population(now.date())
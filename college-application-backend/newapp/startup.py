@@ -0,0 +1,324 @@
+# startup.py
+"""
+Staged application startup.
+
+Stage 1 (blocking, fast): bring the schema up to SCHEMA_VERSION. The stored
+version lives in `app_meta`, so on an up-to-date database this is a single
+SELECT instead of `create_all` reflecting every table.
+Stage 2 (blocking, fast): load the boot fixtures (default admin, mess menu);
+a hash check per fixture once they've been applied.
+Stage 3 (background): anything slow - e.g. scraping - runs in a worker
+thread after the app has started accepting requests; `every()` schedules
+recurring jobs (reconcilers) the same way.
+
+`bootstrap()` is idempotent and only does its work once per process.
+"""
+import asyncio
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict
+
+from sqlalchemy import delete, func, insert, inspect, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from newapp import models
+from newapp.database import SessionLocal, engine
+
+# Bump this whenever models.py gains a table/column or a migration step below
+SCHEMA_VERSION = 12
+SCHEMA_VERSION_KEY = "schema_version"
+
+timings: Dict[str, float] = {}
+
+_bootstrap_lock = threading.Lock()
+_bootstrapped = False
+_background_tasks = set()
+
+
+@contextmanager
+def _stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - started
+        print(f"⏱️  startup stage '{name}' took {timings[name] * 1000:.1f} ms")
+
+
+# ================ SCHEMA ================
+
+def get_schema_version(db: Session) -> int:
+    """Stored schema version, 0 for a database that predates versioning"""
+    try:
+        row = db.query(models.AppMeta).filter(
+            models.AppMeta.key == SCHEMA_VERSION_KEY
+        ).first()
+        return int(row.value) if row and row.value else 0
+    except Exception:
+        db.rollback()
+        return 0
+
+
+def set_schema_version(db: Session, version: int):
+    row = db.query(models.AppMeta).filter(
+        models.AppMeta.key == SCHEMA_VERSION_KEY
+    ).first()
+    if row:
+        row.value = str(version)
+    else:
+        db.add(models.AppMeta(key=SCHEMA_VERSION_KEY, value=str(version)))
+    db.commit()
+
+
+def fix_database_schema(db: Session):
+    """Fix the database schema by adding missing columns"""
+    try:
+        # Add missing columns if they don't exist
+
+        # Check if course_id exists in timetable_entries
+        try:
+            db.execute(text("SELECT course_id FROM timetable_entries LIMIT 1"))
+        except:
+            print("Adding course_id column to timetable_entries")
+            db.execute(text("ALTER TABLE timetable_entries ADD COLUMN course_id INTEGER REFERENCES courses(id)"))
+
+        # Check if start_date exists in courses
+        try:
+            db.execute(text("SELECT start_date FROM courses LIMIT 1"))
+        except:
+            print("Adding start_date column to courses")
+            db.execute(text("ALTER TABLE courses ADD COLUMN start_date DATE"))
+
+        # Check if seats_remaining exists in club_events
+        try:
+            db.execute(text("SELECT seats_remaining FROM club_events LIMIT 1"))
+        except:
+            print("Adding seats_remaining column to club_events")
+            db.execute(text("ALTER TABLE club_events ADD COLUMN seats_remaining INTEGER"))
+            taken = ("(SELECT COUNT(*) FROM event_registrations "
+                     "WHERE event_registrations.event_id = club_events.id)")
+            db.execute(text(
+                f"UPDATE club_events SET seats_remaining = CASE "
+                f"WHEN {taken} >= max_participants THEN 0 "
+                f"ELSE max_participants - {taken} END "
+                f"WHERE max_participants > 0"
+            ))
+
+        # Native enum types (PostgreSQL) don't pick up new members by themselves
+        if engine.dialect.name == "postgresql":
+            for member in models.NotificationType:
+                db.execute(text(f"ALTER TYPE notificationtype ADD VALUE IF NOT EXISTS '{member.name}'"))
+
+        db.commit()
+        print("Database schema fixed successfully")
+    except Exception as e:
+        print(f"Error fixing database schema: {e}")
+        db.rollback()
+
+
+def fix_todo_table_schema(db: Session):
+    """Recreate todo_items if its columns don't match the model"""
+    try:
+        expected = {column.name for column in models.TodoItem.__table__.columns}
+        existing = {column["name"] for column in inspect(engine).get_columns("todo_items")}
+        if existing and expected <= existing:
+            return
+
+        # Drop the existing table if it has wrong schema
+        db.execute(text("DROP TABLE IF EXISTS todo_items"))
+        db.commit()
+
+        # Recreate the table with correct schema
+        models.TodoItem.__table__.create(bind=engine, checkfirst=True)
+        db.commit()
+
+        print("TodoItem table schema fixed successfully")
+    except Exception as e:
+        print(f"Error fixing TodoItem table schema: {e}")
+        db.rollback()
+
+
+# Tables given a unique (user, day) index, and their day column. Rows that
+# predate the index are merged once per table; app_meta records it.
+DAILY_TABLES = {"wellness_entries": "date", "daily_analyses": "analysis_date", "chat_analyses": "analysis_date"}
+DEDUPLICATED_KEY = "daily_rows_merged:{table}"
+
+
+def _join_notes(values):
+    return "\n".join(dict.fromkeys(v.strip() for v in values if v and v.strip())) or None
+
+
+def _join_triggers(values):
+    items = [item.strip() for v in values if v for item in v.split(",")]
+    return ",".join(dict.fromkeys(item for item in items if item)) or None
+
+
+# Columns whose older values are combined rather than superseded by the newest row's
+COMBINE = {"wellness_entries": {"notes": _join_notes, "triggers": _join_triggers}}
+
+
+def merge_daily_duplicates(db: Session, table_name: str, day_column: str) -> int:
+    """
+    Fold each (user, day) group into its newest row: the newest row's values
+    win, columns it left empty take the latest older value, COMBINE columns
+    are joined, created_at is the earliest. Returns the rows removed.
+    """
+    table = models.Base.metadata.tables[table_name]
+    user, day = table.c.user_id, table.c[day_column]
+    combine = COMBINE.get(table_name, {})
+    groups = db.execute(select(user, day).group_by(user, day).having(func.count() > 1)).all()
+    removed = 0
+    for user_id, on in groups:
+        rows = db.execute(select(table).where(user == user_id, day == on).order_by(table.c.id.desc())).mappings().all()
+        keep, older = rows[0], rows[1:]
+        values = {}
+        for column in table.columns.keys():
+            if column in ("id", "user_id", day_column):
+                continue
+            if column in combine:
+                values[column] = combine[column]([row[column] for row in reversed(rows)])
+            elif column == "created_at":
+                values[column] = min((row[column] for row in rows if row[column]), default=None)
+            elif keep[column] is None:
+                values[column] = next((row[column] for row in older if row[column] is not None), None)
+        db.execute(update(table).where(table.c.id == keep["id"]).values(**values))
+        db.execute(delete(table).where(table.c.id.in_([row["id"] for row in older])))
+        removed += len(older)
+    return removed
+
+
+def _drop_index(db: Session, table: str, name: str):
+    if name not in {index["name"] for index in inspect(db.connection()).get_indexes(table)}:
+        return
+    # MySQL names the table and has no IF EXISTS
+    db.execute(text(f"DROP INDEX {name} ON {table}" if engine.dialect.name == "mysql" else f"DROP INDEX {name}"))
+
+
+def deduplicate_daily_rows(db: Session):
+    """Merge duplicate (user, day) rows so the unique indexes can be built; once per table"""
+    meta = models.AppMeta.__table__
+    for table, day_column in DAILY_TABLES.items():
+        key = DEDUPLICATED_KEY.format(table=table)
+        if db.execute(select(meta.c.key).where(meta.c.key == key)).first():
+            continue
+        try:
+            removed = merge_daily_duplicates(db, table, day_column)
+            db.execute(insert(meta).values(key=key, value=str(removed), updated_at=datetime.utcnow()))
+            db.commit()
+            if removed:
+                print(f"🧹 Merged {removed} duplicate daily rows in {table}")
+        except IntegrityError:
+            db.rollback()  # another worker merged this table first
+        except Exception as e:
+            print(f"Error merging duplicate rows in {table}: {e}")
+            db.rollback()
+    try:
+        # Superseded by uq_wellness_entries_user_date
+        _drop_index(db, "wellness_entries", "ix_wellness_entries_user_date")
+        db.commit()
+    except Exception as e:
+        print(f"Error dropping ix_wellness_entries_user_date: {e}")
+        db.rollback()
+
+
+def create_missing_indexes():
+    """create_all skips existing tables, so add indexes declared on them since"""
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def ensure_schema():
+    """Create tables and run fix-ups, but only if the stored version is behind"""
+    db = SessionLocal()
+    try:
+        current = get_schema_version(db)
+        if current >= SCHEMA_VERSION:
+            return
+
+        print(f"Migrating database schema {current} -> {SCHEMA_VERSION}")
+        models.Base.metadata.create_all(bind=engine)
+        fix_database_schema(db)
+        fix_todo_table_schema(db)
+        deduplicate_daily_rows(db)
+        create_missing_indexes()
+        set_schema_version(db, SCHEMA_VERSION)
+    finally:
+        db.close()
+
+
+# ================ PIPELINE ================
+
+def bootstrap():
+    """Run the blocking startup stages once per process"""
+    global _bootstrapped
+    if _bootstrapped:
+        return
+
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return
+
+        with _stage("schema"):
+            ensure_schema()
+
+        with _stage("fixtures"):
+            from newapp.fixtures import load_boot_fixtures
+            load_boot_fixtures()
+
+        _bootstrapped = True
+
+
+def _run_with_session(name: str, job: Callable[[Session], None]):
+    db = SessionLocal()
+    try:
+        with _stage(name):
+            job(db)
+    except Exception as e:
+        print(f"Background startup job '{name}' failed: {e}")
+        traceback.print_exc()
+    finally:
+        db.close()
+
+
+def defer(name: str, job: Callable[[Session], None]) -> asyncio.Task:
+    """Run `job(db)` in a worker thread once the event loop is serving requests"""
+    task = asyncio.get_running_loop().create_task(
+        asyncio.to_thread(_run_with_session, name, job)
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def every(name: str, interval: float, job: Callable[[Session], None]) -> asyncio.Task:
+    """Run `job(db)` in a worker thread now and then every `interval` seconds"""
+    def run_once():
+        db = SessionLocal()
+        try:
+            job(db)
+        except Exception as e:
+            print(f"Periodic job '{name}' failed: {e}")
+            traceback.print_exc()
+        finally:
+            db.close()
+
+    async def loop():
+        while True:
+            await asyncio.to_thread(run_once)
+            await asyncio.sleep(interval)
+
+    task = asyncio.get_running_loop().create_task(loop())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def shutdown():
+    """Cancel background and periodic jobs that are still pending"""
+    for task in list(_background_tasks):
+        task.cancel()
@@ -0,0 +1,158 @@
+# streaming.py
+"""
+JSON response helpers.
+
+The app's default response class is FastAPI's ORJSONResponse, so ordinary
+handlers already serialise through orjson. For list endpoints whose size is
+bounded only by the data (marketplace listings, full wellness history, the
+course catalog), `stream_rows` goes further: the statement runs on its own
+connection with a server-side cursor (`stream_results`), rows are fetched
+CHUNK_SIZE at a time, and each chunk is serialised and sent before the next
+is fetched, so memory stays proportional to the chunk, not the result.
+
+Clients get a plain JSON array by default - the same body as before - or
+NDJSON (one object per line) if they send `Accept: application/x-ndjson`.
+
+List endpoints also take an opt-in `fields=` parameter (e.g.
+`fields=id,title,price,seller.name`) so a screen can fetch only the keys it
+renders; `parse_fields` turns it into a spec and `pick_fields` applies it.
+Unknown names are ignored; without `fields` the full objects are returned.
+
+`stream_events` sends an async stream of (event, data) pairs - an AI answer
+token by token - as server-sent events, or as NDJSON objects with an "event"
+key for clients that ask for it.
+
+Once the first chunk has gone out the status code is fixed at 200; an error
+mid-stream is logged and the body is cut short, which the client sees as
+malformed JSON.
+"""
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional, Tuple
+
+import orjson
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.sql import Executable
+
+from .database import engine
+
+CHUNK_SIZE = 500
+NDJSON = "application/x-ndjson"
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+FieldSpec = Dict[str, Optional["FieldSpec"]]
+
+
+def parse_fields(fields: Optional[str]) -> Optional[FieldSpec]:
+    """"id,seller.name" -> {"id": None, "seller": {"name": None}}; None means everything"""
+    if not fields:
+        return None
+    spec: FieldSpec = {}
+    for path in fields.split(","):
+        node = spec
+        parts = [part for part in path.strip().split(".") if part]
+        for depth, part in enumerate(parts):
+            if depth == len(parts) - 1:
+                node.setdefault(part, None)
+            else:
+                child = node.get(part)
+                if child is None and part in node:
+                    break  # the whole object was already asked for
+                node = node.setdefault(part, {})
+    return spec or None
+
+
+def pick_fields(value, spec: Optional[FieldSpec]):
+    """Keep only the fields in `spec`, for one object or a list of them"""
+    if spec is None:
+        return value
+    if isinstance(value, list):
+        return [pick_fields(item, spec) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {
+        key: value[key] if sub is None else pick_fields(value[key], sub)
+        for key, sub in spec.items() if key in value
+    }
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON in request.headers.get("accept", "")
+
+
+def iter_chunks(statement: Executable, chunk_size: int = CHUNK_SIZE) -> Iterator[list]:
+    """Rows of `statement` in lists of up to `chunk_size`, from a server-side cursor"""
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(statement)
+        for partition in result.partitions():
+            yield partition
+
+
+def _json_array(chunks: Iterator[list], serialize: Callable) -> Iterator[bytes]:
+    yield b"["
+    separator = b""
+    for rows in chunks:
+        yield separator + b",".join(orjson.dumps(serialize(row), option=ORJSON_OPTIONS) for row in rows)
+        separator = b","
+    yield b"]"
+
+
+def _ndjson(chunks: Iterator[list], serialize: Callable) -> Iterator[bytes]:
+    for rows in chunks:
+        yield b"".join(orjson.dumps(serialize(row), option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+                       for row in rows)
+
+
+def _guarded(body: Iterator[bytes], name: str) -> Iterator[bytes]:
+    try:
+        yield from body
+    except Exception as e:
+        print(f"❌ Streaming {name} failed mid-response: {e}")
+
+
+def stream_rows(request: Request, statement: Executable, serialize: Callable,
+                chunk_size: int = CHUNK_SIZE, name: Optional[str] = None,
+                headers: Optional[dict] = None, fields: Optional[str] = None) -> StreamingResponse:
+    """Stream `serialize(row)` for every row of `statement` as a JSON array or NDJSON"""
+    spec = parse_fields(fields)
+    if spec is not None:
+        full = serialize
+        serialize = lambda row: pick_fields(full(row), spec)
+    chunks = iter_chunks(statement, chunk_size)
+    if wants_ndjson(request):
+        body, media_type = _ndjson(chunks, serialize), NDJSON
+    else:
+        body, media_type = _json_array(chunks, serialize), "application/json"
+    # A sync iterator: Starlette pulls it in the threadpool, off the event loop
+    return StreamingResponse(_guarded(body, name or request.url.path),
+                             media_type=media_type, headers=headers)
+
+
+def _sse(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data, option=ORJSON_OPTIONS) + b"\n\n"
+
+
+async def _events(events: AsyncIterator[Tuple[str, dict]], ndjson: bool, name: str) -> AsyncIterator[bytes]:
+    try:
+        async for event, data in events:
+            if ndjson:
+                yield orjson.dumps({"event": event, **data}, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+            else:
+                yield _sse(event, data)
+    except Exception as e:
+        print(f"❌ Streaming {name} failed mid-response: {e}")
+    finally:
+        await events.aclose()  # runs its cleanup now, also when the client went away
+
+
+def stream_events(request: Request, events: AsyncIterator[Tuple[str, dict]],
+                  name: Optional[str] = None) -> StreamingResponse:
+    """Stream (event, data) pairs as server-sent events, or NDJSON"""
+    # no-transform: sent as written, never held back for compression (see compression.py)
+    headers = {"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"}
+    if wants_ndjson(request):
+        return StreamingResponse(_events(events, True, name or request.url.path), media_type=NDJSON,
+                                 headers=headers)
+    return StreamingResponse(_events(events, False, name or request.url.path), media_type="text/event-stream",
+                             headers=headers)
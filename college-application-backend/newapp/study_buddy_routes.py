@@ -6,11 +6,13 @@ from sqlalchemy import and_, or_, func, text
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
-import numpy as np
 from collections import defaultdict
 
 from .database import get_database
 from . import models
+from .lazy_imports import lazy_import
+
+np = lazy_import("numpy")
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
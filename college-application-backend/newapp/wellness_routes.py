@@ -1,11 +1,9 @@
 # apis/wellness_routes.py
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
 from datetime import datetime, timedelta, date
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from textblob import TextBlob
-import numpy as np
+from sqlalchemy import func, and_, select
 import json
 from pydantic import BaseModel
 from typing import Optional, List
@@ -14,15 +12,30 @@ from newapp.models import (
     RiskAssessment,
     CounselorForm,      # ← Add this
     DailyAnalysis,
-    ChatMessage,
-    TimetableEntry,
-    TodoItem,
     GradeEntry
 )
 from newapp.database import get_database as get_db
+from newapp.streaming import stream_rows
+from newapp import activity_rollups, daily_analysis, wellness_stats
+from newapp.database import upsert
+from newapp.lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+textblob = lazy_import("textblob")
 
 wellness_bp = APIRouter()
 
+# Letter grade -> points for the academic decline risk (unknown grades count as 5)
+GRADE_POINTS = {"A+": 10, "A": 9, "B+": 8, "B": 7, "C+": 6, "C": 5, "D": 4, "F": 2}
+# Decimal places risk inputs are rounded to before threshold comparisons
+RISK_PRECISION = 6
+
+# A repeat check-in the same day overwrites the day's entry
+upsert_entry = upsert(WellnessEntry.__table__, ("user_id", "date"), (
+    "mood_score", "stress_level", "energy_level", "sleep_hours", "sleep_quality",
+    "notes", "triggers", "updated_at",
+))
+
 # ==================== PYDANTIC MODELS ====================
 
 class WellnessCheckIn(BaseModel):
@@ -64,67 +77,77 @@ async def wellness_check_in():
 
 @wellness_bp.post('/checkin')
 async def create_wellness_checkin(data: WellnessCheckIn, db: Session = Depends(get_db)):
-    """Save daily wellness check-in"""
+    """
+    Save daily wellness check-in
+
+    One upsert on (user_id, date); the day's full analysis (chat activity,
+    classes, todos) and the rolling stats are updated by the daily-analysis
+    workers, see daily_analysis.py and GET /daily-analysis/{user_id}.
+    """
     today = date.today()
     
     print(f"📝 Check-in for user {data.user_id}")
     
-    # Check if entry already exists for today
-    existing = db.query(WellnessEntry).filter(
-        WellnessEntry.user_id == data.user_id,
-        WellnessEntry.date == today
-    ).first()
-    
-    if existing:
-        # Update existing entry
-        existing.mood_score = data.mood
-        existing.stress_level = data.stress
-        existing.energy_level = data.energy
-        existing.sleep_hours = data.sleep_hours
-        existing.sleep_quality = data.sleep_quality
-        existing.notes = data.notes
-        existing.triggers = data.triggers
-        existing.updated_at = datetime.utcnow()
-        print(f"✏️ Updated existing entry ID: {existing.id}")
-    else:
-        # Create new entry
-        entry = WellnessEntry(
-            user_id=data.user_id,
-            date=today,
-            mood_score=data.mood,
-            stress_level=data.stress,
-            energy_level=data.energy,
-            sleep_hours=data.sleep_hours,
-            sleep_quality=data.sleep_quality,
-            notes=data.notes,
-            triggers=data.triggers
-        )
-        db.add(entry)
-        print(f"➕ Created new entry for {today}")
-    
+    db.execute(upsert_entry, {
+        "user_id": data.user_id,
+        "date": today,
+        "mood_score": data.mood,
+        "stress_level": data.stress,
+        "energy_level": data.energy,
+        "sleep_hours": data.sleep_hours,
+        "sleep_quality": data.sleep_quality,
+        "notes": data.notes,
+        "triggers": data.triggers,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    })
     db.commit()
     
-    # Verify it was saved
-    count = db.query(WellnessEntry).filter(
-        WellnessEntry.user_id == data.user_id
-    ).count()
-    print(f"📊 Total entries for user {data.user_id}: {count}")
-    
-    # Generate daily analysis
-    analysis = generate_daily_analysis(data.user_id, db)
+    daily_analysis.enqueue(data.user_id, today)
     
     return {
         "success": True,
         "message": "Check-in saved successfully",
         "analysis": {
-            "predicted_mood": analysis.predicted_mood,
-            "risk_level": analysis.risk_level,
-            "recommendations": json.loads(analysis.recommendations or "[]")
+            "predicted_mood": data.mood,
+            "risk_level": daily_analysis.risk_level(data.mood, data.stress),
+            "recommendations": daily_analysis.recommendations(data.stress),
+            "pending": True
         }
     
     }
 
 
+@wellness_bp.get('/daily-analysis/{user_id}')
+async def get_daily_analysis(user_id: int, day: Optional[date] = None, db: Session = Depends(get_db)):
+    """The stored daily analysis for `day` (default today), once the workers have run it"""
+    day = day or date.today()
+    analysis = db.query(DailyAnalysis).filter(
+        DailyAnalysis.user_id == user_id,
+        DailyAnalysis.analysis_date == day
+    ).first()
+    
+    if not analysis:
+        return {"exists": False, "pending": daily_analysis.queue.is_pending(user_id, day)}
+    
+    return {
+        "exists": True,
+        "date": analysis.analysis_date.isoformat(),
+        "predicted_mood": analysis.predicted_mood,
+        "predicted_stress": analysis.predicted_stress,
+        "predicted_energy": analysis.predicted_energy,
+        "message_count": analysis.message_count,
+        "chat_activity_level": analysis.chat_activity_level,
+        "avg_message_sentiment": analysis.avg_message_sentiment,
+        "sentiment_score": analysis.sentiment_score,
+        "classes_today": analysis.classes_today,
+        "todos_pending": analysis.todos_pending,
+        "academic_stress": analysis.academic_stress,
+        "risk_level": analysis.risk_level,
+        "recommendations": json.loads(analysis.recommendations or "[]")
+    }
+
+
 # ==================== ANALYTICS ====================
 
 @wellness_bp.get('/analytics/{user_id}')
@@ -133,7 +156,13 @@ async def get_wellness_analytics(
     days: int = Query(30),
     db: Session = Depends(get_db)
 ):
-    """Get 30-day wellness analytics with charts"""
+    """
+    Get 30-day wellness analytics with charts
+    
+    Computed from the window's entries, which the time series needs anyway;
+    reading the rolling aggregates (wellness_stats) as well would only add
+    a query.
+    """
     end_date = date.today()
     start_date = end_date - timedelta(days=days)
     
@@ -197,26 +226,30 @@ async def get_wellness_analytics(
 async def assess_mental_health_risk(user_id: int, db: Session = Depends(get_db)):
     """Comprehensive mental health risk assessment"""
     
-    # Get last 14 days of data
-    fourteen_days_ago = date.today() - timedelta(days=14)
-    entries = db.query(WellnessEntry).filter(
-        WellnessEntry.user_id == user_id,
-        WellnessEntry.date >= fourteen_days_ago
-    ).all()
-    
-    if len(entries) < 3:
+    # Last 14 days, with the last 7 as "recent", from the rolling aggregates
+    state = wellness_stats.load(db, user_id)
+    fortnight = wellness_stats.window(state, 14)
+    week = wellness_stats.window(state, 7)
+    if fortnight["n"] < 3:
         raise HTTPException(status_code=400, detail="Insufficient data for assessment")
+    recent = week if week["n"] else fortnight
     
     # Calculate risk scores
-    mood_risk = calculate_mood_risk(entries)
-    stress_risk = calculate_stress_risk(entries)
-    sleep_risk = calculate_sleep_risk(entries)
+    mood_risk = mood_risk_score(
+        wellness_stats.mean(recent, "mood"), wellness_stats.std(fortnight, "mood")
+    )
+    stress_risk = stress_risk_score(
+        wellness_stats.mean(recent, "stress"), wellness_stats.slope(recent, "day", "stress")
+    )
+    sleep_risk = sleep_risk_score(
+        wellness_stats.sleep_mean(fortnight), wellness_stats.recent_sleep(state, 14)
+    )
     social_risk = calculate_social_withdrawal_risk(user_id, db)
     academic_risk = calculate_academic_risk(user_id, db)
     
     # Overall risk
     risk_scores = [mood_risk, stress_risk, sleep_risk, social_risk, academic_risk]
-    overall_risk = np.mean([s for s in risk_scores if s > 0])
+    overall_risk = float(np.mean([s for s in risk_scores if s > 0]))
     
     # Determine risk level
     if overall_risk >= 70:
@@ -284,7 +317,7 @@ async def submit_counselor_form(data: CounselorFormSubmit, db: Session = Depends
     
     # Analyze message sentiment to determine priority
     message = data.message
-    sentiment = TextBlob(message).sentiment.polarity
+    sentiment = textblob.TextBlob(message).sentiment.polarity
     
     # Detect urgency keywords
     urgent_keywords = ['suicide', 'kill', 'harm', 'emergency', 'crisis']
@@ -368,20 +401,19 @@ async def get_today_entry(user_id: int, db: Session = Depends(get_db)):
 
 
 @wellness_bp.get('/history/{user_id}')
-async def get_wellness_history(user_id: int, db: Session = Depends(get_db)):
-    """Get all wellness entries for user"""
+async def get_wellness_history(user_id: int, request: Request, fields: Optional[str] = None):
+    """Get all wellness entries for user, newest first (streamed; NDJSON on request; `fields=` to pick keys)"""
     
-    entries = db.query(WellnessEntry).filter(
-        WellnessEntry.user_id == user_id
-    ).order_by(WellnessEntry.date.desc()).all()
+    entries = WellnessEntry.__table__
+    query = select(
+        entries.c.id, entries.c.date, entries.c.mood_score, entries.c.stress_level,
+        entries.c.energy_level, entries.c.sleep_hours, entries.c.sleep_quality,
+        entries.c.notes, entries.c.triggers
+    ).where(entries.c.user_id == user_id).order_by(entries.c.date.desc(), entries.c.id.desc())
     
-    # Add debug logging
     print(f"📋 History request for user {user_id}")
-    print(f"📊 Found {len(entries)} total entries")
-    if entries:
-        print(f"📅 Date range: {entries[-1].date} to {entries[0].date}")
     
-    result = [{
+    return stream_rows(request, query, lambda e: {
         "id": e.id,
         "date": str(e.date),
         "mood_score": e.mood_score,
@@ -391,32 +423,25 @@ async def get_wellness_history(user_id: int, db: Session = Depends(get_db)):
         "sleep_quality": e.sleep_quality,
         "notes": e.notes,
         "triggers": e.triggers
-    } for e in entries]
-    
-    print(f"✅ Returning {len(result)} entries")
-    return result
+    }, name="wellness history", fields=fields)
 
 @wellness_bp.get('/insights/{user_id}')
 async def get_personalized_insights(user_id: int, db: Session = Depends(get_db)):
     """Generate personalized wellness insights"""
     
-    # Get last 30 days
-    thirty_days_ago = date.today() - timedelta(days=30)
-    entries = db.query(WellnessEntry).filter(
-        WellnessEntry.user_id == user_id,
-        WellnessEntry.date >= thirty_days_ago
-    ).all()
+    # Last 30 days vs the last 7, from the rolling aggregates
+    state = wellness_stats.load(db, user_id)
+    month = wellness_stats.window(state, 30)
+    week = wellness_stats.window(state, 7)
     
-    if not entries:
+    if not month["n"]:
         return {"insights": []}
     
     insights = []
     
     # Mood trend
-    moods = [e.mood_score for e in entries]
-    recent_moods = moods[-7:]
-    overall_avg = np.mean(moods)
-    recent_avg = np.mean(recent_moods)
+    overall_avg = wellness_stats.mean(month, "mood")
+    recent_avg = wellness_stats.mean(week if week["n"] else month, "mood")
     
     if recent_avg > overall_avg + 0.5:
         insights.append({
@@ -434,9 +459,8 @@ async def get_personalized_insights(user_id: int, db: Session = Depends(get_db))
         })
     
     # Sleep correlation
-    sleep_hours = [e.sleep_hours for e in entries if e.sleep_hours]
-    if sleep_hours:
-        avg_sleep = np.mean(sleep_hours)
+    avg_sleep = wellness_stats.sleep_mean(month)
+    if avg_sleep is not None:
         if avg_sleep < 6:
             insights.append({
                 "type": "action",
@@ -446,8 +470,7 @@ async def get_personalized_insights(user_id: int, db: Session = Depends(get_db))
             })
     
     # Stress levels
-    stress_levels = [e.stress_level for e in entries]
-    avg_stress = np.mean(stress_levels)
+    avg_stress = wellness_stats.mean(month, "stress")
     if avg_stress > 7:
         insights.append({
             "type": "alert",
@@ -457,7 +480,7 @@ async def get_personalized_insights(user_id: int, db: Session = Depends(get_db))
         })
     
     # Consistency
-    streak = calculate_streak(entries)
+    streak = wellness_stats.streak(state, 30)
     if streak >= 7:
         insights.append({
             "type": "achievement",
@@ -471,69 +494,60 @@ async def get_personalized_insights(user_id: int, db: Session = Depends(get_db))
 
 @wellness_bp.get('/monthly-report/{user_id}')
 async def get_monthly_report(user_id: int, db: Session = Depends(get_db)):
-    """Generate comprehensive monthly report"""
+    """Generate comprehensive monthly report (from the month-to-date aggregates)"""
     
-    # Get current month data
     today = date.today()
     month_start = today.replace(day=1)
     
-    entries = db.query(WellnessEntry).filter(
-        WellnessEntry.user_id == user_id,
-        WellnessEntry.date >= month_start,
-        WellnessEntry.date <= today
-    ).all()
-    
-    if not entries:
+    month = wellness_stats.load(db, user_id, today)["month"]
+    if not month["n"]:
         raise HTTPException(status_code=404, detail="No data for this month")
     
-    # Statistics
-    moods = [e.mood_score for e in entries]
-    stress = [e.stress_level for e in entries]
-    energy = [e.energy_level for e in entries]
-    sleep = [e.sleep_hours for e in entries if e.sleep_hours]
-    
-    # Mood distribution
-    mood_distribution = {
-        "1-2": sum(1 for m in moods if m <= 2),
-        "2-3": sum(1 for m in moods if 2 < m <= 3),
-        "3-4": sum(1 for m in moods if 3 < m <= 4),
-        "4-5": sum(1 for m in moods if m > 4)
-    }
-    
-    # Stress distribution
-    stress_distribution = {
-        "Low (1-3)": sum(1 for s in stress if s <= 3),
-        "Medium (4-6)": sum(1 for s in stress if 3 < s <= 6),
-        "High (7-10)": sum(1 for s in stress if s > 6)
-    }
+    mood_bins = month["mood_bins"]
+    stress_bins = month["stress_bins"]
     
-    # Best and worst days
-    best_entry = max(entries, key=lambda x: x.mood_score)
-    worst_entry = min(entries, key=lambda x: x.mood_score)
+    # Best and worst days; only their notes need the entries
+    best_day, best_mood = month["best"]
+    worst_day, worst_mood = month["worst"]
+    notes = dict(db.execute(
+        select(WellnessEntry.date, WellnessEntry.notes).where(
+            WellnessEntry.user_id == user_id,
+            WellnessEntry.date.in_([date.fromisoformat(best_day), date.fromisoformat(worst_day)])
+        )
+    ).all())
     
     return {
         "month": month_start.strftime("%B %Y"),
-        "total_entries": len(entries),
+        "total_entries": month["n"],
         "statistics": {
-            "avg_mood": round(np.mean(moods), 2),
-            "avg_stress": round(np.mean(stress), 2),
-            "avg_energy": round(np.mean(energy), 2),
-            "avg_sleep": round(np.mean(sleep), 2) if sleep else 0
+            "avg_mood": round(month["sum"]["mood"] / month["n"], 2),
+            "avg_stress": round(month["sum"]["stress"] / month["n"], 2),
+            "avg_energy": round(month["sum"]["energy"] / month["n"], 2),
+            "avg_sleep": round(month["sleep_sum"] / month["sleep_n"], 2) if month["sleep_n"] else 0
         },
         "distributions": {
-            "mood": mood_distribution,
-            "stress": stress_distribution
+            "mood": {
+                "1-2": mood_bins[0],
+                "2-3": mood_bins[1],
+                "3-4": mood_bins[2],
+                "4-5": mood_bins[3]
+            },
+            "stress": {
+                "Low (1-3)": stress_bins[0],
+                "Medium (4-6)": stress_bins[1],
+                "High (7-10)": stress_bins[2]
+            }
         },
         "highlights": {
             "best_day": {
-                "date": str(best_entry.date),
-                "mood": best_entry.mood_score,
-                "notes": best_entry.notes
+                "date": best_day,
+                "mood": best_mood,
+                "notes": notes.get(date.fromisoformat(best_day))
             },
             "worst_day": {
-                "date": str(worst_entry.date),
-                "mood": worst_entry.mood_score,
-                "notes": worst_entry.notes
+                "date": worst_day,
+                "mood": worst_mood,
+                "notes": notes.get(date.fromisoformat(worst_day))
             }
         }
     }
@@ -542,74 +556,6 @@ async def get_monthly_report(user_id: int, db: Session = Depends(get_db)):
 # ==================== HELPER FUNCTIONS (Keep as-is) ====================
 # [All your helper functions remain unchanged - they're pure Python]
 
-def generate_daily_analysis(user_id, db):
-    """Generate AI daily analysis"""
-    today = date.today()
-    
-    entry = db.query(WellnessEntry).filter(
-        WellnessEntry.user_id == user_id,
-        WellnessEntry.date == today
-    ).first()
-    
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    message_count = db.query(ChatMessage).filter(
-        ChatMessage.sender_id == user_id,
-        ChatMessage.created_at >= seven_days_ago
-    ).count()
-    
-    day_name = today.strftime("%A")
-    classes_today = db.query(TimetableEntry).filter(
-        TimetableEntry.user_id == user_id,
-        TimetableEntry.day_of_week == day_name
-    ).count()
-    
-    todos_pending = db.query(TodoItem).filter(
-        TodoItem.user_id == user_id,
-        TodoItem.is_completed == False
-    ).count()
-    
-    academic_stress = min(10, (classes_today * 1.5) + (todos_pending * 0.5))
-    
-    predicted_mood = entry.mood_score if entry else 3.0
-    predicted_stress = entry.stress_level if entry else 5.0
-    
-    if predicted_mood < 2.5 or predicted_stress > 7:
-        risk_level = "high"
-    elif predicted_mood < 3.5 or predicted_stress > 5:
-        risk_level = "medium"
-    else:
-        risk_level = "low"
-    
-    recommendations = []
-    if predicted_stress > 6:
-        recommendations.append("Take 10-minute breaks every hour")
-        recommendations.append("Try box breathing exercise")
-    if classes_today >= 4:
-        recommendations.append("Heavy class schedule - pace yourself")
-    if message_count < 5:
-        recommendations.append("Consider reaching out to friends")
-    
-    analysis = DailyAnalysis(
-        user_id=user_id,
-        analysis_date=today,
-        predicted_mood=predicted_mood,
-        predicted_stress=predicted_stress,
-        predicted_energy=entry.energy_level if entry else 5.0,
-        message_count=message_count,
-        chat_activity_level="low" if message_count < 10 else "medium" if message_count < 30 else "high",
-        classes_today=classes_today,
-        todos_pending=todos_pending,
-        academic_stress=academic_stress,
-        risk_level=risk_level,
-        recommendations=json.dumps(recommendations)
-    )
-    
-    db.add(analysis)
-    db.commit()
-    
-    return analysis
-
-
 def calculate_correlation(x, y):
     """Calculate Pearson correlation"""
     if len(x) < 2 or len(y) < 2:
@@ -689,9 +635,13 @@ def calculate_mood_risk(entries):
     moods = [e.mood_score for e in entries]
     recent_moods = moods[-7:] if len(moods) >= 7 else moods
     
-    avg_recent = np.mean(recent_moods)
-    volatility = np.std(moods)
-    
+    return mood_risk_score(np.mean(recent_moods), np.std(moods))
+
+
+def mood_risk_score(avg_recent, volatility):
+    """Mood risk from the recent average and the overall standard deviation"""
+    # Compared at 6 places so incremental, batch and numpy sums agree at the thresholds
+    avg_recent, volatility = round(avg_recent, RISK_PRECISION), round(volatility, RISK_PRECISION)
     risk = 0
     if avg_recent < 2.5:
         risk += 50
@@ -712,8 +662,13 @@ def calculate_stress_risk(entries):
     avg_stress = np.mean(recent_stress)
     trend = np.polyfit(range(len(recent_stress)), recent_stress, 1)[0]
     
+    return stress_risk_score(avg_stress, trend)
+
+
+def stress_risk_score(avg_stress, trend):
+    """Stress risk from the recent average and its slope per day"""
     risk = (avg_stress / 10) * 50
-    if trend > 0.5:
+    if round(trend, RISK_PRECISION) > 0.5:
         risk += 30
     
     return min(100, risk)
@@ -726,8 +681,15 @@ def calculate_sleep_risk(entries):
     if not sleep_hours:
         return 0
     
-    avg_sleep = np.mean(sleep_hours)
-    recent_sleep = np.mean(sleep_hours[-3:]) if len(sleep_hours) >= 3 else avg_sleep
+    return sleep_risk_score(np.mean(sleep_hours), sleep_hours[-3:])
+
+
+def sleep_risk_score(avg_sleep, last_nights):
+    """Sleep risk from the average reported sleep and the last 3 reported nights"""
+    if avg_sleep is None:
+        return 0
+    recent_sleep = sum(last_nights[-3:]) / 3 if len(last_nights) >= 3 else avg_sleep
+    recent_sleep = round(recent_sleep, RISK_PRECISION)
     
     risk = 0
     if recent_sleep < 5:
@@ -742,19 +704,7 @@ def calculate_sleep_risk(entries):
 
 def calculate_social_withdrawal_risk(user_id, db):
     """Calculate social withdrawal risk"""
-    week_ago = datetime.now() - timedelta(days=7)
-    two_weeks_ago = datetime.now() - timedelta(days=14)
-    
-    current_messages = db.query(ChatMessage).filter(
-        ChatMessage.sender_id == user_id,
-        ChatMessage.created_at >= week_ago
-    ).count()
-    
-    prev_messages = db.query(ChatMessage).filter(
-        ChatMessage.sender_id == user_id,
-        ChatMessage.created_at >= two_weeks_ago,
-        ChatMessage.created_at < week_ago
-    ).count()
+    current_messages, prev_messages = activity_rollups.weekly_messages(db, user_ids=[user_id]).get(user_id, (0, 0))
     
     if prev_messages == 0:
         return 0
@@ -780,8 +730,7 @@ def calculate_academic_risk(user_id, db):
     if len(grades) < 2:
         return 0
     
-    grade_map = {"A+": 10, "A": 9, "B+": 8, "B": 7, "C+": 6, "C": 5, "D": 4, "F": 2}
-    scores = [grade_map.get(g.grade, 5) for g in grades]
+    scores = [GRADE_POINTS.get(g.grade, 5) for g in grades]
     
     recent_avg = np.mean(scores[:3])
     overall_avg = np.mean(scores)
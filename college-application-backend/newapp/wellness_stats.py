@@ -0,0 +1,360 @@
+# wellness_stats.py
+"""
+Rolling wellness aggregates.
+
+The insights, monthly report and risk endpoints used to reload every
+WellnessEntry in their window and recompute means, correlations, streaks
+and weekday patterns with numpy on each call. (/analytics still does: it
+returns the entries as a time series, so it has them anyway.) Instead each
+user has
+one `wellness_stats` row whose JSON `state` holds, as of the day it was last
+advanced (`end`):
+
+  - per window in WINDOWS (entries dated end-w .. end, the same bounds the
+    endpoints always used): count, Welford means and M2 for mood, stress,
+    energy, sleep (missing = 0) and the day number, co-moments for the
+    sleep/stress/energy-mood correlations and the stress-over-time slope,
+    truthy-sleep count/sum, and per-weekday count/mood/stress sums
+  - the current check-in streak (last date + length)
+  - the last RECENT_SLEEP reported sleep values
+  - month-to-date sums, mood/stress histograms and best/worst day
+
+The daily-analysis worker folds each check-in in (daily_analysis.py), in
+the transaction that stores the day's analysis. Moving `end` forward
+evicts the entries that fell out of each window with the inverse Welford
+update; only those rows are read (usually one per window per day). Reads
+advance a copy of the state to today the same way without writing it back.
+An entry for a day already counted (a repeat check-in), or a missing row,
+rebuilds the state from the last MAX_WINDOW days of entries.
+tests/test_wellness_stats.py checks every window against the batch
+formulas day by day.
+"""
+import copy
+import math
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from newapp.models import WellnessEntry, WellnessStats
+
+WINDOWS = (7, 14, 30, 90)  # days
+MAX_WINDOW = max(WINDOWS)
+RECENT_SLEEP = 3
+# M2 left over from evicting the varying entries of a now-constant series is
+# rounding error, not variance; real variance on these scales is far larger
+M2_EPSILON = 1e-9
+
+MOMENTS = ("mood", "stress", "energy", "sleep", "day")
+PAIRS = (("sleep", "mood"), ("stress", "mood"), ("energy", "mood"), ("day", "stress"))
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+_entries = WellnessEntry.__table__
+_stats = WellnessStats.__table__
+
+
+def _observation(row) -> dict:
+    return {
+        "date": row.date,
+        "mood": row.mood_score,
+        "stress": row.stress_level,
+        "energy": row.energy_level,
+        "sleep": row.sleep_hours or 0,
+        "sleep_hours": row.sleep_hours,
+        "day": row.date.toordinal(),
+    }
+
+
+# ================ WINDOW MOMENTS ================
+
+def _empty_window() -> dict:
+    return {
+        "n": 0,
+        "mean": {name: 0.0 for name in MOMENTS},
+        "m2": {name: 0.0 for name in MOMENTS},
+        "cov": {f"{a}_{b}": 0.0 for a, b in PAIRS},
+        "sleep_n": 0,
+        "sleep_sum": 0.0,
+        "weekday": {day: [0, 0.0, 0.0] for day in WEEKDAYS},
+    }
+
+
+def _add(window: dict, x: dict):
+    window["n"] += 1
+    n = window["n"]
+    mean, m2, cov = window["mean"], window["m2"], window["cov"]
+    before = dict(mean)
+    for name in MOMENTS:
+        mean[name] += (x[name] - before[name]) / n
+    for name in MOMENTS:
+        m2[name] += (x[name] - before[name]) * (x[name] - mean[name])
+    for a, b in PAIRS:
+        cov[f"{a}_{b}"] += (x[a] - before[a]) * (x[b] - mean[b])
+
+    if x["sleep_hours"]:
+        window["sleep_n"] += 1
+        window["sleep_sum"] += x["sleep_hours"]
+    weekday = window["weekday"][WEEKDAYS[x["date"].weekday()]]
+    weekday[0] += 1
+    weekday[1] += x["mood"]
+    weekday[2] += x["stress"]
+
+
+def _remove(window: dict, x: dict):
+    """Inverse of `_add`"""
+    n = window["n"] - 1
+    if n == 0:
+        window.update(_empty_window())
+        return
+    window["n"] = n
+    mean, m2, cov = window["mean"], window["m2"], window["cov"]
+    before = dict(mean)
+    for name in MOMENTS:
+        mean[name] = (before[name] * (n + 1) - x[name]) / n
+    for name in MOMENTS:
+        m2[name] = max(0.0, m2[name] - (x[name] - mean[name]) * (x[name] - before[name]))
+    for a, b in PAIRS:
+        cov[f"{a}_{b}"] -= (x[a] - mean[a]) * (x[b] - before[b])
+
+    if x["sleep_hours"]:
+        window["sleep_n"] -= 1
+        window["sleep_sum"] -= x["sleep_hours"]
+    weekday = window["weekday"][WEEKDAYS[x["date"].weekday()]]
+    weekday[0] -= 1
+    weekday[1] -= x["mood"]
+    weekday[2] -= x["stress"]
+
+
+# ================ STATE ================
+
+def _empty_month(day: date) -> dict:
+    return {
+        "start": day.replace(day=1).isoformat(),
+        "n": 0,
+        "sum": {"mood": 0.0, "stress": 0.0, "energy": 0.0},
+        "sleep_n": 0,
+        "sleep_sum": 0.0,
+        "mood_bins": [0, 0, 0, 0],
+        "stress_bins": [0, 0, 0],
+        "best": None,
+        "worst": None,
+    }
+
+
+def _empty_state(day: date) -> dict:
+    return {
+        "end": day.isoformat(),
+        "windows": {str(w): _empty_window() for w in WINDOWS},
+        "streak": {"last": None, "days": 0},
+        "recent_sleep": [],
+        "month": _empty_month(day),
+    }
+
+
+def _add_to_month(month: dict, x: dict):
+    month["n"] += 1
+    for name in month["sum"]:
+        month["sum"][name] += x[name]
+    if x["sleep_hours"]:
+        month["sleep_n"] += 1
+        month["sleep_sum"] += x["sleep_hours"]
+
+    mood, stress = x["mood"], x["stress"]
+    month["mood_bins"][0 if mood <= 2 else 1 if mood <= 3 else 2 if mood <= 4 else 3] += 1
+    month["stress_bins"][0 if stress <= 3 else 1 if stress <= 6 else 2] += 1
+    # Strict comparisons keep the earliest day on ties, like max()/min() over the month
+    if month["best"] is None or mood > month["best"][1]:
+        month["best"] = [x["date"].isoformat(), mood]
+    if month["worst"] is None or mood < month["worst"][1]:
+        month["worst"] = [x["date"].isoformat(), mood]
+
+
+def _track(state: dict, x: dict):
+    """Streak and recent sleep; entries must arrive in date order"""
+    streak = state["streak"]
+    day = x["date"]
+    if streak["last"] and date.fromisoformat(streak["last"]) == day - timedelta(days=1):
+        streak["days"] += 1
+    elif streak["last"] != day.isoformat():
+        streak["days"] = 1
+    streak["last"] = day.isoformat()
+
+    if x["sleep_hours"]:
+        state["recent_sleep"] = (state["recent_sleep"] + [[day.isoformat(), x["sleep_hours"]]])[-RECENT_SLEEP:]
+
+
+def _add_entry(state: dict, x: dict):
+    """Add the entry for day `state["end"]`"""
+    for window in state["windows"].values():
+        _add(window, x)
+    _track(state, x)
+    _add_to_month(state["month"], x)
+
+
+def _advance(db: Session, user_id: int, state: dict, day: date):
+    """Move the windows forward to end on `day`, evicting entries that fell out"""
+    end = date.fromisoformat(state["end"])
+    if day <= end:
+        return
+
+    # Windows still overlapping the new range lose only their oldest days
+    sliding = [w for w in WINDOWS if day - timedelta(days=w) <= end]
+    for w in WINDOWS:
+        if w not in sliding:
+            state["windows"][str(w)] = _empty_window()
+    if sliding:
+        rows = db.execute(
+            select(_entries.c.date, _entries.c.mood_score, _entries.c.stress_level,
+                   _entries.c.energy_level, _entries.c.sleep_hours)
+            .where(_entries.c.user_id == user_id,
+                   _entries.c.date >= end - timedelta(days=max(sliding)),
+                   _entries.c.date < day - timedelta(days=min(sliding)),
+                   _entries.c.date <= end)
+        ).all()
+        for w in sliding:
+            first_kept = day - timedelta(days=w)
+            window = state["windows"][str(w)]
+            for row in rows:
+                if end - timedelta(days=w) <= row.date < first_kept:
+                    _remove(window, _observation(row))
+
+    if day.replace(day=1).isoformat() != state["month"]["start"]:
+        state["month"] = _empty_month(day)
+    state["end"] = day.isoformat()
+
+
+def build(db: Session, user_id: int, today: Optional[date] = None) -> dict:
+    """State from scratch, from the last MAX_WINDOW days of entries"""
+    today = today or date.today()
+    state = _empty_state(today)
+    rows = db.execute(
+        select(_entries.c.date, _entries.c.mood_score, _entries.c.stress_level,
+               _entries.c.energy_level, _entries.c.sleep_hours)
+        .where(_entries.c.user_id == user_id,
+               _entries.c.date >= today - timedelta(days=MAX_WINDOW),
+               _entries.c.date <= today)
+        .order_by(_entries.c.date, _entries.c.id)
+    ).all()
+    month_start = today.replace(day=1)
+    for row in rows:
+        x = _observation(row)
+        for w in WINDOWS:
+            if row.date >= today - timedelta(days=w):
+                _add(state["windows"][str(w)], x)
+        _track(state, x)
+        if row.date >= month_start:
+            _add_to_month(state["month"], x)
+    return state
+
+
+def record_checkin(db: Session, entry: WellnessEntry, replaced: bool = False):
+    """
+    Fold a check-in (an entry or a row with the same columns) into the user's
+    stats, in the caller's transaction
+
+    `replaced`: the entry overwrote one already counted (a second check-in
+    the same day); its old values are gone, so the state is rebuilt. A state
+    whose streak already ends on the entry's day is treated the same way.
+    """
+    current = db.execute(select(_stats.c.state).where(_stats.c.user_id == entry.user_id)).scalar()
+    if (current is None or replaced or date.fromisoformat(current["end"]) > entry.date
+            or current["streak"]["last"] == entry.date.isoformat()):
+        db.flush()  # the session doesn't autoflush; build() has to see this entry
+        state = build(db, entry.user_id, entry.date)
+    else:
+        state = copy.deepcopy(current)
+        _advance(db, entry.user_id, state, entry.date)
+        _add_entry(state, _observation(entry))
+
+    if current is None:
+        db.execute(insert(_stats).values(user_id=entry.user_id, state=state, updated_at=datetime.utcnow()))
+    else:
+        db.execute(update(_stats).where(_stats.c.user_id == entry.user_id)
+                   .values(state=state, updated_at=datetime.utcnow()))
+
+
+def load(db: Session, user_id: int, today: Optional[date] = None) -> dict:
+    """The user's state advanced to `today` (not written back); built and stored on first use"""
+    today = today or date.today()
+    current = db.execute(select(_stats.c.state).where(_stats.c.user_id == user_id)).scalar()
+    if current is None:
+        state = build(db, user_id, today)
+        try:
+            db.execute(insert(_stats).values(user_id=user_id, state=state, updated_at=datetime.utcnow()))
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+        return state
+    if date.fromisoformat(current["end"]) > today:
+        return build(db, user_id, today)
+
+    state = copy.deepcopy(current)
+    _advance(db, user_id, state, today)
+    return state
+
+
+# ================ READS ================
+
+def window(state: dict, days: int) -> dict:
+    return state["windows"][str(days)]
+
+
+def mean(window: dict, name: str) -> float:
+    return window["mean"][name] if window["n"] else 0.0
+
+
+def std(window: dict, name: str) -> float:
+    """Population standard deviation (np.std)"""
+    return math.sqrt(window["m2"][name] / window["n"]) if window["n"] else 0.0
+
+
+def correlation(window: dict, x: str, y: str) -> float:
+    """Pearson r rounded like calculate_correlation; 0.0 where it's undefined"""
+    if window["n"] < 2 or window["m2"][x] < M2_EPSILON or window["m2"][y] < M2_EPSILON:
+        return 0.0
+    denominator = math.sqrt(window["m2"][x] * window["m2"][y])
+    return round(max(-1.0, min(1.0, window["cov"][f"{x}_{y}"] / denominator)), 2)
+
+
+def slope(window: dict, x: str, y: str) -> float:
+    """Least-squares slope of y over x (np.polyfit(x, y, 1)[0])"""
+    if window["n"] < 2 or window["m2"][x] < M2_EPSILON:
+        return 0.0
+    return window["cov"][f"{x}_{y}"] / window["m2"][x]
+
+
+def sleep_mean(window: dict) -> Optional[float]:
+    """Mean of the reported (non-zero) sleep hours"""
+    return window["sleep_sum"] / window["sleep_n"] if window["sleep_n"] else None
+
+
+def weekly_patterns(state: dict, days: int) -> Dict[str, dict]:
+    """Same shape as analyze_weekly_patterns, weekdays in order from the window's first day"""
+    start = date.fromisoformat(state["end"]) - timedelta(days=days)
+    patterns = {}
+    for offset in range(7):
+        day = WEEKDAYS[(start.weekday() + offset) % 7]
+        count, mood_sum, stress_sum = window(state, days)["weekday"][day]
+        if count:
+            patterns[day] = {
+                "avg_mood": round(mood_sum / count, 2),
+                "avg_stress": round(stress_sum / count, 2),
+            }
+    return patterns
+
+
+def streak(state: dict, days: int) -> int:
+    """calculate_streak over the window's entries"""
+    last = state["streak"]["last"]
+    start = date.fromisoformat(state["end"]) - timedelta(days=days)
+    if last is None or date.fromisoformat(last) < start:
+        return 0
+    return min(state["streak"]["days"], (date.fromisoformat(last) - start).days + 1)
+
+
+def recent_sleep(state: dict, days: int) -> List[float]:
+    """The last RECENT_SLEEP reported sleep values inside the window, oldest first"""
+    start = date.fromisoformat(state["end"]) - timedelta(days=days)
+    return [hours for day, hours in state["recent_sleep"] if date.fromisoformat(day) >= start]
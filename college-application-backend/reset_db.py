@@ -1,6 +1,7 @@
 # reset_db.py
-from newapp.database import SessionLocal, engine
+from newapp.database import engine
 from newapp import models
+from newapp.fixtures import load_boot_fixtures
 
 if __name__ == "__main__":
     print("WARNING: This will delete ALL data in the database!")
@@ -12,16 +13,11 @@ if __name__ == "__main__":
         print("Recreating all tables...")
         models.Base.metadata.create_all(bind=engine)
         
-        # Optionally reinitialize some data
-        db = SessionLocal()
+        # Reload seed data (default admin, mess menu)
         try:
-            # You can call your data population functions here
-            # from main import populate_mess_menu_data
-            # populate_mess_menu_data(db)
+            load_boot_fixtures()
             print("Database tables have been reset!")
         except Exception as e:
             print(f"Error: {e}")
-        finally:
-            db.close()
     else:
         print("Operation cancelled.")
\ No newline at end of file
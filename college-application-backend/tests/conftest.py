@@ -0,0 +1,53 @@
+# tests/conftest.py
+"""
+Shared fixtures. The app runs against a throwaway SQLite database, created
+once per session with the same bootstrap the server runs at startup.
+"""
+import itertools
+import os
+import tempfile
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'test.db')}"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from newapp import models, startup
+from newapp.database import SessionLocal
+
+pytest_plugins = ["newapp.pytest_query_budget"]
+
+_ids = itertools.count(1)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    startup.bootstrap()
+
+
+@pytest.fixture(scope="session")
+def client():
+    from newapp.main import app
+
+    return TestClient(app)  # no lifespan: the periodic jobs stay off
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    def make(**fields):
+        n = next(_ids)
+        user = models.User(email=f"student{n}@smail.iitpkd.ac.in", college_id=f"T{n:04d}",
+                           full_name=f"Student {n}", hashed_password="x", department="CS", year=2,
+                           is_active=True, **fields)
+        db.add(user)
+        db.commit()
+        return user
+    return make
@@ -0,0 +1,26 @@
+# tests/test_admin_routes.py
+import pytest
+
+from newapp import models
+from newapp.admin_auth import create_admin_token
+
+
+@pytest.fixture
+def admin_headers(db, make_user):
+    user = make_user()
+    admin = models.AdminUser(user_id=user.id, admin_level="admin")
+    db.add(admin)
+    db.commit()
+    return {"Authorization": f"Bearer {create_admin_token(admin.id, user.id)}"}
+
+
+@pytest.mark.parametrize("method, url", [
+    ("GET", "/admin/stats/history"),
+    ("POST", "/admin/stats/reconcile"),
+    ("GET", "/admin/wellness/at-risk"),
+    ("POST", "/admin/wellness/risk-scoring/run"),
+])
+def test_admin_only_routes_need_a_token(client, admin_headers, method, url):
+    assert client.request(method, url).status_code == 401
+    assert client.request(method, url, headers={"Authorization": "Bearer not-a-token"}).status_code == 401
+    assert client.request(method, url, headers=admin_headers).status_code == 200
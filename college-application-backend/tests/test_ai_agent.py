@@ -0,0 +1,100 @@
+# tests/test_ai_agent.py
+"""
+AgentRegistry with the MCP client and `create_agent` stubbed out, so
+neither LangChain nor an MCP server is needed.
+"""
+import asyncio
+import sys
+import types
+
+import pytest
+
+from newapp import ai_agent
+
+
+class FakeMCPClient:
+    def __init__(self, connections):
+        self.tools_listed = 0
+        self.failing = False
+
+    async def get_tools(self):
+        self.tools_listed += 1
+        await asyncio.sleep(0.05)
+        if self.failing:
+            raise ConnectionError("MCP server down")
+        return ["get_timetable", "get_mess_menu"]
+
+
+class FakeAgent:
+    def __init__(self, model, tools, system_prompt):
+        self.tools = tools
+
+
+@pytest.fixture
+def stack(monkeypatch):
+    built = []
+
+    def create_agent(model, tools, system_prompt=None):
+        built.append(FakeAgent(model, tools, system_prompt))
+        return built[-1]
+
+    client = types.ModuleType("langchain_mcp_adapters.client")
+    client.MultiServerMCPClient = FakeMCPClient
+    agents = types.ModuleType("langchain.agents")
+    agents.create_agent = create_agent
+    monkeypatch.setitem(sys.modules, "langchain_mcp_adapters", types.ModuleType("langchain_mcp_adapters"))
+    monkeypatch.setitem(sys.modules, "langchain_mcp_adapters.client", client)
+    monkeypatch.setitem(sys.modules, "langchain", types.ModuleType("langchain"))
+    monkeypatch.setitem(sys.modules, "langchain.agents", agents)
+    return built
+
+
+def test_concurrent_requests_share_one_build(stack):
+    registry = ai_agent.AgentRegistry(url="http://mcp.test/mcp")
+
+    async def ask_all():
+        return await asyncio.gather(*(registry.get() for _ in range(20)))
+
+    agents = asyncio.run(ask_all())
+    assert len(stack) == 1
+    assert all(agent is stack[0] for agent in agents)
+    assert registry.mcp_client().tools_listed == 1
+
+
+def test_agent_is_rebuilt_after_the_ttl(stack):
+    registry = ai_agent.AgentRegistry(url="http://mcp.test/mcp", ttl=0.1)
+
+    async def ask_twice():
+        first = await registry.get()
+        assert await registry.get() is first
+        await asyncio.sleep(0.15)
+        return first, await registry.get()
+
+    first, second = asyncio.run(ask_twice())
+    assert len(stack) == 2
+    assert second is stack[1] and second is not first
+
+
+def test_failed_refresh_keeps_the_old_agent(stack):
+    registry = ai_agent.AgentRegistry(url="http://mcp.test/mcp", ttl=0.1)
+
+    async def refresh_during_outage():
+        first = await registry.get()
+        registry.mcp_client().failing = True
+        await asyncio.sleep(0.15)
+        during = [await registry.get() for _ in range(3)]
+        return first, during
+
+    first, during = asyncio.run(refresh_during_outage())
+    assert all(agent is first for agent in during)
+    assert len(stack) == 1
+    # One failed attempt, then no retries until RETRY_AFTER has passed
+    assert registry.mcp_client().tools_listed == 2
+
+
+def test_first_build_failure_is_raised(stack):
+    registry = ai_agent.AgentRegistry(url="http://mcp.test/mcp")
+    registry.mcp_client().failing = True
+    with pytest.raises(ConnectionError):
+        asyncio.run(registry.get())
+    assert not stack
@@ -0,0 +1,57 @@
+# tests/test_ai_service.py
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import func, select
+
+from newapp import ai_agent, llm_gate, models
+from newapp.ai_service import AIAssistant
+from newapp.database import SessionLocal
+
+UNSURE = "I don't have enough information about that, sorry."
+
+
+class Chunk:
+    type = "AIMessageChunk"
+
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeAgent:
+    async def astream(self, inputs, stream_mode="messages"):
+        for word in UNSURE.split(" "):
+            yield Chunk(word + " "), {}
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    registry = ai_agent.registry
+    monkeypatch.setattr(registry, "_agent", FakeAgent())
+    monkeypatch.setattr(registry, "_built_at", time.monotonic())
+    monkeypatch.setattr(registry, "gate", llm_gate.LLMGate(max_concurrency=10, rate=0))
+
+
+def stored(user_id: int) -> list:
+    with SessionLocal() as db:
+        return db.execute(select(models.ChatHistory.is_user, func.count()).where(
+            models.ChatHistory.user_id == user_id).group_by(models.ChatHistory.is_user)).all()
+
+
+def test_failed_write_still_stores_the_question(agent, make_user, monkeypatch):
+    user_id = make_user().id
+
+    def conflicting_row(self, user_id, question):
+        # Flushed with the reply, so the write fails half-way and leaves the session to be rolled back
+        self.db.add(models.AppMeta(key="schema_version", value="0"))
+
+    monkeypatch.setattr(AIAssistant, "_queue_unanswered_question", conflicting_row)
+
+    async def ask():
+        return [event async for event in AIAssistant(SessionLocal()).stream_response(
+            user_id, "Who runs the robotics society night?")]
+
+    with pytest.raises(Exception, match="UNIQUE constraint failed"):
+        asyncio.run(ask())
+    assert stored(user_id) == [(True, 1)]
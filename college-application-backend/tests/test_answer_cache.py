@@ -0,0 +1,31 @@
+# tests/test_answer_cache.py
+import pytest
+
+from newapp.answer_cache import AnswerCache
+
+
+@pytest.fixture
+def cache():
+    return AnswerCache(near_duplicates=True)
+
+
+def test_rephrased_question_is_a_near_hit(cache):
+    cache.put("end semester examinations schedule", {"response": "from 24 November"}, 0.85, [])
+    assert cache.get("end-semester examination schedule").response["response"] == "from 24 November"
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("Warden of hostel 3", "Warden of hostel 4"),
+    ("CS101 syllabus", "CS102 syllabus"),
+    ("Fee structure 2024", "Fee structure 2025"),
+    ("Warden of hostel 3", "Warden of hostel"),
+])
+def test_different_number_or_code_is_a_miss(cache, cached, asked):
+    cache.put(cached, {"response": cached}, 0.85, [])
+    assert cache.get(asked) is None
+    assert cache.get(cached).response["response"] == cached
+
+
+def test_same_number_reworded_is_a_hit(cache):
+    cache.put("hostel 3 warden contact number", {"response": "0491 209 1234"}, 0.85, [])
+    assert cache.get("Hostel 3 warden contact numbers?").response["response"] == "0491 209 1234"
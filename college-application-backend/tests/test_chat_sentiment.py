@@ -0,0 +1,84 @@
+# tests/test_chat_sentiment.py
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, insert, select
+
+from newapp import chat_sentiment, models
+from newapp.database import engine
+
+CORPUS = [
+    "Had a great time at the club meeting today!", "This assignment is killing me, I hate it",
+    "Anyone up for lunch at the mess?", "I'm so tired and stressed about the exams",
+    "Congrats on the results, amazing work!", "Ugh the wifi is awful in the hostel", "ok",
+]
+MESSAGES = 60
+
+
+def reset(keep_cache: bool = False):
+    with engine.begin() as conn:
+        if not keep_cache:
+            conn.execute(delete(models.MessageSentiment.__table__))
+        conn.execute(delete(models.ChatAnalysis.__table__))
+    chat_sentiment.set_watermark(0)
+
+
+def snapshot(user_ids) -> dict:
+    table = models.ChatAnalysis.__table__
+    with engine.connect() as conn:
+        return {(row.user_id, row.analysis_date): tuple(row._mapping[c] for c in chat_sentiment.AGGREGATE_COLUMNS)
+                for row in conn.execute(select(table).where(table.c.user_id.in_(user_ids)))}
+
+
+@pytest.fixture
+def chat(db, make_user):
+    rng = random.Random(3)
+    user_ids = [make_user().id for _ in range(4)]
+    group = models.ChatGroup(name="Sentiment", created_by=user_ids[0])
+    db.add(group)
+    db.commit()
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(delete(models.ChatMessage.__table__))
+        conn.execute(insert(models.ChatMessage.__table__), [{
+            "group_id": group.id, "sender_id": rng.choice(user_ids), "message": rng.choice(CORPUS),
+            "created_at": now - timedelta(days=rng.uniform(0, 3), seconds=chat_sentiment.SETTLE),
+        } for _ in range(MESSAGES)])
+    reset()
+    yield {"user_ids": user_ids, "group_id": group.id}
+    reset()
+
+
+def test_restart_resumes_from_the_watermark(chat):
+    everything = chat_sentiment.run(workers=0)
+    reference = snapshot(chat["user_ids"])
+    assert everything["messages"] == MESSAGES and reference
+
+    reset()
+    first = chat_sentiment.process_batch(workers=0, batch_size=25)
+    rest = chat_sentiment.run(workers=0)
+    assert first["messages"] + rest["messages"] == MESSAGES
+    assert snapshot(chat["user_ids"]) == reference
+
+
+def test_rerun_from_zero_uses_the_cache_and_changes_nothing(chat):
+    chat_sentiment.run(workers=0)
+    reference = snapshot(chat["user_ids"])
+
+    reset(keep_cache=True)
+    again = chat_sentiment.run(workers=0)
+    assert again["scored"] == 0 and again["cached"] == MESSAGES
+    assert snapshot(chat["user_ids"]) == reference
+
+
+def test_recent_messages_wait_until_settled(chat, monkeypatch):
+    chat_sentiment.run(workers=0)
+    with engine.begin() as conn:
+        conn.execute(insert(models.ChatMessage.__table__).values(
+            group_id=chat["group_id"], sender_id=chat["user_ids"][0], message="Best fest ever",
+            created_at=datetime.utcnow()))
+    assert chat_sentiment.run(workers=0)["messages"] == 0
+
+    monkeypatch.setattr(chat_sentiment, "SETTLE", 0)
+    assert chat_sentiment.run(workers=0)["messages"] == 1
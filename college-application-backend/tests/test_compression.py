@@ -0,0 +1,50 @@
+# tests/test_compression.py
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+from newapp.compression import MINIMUM_SIZE, CompressionMiddleware
+
+ROW = b'{"id":1,"title":"Cycle for sale","price":2500},'
+BIG = ROW * (2 * MINIMUM_SIZE // len(ROW))
+
+
+def streamed(*parts: bytes, **headers):
+    async def endpoint(request):
+        def body():
+            yield from parts
+        return StreamingResponse(body(), media_type="application/json", headers=headers)
+    return endpoint
+
+
+def whole(body: bytes):
+    async def endpoint(request):
+        return Response(body, media_type="application/json")
+    return endpoint
+
+
+app = Starlette(routes=[
+    Route("/tiny-stream", streamed(b"[", b'{"id":1}', b"]")),
+    Route("/big-stream", streamed(b"[", *[ROW] * (2 * MINIMUM_SIZE // len(ROW)), b"{}]")),
+    Route("/events", streamed(b"[", BIG, b"]", **{"Cache-Control": "no-cache, no-transform"})),
+    Route("/tiny", whole(b'{"id":1}')),
+    Route("/big", whole(BIG)),
+])
+app.add_middleware(CompressionMiddleware)
+client = TestClient(app)
+
+
+@pytest.mark.parametrize("path, encoded", [
+    ("/tiny-stream", False),
+    ("/big-stream", True),
+    ("/events", False),
+    ("/tiny", False),
+    ("/big", True),
+])
+def test_only_bodies_of_minimum_size_are_compressed(path, encoded):
+    response = client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert (response.headers.get("content-encoding") == "gzip") is encoded
+    assert response.content == client.get(path, headers={"Accept-Encoding": "identity"}).content
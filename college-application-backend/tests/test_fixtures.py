@@ -0,0 +1,51 @@
+# tests/test_fixtures.py
+import copy
+
+from newapp import fixtures, models
+
+MONDAY_BREAKFAST = ("WEEK_1", "MONDAY", "BREAKFAST")
+
+
+def menu_item(db, name: str):
+    week_type, day, meal_type = MONDAY_BREAKFAST
+    db.expire_all()
+    return db.query(models.MessMenuItem).filter(
+        models.MessMenuItem.menu_week_type == models.MenuWeekType[week_type],
+        models.MessMenuItem.day_of_week == models.DayOfWeek[day],
+        models.MessMenuItem.meal_type == models.MealType[meal_type],
+        models.MessMenuItem.item_name == name,
+    ).first()
+
+
+def test_menu_reload_keeps_admin_items_and_votes(db, monkeypatch):
+    _, data = fixtures._read("mess_menu")
+    edited = copy.deepcopy(data)
+    week_type, day, meal_type = MONDAY_BREAKFAST
+    items = edited["menu"][week_type][day][meal_type]
+    removed = items.pop(0)[0]
+    items.append(["Poha", "Main", 4.2, 10])
+    kept = items[0][0]
+    items[0][1] = "Common (refilled)"
+
+    admin_item = models.MessMenuItem(menu_week_type=models.MenuWeekType[week_type],
+                                     day_of_week=models.DayOfWeek[day], meal_type=models.MealType[meal_type],
+                                     item_name="Admin special", description="Main")
+    db.add(admin_item)
+    menu_item(db, kept).votes = 999
+    db.commit()
+
+    monkeypatch.setattr(fixtures, "_read", lambda name: ("edited", edited))
+    try:
+        assert fixtures.load_fixture("mess_menu")
+        assert menu_item(db, "Admin special") is not None
+        assert menu_item(db, removed) is None
+        assert menu_item(db, "Poha") is not None
+        assert menu_item(db, kept).description == "Common (refilled)"
+        assert menu_item(db, kept).votes == 999
+    finally:
+        monkeypatch.undo()
+        fixtures.load_fixture("mess_menu")
+        db.delete(menu_item(db, "Admin special"))
+        db.commit()
+    assert menu_item(db, removed) is not None
+    assert menu_item(db, "Poha") is None
@@ -0,0 +1,37 @@
+# tests/test_mess_menu_cache.py
+from datetime import datetime, timedelta
+
+from starlette.requests import Request
+
+from newapp.mess_menu_cache import MessMenuCache, menu_response, week_type_for
+
+# A Wednesday, then the Monday after it: the week type flips in between
+WEDNESDAY = datetime(2031, 1, 8, 12, 0)
+NEXT_WEEK = datetime(2031, 1, 13, 1, 0)
+
+
+def conditional_get(entry, **headers):
+    request = Request({"type": "http", "headers": [(name.replace("_", "-").encode(), value.encode())
+                                                   for name, value in headers.items()]})
+    return menu_response(request, entry)
+
+
+def test_rollover_is_not_answered_with_not_modified(db):
+    assert week_type_for(WEDNESDAY) != week_type_for(NEXT_WEEK)
+    cache = MessMenuCache()
+    this_week = cache.get(db, now=WEDNESDAY)
+    since = conditional_get(this_week).headers["last-modified"]
+    assert conditional_get(this_week, if_modified_since=since).status_code == 304
+
+    next_week = cache.get(db, now=NEXT_WEEK)
+    assert next_week.last_modified > this_week.last_modified
+    response = conditional_get(next_week, if_modified_since=since)
+    assert response.status_code == 200
+    assert response.body == next_week.body
+
+
+def test_last_modified_is_at_least_the_week_start(db):
+    entry = MessMenuCache().get(db, now=NEXT_WEEK)
+    week_start = NEXT_WEEK.replace(hour=0)
+    assert entry.last_modified >= week_start
+    assert entry.expires_at == week_start + timedelta(days=7)
@@ -0,0 +1,59 @@
+# tests/test_query_budget.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from newapp import models
+from newapp.admin_auth import create_admin_token
+from newapp.club_directory import directory_cache
+from newapp.pytest_query_budget import QueryBudgetExceeded
+
+
+@pytest.fixture
+def clubs(db, make_user):
+    head = make_user()
+    followers = [make_user() for _ in range(5)]
+    clubs = [models.Club(name=f"Budget club {head.id}-{i}", category="Technical", description="Test club",
+                         club_head_id=head.id) for i in range(20)]
+    db.add_all(clubs)
+    db.flush()
+    db.add_all(models.ClubFollower(club_id=club.id, user_id=user.id) for club in clubs for user in followers)
+    db.commit()
+    directory_cache.invalidate()
+    yield clubs
+    directory_cache.invalidate()
+
+
+def test_club_directory_is_a_fixed_number_of_queries(client, clubs, route_budget):
+    response = route_budget(client, "GET", "/clubs/", max_queries=3)
+    assert response.status_code == 200
+    listed = {club["name"]: club for club in response.json()}
+    assert all(listed[club.name]["follower_count"] == 5 for club in clubs)
+
+
+def test_cached_club_directory_needs_no_queries(client, clubs, route_budget):
+    client.get("/clubs/")
+    assert route_budget(client, "GET", "/clubs/", max_queries=0).status_code == 200
+
+
+def test_budget_catches_per_row_queries(db, clubs, query_budget):
+    with pytest.raises(QueryBudgetExceeded, match="N\\+1"):
+        with query_budget(allow_n_plus_one=False):
+            for club in clubs:
+                db.query(models.ClubFollower).filter(models.ClubFollower.club_id == club.id).count()
+
+
+def test_rsvps_and_likes_keep_the_cached_directory(client, db, clubs, make_user, route_budget):
+    user = make_user()
+    admin = models.AdminUser(user_id=user.id, admin_level="admin")
+    event = models.ClubEvent(club_id=clubs[0].id, title="Budget talk", description="Test event",
+                             event_date=datetime.utcnow() + timedelta(days=3), location="Hall")
+    db.add_all([admin, event])
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_admin_token(admin.id, user.id)}"}
+    client.get("/clubs/")
+    assert client.post(f"/clubs/events/{event.id}/register", headers=headers).status_code == 200
+    assert client.post(f"/clubs/events/{event.id}/like", headers=headers).status_code == 200
+    assert client.post(f"/clubs/events/{event.id}/like", headers=headers).status_code == 200
+    assert client.delete(f"/clubs/events/{event.id}/register", headers=headers).status_code == 200
+    assert route_budget(client, "GET", "/clubs/", max_queries=0).status_code == 200
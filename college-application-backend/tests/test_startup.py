@@ -0,0 +1,61 @@
+# tests/test_startup.py
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+from sqlalchemy.orm import Session
+
+from newapp import models, startup
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """A database from before the unique (user, day) indexes, with the old wellness index"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for name in ("uq_wellness_entries_user_date", "uq_daily_analyses_user_date", "uq_chat_analyses_user_date"):
+            conn.execute(text(f"DROP INDEX {name}"))
+        conn.execute(text("CREATE INDEX ix_wellness_entries_user_date ON wellness_entries (user_id, date)"))
+    with Session(engine) as db:
+        yield db
+
+
+def entry(**fields):
+    values = dict(user_id=1, date=date(2025, 3, 1), mood_score=3, stress_level=5, energy_level=5)
+    return models.WellnessEntry(**{**values, **fields})
+
+
+def test_duplicates_are_merged_not_dropped(legacy_db):
+    legacy_db.add_all([
+        entry(mood_score=2, sleep_hours=6.5, notes="exam tomorrow", triggers="exams,sleep",
+              created_at=datetime(2025, 3, 1, 8)),
+        entry(mood_score=4, notes="felt better after the walk", triggers="exams,friends",
+              created_at=datetime(2025, 3, 1, 20)),
+        entry(date=date(2025, 3, 2), mood_score=5),
+    ])
+    legacy_db.commit()
+
+    startup.deduplicate_daily_rows(legacy_db)
+
+    rows = legacy_db.scalars(select(models.WellnessEntry).order_by(models.WellnessEntry.date)).all()
+    assert len(rows) == 2
+    merged = rows[0]
+    assert merged.mood_score == 4  # newest wins
+    assert merged.sleep_hours == 6.5  # filled from the older row
+    assert merged.notes == "exam tomorrow\nfelt better after the walk"
+    assert merged.triggers == "exams,sleep,friends"
+    assert merged.created_at == datetime(2025, 3, 1, 8)
+    assert rows[1].mood_score == 5
+
+
+def test_runs_once_per_table_and_drops_the_old_index(legacy_db):
+    startup.deduplicate_daily_rows(legacy_db)
+    indexes = {index["name"] for index in inspect(legacy_db.connection()).get_indexes("wellness_entries")}
+    assert "ix_wellness_entries_user_date" not in indexes
+
+    legacy_db.add_all([entry(), entry(mood_score=1)])
+    legacy_db.commit()
+    startup.deduplicate_daily_rows(legacy_db)  # a later schema bump
+    assert legacy_db.scalar(select(models.WellnessEntry.id).where(models.WellnessEntry.mood_score == 1))
+    assert len(legacy_db.scalars(select(models.WellnessEntry)).all()) == 2
@@ -0,0 +1,145 @@
+# tests/test_wellness_stats.py
+"""
+The rolling aggregates against the batch formulas they replaced
+(np.mean/np.std/np.polyfit and the wellness_routes helpers), every window,
+every day, through gaps, missing sleep and same-day re-check-ins.
+"""
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from newapp import wellness_stats
+from newapp.models import WellnessEntry
+from newapp.wellness_routes import analyze_weekly_patterns, calculate_correlation, calculate_streak
+
+START = date(2026, 1, 5)
+DAYS = 100
+TOLERANCE = 1e-6
+
+
+def random_values(rng: random.Random) -> dict:
+    return {
+        "mood_score": rng.choice([1, 1.5, 2, 2.5, 3, 3.5, 4, 4.5, 5]),
+        "stress_level": float(rng.randint(1, 10)),
+        "energy_level": float(rng.randint(1, 10)),
+        "sleep_hours": None if rng.random() < 0.2 else rng.choice([4, 5, 5.5, 6, 7, 7.5, 8, 9]),
+    }
+
+
+def check_in(db, rng: random.Random, user_id: int, day: date):
+    entry = WellnessEntry(user_id=user_id, date=day, **random_values(rng))
+    db.add(entry)
+    wellness_stats.record_checkin(db, entry)
+    db.commit()
+    if rng.random() < 0.1:
+        for name, value in random_values(rng).items():
+            setattr(entry, name, value)
+        wellness_stats.record_checkin(db, entry, replaced=True)
+        db.commit()
+
+
+def batch(entries: list, days: int, today: date) -> dict:
+    entries = sorted((e for e in entries if e.date >= today - timedelta(days=days)), key=lambda e: e.date)
+    if not entries:
+        return {"n": 0}
+    moods = [e.mood_score for e in entries]
+    stress = [e.stress_level for e in entries]
+    energy = [e.energy_level for e in entries]
+    sleep = [e.sleep_hours or 0 for e in entries]
+    reported = [e.sleep_hours for e in entries if e.sleep_hours]
+    ordinals = [e.date.toordinal() for e in entries]
+    correlations = {}
+    for name, series in (("sleep", sleep), ("stress", stress), ("energy", energy)):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            value = calculate_correlation(series, moods)
+        correlations[name] = 0.0 if value != value else value  # nan -> 0.0, as the aggregate reports it
+    return {
+        "n": len(entries),
+        "mood": float(np.mean(moods)), "stress": float(np.mean(stress)),
+        "energy": float(np.mean(energy)), "sleep": float(np.mean(sleep)),
+        "mood_std": float(np.std(moods)),
+        "stress_slope": float(np.polyfit(ordinals, stress, 1)[0]) if len(set(ordinals)) > 1 else 0.0,
+        "sleep_mean": float(np.mean(reported)) if reported else None,
+        "recent_sleep": reported[-3:],
+        "correlations": correlations,
+        "streak": calculate_streak(entries),
+        "weekly": analyze_weekly_patterns(entries),
+    }
+
+
+def aggregate(state: dict, days: int) -> dict:
+    window = wellness_stats.window(state, days)
+    if not window["n"]:
+        return {"n": 0}
+    return {
+        "n": window["n"],
+        "mood": wellness_stats.mean(window, "mood"), "stress": wellness_stats.mean(window, "stress"),
+        "energy": wellness_stats.mean(window, "energy"), "sleep": wellness_stats.mean(window, "sleep"),
+        "mood_std": wellness_stats.std(window, "mood"),
+        "stress_slope": wellness_stats.slope(window, "day", "stress"),
+        "sleep_mean": wellness_stats.sleep_mean(window),
+        "recent_sleep": wellness_stats.recent_sleep(state, days),
+        "correlations": {name: wellness_stats.correlation(window, name, "mood")
+                         for name in ("sleep", "stress", "energy")},
+        "streak": wellness_stats.streak(state, days),
+        "weekly": wellness_stats.weekly_patterns(state, days),
+    }
+
+
+def differences(expected, actual, path="") -> list:
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        if set(expected) != set(actual):
+            return [f"{path}: keys {sorted(expected)} != {sorted(actual)}"]
+        return [d for key in expected for d in differences(expected[key], actual[key], f"{path}.{key}")]
+    if isinstance(expected, list) and isinstance(actual, list) and len(expected) == len(actual):
+        return [d for i, (a, b) in enumerate(zip(expected, actual)) for d in differences(a, b, f"{path}[{i}]")]
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        # Correlations are rounded to 2 places; allow the last digit to flip
+        tolerance = 0.0100001 if ".correlations." in path else TOLERANCE
+        return [] if abs(expected - actual) <= tolerance else [f"{path}: {expected} != {actual}"]
+    return [] if expected == actual else [f"{path}: {expected} != {actual}"]
+
+
+def month_differences(entries: list, state: dict, today: date) -> list:
+    month = [e for e in entries if today.replace(day=1) <= e.date <= today]
+    if not month:
+        return [] if state["month"]["n"] == 0 else ["month: expected empty"]
+    best = max(month, key=lambda e: e.mood_score)
+    worst = min(month, key=lambda e: e.mood_score)
+    expected = {"n": len(month), "mood": sum(e.mood_score for e in month) / len(month),
+                "best": [best.date.isoformat(), best.mood_score], "worst": [worst.date.isoformat(), worst.mood_score]}
+    got = state["month"]
+    actual = {"n": got["n"], "mood": got["sum"]["mood"] / got["n"], "best": got["best"], "worst": got["worst"]}
+    return differences(expected, actual, ".month")
+
+
+@pytest.mark.parametrize("check_in_rate", [0.9, 0.4], ids=["most-days", "sparse"])
+def test_rolling_aggregates_match_batch_formulas(db, make_user, check_in_rate):
+    rng = random.Random(42)
+    user_id = make_user().id
+    problems = []
+    for offset in range(DAYS):
+        today = START + timedelta(days=offset)
+        if rng.random() < check_in_rate:
+            check_in(db, rng, user_id, today)
+        state = wellness_stats.load(db, user_id, today)
+        entries = db.query(WellnessEntry).filter(WellnessEntry.user_id == user_id).all()
+        problems += [f"{today}: {p}" for p in month_differences(entries, state, today)]
+        for days in wellness_stats.WINDOWS:
+            problems += [f"{today}: {p}" for p in differences(batch(entries, days, today), aggregate(state, days),
+                                                              f"[{days}d]")]
+    assert not problems, problems[:5]
+
+
+def test_analytics_is_one_query_over_the_entries(client, db, make_user, route_budget):
+    user_id = make_user().id
+    today = date.today()
+    db.add_all(WellnessEntry(user_id=user_id, date=today - timedelta(days=d), mood_score=3 + d % 2,
+                             stress_level=5, energy_level=6, sleep_hours=7) for d in range(10))
+    db.commit()
+    response = route_budget(client, "GET", f"/wellness/analytics/{user_id}?days=30", max_queries=1)
+    assert response.status_code == 200
+    assert response.json()["statistics"]["total_entries"] == 10
+    assert response.json()["statistics"]["avg_mood"] == 3.5